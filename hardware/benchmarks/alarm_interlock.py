@@ -0,0 +1,128 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from control import server  # noqa: E402
+from control.calibration import FlowCalibrationStore  # noqa: E402
+from control.constants import RIG_CLOSED_ANGLE, RIG_DIAGNOSTIC_SERVO_CHANNELS, RIG_OPEN_ANGLE  # noqa: E402
+from control.session import DeviceTimings, SimulatedGpio, SimulatedServo  # noqa: E402
+
+# Thermal alarm interlock against simulated rig servos: a closed-loop dispense is started, an over-temperature
+# alarm with actions goes active after its second pulse, and the check fails unless the valve is closed at once,
+# no further pulse opens it, the client gets dispense_failed with the alarm and a stir is refused; once the alarm
+# clears a dispense runs again. A manual rig_set may close the valve during the alarm but not open it.
+#   python benchmarks/alarm_interlock.py
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.messages: list[dict] = []
+
+    async def send(self, payload: str) -> None:
+        self.messages.append(json.loads(payload))
+
+    def replies(self) -> list[dict]:
+        return [message for message in self.messages if message.get("type") in ("ack", "error")]
+
+
+def alarm(status: str) -> dict:
+    return {
+        "rule": "bench_overtemp",
+        "status": status,
+        "kind": "max_above",
+        "value": 95.0 if status == "active" else 40.0,
+        "trigger": 90.0,
+        "clear": 85.0,
+        "roi": [0, 0, 32, 24],
+        "actions": ["close_non_base_servos", "force_stirrer_off"],
+        "atMs": int(time.time() * 1000),
+    }
+
+
+async def command(websocket: Recorder, payload: dict) -> dict:
+    before = len(websocket.replies())
+    await server.handle_message(websocket, json.dumps(payload))
+    # Valve moves are acknowledged from a spawned task once the write lands.
+    while len(websocket.replies()) == before:
+        await asyncio.sleep(0.01)
+    return websocket.replies()[before]
+
+
+async def main_async(directory: str) -> None:
+    server.THERMAL_ALARM_ACTIONS_ENABLED = True
+    server.CLIP_CAPTURE_ENABLED = False
+    server.flow_calibration = FlowCalibrationStore(os.path.join(directory, "flow_calibration.bin"))
+    rig = server.rig_controller
+    rig.servos = [SimulatedServo(DeviceTimings({}, 1.0), angle) for angle in rig.servo_angles]
+    rig.lgpio = SimulatedGpio()
+    rig.gpio_handle = 0
+    rig.available = True
+    rig.initializing = False
+    rig.error = None
+
+    valve = RIG_DIAGNOSTIC_SERVO_CHANNELS[0]
+    opens: list[float] = []
+    write_servo = rig._write_servo
+
+    def counting_write(channel: int, angle: float) -> None:
+        if channel == valve and angle == RIG_OPEN_ANGLE:
+            opens.append(time.monotonic())
+        write_servo(channel, angle)
+
+    rig._write_servo = counting_write
+
+    async def measure(_frame_timeout_s: float) -> float:
+        # Each pulse shows a little liquid, so the loop keeps pulsing toward the target.
+        await asyncio.sleep(0.02)
+        return 10.0 + 0.1 * len(opens)
+
+    server.volume_estimator.measure = measure
+
+    websocket = Recorder()
+    server.clients.add(websocket)
+    server.client_send_locks[websocket] = asyncio.Lock()
+    dispense = {"type": "dispense", "dropper": 1, "amountMl": 2.0, "mode": "closed_loop"}
+    job = asyncio.create_task(command(websocket, dispense))
+    while len(opens) < 2:
+        await asyncio.sleep(0.01)
+    await server.handle_thermal_alarm(alarm("active"))
+    closed_at_alarm = rig.servo_angles[valve] == RIG_CLOSED_ANGLE
+    opens_at_alarm = len(opens)
+    reply = await asyncio.wait_for(job, timeout=30.0)
+    stir = await command(websocket, {"type": "automation_stir", "durationS": 1.0})
+    opened = await command(websocket, {"type": "rig_set", "channel": valve, "angle": RIG_OPEN_ANGLE})
+    closed = await command(websocket, {"type": "rig_set", "channel": valve, "angle": RIG_CLOSED_ANGLE})
+    opens_while_active = len(opens) - opens_at_alarm
+
+    await server.handle_thermal_alarm(alarm("cleared"))
+    after_clear = await command(websocket, {"type": "dispense", "dropper": 1, "amountMl": 0.5})
+
+    print(f"pulses before the alarm {opens_at_alarm}, while it was active {opens_while_active}")
+    print(f"valve closed by the alarm: {closed_at_alarm}")
+    print(f"dispense reply: {reply.get('error', reply.get('type'))}")
+    print(f"stir while active: {stir.get('error', stir.get('type'))}")
+    print(f"rig_set open while active: {opened.get('error', opened.get('type'))}, close: {closed['type']}")
+    print(f"dispense after clear: {after_clear['type']}")
+    assert closed_at_alarm
+    assert opens_while_active == 0
+    assert reply["type"] == "error" and reply["error"].startswith("dispense_failed:thermal_alarm_active")
+    assert reply["jobId"].startswith("dispense")
+    assert stir["type"] == "error" and stir["error"].startswith("thermal_alarm_active")
+    assert opened["type"] == "error" and opened["error"].startswith("thermal_alarm_active")
+    assert closed["type"] == "ack"
+    assert after_clear["type"] == "ack"
+    print("ok")
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(main_async(directory))
+
+
+if __name__ == "__main__":
+    main()
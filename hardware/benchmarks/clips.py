@@ -0,0 +1,110 @@
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Awaitable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from control.clips import ClipArchiver, read_clip  # noqa: E402
+from control.constants import CLIP_DIRECTORY, CLIP_POST_S, CLIP_PRE_S, CLIP_WRITE_BYTES_PER_S  # noqa: E402
+from control.controllers import ThermalController, WebcamController  # noqa: E402
+
+# Automation clip capture with the test-pattern webcam and thermal controllers: a job of the given length runs
+# after the rings have warmed up, and the clip is checked against the window (frames from CLIP_PRE_S before to
+# CLIP_POST_S after, consecutive ids, intact JPEGs) read back from disk. Webcam frame gaps and event loop lag
+# are compared with and without a clip being cut and written, and the writer's bandwidth against its budget.
+#   python benchmarks/clips.py --job-s 3
+
+
+async def watch(webcam: WebcamController, stop: asyncio.Event) -> tuple[list[float], list[float]]:
+    gaps: list[float] = []
+    lags: list[float] = []
+    last_id, last_at = webcam.frame_counter, time.monotonic()
+    while not stop.is_set():
+        expected = time.monotonic() + 0.01
+        await asyncio.sleep(0.01)
+        lags.append(max(0.0, time.monotonic() - expected))
+        if webcam.frame_counter != last_id:
+            now = time.monotonic()
+            gaps.append(now - last_at)
+            last_id, last_at = webcam.frame_counter, now
+    return gaps, lags
+
+
+async def phase(webcam: WebcamController, seconds: float, job: Awaitable[None] | None = None) -> tuple[list[float], list[float]]:
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(watch(webcam, stop))
+    if job is not None:
+        await job
+    else:
+        await asyncio.sleep(seconds)
+    stop.set()
+    return await watcher
+
+
+def summary(name: str, gaps: list[float], lags: list[float]) -> None:
+    print(
+        f"{name:<13} webcam gap p50 {1000 * statistics.median(gaps):5.1f} ms max {1000 * max(gaps):6.1f} ms"
+        f"  loop lag max {1000 * max(lags):5.1f} ms"
+    )
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    thermal = ThermalController(test_pattern=True)
+    webcam = WebcamController(test_pattern=True)
+    await asyncio.gather(thermal.initialize(), webcam.initialize())
+    await thermal.start()
+    await webcam.start()
+    archiver = ClipArchiver({"webcam": webcam.ring, "thermal": thermal.ring})
+    await archiver.start()
+    await asyncio.sleep(CLIP_PRE_S + 1.0)
+
+    summary("idle", *await phase(webcam, CLIP_PRE_S + args.job_s + CLIP_POST_S))
+
+    async def job() -> None:
+        archiver.begin("bench", "dispense-0001", "dispense", {"dropper": 1})
+        await asyncio.sleep(args.job_s)
+        archiver.end("dispense-0001", "completed")
+        while archiver.written == 0:
+            await asyncio.sleep(0.1)
+
+    started = time.monotonic()
+    summary("clip running", *await phase(webcam, 0.0, job()))
+    elapsed = time.monotonic() - started
+
+    meta, streams = read_clip(os.path.join(CLIP_DIRECTORY, "bench", "dispense-0001"))
+    for name, frames in streams.items():
+        ids = [frame_id for frame_id, _updated_ms, _jpeg in frames]
+        times = [updated_ms for _frame_id, updated_ms, _jpeg in frames]
+        intact = all(jpeg[:2] == b"\xff\xd8" and jpeg[-2:] == b"\xff\xd9" for _id, _ms, jpeg in frames)
+        print(
+            f"{name:<7} {len(frames):4d} frames  ids consecutive {ids == list(range(ids[0], ids[0] + len(ids)))}"
+            f"  jpegs intact {intact}  covers {(meta['fromMs'] - times[0]) / 1000:+.2f} s before window start"
+            f" to {(times[-1] - meta['toMs']) / 1000:+.2f} s after window end"
+        )
+    print(
+        f"clip of {meta['toMs'] - meta['fromMs']} ms: {archiver.bytes_written / 1e6:.1f} MB written,"
+        f" done {elapsed - args.job_s - CLIP_POST_S:.2f} s after the window closed"
+        f" (budget {CLIP_WRITE_BYTES_PER_S / 1e6:g} MB/s), dropped {meta['dropped']}"
+    )
+    await archiver.stop()
+    await thermal.stop()
+    await webcam.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Automation clip capture from the frame rings.")
+    parser.add_argument("--job-s", type=float, default=3.0)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        # CLIP_DIRECTORY is relative, so the clip lands in the temporary directory.
+        os.chdir(directory)
+        asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
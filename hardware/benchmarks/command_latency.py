@@ -0,0 +1,119 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+
+import aiohttp
+import websockets
+
+HARDWARE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HARDWARE_DIR)
+
+from control.constants import PORT, THERMAL_HTTP_PORT, WEBCAM_STREAM_PATH  # noqa: E402
+
+# Command round-trip latency while MJPEG viewers pull the webcam stream, with media in-process vs
+# in the child media process. Runs the real server on test-pattern frames, so no hardware is needed.
+#   python benchmarks/command_latency.py --viewers 20 --seconds 15
+
+SERVER_BOOTSTRAP = """
+import asyncio
+import control.constants as constants
+constants.MEDIA_PROCESS_ENABLED = {media_process}
+constants.MEDIA_TEST_PATTERN = True
+from control.server import main
+asyncio.run(main())
+"""
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def wait_for_stream(session: aiohttp.ClientSession, timeout_s: float) -> None:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(f"http://127.0.0.1:{THERMAL_HTTP_PORT}/webcam.json") as response:
+                if response.status == 200 and (await response.json()).get("frameId", 0) > 0:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError("server did not start streaming")
+
+
+async def run_mode(media_process: bool, viewers: int, seconds: float) -> dict[str, float]:
+    server = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-c",
+        SERVER_BOOTSTRAP.format(media_process=media_process),
+        cwd=HARDWARE_DIR,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    received = [0]
+    latencies_ms: list[float] = []
+    try:
+        async with aiohttp.ClientSession() as session:
+            await wait_for_stream(session, 30.0)
+            deadline = time.monotonic() + seconds
+
+            async def viewer() -> None:
+                async with session.get(f"http://127.0.0.1:{THERMAL_HTTP_PORT}{WEBCAM_STREAM_PATH}") as response:
+                    async for chunk in response.content.iter_any():
+                        received[0] += len(chunk)
+                        if time.monotonic() >= deadline:
+                            return
+
+            async with websockets.connect(f"ws://127.0.0.1:{PORT}", max_size=None) as client:
+
+                async def command_loop() -> None:
+                    while time.monotonic() < deadline:
+                        started = time.perf_counter()
+                        await client.send(json.dumps({"type": "get_state"}))
+                        while json.loads(await client.recv()).get("type") != "state":
+                            pass
+                        latencies_ms.append((time.perf_counter() - started) * 1000.0)
+                        await asyncio.sleep(0.02)
+
+                await asyncio.gather(command_loop(), *(viewer() for _ in range(viewers)))
+    finally:
+        server.send_signal(signal.SIGINT)
+        try:
+            await asyncio.wait_for(server.wait(), 15.0)
+        except TimeoutError:
+            server.kill()
+            await server.wait()
+
+    return {
+        "commands": len(latencies_ms),
+        "p50_ms": percentile(latencies_ms, 0.5),
+        "p99_ms": percentile(latencies_ms, 0.99),
+        "max_ms": max(latencies_ms, default=float("nan")),
+        "viewer_mb_s": received[0] / seconds / 1e6,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Command latency under MJPEG fan-out, in-process vs media process.")
+    parser.add_argument("--viewers", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=15.0)
+    args = parser.parse_args()
+
+    for label, media_process in (("in_process", False), ("media_process", True)):
+        result = await run_mode(media_process, args.viewers, args.seconds)
+        print(
+            f"{label:<14} viewers={args.viewers} commands={result['commands']} "
+            f"p50_ms={result['p50_ms']:.2f} p99_ms={result['p99_ms']:.2f} max_ms={result['max_ms']:.2f} "
+            f"viewer_mb_s={result['viewer_mb_s']:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
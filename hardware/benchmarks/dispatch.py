@@ -0,0 +1,89 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from control import server  # noqa: E402
+
+# Messages per second through handle_message with a no-op websocket and a no-op arm, for the
+# dashboard's slider stream (xarm_set) and a few other shapes. Log output goes to /dev/null so the
+# cost of formatting and writing records is counted without flooding the terminal.
+#   python benchmarks/dispatch.py --messages 20000
+
+
+class NullWebsocket:
+    async def send(self, _payload: str) -> None:
+        return None
+
+
+class NullArm:
+    def setPosition(self, *_args: object) -> None:
+        return None
+
+
+def message_sets() -> dict[str, list[str]]:
+    return {
+        "xarm_set": [
+            json.dumps({"type": "xarm_set", "id": 1 + index % 6, "angle": float(index % 90), "moveMs": 120})
+            for index in range(256)
+        ],
+        "legacy_set": [
+            json.dumps({"type": "set", "id": 1 + index % 6, "angle": float(index % 90)}) for index in range(256)
+        ],
+        "get_state": [json.dumps({"type": "get_state"})],
+        "unknown": [json.dumps({"type": "not_a_command", "value": 1})],
+    }
+
+
+async def run_case(messages: list[str], count: int) -> float:
+    websocket = NullWebsocket()
+    server.clients.add(websocket)
+    server.client_send_locks[websocket] = asyncio.Lock()
+    try:
+        started = time.perf_counter()
+        for index in range(count):
+            await server.handle_message(websocket, messages[index % len(messages)])
+        return count / (time.perf_counter() - started)
+    finally:
+        server.clients.discard(websocket)
+        server.client_send_locks.pop(websocket, None)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="handle_message throughput with a no-op transport.")
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(logging.FileHandler(os.devnull))
+
+    server.xarm_controller.arm = NullArm()
+    server.xarm_controller.available = True
+    server.xarm_controller.initializing = False
+    server.xarm_controller.error = None
+
+    decoders = [("json", json.loads)]
+    if server.orjson is not None:
+        decoders.append(("orjson", server.orjson.loads))
+    log_modes = (("log_every", 0.0), ("log_rate_limited", server.COMMAND_LOG_INTERVAL_S or 1.0))
+
+    for case, messages in message_sets().items():
+        for decoder_name, decoder in decoders:
+            for log_name, interval in log_modes:
+                server.decode_json = decoder
+                server.COMMAND_LOG_INTERVAL_S = interval
+                server.command_log_last_monotonic.clear()
+                server.command_log_suppressed.clear()
+                rate = await run_case(messages, args.messages)
+                print(f"{case:<10} {decoder_name:<7} {log_name:<17} {rate:>10.0f} msg/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
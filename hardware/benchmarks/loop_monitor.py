@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from control import loop_monitor  # noqa: E402
+
+# Event loop monitor: dispatch throughput of a synthetic command workload with the monitor off, on, and while
+# the sampling profiler runs; whether a deliberately blocking callback is caught with its stack; and whether
+# the profiler attributes a CPU-heavy coroutine correctly.
+#   python benchmarks/loop_monitor.py --seconds 3
+
+
+async def command_worker(deadline: float, counter: list[int]) -> None:
+    state = {"type": "state", "angles": [90.0] * 16, "servos": list(range(6))}
+    while time.perf_counter() < deadline:
+        json.dumps(state)
+        counter[0] += 1
+        await asyncio.sleep(0)
+
+
+async def throughput(seconds: float) -> float:
+    counter = [0]
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*(command_worker(deadline, counter) for _ in range(8)))
+    return counter[0] / seconds
+
+
+def blocking_valve_write(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+def hot_encode(rounds: int) -> int:
+    total = 0
+    for index in range(rounds):
+        total += len(json.dumps({"frame": index, "pixels": [index] * 64}))
+    return total
+
+
+async def hot_loop(deadline: float) -> None:
+    while time.perf_counter() < deadline:
+        hot_encode(200)
+        await asyncio.sleep(0.002)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Event loop lag monitor and profiler overhead.")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--block-ms", type=float, default=250.0)
+    args = parser.parse_args()
+
+    baseline = await throughput(args.seconds)
+    print(f"monitor off   {baseline:>10.0f} dispatch/s")
+
+    monitor = loop_monitor.LoopMonitor()
+    await monitor.start()
+    monitored = await throughput(args.seconds)
+    print(f"monitor on    {monitored:>10.0f} dispatch/s  ({(monitored / baseline - 1) * 100:+.1f}%)")
+
+    profile = monitor.start_profile(args.seconds)
+    profiled = await throughput(args.seconds)
+    await profile
+    print(f"profiling     {profiled:>10.0f} dispatch/s  ({(profiled / baseline - 1) * 100:+.1f}%)")
+    print(f"lag ema {monitor.lag_ms:.2f}ms  max {monitor.max_lag_ms:.2f}ms over {monitor.samples} ticks")
+
+    asyncio.get_running_loop().call_soon(blocking_valve_write, args.block_ms / 1000.0)
+    await asyncio.sleep(0.3)
+    caught = [entry for entry in monitor.slow_callback_log if any("blocking_valve_write" in line for line in entry["stack"])]
+    print(f"blocked {args.block_ms:.0f}ms: caught={bool(caught)}", end="")
+    if caught:
+        print(f" lagMs={caught[-1]['lagMs']} top={caught[-1]['stack'][-1]}")
+    else:
+        print()
+
+    deadline = time.perf_counter() + 1.0
+    profile = monitor.start_profile(1.0)
+    await hot_loop(deadline)
+    result = await profile
+    print(f"profile samples={result['samples']} busyPct={result['busyPct']}")
+    for entry in result["functions"][:5]:
+        print(f"    {entry['function']:<40} self={entry['selfSamples']:>4} total={entry['totalSamples']:>4}")
+    await monitor.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
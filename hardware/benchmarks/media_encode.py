@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import websockets  # noqa: E402
+
+from control.constants import THERMAL_FRAME_HEIGHT, THERMAL_FRAME_WIDTH  # noqa: E402
+from control.executors import media_executor  # noqa: E402
+from control.media_encoder import MediaEncoderPool, encode_webcam_jpeg, render_thermal_jpeg  # noqa: E402
+
+# Sustained thermal/webcam encode FPS with in-process threads vs the shared-memory process pool,
+# while a websocket client measures round-trip latency through the same event loop.
+#   python benchmarks/media_encode.py --seconds 10 --processes 2
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run_mode(processes: int, seconds: float) -> dict[str, float]:
+    pool = MediaEncoderPool(processes)
+    pool.start()
+    thermal_frame = [20.0 + random.random() * 15.0 for _ in range(THERMAL_FRAME_WIDTH * THERMAL_FRAME_HEIGHT)]
+    webcam_frame = np.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    counts = {"thermal": 0, "webcam": 0}
+    deadline = time.monotonic() + seconds
+
+    async def thermal_loop() -> None:
+        while time.monotonic() < deadline:
+            if pool.available:
+                await pool.encode_thermal(thermal_frame)
+            else:
+                await media_executor.run(render_thermal_jpeg, thermal_frame)
+            counts["thermal"] += 1
+
+    async def webcam_loop() -> None:
+        while time.monotonic() < deadline:
+            if pool.available:
+                await pool.encode_webcam(webcam_frame)
+            else:
+                await media_executor.run(encode_webcam_jpeg, webcam_frame)
+            counts["webcam"] += 1
+
+    async def echo(websocket) -> None:
+        async for message in websocket:
+            await websocket.send(message)
+
+    latencies_ms: list[float] = []
+    async with websockets.serve(echo, "127.0.0.1", 0) as server:
+        port = next(iter(server.sockets)).getsockname()[1]
+        async with websockets.connect(f"ws://127.0.0.1:{port}") as client:
+
+            async def ping_loop() -> None:
+                while time.monotonic() < deadline:
+                    started = time.perf_counter()
+                    await client.send("ping")
+                    await client.recv()
+                    latencies_ms.append((time.perf_counter() - started) * 1000.0)
+                    await asyncio.sleep(0.01)
+
+            # Warm the worker processes before timing.
+            if pool.available:
+                await pool.encode_thermal(thermal_frame)
+                await pool.encode_webcam(webcam_frame)
+            await asyncio.gather(thermal_loop(), webcam_loop(), ping_loop())
+
+    pool.stop()
+    return {
+        "thermal_fps": counts["thermal"] / seconds,
+        "webcam_fps": counts["webcam"] / seconds,
+        "ws_p50_ms": percentile(latencies_ms, 0.5),
+        "ws_p99_ms": percentile(latencies_ms, 0.99),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Media encode throughput with and without process offload.")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--processes", type=int, default=2)
+    args = parser.parse_args()
+
+    for label, processes in (("threads", 0), (f"processes={args.processes}", args.processes)):
+        result = await run_mode(processes, args.seconds)
+        print(
+            f"{label:<14} thermal_fps={result['thermal_fps']:.1f} webcam_fps={result['webcam_fps']:.1f} "
+            f"ws_p50_ms={result['ws_p50_ms']:.2f} ws_p99_ms={result['ws_p99_ms']:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.dispatch import NullArm, NullWebsocket, message_sets  # noqa: E402
+from control import metrics, server  # noqa: E402
+
+# Cost of the metrics hot path: one histogram observation (unlabeled and labeled), allocations per
+# observation, the xarm_set dispatch rate with and without command instrumentation, and /metrics render time.
+#   python benchmarks/metrics.py --samples 200000
+
+
+class NullHistogram:
+    def observe(self, _value: float) -> None:
+        return None
+
+
+class NullFamily:
+    def labels(self, *_values: str) -> NullHistogram:
+        return NullHistogram()
+
+
+def observe_cost(samples: int) -> tuple[float, float, int]:
+    family = metrics.HistogramFamily("bench_seconds", "bench")
+    labeled = metrics.HistogramFamily("bench_labeled_seconds", "bench", ("command",))
+    values = [index * 1e-5 for index in range(1024)]
+
+    started = time.perf_counter()
+    for index in range(samples):
+        family.observe(values[index & 1023])
+    unlabeled_ns = (time.perf_counter() - started) / samples * 1e9
+
+    started = time.perf_counter()
+    for index in range(samples):
+        labeled.labels("xarm_set").observe(values[index & 1023])
+    labeled_ns = (time.perf_counter() - started) / samples * 1e9
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for index in range(samples):
+        family.observe(values[index & 1023])
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retained = sum(stat.size_diff for stat in after.compare_to(before, "filename") if "metrics.py" in str(stat))
+    return unlabeled_ns, labeled_ns, retained
+
+
+async def dispatch_rate(messages: list[str], count: int) -> float:
+    websocket = NullWebsocket()
+    server.clients.add(websocket)
+    server.client_send_locks[websocket] = asyncio.Lock()
+    try:
+        started = time.perf_counter()
+        for index in range(count):
+            await server.handle_message(websocket, messages[index % len(messages)])
+        return count / (time.perf_counter() - started)
+    finally:
+        server.clients.discard(websocket)
+        server.client_send_locks.pop(websocket, None)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Metrics instrumentation overhead.")
+    parser.add_argument("--samples", type=int, default=200000)
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    unlabeled_ns, labeled_ns, retained = observe_cost(args.samples)
+    print(f"observe unlabeled {unlabeled_ns:.0f}ns  labeled {labeled_ns:.0f}ns  retained_bytes={retained}")
+
+    server.logging.getLogger().setLevel(server.logging.WARNING)
+    server.xarm_controller.arm = NullArm()
+    server.xarm_controller.available = True
+    server.xarm_controller.initializing = False
+    server.xarm_controller.error = None
+    messages = message_sets()["xarm_set"]
+    instrumented = server.command_seconds
+    for label, family in (("metrics_on", instrumented), ("metrics_off", NullFamily())):
+        server.command_seconds = family
+        rate = await dispatch_rate(messages, args.messages)
+        print(f"xarm_set {label:<11} {rate:>8.0f} msg/s")
+    server.command_seconds = instrumented
+
+    started = time.perf_counter()
+    text = metrics.metrics_text()
+    print(f"render {len(text.splitlines())} lines in {(time.perf_counter() - started) * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,151 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import signal
+import sys
+import tempfile
+import time
+
+import websockets
+
+HARDWARE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HARDWARE_DIR)
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+from control.constants import PORT, THERMAL_FRAME_HEIGHT, THERMAL_FRAME_WIDTH  # noqa: E402
+from control.session import (  # noqa: E402
+    RECORD_COMMAND,
+    RECORD_DEVICE_CALL,
+    RECORD_THERMAL_FRAME,
+    RECORD_WEBCAM_JPEG,
+    SessionFile,
+    SessionReplayer,
+    encode_command,
+    encode_device_call,
+    encode_record,
+)
+
+# Replays a session bundle against the real server stack with simulated devices and reports command reply
+# latency, at 1x and accelerated speed. Without --bundle a synthetic session is generated: two dashboards
+# streaming xarm and rig sliders at 30 Hz with periodic state polls, and device timings typical of the rig.
+#   python benchmarks/session_replay.py --seconds 30 --speeds 1 4
+#   python benchmarks/session_replay.py --bundle data/sessions/session-20260101-120000.session
+
+SERVER_BOOTSTRAP = """
+import asyncio
+import control.constants as constants
+constants.SESSION_REPLAY_PATH = {path!r}
+constants.SESSION_REPLAY_SPEED = {speed}
+constants.TELEMETRY_ENABLED = False
+from control.server import main
+asyncio.run(main())
+"""
+
+
+def write_synthetic_bundle(path: str, seconds: float) -> None:
+    rng = random.Random(7)
+    records: list[tuple[float, int, bytes]] = []
+    for index in range(int(seconds * 30)):
+        offset_s = index / 30.0
+        angle = 120.0 + 60.0 * math.sin(offset_s)
+        message = json.dumps({"type": "xarm_set", "id": 1 + index % 6, "angle": round(angle, 1), "wait": False})
+        records.append((offset_s, RECORD_COMMAND, encode_command(0, message)))
+        rig_message = json.dumps({"type": "rig_set", "channel": 1 + index % 3, "angle": 90 if index % 60 < 30 else 0})
+        records.append((offset_s + 0.01, RECORD_COMMAND, encode_command(1, rig_message)))
+        if index % 30 == 0:
+            records.append((offset_s + 0.02, RECORD_COMMAND, encode_command(1, json.dumps({"type": "get_state"}))))
+    for index in range(int(seconds * 40)):
+        records.append((index / 40.0, RECORD_DEVICE_CALL, encode_device_call("xarm", "setPosition", rng.gauss(22.0, 6.0))))
+        records.append((index / 40.0, RECORD_DEVICE_CALL, encode_device_call("rig", "angle", rng.gauss(1.2, 0.3))))
+    for index in range(200):
+        records.append((0.0, RECORD_DEVICE_CALL, encode_device_call("xarm", "getPosition", rng.gauss(9.0, 2.0))))
+        records.append((0.0, RECORD_DEVICE_CALL, encode_device_call("thermal", "_read_frame", rng.gauss(180.0, 20.0))))
+        records.append((0.0, RECORD_DEVICE_CALL, encode_device_call("webcam", "_read_raw_frame", rng.gauss(30.0, 5.0))))
+
+    ys, xs = np.mgrid[0:THERMAL_FRAME_HEIGHT, 0:THERMAL_FRAME_WIDTH]
+    for index in range(20):
+        frame = 22.0 + 15.0 * np.exp(-((xs - index) ** 2 + (ys - 12) ** 2) / 20.0)
+        records.append((index * 0.25, RECORD_THERMAL_FRAME, frame.astype("<f4").tobytes()))
+    noise = np.random.default_rng(0)
+    for index in range(20):
+        image = noise.integers(0, 255, (480, 640, 3), dtype=np.uint8)
+        records.append((index / 15.0, RECORD_WEBCAM_JPEG, cv2.imencode(".jpg", image)[1].tobytes()))
+
+    records.sort(key=lambda record: record[0])
+    session_file = SessionFile(path)
+    session_file.open({"version": 1, "startedAt": time.time(), "synthetic": True})
+    session_file.write(b"".join(encode_record(kind, offset_s, payload) for offset_s, kind, payload in records))
+    session_file.close()
+
+
+async def wait_until_ready(timeout_s: float) -> None:
+    # The port opens before the controllers finish initializing; replay starts once none reports it.
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            async with websockets.connect(f"ws://127.0.0.1:{PORT}", max_size=None) as websocket:
+                while time.monotonic() < deadline:
+                    message = json.loads(await websocket.recv())
+                    if message.get("type") != "state":
+                        continue
+                    if not any(message[name].get("initializing") for name in ("xarm", "rig", "thermal", "webcam")):
+                        return
+                    await asyncio.sleep(0.1)
+                    await websocket.send(json.dumps({"type": "get_state"}))
+        except OSError:
+            await asyncio.sleep(0.25)
+    raise RuntimeError("server did not start")
+
+
+async def replay(path: str, speed: float) -> dict:
+    server = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-c",
+        SERVER_BOOTSTRAP.format(path=os.path.abspath(path), speed=speed),
+        cwd=HARDWARE_DIR,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        await wait_until_ready(30.0)
+        return await SessionReplayer(path).run(f"ws://127.0.0.1:{PORT}", speed)
+    finally:
+        server.send_signal(signal.SIGINT)
+        try:
+            await asyncio.wait_for(server.wait(), 15.0)
+        except TimeoutError:
+            server.kill()
+            await server.wait()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay a lab session bundle against simulated devices.")
+    parser.add_argument("--bundle")
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--speeds", type=float, nargs="+", default=[1.0, 4.0])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.bundle
+        if path is None:
+            path = os.path.join(directory, "synthetic.session")
+            write_synthetic_bundle(path, args.seconds)
+            print(f"synthetic bundle {os.path.getsize(path)} bytes")
+        for speed in args.speeds:
+            result = await replay(path, speed)
+            print(
+                f"speed={speed:g}x commands={result['commands']} answered={result['answered']} "
+                f"unanswered={result['unanswered']} p50_ms={result['p50Ms']} p99_ms={result['p99Ms']} "
+                f"max_ms={result['maxMs']} send_lag_p99_ms={result['sendLagP99Ms']}"
+            )
+            for name, stats in result["byType"].items():
+                print(f"    {name:<10} count={stats['count']} p50_ms={stats['p50Ms']} p99_ms={stats['p99Ms']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,247 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiohttp  # noqa: E402
+import websockets  # noqa: E402
+from aiohttp import web  # noqa: E402
+
+from control import server  # noqa: E402
+from control.codec import unpack_jpeg_frame  # noqa: E402
+from control.constants import CONTROL_WS_PATH, THERMAL_STREAM_PATH, WEBCAM_STREAM_PATH  # noqa: E402
+from control.controllers import ThermalController, WebcamController  # noqa: E402
+from control.media_http import add_media_routes, start_http_app  # noqa: E402
+
+# A dashboard's view of the test-pattern thermal camera and webcam plus the control socket, served two ways: the
+# websockets server on one port with the MJPEG streams on another (three connections), and single-port mode with
+# both streams subscribed over the control websocket (one connection). Frames per second per stream, MB received,
+# JPEGs intact, get_state round trips while the frames flow and CPU time of the process (server and client). Then a
+# client behind a proxy that passes --throttle-kbps: the check fails unless the server skips frames for it and its
+# get_state round trips stay within --max-ack-ms.
+#   python benchmarks/single_port.py --seconds 10 --throttle-kbps 300
+
+
+class Tally:
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.frames = {"thermal": 0, "webcam": 0}
+        self.bytes = 0
+        self.broken = 0
+
+    def add(self, stream: str, jpeg: bytes | memoryview) -> None:
+        self.frames[stream] += 1
+        self.bytes += len(jpeg)
+        if jpeg[:2] != b"\xff\xd8" or jpeg[-2:] != b"\xff\xd9":
+            self.broken += 1
+
+
+async def read_mjpeg(session: aiohttp.ClientSession, url: str, stream: str, tally: Tally) -> None:
+    async with session.get(url) as response:
+        length = None
+        while True:
+            line = await response.content.readline()
+            if not line:
+                return
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":", 1)[1])
+            elif line == b"\r\n" and length is not None:
+                tally.add(stream, await response.content.readexactly(length))
+                length = None
+
+
+async def round_trips(send, replies: asyncio.Queue, count: int) -> list[float]:
+    timings = []
+    for _ in range(count):
+        started = time.perf_counter()
+        await send(json.dumps({"type": "get_state"}))
+        await replies.get()
+        timings.append(time.perf_counter() - started)
+        await asyncio.sleep(0.05)
+    return timings
+
+
+async def two_ports(args: argparse.Namespace, tally: Tally) -> tuple[int, list[float]]:
+    app = web.Application()
+    add_media_routes(app, server.thermal_controller, server.webcam_controller)
+    runner = await start_http_app(app, "127.0.0.1", args.port + 1, "bench-media")
+    replies: asyncio.Queue = asyncio.Queue()
+    async with websockets.serve(server.handler, "127.0.0.1", args.port, compression=None):
+        async with websockets.connect(f"ws://127.0.0.1:{args.port}", compression=None) as control:
+
+            async def receive() -> None:
+                async for message in control:
+                    if json.loads(message).get("type") == "state":
+                        replies.put_nowait(None)
+
+            receiver = asyncio.create_task(receive())
+            await replies.get()
+            async with aiohttp.ClientSession() as session:
+                base = f"http://127.0.0.1:{args.port + 1}"
+                readers = [
+                    asyncio.create_task(read_mjpeg(session, base + THERMAL_STREAM_PATH, "thermal", tally)),
+                    asyncio.create_task(read_mjpeg(session, base + WEBCAM_STREAM_PATH, "webcam", tally)),
+                ]
+                timings = await measure(args, tally, round_trips(control.send, replies, args.requests))
+                for task in (*readers, receiver):
+                    task.cancel()
+                await asyncio.gather(*readers, receiver, return_exceptions=True)
+    await runner.cleanup()
+    return 3, timings
+
+
+async def single_port(args: argparse.Namespace, tally: Tally) -> tuple[int, list[float]]:
+    app = web.Application()
+    app.router.add_get(CONTROL_WS_PATH, server.handle_ws_request)
+    runner = await start_http_app(app, "127.0.0.1", args.port, "bench-control")
+    replies: asyncio.Queue = asyncio.Queue()
+    async with aiohttp.ClientSession() as session:
+        url = f"http://127.0.0.1:{args.port}{CONTROL_WS_PATH}?compress=0"
+        async with session.ws_connect(url) as control:
+
+            async def receive() -> None:
+                async for message in control:
+                    if message.type == aiohttp.WSMsgType.BINARY:
+                        meta, jpeg = unpack_jpeg_frame(message.data)
+                        tally.add(meta["stream"], jpeg)
+                    elif message.type == aiohttp.WSMsgType.TEXT and json.loads(message.data).get("type") == "state":
+                        replies.put_nowait(None)
+
+            receiver = asyncio.create_task(receive())
+            await replies.get()
+            for stream in ("thermal", "webcam"):
+                await control.send_str(json.dumps({"type": "media_subscribe", "stream": stream}))
+            timings = await measure(args, tally, round_trips(control.send_str, replies, args.requests))
+            receiver.cancel()
+            await asyncio.gather(receiver, return_exceptions=True)
+    await runner.cleanup()
+    return 1, timings
+
+
+async def throttle_proxy(upstream_port: int, bytes_per_s: float) -> tuple[asyncio.Server, set[asyncio.Task]]:
+    loop = asyncio.get_running_loop()
+    connections: set[asyncio.Task] = set()
+
+    async def pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, rate: float | None) -> None:
+        try:
+            while data := await reader.read(4096):
+                writer.write(data)
+                await writer.drain()
+                if rate is not None:
+                    await asyncio.sleep(len(data) / rate)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def connected(client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter) -> None:
+        # A small receive buffer so the backlog builds in the server's transport rather than in the kernel.
+        upstream = socket.socket()
+        upstream.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 16 * 1024)
+        upstream.setblocking(False)
+        await loop.sock_connect(upstream, ("127.0.0.1", upstream_port))
+        upstream_reader, upstream_writer = await asyncio.open_connection(sock=upstream)
+        task = asyncio.gather(
+            pipe(client_reader, upstream_writer, None),
+            pipe(upstream_reader, client_writer, bytes_per_s),
+        )
+        connections.add(task)
+        await asyncio.gather(task, return_exceptions=True)
+
+    return await asyncio.start_server(connected, "127.0.0.1", 0), connections
+
+
+async def throttled(args: argparse.Namespace, tally: Tally) -> tuple[int, list[float]]:
+    app = web.Application()
+    app.router.add_get(CONTROL_WS_PATH, server.handle_ws_request)
+    runner = await start_http_app(app, "127.0.0.1", args.port, "bench-control")
+    proxy, proxied = await throttle_proxy(args.port, args.throttle_kbps * 1000.0)
+    proxy_port = next(iter(proxy.sockets)).getsockname()[1]
+    replies: asyncio.Queue = asyncio.Queue()
+    async with aiohttp.ClientSession() as session:
+        async with session.ws_connect(f"http://127.0.0.1:{proxy_port}{CONTROL_WS_PATH}?compress=0") as control:
+
+            async def receive() -> None:
+                async for message in control:
+                    if message.type == aiohttp.WSMsgType.BINARY:
+                        meta, jpeg = unpack_jpeg_frame(message.data)
+                        tally.add(meta["stream"], jpeg)
+                    elif message.type == aiohttp.WSMsgType.TEXT and json.loads(message.data).get("type") == "state":
+                        replies.put_nowait(None)
+
+            receiver = asyncio.create_task(receive())
+            await replies.get()
+            for stream in ("thermal", "webcam"):
+                await control.send_str(json.dumps({"type": "media_subscribe", "stream": stream}))
+            timings = await measure(args, tally, round_trips(control.send_str, replies, args.requests))
+            receiver.cancel()
+            await asyncio.gather(receiver, return_exceptions=True)
+    for connection in proxied:
+        connection.cancel()
+    proxy.close()
+    await runner.cleanup()
+    return 1, timings
+
+
+async def measure(args: argparse.Namespace, tally: Tally, trips) -> list[float]:
+    await asyncio.sleep(1.0)
+    tally.reset()
+    timings, _ = await asyncio.gather(trips, asyncio.sleep(args.seconds))
+    return timings
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    server.thermal_controller = ThermalController(test_pattern=True)
+    server.webcam_controller = WebcamController(test_pattern=True)
+    await asyncio.gather(server.thermal_controller.initialize(), server.webcam_controller.initialize())
+    await server.thermal_controller.start()
+    await server.webcam_controller.start()
+    await asyncio.sleep(1.0)
+
+    skipped_before = {}
+    for name, run in (("two ports", two_ports), ("single port", single_port), ("throttled", throttled)):
+        skipped_before[name] = server.media_frames_skipped
+        tally = Tally()
+        cpu_started = time.process_time()
+        wall_started = time.perf_counter()
+        connections, timings = await run(args, tally)
+        cpu_share = (time.process_time() - cpu_started) / (time.perf_counter() - wall_started)
+        print(
+            f"{name:<11} {connections} connections  thermal {tally.frames['thermal'] / args.seconds:5.1f} fps"
+            f"  webcam {tally.frames['webcam'] / args.seconds:5.1f} fps  {tally.bytes / 1e6:6.1f} MB"
+            f"  broken jpegs {tally.broken}  get_state p50 {1000 * statistics.median(timings):5.2f} ms"
+            f" max {1000 * max(timings):5.2f} ms  cpu {100 * cpu_share:4.1f}%"
+        )
+    throttled_skipped = server.media_frames_skipped - skipped_before["throttled"]
+    print(
+        f"websocket media frames sent {server.media_frames_sent} skipped {server.media_frames_skipped}"
+        f" ({throttled_skipped} for the client throttled to {args.throttle_kbps:g} kB/s)"
+    )
+    assert tally.broken == 0
+    assert throttled_skipped > 0
+    assert max(timings) * 1000 < args.max_ack_ms
+    print("ok")
+    await server.thermal_controller.stop()
+    await server.webcam_controller.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Control socket and media streams on one port vs two.")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--port", type=int, default=18090)
+    parser.add_argument("--throttle-kbps", type=float, default=300.0)
+    parser.add_argument("--max-ack-ms", type=float, default=2000.0)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
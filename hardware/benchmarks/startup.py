@@ -0,0 +1,116 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import statistics
+import sys
+import time
+
+import websockets
+
+HARDWARE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HARDWARE_DIR)
+
+from control.constants import PORT  # noqa: E402
+
+# Time from spawning the server to the first `state` message on the websocket, and to the first state in
+# which no subsystem still reports `initializing`. The xArm is simulated with the USB open and per-servo
+# read latency of the real arm so its startup scan costs what it does on the rig; media uses test patterns.
+#   python benchmarks/startup.py --runs 5 --xarm-open-s 0.8 --xarm-read-ms 60
+
+SERVER_BOOTSTRAP = """
+import asyncio
+import sys
+import time
+import types
+import control.constants as constants
+constants.MEDIA_TEST_PATTERN = True
+constants.TELEMETRY_ENABLED = False
+
+class Controller:
+    def __init__(self, _port):
+        time.sleep({open_s})
+
+    def getPosition(self, _servo_id):
+        time.sleep({read_s})
+        return 500
+
+    def setPosition(self, _servo_id, _position, _duration, _wait):
+        time.sleep({read_s})
+
+sys.modules["xarm"] = types.SimpleNamespace(Controller=Controller)
+from control.server import main
+asyncio.run(main())
+"""
+
+SUBSYSTEMS = ("xarm", "rig", "thermal", "webcam")
+
+
+async def first_states(started: float, deadline_s: float) -> tuple[float | None, float | None]:
+    while True:
+        try:
+            websocket = await websockets.connect(f"ws://127.0.0.1:{PORT}", max_size=None)
+            break
+        except OSError:
+            if time.perf_counter() - started > deadline_s:
+                raise RuntimeError("server did not start") from None
+            await asyncio.sleep(0.01)
+    first_state_s: float | None = None
+    async with websocket:
+        while time.perf_counter() - started < deadline_s:
+            message = json.loads(await asyncio.wait_for(websocket.recv(), deadline_s))
+            if message.get("type") != "state":
+                continue
+            now_s = time.perf_counter() - started
+            if first_state_s is None:
+                first_state_s = now_s
+            if not any(message[name].get("initializing") for name in SUBSYSTEMS):
+                return first_state_s, now_s
+            await websocket.send(json.dumps({"type": "get_state"}))
+            await asyncio.sleep(0.01)
+    return first_state_s, None
+
+
+async def measure(open_s: float, read_s: float) -> tuple[float | None, float | None]:
+    spawned = time.perf_counter()
+    server = await asyncio.create_subprocess_exec(
+        sys.executable,
+        "-c",
+        SERVER_BOOTSTRAP.format(open_s=open_s, read_s=read_s),
+        cwd=HARDWARE_DIR,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        return await first_states(spawned, 60.0)
+    finally:
+        server.send_signal(signal.SIGINT)
+        try:
+            await asyncio.wait_for(server.wait(), 15.0)
+        except TimeoutError:
+            server.kill()
+            await server.wait()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Server time-to-first-state after a restart.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--xarm-open-s", type=float, default=0.8)
+    parser.add_argument("--xarm-read-ms", type=float, default=60.0)
+    args = parser.parse_args()
+
+    first: list[float] = []
+    ready: list[float] = []
+    for _ in range(args.runs):
+        first_state_s, ready_s = await measure(args.xarm_open_s, args.xarm_read_ms / 1000.0)
+        first.append(first_state_s)
+        if ready_s is not None:
+            ready.append(ready_s)
+        print(f"first_state={first_state_s:.3f}s ready={'-' if ready_s is None else f'{ready_s:.3f}s'}")
+    print(f"median first_state={statistics.median(first):.3f}s", end="")
+    print(f" ready={statistics.median(ready):.3f}s" if ready else "")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
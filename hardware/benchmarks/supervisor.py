@@ -0,0 +1,118 @@
+import argparse
+import asyncio
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from control import controllers, supervisor  # noqa: E402
+from control.executors import InstrumentedExecutor  # noqa: E402
+
+# Device supervisor: the retry schedule a missing device is probed on, how long a replugged device takes to
+# come back (unplugged for a while, then its node appears), and what a webcam with no camera attached costs in
+# CPU and open attempts while the supervisor owns reopening it.
+#   python benchmarks/supervisor.py --unplugged-s 20 --open-ms 150 --trials 5
+
+
+class FakeDevice:
+    def __init__(self, open_s: float) -> None:
+        self.open_s = open_s
+        self.plugged = False
+        self.available = False
+        self.initializing = False
+        self.error: str | None = "fake_missing"
+        self.opens: list[float] = []
+
+    def _open(self) -> None:
+        self.opens.append(time.monotonic())
+        time.sleep(self.open_s)
+        self.available = self.plugged
+        self.error = None if self.plugged else "fake_open_failed"
+
+    async def initialize(self) -> None:
+        await executor.run(self._open)
+
+
+executor = InstrumentedExecutor("bench-device", 1)
+
+
+def install_fake_nodes(device: FakeDevice) -> None:
+    # The node shows up in the hot-plug scan exactly while the device is plugged.
+    supervisor.device_nodes = lambda: frozenset({"/dev/fake0"} if device.plugged else ())
+
+
+async def replug_trial(open_s: float, unplugged_s: float) -> tuple[float, list[float], int]:
+    device = FakeDevice(open_s)
+    install_fake_nodes(device)
+    devices = supervisor.DeviceSupervisor()
+    devices.add("fake", device, executor, lambda: True)
+    await devices.start()
+    started = time.monotonic()
+    # Random phase against the poll so the recovery time covers the whole interval.
+    await asyncio.sleep(unplugged_s + random.random() * supervisor.DEVICE_HOTPLUG_POLL_S)
+    device.plugged = True
+    plugged_at = time.monotonic()
+    while not device.available:
+        await asyncio.sleep(0.005)
+    recovered_s = time.monotonic() - plugged_at
+    await devices.stop()
+    return recovered_s, [round(at - started, 1) for at in device.opens], len(device.opens)
+
+
+async def missing_webcam(seconds: float) -> tuple[float, int, str | None]:
+    webcam = controllers.WebcamController(False)
+    controllers.WEBCAM_DEVICE_INDEX = 97
+    supervisor.WEBCAM_DEVICE_INDEX = 97
+    await webcam.initialize()
+    opens = [0]
+    video_capture = webcam.cv2.VideoCapture
+
+    def counted_capture(*args):
+        opens[0] += 1
+        return video_capture(*args)
+
+    webcam.cv2.VideoCapture = counted_capture
+    devices = supervisor.DeviceSupervisor()
+    devices.add_media(controllers.ThermalController(True), webcam)
+    await webcam.start()
+    await devices.start()
+    cpu_started = resource.getrusage(resource.RUSAGE_SELF)
+    await asyncio.sleep(seconds)
+    cpu_ended = resource.getrusage(resource.RUSAGE_SELF)
+    await devices.stop()
+    await webcam.stop()
+    cpu_s = (cpu_ended.ru_utime - cpu_started.ru_utime) + (cpu_ended.ru_stime - cpu_started.ru_stime)
+    return 100.0 * cpu_s / seconds, opens[0], webcam.error
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Device supervisor backoff, replug recovery, and idle cost.")
+    parser.add_argument("--unplugged-s", type=float, default=20.0)
+    parser.add_argument("--open-ms", type=float, default=150.0)
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--webcam-s", type=float, default=10.0)
+    args = parser.parse_args()
+    supervisor.logging.getLogger().setLevel(supervisor.logging.ERROR)
+
+    recoveries: list[float] = []
+    for trial in range(args.trials):
+        recovered_s, opens, count = await replug_trial(args.open_ms / 1000.0, args.unplugged_s)
+        recoveries.append(recovered_s)
+        if trial == 0:
+            print(f"probes while unplugged for {args.unplugged_s:.0f}s: {count - 1} at {opens[:-1]}s")
+        print(f"replug -> available {recovered_s * 1000.0:7.1f}ms")
+    print(
+        f"median recovery {statistics.median(recoveries) * 1000.0:.1f}ms"
+        f" (poll {supervisor.DEVICE_HOTPLUG_POLL_S:.1f}s + open {args.open_ms:.0f}ms)"
+    )
+
+    cpu_pct, opens, error = await missing_webcam(args.webcam_s)
+    print(f"missing webcam over {args.webcam_s:.0f}s: cpu {cpu_pct:.2f}%  opens {opens}  error={error}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from control.constants import TELEMETRY_CHUNK_ROWS, TELEMETRY_SAMPLE_INTERVAL_S  # noqa: E402
+from control.telemetry import TELEMETRY_CHANNELS, TelemetryReader, TelemetryRecorder, TelemetryWriter  # noqa: E402
+
+# Writes a synthetic run at the thermal sample rate, then times full and windowed reads from the index
+# and from a crash-truncated copy, and the per-sample cost of the recorder on the event loop.
+#   python benchmarks/telemetry.py --hours 1
+
+
+def write_run(path: str, rows: int) -> float:
+    writer = TelemetryWriter(path, TELEMETRY_CHANNELS)
+    writer.open()
+    started_at = 1760000000.0
+    started = time.perf_counter()
+    for first in range(0, rows, TELEMETRY_CHUNK_ROWS):
+        count = min(TELEMETRY_CHUNK_ROWS, rows - first)
+        index = np.arange(first, first + count)
+        timestamps = started_at + index * TELEMETRY_SAMPLE_INTERVAL_S
+        columns = np.sin(index[:, None] * 0.001 + np.arange(len(TELEMETRY_CHANNELS))[None, :]).astype("<f4")
+        columns[::97, -1] = math.nan
+        writer.write_chunk(timestamps, columns)
+    writer.close()
+    return time.perf_counter() - started
+
+
+def time_read(path: str, start: float | None, end: float | None, channels: list[str] | None) -> tuple[float, int]:
+    started = time.perf_counter()
+    reader = TelemetryReader(path)
+    result = reader.read_range(start, end, channels)
+    return time.perf_counter() - started, len(result["t"])
+
+
+def sample_cost(samples: int) -> float:
+    recorder = TelemetryRecorder(lambda: [1.0] * (len(TELEMETRY_CHANNELS) - 1) + [None])
+    recorder._allocate()
+    started = time.perf_counter()
+    for _ in range(samples):
+        recorder.record_sample()
+        if recorder.rows >= TELEMETRY_CHUNK_ROWS:
+            recorder.rows = 0
+    return (time.perf_counter() - started) / samples * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Telemetry file write and range-read speed.")
+    parser.add_argument("--hours", type=float, default=1.0)
+    args = parser.parse_args()
+
+    rows = int(args.hours * 3600 / TELEMETRY_SAMPLE_INTERVAL_S)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "run.ctl")
+        write_s = write_run(path, rows)
+        size = os.path.getsize(path)
+        print(f"wrote rows={rows} bytes={size} ({size / rows:.1f} B/row) in {write_s * 1000:.1f}ms")
+
+        reader = TelemetryReader(path)
+        first, last = reader.time_range()
+        full = reader.read_range()
+        assert len(full["t"]) == rows and np.all(np.diff(full["t"]) > 0)
+        assert np.isnan(full["volumeMl"][0]) and not np.isnan(full["volumeMl"][1])
+
+        full_s, full_rows = time_read(path, None, None, None)
+        one_s, _ = time_read(path, None, None, ["thermalMaxC"])
+        middle = (first + last) / 2
+        window_s, window_rows = time_read(path, middle, middle + 300, ["thermalMaxC", "xarm1Deg"])
+        print(f"read all channels rows={full_rows} {full_s * 1000:.1f}ms")
+        print(f"read one channel  rows={full_rows} {one_s * 1000:.1f}ms")
+        print(f"read 5min window  rows={window_rows} {window_s * 1000:.2f}ms")
+
+        # Cut the file mid-chunk as a crash would; the reader falls back to scanning chunk headers.
+        truncated = os.path.join(directory, "truncated.ctl")
+        with open(path, "rb") as source, open(truncated, "wb") as target:
+            target.write(source.read(size // 2 + 123))
+        scan_s, scan_rows = time_read(truncated, None, None, ["thermalMaxC"])
+        assert 0 < scan_rows < rows
+        print(f"read truncated    rows={scan_rows} {scan_s * 1000:.1f}ms")
+
+        sample_us = sample_cost(20000)
+        print(f"record_sample {sample_us:.2f}us per sample")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from control.constants import THERMAL_ALARM_RULES, THERMAL_FRAME_HEIGHT, THERMAL_FRAME_WIDTH  # noqa: E402
+from control.thermal_alarms import ThermalAlarmEngine  # noqa: E402
+
+# Thermal alarm evaluation on synthetic raw frames at the sub-page rate: CPU per frame for the default rules and
+# for a grid of per-well ROIs, with and without a dead (NaN) pixel, and how many frames after a sudden step or
+# during a steady ramp the alarm fires and clears.
+#   python benchmarks/thermal_alarms.py --frames 2000 --rate-hz 16
+
+
+def frame(base_c: float, rng: random.Random, dead_pixel: bool = False) -> list[float]:
+    values = [base_c + rng.gauss(0.0, 0.25) for _ in range(THERMAL_FRAME_WIDTH * THERMAL_FRAME_HEIGHT)]
+    if dead_pixel:
+        values[100] = float("nan")
+    return values
+
+
+def well_rules() -> list[tuple]:
+    rules = []
+    for row in range(2):
+        for column in range(4):
+            roi = (column * 8, row * 12, 8, 12)
+            rules.append((f"well{row}{column}", roi, "max_above", 90.0, 85.0, ()))
+            rules.append((f"well{row}{column}_rise", roi, "mean_rise", 5.0, 2.0, ()))
+    return rules
+
+
+def cost_us(rules: list[tuple], frames: list[list[float]], rate_hz: float) -> float:
+    engine = ThermalAlarmEngine(rules)
+    started = time.process_time()
+    for index, values in enumerate(frames):
+        engine.evaluate(values, index / rate_hz)
+    return 1e6 * (time.process_time() - started) / len(frames)
+
+
+def response(rules: list[tuple], temperatures: list[float], rate_hz: float) -> list[tuple[int, str, str]]:
+    engine = ThermalAlarmEngine(rules)
+    rng = random.Random(2)
+    events = []
+    for index, base_c in enumerate(temperatures):
+        for event in engine.evaluate(frame(base_c, rng), index / rate_hz):
+            events.append((index, event["rule"], event["status"]))
+    return events
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Thermal alarm evaluation cost and response.")
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--rate-hz", type=float, default=16.0)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    clean = [frame(30.0, rng) for _ in range(args.frames)]
+    dead = [frame(30.0, rng, dead_pixel=True) for _ in range(args.frames)]
+    default_rules = list(THERMAL_ALARM_RULES)
+    for name, rules in (("default", default_rules), ("8 wells", well_rules())):
+        print(
+            f"{name:<8} {len(rules):2d} rules  {cost_us(rules, clean, args.rate_hz):6.1f} us/frame"
+            f"  with a dead pixel {cost_us(rules, dead, args.rate_hz):6.1f} us/frame"
+        )
+
+    settle = int(2 * args.rate_hz)
+    step = [30.0] * settle + [160.0] * settle + [30.0] * settle
+    ramp_rate_c = 20.0
+    ramp = [30.0] * settle + [30.0 + ramp_rate_c * index / args.rate_hz for index in range(settle)]
+    ramp += [ramp[-1]] * (3 * settle)
+    for name, temperatures, change_at in (("step 30->160->30 C", step, settle), ("ramp 20 C/s", ramp, settle)):
+        print(f"{name}:")
+        for index, rule, status in response(default_rules, temperatures, args.rate_hz):
+            since = index - change_at
+            print(f"  frame {since:+4d} ({1000 * since / args.rate_hz:+6.0f} ms)  {rule} {status}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from control.constants import THERMAL_FRAME_HEIGHT, THERMAL_FRAME_WIDTH  # noqa: E402
+from control.media_encoder import render_thermal_jpeg  # noqa: E402
+from control.thermal_filter import ThermalFilter  # noqa: E402
+
+# Thermal publishing with and without the temporal filter on synthetic sensor frames (gaussian pixel noise on
+# top of the scene) at the sub-page rate: frames encoded per second and CPU for an idle bench and for a moving
+# hot spot, colour-scale flicker and JPEG size churn while idle, and how quickly a sudden 8 C step shows up.
+#   python benchmarks/thermal_filter.py --seconds 10 --rate-hz 16 --noise-c 0.25
+
+
+def scene(phase: float | None, noise_c: float, rng: random.Random, step_c: float = 0.0) -> list[float]:
+    hot_x, hot_y = 12.0, 9.0
+    if phase is not None:
+        hot_x = (math.sin(phase) * 0.4 + 0.5) * (THERMAL_FRAME_WIDTH - 1)
+        hot_y = (math.cos(phase * 0.7) * 0.4 + 0.5) * (THERMAL_FRAME_HEIGHT - 1)
+    return [
+        24.0
+        + 16.0 * math.exp(-((x - hot_x) ** 2 + (y - hot_y) ** 2) / 18.0)
+        + (step_c if 20 <= x < 24 and 4 <= y < 8 else 0.0)
+        + rng.gauss(0.0, noise_c)
+        for y in range(THERMAL_FRAME_HEIGHT)
+        for x in range(THERMAL_FRAME_WIDTH)
+    ]
+
+
+def run(frames: list[list[float]], filtered: bool) -> dict[str, float]:
+    thermal_filter = ThermalFilter() if filtered else None
+    published = 0
+    sizes: list[int] = []
+    scales: list[tuple[float, float]] = []
+    started = time.process_time()
+    for frame in frames:
+        scale = None
+        if thermal_filter is not None:
+            values = thermal_filter.update(frame)
+            scale = thermal_filter.color_scale()
+            if not thermal_filter.changed():
+                continue
+            thermal_filter.mark_published()
+            frame = values.tolist()
+        jpeg, min_temp, max_temp = render_thermal_jpeg(frame, scale)
+        published += 1
+        sizes.append(len(jpeg))
+        scales.append(scale or (min_temp, max_temp))
+    cpu_s = time.process_time() - started
+    return {
+        "published": published,
+        "cpu_ms": 1000.0 * cpu_s / len(frames),
+        "size_sd": statistics.pstdev(sizes) if len(sizes) > 1 else 0.0,
+        "scale_sd": statistics.pstdev([high for _low, high in scales]) if len(scales) > 1 else 0.0,
+    }
+
+
+def step_latency(rate_hz: float, noise_c: float, rng: random.Random) -> float:
+    thermal_filter = ThermalFilter()
+    for _ in range(int(rate_hz)):
+        thermal_filter.update(scene(None, noise_c, rng))
+    step_pixel = 5 * THERMAL_FRAME_WIDTH + 21
+    for index in range(int(rate_hz)):
+        values = thermal_filter.update(scene(None, noise_c, rng, step_c=8.0))
+        if values[step_pixel] - 24.0 >= 0.9 * 8.0:
+            return (index + 1) / rate_hz
+    return float("inf")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Thermal temporal filter: publish rate, flicker and latency.")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--rate-hz", type=float, default=16.0)
+    parser.add_argument("--noise-c", type=float, default=0.25)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    count = int(args.seconds * args.rate_hz)
+    idle = [scene(None, args.noise_c, rng) for _ in range(count)]
+    moving = [scene(index / args.rate_hz, args.noise_c, rng) for index in range(count)]
+    for name, frames in (("idle", idle), ("moving", moving)):
+        for filtered in (False, True):
+            result = run(frames, filtered)
+            print(
+                f"{name:<6} filter={'on ' if filtered else 'off'} {result['published'] / args.seconds:5.1f} jpeg/s"
+                f"  cpu {result['cpu_ms']:5.2f} ms/frame  jpeg size sd {result['size_sd']:6.1f} B"
+                f"  scale max sd {result['scale_sd']:.3f} C"
+            )
+    print(f"8 C step reaches 90% after {step_latency(args.rate_hz, args.noise_c, rng) * 1000.0:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
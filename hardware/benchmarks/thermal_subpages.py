@@ -0,0 +1,204 @@
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import adafruit_mlx90640  # noqa: E402
+
+from control import mlx90640  # noqa: E402
+
+# MLX90640 capture against an emulated sensor on an I2C bus of the given clock: sub-page timing, data-ready
+# status, and transfer time per byte. Compares the driver's getFrame() at the previous 4 Hz setting with
+# sub-page capture at the rate the bus sustains (frame updates per second and CPU per update), and checks the
+# numpy conversion against the driver's _CalculateTo on the same RAM.
+#   python benchmarks/thermal_subpages.py --seconds 5 --clock-hz 400000 --refresh-hz 16
+
+
+def synthetic_eeprom(seed: int) -> list[int]:
+    rng = random.Random(seed)
+    ee = [0] * 832
+    ee[10] = 0x0800
+    ee[16] = 0x4210
+    ee[17] = 0xFFC0
+    ee[32] = 0x6322
+    ee[33] = 0x2E2A
+    for index in range(34, 48):
+        ee[index] = 0x1111
+    ee[48] = 0x18EF
+    ee[49] = 0x2FF1
+    ee[50] = 0x5952
+    ee[51] = 0x9D68
+    ee[52] = 0x3333
+    ee[53] = 0x1234
+    ee[54] = 0x5354
+    ee[55] = 0x5354
+    ee[56] = 0x2363
+    ee[57] = 0x0422
+    ee[58] = 0x03C4
+    ee[59] = 0x04F1
+    ee[60] = 0xF020
+    ee[61] = 0x9797
+    ee[62] = 0x9797
+    ee[63] = 0x2369
+    for pixel in range(768):
+        offset = rng.randint(-4, 4) & 0x3F
+        alpha = rng.randint(-6, 6) & 0x3F
+        kta = rng.randint(-2, 2) & 0x7
+        ee[64 + pixel] = (offset << 10) | (alpha << 4) | (kta << 1) or 0x0002
+    # One dead pixel, which the driver reports as -273.15 and the reader leaves NaN.
+    ee[64 + 100] = 0
+    return ee
+
+
+def make_sensor(eeprom: list[int], device: object) -> adafruit_mlx90640.MLX90640:
+    adafruit_mlx90640.eeData[:] = eeprom
+    sensor = adafruit_mlx90640.MLX90640.__new__(adafruit_mlx90640.MLX90640)
+    sensor.i2c_device = device
+    sensor.brokenPixels = []
+    sensor.outlierPixels = []
+    sensor._ExtractParameters()
+    return sensor
+
+
+class EmulatedSensor:
+    def __init__(self, eeprom: list[int], clock_hz: float) -> None:
+        self.eeprom = eeprom
+        self.byte_s = 9.0 / clock_hz
+        self.control = 0x1901
+        self.started = time.monotonic()
+        self.cleared = 0
+
+    def __enter__(self) -> "EmulatedSensor":
+        return self
+
+    def __exit__(self, *_exc: object) -> None:
+        return None
+
+    def period_s(self) -> float:
+        return 1.0 / (2 ** (((self.control >> 7) & 0x7) - 1))
+
+    def measured(self) -> int:
+        return int((time.monotonic() - self.started) / self.period_s())
+
+    def ram(self) -> list[int]:
+        phase = time.monotonic()
+        hot_x = (math.sin(phase) * 0.4 + 0.5) * 31
+        hot_y = (math.cos(phase * 0.7) * 0.4 + 0.5) * 23
+        words = [
+            int(600 + 900 * math.exp(-((pixel % 32 - hot_x) ** 2 + (pixel // 32 - hot_y) ** 2) / 18.0))
+            for pixel in range(768)
+        ]
+        aux = [0] * 64
+        aux[0] = 19442
+        aux[8] = 0xFFCA
+        aux[10] = 6273
+        aux[32] = 1711
+        aux[40] = 0xFFC8
+        aux[42] = 0xCCC5
+        return [word & 0xFFFF for word in words + aux]
+
+    def register(self, address: int) -> list[int]:
+        if address == mlx90640.STATUS_REGISTER:
+            measured = self.measured()
+            ready = mlx90640.STATUS_DATA_READY if measured > self.cleared else 0
+            return [0x0010 | ready | ((measured - 1) & 1)]
+        if address == mlx90640.CONTROL_REGISTER:
+            return [self.control]
+        if address == 0x2400:
+            return self.eeprom
+        if address == mlx90640.RAM_ADDRESS:
+            return self.ram()
+        return [0]
+
+    def write(self, buffer: bytes) -> None:
+        time.sleep(len(buffer) * self.byte_s)
+        address = int.from_bytes(buffer[0:2], "big")
+        value = int.from_bytes(buffer[2:4], "big")
+        if address == mlx90640.STATUS_REGISTER:
+            self.cleared = self.measured()
+        elif address == mlx90640.CONTROL_REGISTER:
+            self.control = value
+
+    def write_then_readinto(self, out_buffer: bytes, in_buffer: bytearray, in_end: int | None = None) -> None:
+        length = len(in_buffer) if in_end is None else in_end
+        time.sleep((len(out_buffer) + length) * self.byte_s)
+        words = self.register(int.from_bytes(out_buffer[0:2], "big"))
+        for index in range(length // 2):
+            in_buffer[2 * index : 2 * index + 2] = words[index].to_bytes(2, "big")
+
+
+def equivalence(eeprom: list[int]) -> float:
+    device = EmulatedSensor(eeprom, 1e9)
+    sensor = make_sensor(eeprom, device)
+    reader = mlx90640.SubpageReader(sensor, 16)
+    worst = 0.0
+    for subpage in (0, 1):
+        frame_data = device.ram() + [0x1901, subpage]
+        expected = [0.0] * 768
+        sensor._CalculateTo(frame_data, 0.95, sensor._GetTa(frame_data) - 8, expected)
+        words = reader.np.array(frame_data[:832], dtype=reader.np.uint16).view(reader.np.int16).astype(float)
+        indices, temperatures = reader.calibration.temperatures(words, 0x1901, subpage)
+        for index, value in zip(indices.tolist(), temperatures.tolist()):
+            worst = max(worst, abs(value - expected[index]))
+    return worst
+
+
+def run_driver(eeprom: list[int], clock_hz: float, seconds: float) -> tuple[int, float]:
+    device = EmulatedSensor(eeprom, clock_hz)
+    sensor = make_sensor(eeprom, device)
+    sensor.refresh_rate = adafruit_mlx90640.RefreshRate.REFRESH_4_HZ
+    frame = [0.0] * 768
+    updates = 0
+    cpu_started = time.process_time()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        sensor.getFrame(frame)
+        updates += 1
+    return updates, time.process_time() - cpu_started
+
+
+def run_subpages(eeprom: list[int], clock_hz: float, refresh_hz: float, seconds: float) -> tuple[int, float]:
+    device = EmulatedSensor(eeprom, clock_hz)
+    sensor = make_sensor(eeprom, device)
+    sensor.refresh_rate = mlx90640.REFRESH_RATE_CODES[refresh_hz]
+    reader = mlx90640.SubpageReader(sensor, refresh_hz)
+    updates = 0
+    cpu_started = time.process_time()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if reader.read_frame() is not None:
+            updates += 1
+    return updates, time.process_time() - cpu_started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="MLX90640 getFrame vs sub-page capture on an emulated sensor.")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--clock-hz", type=float, default=400000.0)
+    parser.add_argument("--refresh-hz", type=float, default=16.0)
+    args = parser.parse_args()
+
+    eeprom = synthetic_eeprom(1)
+    print(f"max |numpy - driver| over both sub-pages: {equivalence(eeprom):.2e} C")
+
+    refresh_hz = mlx90640.sustainable_refresh_hz(args.refresh_hz, int(args.clock_hz))
+    print(f"bus {args.clock_hz / 1000:.0f} kHz: sub-page rate {refresh_hz} Hz (requested {args.refresh_hz:g})")
+
+    updates, cpu_s = run_driver(eeprom, args.clock_hz, args.seconds)
+    print(
+        f"getFrame 4 Hz    {updates / args.seconds:5.1f} updates/s  cpu {100 * cpu_s / args.seconds:5.1f}%"
+        f"  {1000 * cpu_s / max(updates, 1):6.1f} ms cpu/update"
+    )
+    updates, cpu_s = run_subpages(eeprom, args.clock_hz, refresh_hz, args.seconds)
+    print(
+        f"sub-page {refresh_hz:>4g} Hz {updates / args.seconds:5.1f} updates/s  cpu {100 * cpu_s / args.seconds:5.1f}%"
+        f"  {1000 * cpu_s / max(updates, 1):6.1f} ms cpu/update"
+    )
+
+
+if __name__ == "__main__":
+    main()
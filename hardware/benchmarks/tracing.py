@@ -0,0 +1,91 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.dispatch import NullWebsocket  # noqa: E402
+from control import server, tracing  # noqa: E402
+from control.session import DeviceTimings, SimulatedGpio, SimulatedServo  # noqa: E402
+
+# Span overhead with and without an active trace, then one traced dispense against simulated rig
+# servos (waits shortened) exported as Chrome trace JSON, printed as an indented span tree.
+#   python benchmarks/tracing.py --iterations 200000 --out /tmp/dispense-trace.json
+
+
+def span_cost(iterations: int) -> tuple[float, float]:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        with tracing.trace_span("idle", channel=1):
+            pass
+    untraced_ns = (time.perf_counter() - started) / iterations * 1e9
+
+    with tracing.trace_span("bench", root=True):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            with tracing.trace_span("child", channel=1):
+                pass
+        traced_ns = (time.perf_counter() - started) / iterations * 1e9
+    tracing.finished_spans.clear()
+    return untraced_ns, traced_ns
+
+
+async def traced_dispense() -> dict:
+    timings = DeviceTimings({("rig", "angle"): [1.5]}, 1.0)
+    rig = server.rig_controller
+    rig.servos = [SimulatedServo(timings, angle) for angle in rig.servo_angles]
+    rig.lgpio = SimulatedGpio()
+    rig.gpio_handle = 0
+    rig.available = True
+    rig.initializing = False
+    rig.error = None
+    server.AUTOMATION_DISPENSE_PRE_OPEN_WAIT_S = 0.05
+    server.AUTOMATION_DISPENSE_POST_CLOSE_WAIT_S = 0.05
+    server.AUTOMATION_BASE_ROTATION_SPEED_DEG_PER_S = 3600.0
+    server.flow_calibration.close = lambda: None
+
+    websocket = NullWebsocket()
+    server.clients.add(websocket)
+    server.client_send_locks[websocket] = asyncio.Lock()
+    await server.handle_message(websocket, json.dumps({"type": "dispense", "dropper": 2, "amountMl": 1.0}))
+    return tracing.chrome_trace_payload()
+
+
+def print_tree(payload: dict) -> None:
+    spans = [event for event in payload["traceEvents"] if event["ph"] == "X"]
+    children: dict[int, list[dict]] = {}
+    for event in spans:
+        children.setdefault(event["args"]["parentId"], []).append(event)
+
+    def walk(parent_id: int, depth: int) -> None:
+        for event in sorted(children.get(parent_id, []), key=lambda item: item["ts"]):
+            print(f"{'  ' * depth}{event['name']:<{32 - 2 * depth}} {event['dur'] / 1000.0:8.2f}ms  {event['args']['thread']}")
+            walk(event["args"]["spanId"], depth + 1)
+
+    walk(0, 0)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Span tracing overhead and a traced dispense.")
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    untraced_ns, traced_ns = span_cost(args.iterations)
+    print(f"span untraced {untraced_ns:.0f}ns  traced {traced_ns:.0f}ns")
+
+    server.logging.getLogger().setLevel(server.logging.WARNING)
+    payload = await traced_dispense()
+    json.dumps(payload)
+    print_tree(payload)
+    if args.out:
+        with open(args.out, "w") as handle:
+            json.dump(payload, handle)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
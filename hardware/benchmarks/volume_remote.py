@@ -0,0 +1,85 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+from control import volume  # noqa: E402
+from control.controllers import WebcamController  # noqa: E402
+from control.media_http import start_http_app  # noqa: E402
+from control.mock_vision_server import build_app  # noqa: E402
+from control.volume import VolumeEstimator  # noqa: E402
+
+# The remote volume client against control.mock_vision_server: an answer inside the deadline, a mock slower than
+# the deadline, a query window that closes while the request is in flight, and an overloaded API. The check fails
+# unless each ends the way VolumeEstimator promises (value, volume_api_deadline, cancelled, error) and on time.
+#   python benchmarks/volume_remote.py --deadline-s 1 --window-s 0.5
+
+
+def gray_jpeg(level: int) -> bytes:
+    # Scenes far enough apart that the change gate never serves one from another's cached estimate.
+    ok, encoded = cv2.imencode(".jpg", np.full((480, 640, 3), level, dtype=np.uint8))
+    assert ok
+    return encoded.tobytes()
+
+
+async def run_case(name: str, args: argparse.Namespace, latency_s: float, fail_every: int, level: int) -> dict:
+    runner = await start_http_app(build_app(args.volume_ml, latency_s, fail_every), "127.0.0.1", args.port, "mock")
+    os.environ["ANTHROPIC_BASE_URL"] = f"http://127.0.0.1:{args.port}"
+    os.environ["ANTHROPIC_API_KEY"] = "mock"
+    estimator = VolumeEstimator(WebcamController(test_pattern=True))
+    estimator.initialize_client()
+    windowed = name == "window closed"
+    if windowed:
+        estimator.enable_queries_for_seconds(args.window_s)
+
+    started = time.monotonic()
+    result = await estimator.request_remote(gray_jpeg(level), windowed=windowed)
+    elapsed_s = time.monotonic() - started
+    cache = estimator.cache_payload()
+    await runner.cleanup()
+    print(
+        f"{name:<14} mock {latency_s:4.1f} s  returned {result}  after {elapsed_s:5.2f} s"
+        f"  timeouts {cache['apiTimeouts']} cancelled {cache['apiCancelled']}  error {estimator.error}"
+    )
+    return {"result": result, "elapsed_s": elapsed_s, "error": estimator.error, **cache}
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    volume.VOLUME_REMOTE_DEADLINE_S = args.deadline_s
+    slack_s = volume.VOLUME_REMOTE_WINDOW_POLL_S + 0.25
+    slow_s = args.deadline_s + 2.0
+
+    ok = await run_case("answered", args, 0.1, 0, 40)
+    assert ok["result"] == args.volume_ml and ok["error"] is None
+
+    timeout = await run_case("deadline", args, slow_s, 0, 100)
+    assert timeout["result"] is None and timeout["apiTimeouts"] == 1
+    assert timeout["error"] == "volume_estimation_failed:volume_api_deadline"
+    assert args.deadline_s <= timeout["elapsed_s"] < args.deadline_s + slack_s
+
+    cancelled = await run_case("window closed", args, slow_s, 0, 160)
+    assert cancelled["result"] is None and cancelled["apiCancelled"] == 1 and cancelled["apiTimeouts"] == 0
+    assert args.window_s <= cancelled["elapsed_s"] < args.window_s + slack_s
+
+    overloaded = await run_case("overloaded", args, 0.1, 1, 220)
+    assert overloaded["result"] is None and overloaded["error"].startswith("volume_estimation_failed:")
+    print("ok")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Remote volume client deadlines and cancellation against the mock.")
+    parser.add_argument("--deadline-s", type=float, default=1.0)
+    parser.add_argument("--window-s", type=float, default=0.5)
+    parser.add_argument("--volume-ml", type=float, default=42.0)
+    parser.add_argument("--port", type=int, default=18095)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
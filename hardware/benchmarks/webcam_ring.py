@@ -0,0 +1,128 @@
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiohttp  # noqa: E402
+from aiohttp import web  # noqa: E402
+
+from control.controllers import WebcamController  # noqa: E402
+from control.jpeg_ring import JpegRing  # noqa: E402
+from control.media_http import add_media_routes, start_http_app  # noqa: E402
+
+# Webcam stills and clips from the JPEG ring against the test-pattern camera: time to get one still by reading a
+# part off /webcam.mjpeg (the only way before) vs GET /webcam.jpg, a clip of the last seconds from /webcam/clip
+# checked frame by frame, the cost of one ring append, and how much of the preallocated ring is in use.
+#   python benchmarks/webcam_ring.py --warmup-s 8 --clip-s 5 --requests 50
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def still_from_mjpeg(session: aiohttp.ClientSession, base: str) -> bytes:
+    async with session.get(f"{base}/webcam.mjpeg") as response:
+        length = None
+        while True:
+            line = await response.content.readline()
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":", 1)[1])
+            elif line == b"\r\n" and length is not None:
+                return await response.content.readexactly(length)
+
+
+async def still_from_jpg(session: aiohttp.ClientSession, base: str) -> bytes:
+    async with session.get(f"{base}/webcam.jpg") as response:
+        return await response.read()
+
+
+async def timed(fetch, session: aiohttp.ClientSession, base: str, count: int) -> list[float]:
+    timings = []
+    for _ in range(count):
+        started = time.perf_counter()
+        jpeg = await fetch(session, base)
+        timings.append(time.perf_counter() - started)
+        assert jpeg[:2] == b"\xff\xd8" and jpeg[-2:] == b"\xff\xd9"
+    return timings
+
+
+def split_clip(body: bytes) -> list[tuple[int, bytes]]:
+    frames = []
+    for part in body.split(b"--frame\r\n")[1:]:
+        head, _, rest = part.partition(b"\r\n\r\n")
+        headers = dict(line.split(b": ", 1) for line in head.split(b"\r\n"))
+        length = int(headers[b"Content-Length"])
+        frames.append((int(headers[b"X-Frame-Id"]), rest[:length]))
+    return frames
+
+
+def append_cost_us(frame_bytes: int, count: int) -> float:
+    ring = JpegRing(32 * 1024 * 1024, 1800)
+    jpeg = bytes(frame_bytes)
+    started = time.perf_counter()
+    for frame_id in range(1, count + 1):
+        ring.append(frame_id, jpeg, frame_id)
+    return 1e6 * (time.perf_counter() - started) / count
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    webcam = WebcamController(test_pattern=True)
+    await webcam.initialize()
+    await webcam.start()
+    app = web.Application()
+    add_media_routes(app, None, webcam)
+    runner = await start_http_app(app, "127.0.0.1", args.port, "bench")
+    base = f"http://127.0.0.1:{args.port}"
+    await asyncio.sleep(args.warmup_s)
+
+    async with aiohttp.ClientSession() as session:
+        for name, fetch in (("mjpeg part", still_from_mjpeg), ("webcam.jpg", still_from_jpg)):
+            timings = await timed(fetch, session, base, args.requests)
+            print(
+                f"still via {name:<10} p50 {1000 * statistics.median(timings):6.2f} ms"
+                f"  p95 {1000 * percentile(timings, 0.95):6.2f} ms"
+            )
+
+        end_ms = webcam.last_updated_ms
+        start_ms = end_ms - 1000 * args.clip_s
+        started = time.perf_counter()
+        async with session.get(f"{base}/webcam/clip", params={"from": start_ms, "to": end_ms}) as response:
+            body = await response.read()
+        elapsed = time.perf_counter() - started
+        frames = split_clip(body)
+        ids = [frame_id for frame_id, _jpeg in frames]
+        valid = all(jpeg[:2] == b"\xff\xd8" and jpeg[-2:] == b"\xff\xd9" for _frame_id, jpeg in frames)
+        consecutive = ids == list(range(ids[0], ids[0] + len(ids)))
+        print(
+            f"clip {args.clip_s:g} s: {len(frames)} frames {len(body) / 1e6:.2f} MB in {1000 * elapsed:.1f} ms"
+            f"  jpegs intact {valid}  ids consecutive {consecutive}"
+        )
+        async with session.get(f"{base}/webcam.jpg", params={"frameId": 1}) as response:
+            print(f"frameId=1 after warmup: HTTP {response.status}")
+
+    stats = webcam.ring.stats_payload()
+    average = stats["usedBytes"] / max(stats["frames"], 1)
+    print(
+        f"ring {stats['capacityBytes'] / 2**20:.0f} MiB: {stats['frames']} frames {stats['usedBytes'] / 2**20:.1f} MiB"
+        f" over {stats['spanS']} s; append {append_cost_us(int(average), 5000):.1f} us per {average / 1000:.0f} KB frame"
+    )
+    await webcam.stop()
+    await runner.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Webcam JPEG ring: stills and clips over HTTP.")
+    parser.add_argument("--warmup-s", type=float, default=8.0)
+    parser.add_argument("--clip-s", type=float, default=5.0)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--port", type=int, default=18081)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
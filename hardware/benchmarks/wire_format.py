@@ -0,0 +1,115 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import websockets  # noqa: E402
+
+from control import server  # noqa: E402
+from control.codec import (  # noqa: E402
+    BINARY_SUBPROTOCOL,
+    WIRE_FORMAT_BINARY,
+    WIRE_FORMAT_JSON,
+    decode_binary,
+    encode_binary,
+    encode_payload,
+)
+
+# Bytes per message and encode cost for JSON text vs binary frames, after checking that every
+# sample round-trips exactly and that the binary subprotocol negotiates against the real handler.
+#   python benchmarks/wire_format.py --iterations 20000
+
+
+def sample_payloads() -> dict[str, dict]:
+    thermal = server.thermal_controller.thermal_payload()
+    thermal.update(
+        {"available": True, "error": None, "frameId": 48211, "maxTempC": 36.71, "minTempC": 21.4, "fps": 4.02}
+    )
+    thermal["updatedAtMs"] = 1760000000123
+    webcam = server.webcam_controller.webcam_payload()
+    webcam.update({"available": True, "error": None, "frameId": 90412, "fps": 14.93, "updatedAtMs": 1760000000456})
+    return {
+        "state": server.state_payload(),
+        "thermal": thermal,
+        "webcam": webcam,
+        "ack": {
+            "type": "ack",
+            "subsystem": "xarm",
+            "action": "set",
+            "id": 3,
+            "angle": 118.1,
+            "position": 118.1,
+            "moveMs": 120,
+            "requestedAngle": 118.0,
+            "superseded": False,
+        },
+        "command": {"type": "xarm_set", "id": 3, "angle": 118.0, "moveMs": 120},
+    }
+
+
+def check_round_trips(payloads: dict[str, dict]) -> None:
+    for name, payload in payloads.items():
+        expected = json.loads(json.dumps(payload))
+        decoded_json = json.loads(encode_payload(payload, WIRE_FORMAT_JSON))
+        decoded_binary = decode_binary(encode_binary(payload))
+        assert decoded_json == expected, f"json round trip mismatch for {name}"
+        assert decoded_binary == expected, f"binary round trip mismatch for {name}: {decoded_binary!r}"
+    for edge in (
+        {"type": "thermal", "available": False, "error": "x", "frameId": 0, "maxTempC": None, "minTempC": None,
+         "fps": None, "updatedAtMs": None, "streamPath": "/thermal.mjpeg", "httpPort": 8081},
+        {"type": "webcam", "frameId": 1.5},
+        {"type": "state", "servos": [{"id": 1}, {"id": 2, "extra": True}], "empty": [], "one": [{"a": 1}]},
+    ):
+        assert decode_binary(encode_binary(edge)) == edge, f"binary edge case mismatch: {edge!r}"
+    print("round trips ok")
+
+
+async def check_negotiation() -> None:
+    async with websockets.serve(
+        server.handler, "127.0.0.1", 0, select_subprotocol=server.select_subprotocol
+    ) as ws_server:
+        port = next(iter(ws_server.sockets)).getsockname()[1]
+        async with websockets.connect(f"ws://127.0.0.1:{port}", subprotocols=[BINARY_SUBPROTOCOL]) as client:
+            assert decode_binary(await client.recv())["type"] == "info"
+            assert decode_binary(await client.recv())["type"] == "state"
+            await client.send(encode_binary({"type": "get_state"}))
+            assert decode_binary(await client.recv())["type"] == "state"
+        async with websockets.connect(f"ws://127.0.0.1:{port}") as client:
+            assert json.loads(await client.recv())["type"] == "info"
+            assert json.loads(await client.recv())["type"] == "state"
+    print("subprotocol negotiation ok")
+
+
+def measure(payload: dict, wire_format: str, iterations: int) -> tuple[int, float]:
+    encoded = encode_payload(payload, wire_format)
+    size = len(encoded.encode("utf-8")) if isinstance(encoded, str) else len(encoded)
+    started = time.process_time()
+    for _ in range(iterations):
+        encode_payload(payload, wire_format)
+    return size, (time.process_time() - started) / iterations * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="JSON vs binary websocket frame size and encode cost.")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    payloads = sample_payloads()
+    check_round_trips(payloads)
+    asyncio.run(check_negotiation())
+
+    for name, payload in payloads.items():
+        json_size, json_us = measure(payload, WIRE_FORMAT_JSON, args.iterations)
+        binary_size, binary_us = measure(payload, WIRE_FORMAT_BINARY, args.iterations)
+        print(
+            f"{name:<8} json={json_size:>5}B {json_us:6.2f}us  binary={binary_size:>5}B {binary_us:6.2f}us  "
+            f"size_ratio={binary_size / json_size:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import websockets  # noqa: E402
+
+from control import server  # noqa: E402
+from control.compression import BroadcastDeflateFactory, SharedDeflateCache, compression_stats  # noqa: E402
+from control.constants import (  # noqa: E402
+    WS_COMPRESSION_LEVEL,
+    WS_COMPRESSION_MEM_LEVEL,
+    WS_COMPRESSION_MIN_BYTES,
+    WS_COMPRESSION_WINDOW_BITS,
+)
+
+# Wire bytes and server-side deflate CPU per state broadcast for N clients, comparing no compression,
+# per-client context takeover and a single shared deflate per broadcast.
+#   python benchmarks/ws_compression.py --clients 10 --broadcasts 500
+
+
+def factory(context_takeover: bool) -> BroadcastDeflateFactory:
+    return BroadcastDeflateFactory(
+        WS_COMPRESSION_MIN_BYTES,
+        None if context_takeover else SharedDeflateCache(8),
+        server_no_context_takeover=not context_takeover,
+        server_max_window_bits=WS_COMPRESSION_WINDOW_BITS,
+        client_max_window_bits=WS_COMPRESSION_WINDOW_BITS,
+        compress_settings={"level": WS_COMPRESSION_LEVEL, "memLevel": WS_COMPRESSION_MEM_LEVEL},
+    )
+
+
+async def run_mode(mode: str, clients: int, broadcasts: int) -> dict[str, float]:
+    options: dict = {"compression": None}
+    if mode != "off":
+        options["extensions"] = [factory(mode == "takeover")]
+    for key in vars(compression_stats):
+        if key != "lock":
+            setattr(compression_stats, key, type(getattr(compression_stats, key))())
+
+    raw_bytes = [0]
+    async with websockets.serve(server.handler, "127.0.0.1", 0, **options) as ws_server:
+        port = next(iter(ws_server.sockets)).getsockname()[1]
+        connections = [await websockets.connect(f"ws://127.0.0.1:{port}") for _ in range(clients)]
+        for connection in connections:
+            await connection.recv()
+            await connection.recv()
+
+        async def drain(connection) -> None:
+            for _ in range(broadcasts):
+                await connection.recv()
+
+        drains = [asyncio.create_task(drain(connection)) for connection in connections]
+        started = time.perf_counter()
+        for index in range(broadcasts):
+            # Slider-like changes so consecutive snapshots differ slightly.
+            server.xarm_controller.positions[1 + index % 6] = (index * 7) % 1000
+            payload = server.state_payload()
+            raw_bytes[0] += len(server.encode_payload(payload, server.WIRE_FORMAT_JSON)) * clients
+            await server.broadcast_payload(payload)
+        await asyncio.gather(*drains)
+        elapsed = time.perf_counter() - started
+        for connection in connections:
+            await connection.close()
+
+    stats = compression_stats.state_payload()
+    wire_bytes = stats["bytesOut"] if mode != "off" else raw_bytes[0]
+    return {
+        "bytes_per_message": wire_bytes / (broadcasts * clients),
+        "deflate_ms_per_broadcast": stats["compressMs"] / broadcasts,
+        "shared_hits": stats["sharedHits"],
+        "wall_ms_per_broadcast": elapsed * 1000.0 / broadcasts,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Websocket broadcast compression modes.")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--broadcasts", type=int, default=500)
+    args = parser.parse_args()
+
+    for mode in ("off", "takeover", "shared"):
+        result = await run_mode(mode, args.clients, args.broadcasts)
+        print(
+            f"{mode:<9} clients={args.clients} bytes/msg={result['bytes_per_message']:7.0f} "
+            f"deflate_ms/broadcast={result['deflate_ms_per_broadcast']:.3f} "
+            f"shared_hits={result['shared_hits']} wall_ms/broadcast={result['wall_ms_per_broadcast']:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
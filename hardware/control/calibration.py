@@ -0,0 +1,195 @@
+import logging
+import math
+import os
+import struct
+import time
+from typing import Any
+
+from .constants import (
+    AUTOMATION_FLOW_CALIBRATION_PATH,
+    AUTOMATION_FLOW_MIN_ML_PER_S,
+    AUTOMATION_FLOW_RLS_FORGETTING,
+    AUTOMATION_FLOW_RLS_INITIAL_COVARIANCE,
+    AUTOMATION_RESERVOIR_CAPACITY_ML,
+    AUTOMATION_VALVE_FLOW_ML_PER_S,
+)
+from .executors import rig_executor
+
+CALIBRATION_FILE_MAGIC = b"COLABFC1"
+# kind, valve index, padding, unix time, open seconds, delta ml, head ml before the dispense.
+CALIBRATION_RECORD = struct.Struct("<BB6xdddd")
+
+# A relative calibration path is under the hardware directory, whatever directory the server was started from.
+HARDWARE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RECORD_KIND_MEASURED = 0
+RECORD_KIND_DRAW = 1
+RECORD_KIND_REFILL = 2
+
+
+class FlowModel:
+    # Two-parameter recursive least squares: flow = theta[0] + theta[1] * fill_fraction.
+    def __init__(self, default_flow_ml_per_s: float, capacity_ml: float) -> None:
+        self.capacity_ml = max(capacity_ml, 1e-6)
+        self.theta = [float(default_flow_ml_per_s), 0.0]
+        self.covariance = [
+            [AUTOMATION_FLOW_RLS_INITIAL_COVARIANCE, 0.0],
+            [0.0, AUTOMATION_FLOW_RLS_INITIAL_COVARIANCE],
+        ]
+        self.head_ml = self.capacity_ml
+        self.samples = 0
+
+    def _features(self, head_ml: float) -> tuple[float, float]:
+        return 1.0, max(0.0, head_ml) / self.capacity_ml
+
+    def predict(self, head_ml: float | None = None) -> float:
+        x0, x1 = self._features(self.head_ml if head_ml is None else head_ml)
+        flow = self.theta[0] * x0 + self.theta[1] * x1
+        if not math.isfinite(flow):
+            return AUTOMATION_FLOW_MIN_ML_PER_S
+        return max(AUTOMATION_FLOW_MIN_ML_PER_S, flow)
+
+    def update(self, flow_ml_per_s: float, head_ml: float) -> None:
+        x0, x1 = self._features(head_ml)
+        p = self.covariance
+        px0 = p[0][0] * x0 + p[0][1] * x1
+        px1 = p[1][0] * x0 + p[1][1] * x1
+        denominator = AUTOMATION_FLOW_RLS_FORGETTING + x0 * px0 + x1 * px1
+        if denominator <= 0 or not math.isfinite(denominator):
+            return
+        gain0 = px0 / denominator
+        gain1 = px1 / denominator
+        residual = flow_ml_per_s - (self.theta[0] * x0 + self.theta[1] * x1)
+        self.theta[0] += gain0 * residual
+        self.theta[1] += gain1 * residual
+
+        scale = 1.0 / AUTOMATION_FLOW_RLS_FORGETTING
+        self.covariance = [
+            [(p[0][0] - gain0 * px0) * scale, (p[0][1] - gain0 * px1) * scale],
+            [(p[1][0] - gain1 * px0) * scale, (p[1][1] - gain1 * px1) * scale],
+        ]
+        self.samples += 1
+
+    def apply(self, kind: int, open_s: float, delta_ml: float, head_ml: float) -> None:
+        if kind == RECORD_KIND_REFILL:
+            self.head_ml = min(self.capacity_ml, max(0.0, delta_ml))
+            return
+        if kind == RECORD_KIND_MEASURED and open_s > 0 and delta_ml > 0:
+            self.update(delta_ml / open_s, head_ml - delta_ml / 2.0)
+        self.head_ml = max(0.0, head_ml - max(0.0, delta_ml))
+
+
+class FlowCalibrationStore:
+    def __init__(self, path: str = AUTOMATION_FLOW_CALIBRATION_PATH) -> None:
+        self.path = os.path.join(HARDWARE_DIR, path)
+        valve_count = min(len(AUTOMATION_VALVE_FLOW_ML_PER_S), len(AUTOMATION_RESERVOIR_CAPACITY_ML))
+        self.models = [
+            FlowModel(AUTOMATION_VALVE_FLOW_ML_PER_S[index], AUTOMATION_RESERVOIR_CAPACITY_ML[index])
+            for index in range(valve_count)
+        ]
+        self.error: str | None = None
+        # Cleared when appending would land records out of step with the file; the models still learn in memory.
+        self.writable = True
+        self._fd: int | None = None
+
+    def load(self) -> None:
+        try:
+            with open(self.path, "rb") as handle:
+                data = handle.read()
+        except FileNotFoundError:
+            return
+        except OSError as exc:
+            self.error = f"calibration_load_failed:{exc}"
+            self.writable = False
+            logging.exception("failed to load flow calibration")
+            return
+
+        if not data.startswith(CALIBRATION_FILE_MAGIC):
+            self.error = "calibration_file_invalid"
+            self.writable = False
+            logging.warning("ignoring flow calibration file with unknown header: %s", self.path)
+            return
+
+        body = memoryview(data)[len(CALIBRATION_FILE_MAGIC):]
+        complete = len(body) - (len(body) % CALIBRATION_RECORD.size)
+        for kind, valve, _ts, open_s, delta_ml, head_ml in CALIBRATION_RECORD.iter_unpack(body[:complete]):
+            if valve < len(self.models):
+                self.models[valve].apply(kind, open_s, delta_ml, head_ml)
+
+        if complete != len(body):
+            # A torn trailing record from a crash mid-append; drop it so appends stay aligned.
+            try:
+                with open(self.path, "r+b") as handle:
+                    handle.truncate(len(CALIBRATION_FILE_MAGIC) + complete)
+            except OSError as exc:
+                self.error = f"calibration_truncate_failed:{exc}"
+                self.writable = False
+                logging.warning("could not drop torn flow calibration record: %s", exc)
+        logging.info(
+            "flow calibration loaded records=%s path=%s",
+            complete // CALIBRATION_RECORD.size,
+            self.path,
+        )
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _append(self, kind: int, valve_index: int, open_s: float, delta_ml: float, head_ml: float) -> None:
+        if not self.writable:
+            return
+        try:
+            if self._fd is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                if os.fstat(self._fd).st_size == 0:
+                    os.write(self._fd, CALIBRATION_FILE_MAGIC)
+            os.write(
+                self._fd,
+                CALIBRATION_RECORD.pack(kind, valve_index, time.time(), open_s, delta_ml, head_ml),
+            )
+        except OSError as exc:
+            self.error = f"calibration_write_failed:{exc}"
+            logging.exception("failed to append flow calibration record")
+
+    async def _record(self, kind: int, valve_index: int, open_s: float, delta_ml: float) -> None:
+        model = self.models[valve_index]
+        head_ml = model.head_ml
+        model.apply(kind, open_s, delta_ml, head_ml)
+        await rig_executor.run(self._append, kind, valve_index, open_s, delta_ml, head_ml)
+
+    def flow_ml_per_s(self, valve_index: int) -> float:
+        return self.models[valve_index].predict()
+
+    def open_duration_s(self, valve_index: int, amount_ml: float) -> float:
+        model = self.models[valve_index]
+        # Head falls while the valve is open; the midpoint keeps the estimate unbiased for linear flow.
+        return amount_ml / model.predict(model.head_ml - amount_ml / 2.0)
+
+    async def record_measured(self, valve_index: int, open_s: float, delta_ml: float) -> None:
+        await self._record(RECORD_KIND_MEASURED, valve_index, open_s, delta_ml)
+
+    async def record_draw(self, valve_index: int, open_s: float, amount_ml: float) -> None:
+        await self._record(RECORD_KIND_DRAW, valve_index, open_s, amount_ml)
+
+    async def record_refill(self, valve_index: int, volume_ml: float | None = None) -> None:
+        model = self.models[valve_index]
+        await self._record(RECORD_KIND_REFILL, valve_index, 0.0, model.capacity_ml if volume_ml is None else volume_ml)
+
+    def state_payload(self) -> dict[str, Any]:
+        return {
+            "error": self.error,
+            "valves": [
+                {
+                    "dropper": index + 1,
+                    "flowMlPerS": round(model.predict(), 3),
+                    "headMl": round(model.head_ml, 1),
+                    "capacityMl": model.capacity_ml,
+                    "samples": model.samples,
+                }
+                for index, model in enumerate(self.models)
+            ],
+        }
@@ -0,0 +1,232 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import time
+from typing import Any
+
+from .constants import (
+    CLIP_COLLECT_INTERVAL_S,
+    CLIP_DIRECTORY,
+    CLIP_MAX_DURATION_S,
+    CLIP_MAX_PENDING_BYTES,
+    CLIP_POST_S,
+    CLIP_PRE_S,
+    CLIP_WRITE_BYTES_PER_S,
+)
+from .executors import clip_executor
+from .jpeg_ring import JpegRing
+
+# Each automation job gets a clip: every frame of every stream from CLIP_PRE_S before it started to CLIP_POST_S
+# after it ended. A job can outlast the rings, so its frames are copied out once a second while it runs rather
+# than at the end; copying is a memcpy per frame on the loop, and the capture loops never wait on the disk. One
+# writer thread appends the frames to <stream>.mjpeg at a paced bandwidth, then writes clip.json (frame ids,
+# timestamps and byte offsets per stream) and adds the job to the run's index.jsonl, so a clip is complete
+# exactly when its clip.json exists.
+
+CLIP_META_FILE = "clip.json"
+RUN_INDEX_FILE = "index.jsonl"
+
+
+class ClipJob:
+    def __init__(self, run: str, job_id: str, kind: str, info: dict[str, Any], streams: tuple[str, ...]) -> None:
+        self.run = run
+        self.job_id = job_id
+        self.kind = kind
+        self.info = dict(info)
+        self.directory = os.path.join(CLIP_DIRECTORY, run, job_id)
+        self.started_ms = int(time.time() * 1000)
+        self.ended_ms: int | None = None
+        self.from_ms = self.started_ms - int(CLIP_PRE_S * 1000)
+        self.to_ms: int | None = None
+        self.status = "running"
+        self.next_frame_ids = {name: 0 for name in streams}
+        # Written by the writer thread only: [frameId, updatedAtMs, byte offset, length] per stored frame.
+        self.frames: dict[str, list[list[int]]] = {name: [] for name in streams}
+        self.file_bytes = {name: 0 for name in streams}
+        self.dropped = 0
+        self.task: asyncio.Task | None = None
+
+    def meta_payload(self) -> dict[str, Any]:
+        return {
+            "run": self.run,
+            "jobId": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "info": self.info,
+            "startedAtMs": self.started_ms,
+            "endedAtMs": self.ended_ms,
+            "fromMs": self.from_ms,
+            "toMs": self.to_ms,
+            "dropped": self.dropped,
+            "streams": {
+                name: {"file": f"{name}.mjpeg", "frames": frames} for name, frames in self.frames.items()
+            },
+        }
+
+
+class ClipArchiver:
+    def __init__(self, rings: dict[str, JpegRing]) -> None:
+        self.rings = rings
+        self.jobs: dict[str, ClipJob] = {}
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.writer_task: asyncio.Task | None = None
+        self.pending_bytes = 0
+        self.written = 0
+        self.bytes_written = 0
+        self.dropped = 0
+        self.write_free_at = 0.0
+        self.error: str | None = None
+        self.last_clip: str | None = None
+
+    async def start(self) -> None:
+        if self.writer_task is not None and not self.writer_task.done():
+            return
+        self.writer_task = asyncio.create_task(self._write_loop())
+
+    async def stop(self) -> None:
+        # Jobs still open are closed as they are, so the frames already taken are kept.
+        for job in tuple(self.jobs.values()):
+            self.end(job.job_id, "interrupted")
+            job.to_ms = min(job.to_ms, int(time.time() * 1000))
+        tasks = [job.task for job in self.jobs.values() if job.task is not None]
+        if tasks:
+            await asyncio.wait(tasks, timeout=CLIP_COLLECT_INTERVAL_S * 2)
+        if self.writer_task is not None and not self.writer_task.done():
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self.queue.join(), timeout=5.0)
+            self.writer_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.writer_task
+
+    def begin(self, run: str, job_id: str, kind: str, info: dict[str, Any] | None = None) -> None:
+        if job_id in self.jobs:
+            return
+        job = ClipJob(run, job_id, kind, info or {}, tuple(self.rings))
+        self.jobs[job_id] = job
+        job.task = asyncio.create_task(self._collect(job))
+
+    def end(self, job_id: str, status: str, info: dict[str, Any] | None = None) -> None:
+        job = self.jobs.get(job_id)
+        if job is None or job.ended_ms is not None:
+            return
+        job.ended_ms = int(time.time() * 1000)
+        job.to_ms = job.ended_ms + int(CLIP_POST_S * 1000)
+        job.status = status
+        job.info.update(info or {})
+
+    def _take(self, job: ClipJob, name: str, ring: JpegRing) -> None:
+        window = ring.frame_ids_between(job.from_ms, job.to_ms)
+        if not window:
+            return
+        first = max(window.start, job.next_frame_ids[name])
+        if job.next_frame_ids[name] == 0 and ring.intact(first - 1):
+            # The frame on screen when the window opened; thermal publishes nothing while the scene is still.
+            first -= 1
+        frames: list[tuple[int, int, bytes]] = []
+        size = 0
+        for frame_id, jpeg, updated_ms in ring.frames(range(first, window.stop)):
+            if self.pending_bytes + size + len(jpeg) > CLIP_MAX_PENDING_BYTES:
+                job.dropped += 1
+                self.dropped += 1
+                continue
+            frames.append((frame_id, updated_ms, bytes(jpeg)))
+            size += len(jpeg)
+        job.next_frame_ids[name] = max(first, window.stop)
+        if frames:
+            self.pending_bytes += size
+            self.queue.put_nowait((job, name, frames))
+
+    async def _collect(self, job: ClipJob) -> None:
+        try:
+            while True:
+                now_ms = time.time() * 1000
+                if job.ended_ms is None and now_ms - job.started_ms >= CLIP_MAX_DURATION_S * 1000:
+                    logging.warning("clip %s never ended; closing it", job.job_id)
+                    self.end(job.job_id, "timed_out")
+                finished = job.to_ms is not None and now_ms >= job.to_ms
+                for name, ring in self.rings.items():
+                    self._take(job, name, ring)
+                if finished:
+                    break
+                await asyncio.sleep(CLIP_COLLECT_INTERVAL_S)
+        except Exception:
+            logging.exception("clip %s collection failed", job.job_id)
+        finally:
+            self.jobs.pop(job.job_id, None)
+            self.queue.put_nowait((job, None, []))
+
+    async def _write_loop(self) -> None:
+        while True:
+            job, name, frames = await self.queue.get()
+            try:
+                if name is None:
+                    await clip_executor.run(self._write_meta, job)
+                    self.written += 1
+                    self.last_clip = job.directory
+                    logging.info("clip %s written to %s", job.job_id, job.directory)
+                else:
+                    await clip_executor.run(self._write_frames, job, name, frames)
+            except Exception as exc:
+                self.error = f"clip_write_failed:{exc}"
+                logging.exception("clip %s write failed", job.job_id)
+            finally:
+                self.pending_bytes -= sum(len(jpeg) for _frame_id, _updated_ms, jpeg in frames)
+                self.queue.task_done()
+
+    def _pace(self, size: int) -> None:
+        now = time.monotonic()
+        if self.write_free_at > now:
+            time.sleep(self.write_free_at - now)
+            now = self.write_free_at
+        self.write_free_at = now + size / CLIP_WRITE_BYTES_PER_S
+
+    def _write_frames(self, job: ClipJob, name: str, frames: list[tuple[int, int, bytes]]) -> None:
+        os.makedirs(job.directory, exist_ok=True)
+        with open(os.path.join(job.directory, f"{name}.mjpeg"), "ab") as handle:
+            for frame_id, updated_ms, jpeg in frames:
+                self._pace(len(jpeg))
+                handle.write(jpeg)
+                job.frames[name].append([frame_id, updated_ms, job.file_bytes[name], len(jpeg)])
+                job.file_bytes[name] += len(jpeg)
+                self.bytes_written += len(jpeg)
+
+    def _write_meta(self, job: ClipJob) -> None:
+        os.makedirs(job.directory, exist_ok=True)
+        meta = job.meta_payload()
+        path = os.path.join(job.directory, CLIP_META_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as handle:
+            json.dump(meta, handle)
+        os.replace(path + ".tmp", path)
+        summary = {key: value for key, value in meta.items() if key not in ("info", "streams")}
+        summary["frames"] = {name: len(frames) for name, frames in job.frames.items()}
+        summary["path"] = job.directory
+        with open(os.path.join(CLIP_DIRECTORY, job.run, RUN_INDEX_FILE), "a", encoding="utf-8") as handle:
+            handle.write(json.dumps(summary) + "\n")
+
+    def state_payload(self) -> dict[str, Any]:
+        return {
+            "active": sorted(self.jobs),
+            "written": self.written,
+            "bytesWritten": self.bytes_written,
+            "pendingBytes": self.pending_bytes,
+            "dropped": self.dropped,
+            "lastClip": self.last_clip,
+            "error": self.error,
+        }
+
+
+def read_clip(directory: str) -> tuple[dict[str, Any], dict[str, list[tuple[int, int, bytes]]]]:
+    # For analysis off the rig: the clip's metadata and, per stream, (frameId, updatedAtMs, jpeg) in order.
+    with open(os.path.join(directory, CLIP_META_FILE), encoding="utf-8") as handle:
+        meta = json.load(handle)
+    streams: dict[str, list[tuple[int, int, bytes]]] = {}
+    for name, stream in meta["streams"].items():
+        with open(os.path.join(directory, stream["file"]), "rb") as handle:
+            data = handle.read()
+        streams[name] = [
+            (frame_id, updated_ms, data[offset : offset + length])
+            for frame_id, updated_ms, offset, length in stream["frames"]
+        ]
+    return meta, streams
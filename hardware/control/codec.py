@@ -0,0 +1,168 @@
+import importlib
+import json
+import struct
+from typing import Any
+
+try:
+    msgpack = importlib.import_module("msgpack")
+except Exception:
+    msgpack = None
+
+WIRE_FORMAT_JSON = "json"
+WIRE_FORMAT_BINARY = "binary"
+# Websocket subprotocol a client offers to receive binary frames; clients that offer nothing get JSON text.
+BINARY_SUBPROTOCOL = "colab.binary.v1"
+
+# Binary frames start with one kind byte. Generic payloads are MessagePack; the high-rate telemetry
+# payloads have fixed struct layouts for their numeric fields.
+FRAME_KIND_MSGPACK = 0
+FRAME_KIND_THERMAL = 1
+FRAME_KIND_WEBCAM = 2
+# Encoded camera frames for websocket media subscribers, sent as binary messages whatever the client's wire format:
+# kind byte, JPEG_FRAME_HEADER, then the JPEG as the capture loop encoded it.
+FRAME_KIND_JPEG = 3
+# Stream index in JPEG_STREAMS, frame id, updatedAtMs, min and max C (NaN for the webcam).
+JPEG_FRAME_HEADER = struct.Struct("<Bqqff")
+JPEG_STREAMS = ("thermal", "webcam")
+
+# MessagePack extension type for a list of dicts sharing the same keys, sent as (keys, rows).
+EXT_COLUMNAR = 1
+
+
+class PackedLayout:
+    # Numeric fields go through struct with a null bitmask; any other keys ride along as a MessagePack tail.
+    def __init__(self, payload_type: str, fields: tuple[tuple[str, str], ...]) -> None:
+        self.payload_type = payload_type
+        self.keys = tuple(key for key, _fmt in fields)
+        self.formats = tuple(fmt for _key, fmt in fields)
+        self.struct = struct.Struct("<H" + "".join(self.formats))
+        self.defaults = tuple(False if fmt == "?" else 0.0 if fmt == "d" else 0 for fmt in self.formats)
+
+    def pack(self, payload: dict[str, Any]) -> bytes:
+        null_mask = 0
+        values = []
+        for index, key in enumerate(self.keys):
+            value = payload.get(key)
+            if value is None:
+                null_mask |= 1 << index
+                values.append(self.defaults[index])
+            else:
+                values.append(value)
+        extras = {key: value for key, value in payload.items() if key not in self.keys and key != "type"}
+        return self.struct.pack(null_mask, *values) + msgpack.packb(extras)
+
+    def unpack(self, body: bytes | memoryview) -> dict[str, Any]:
+        null_mask, *values = self.struct.unpack_from(body)
+        payload: dict[str, Any] = {"type": self.payload_type}
+        for index, key in enumerate(self.keys):
+            payload[key] = None if null_mask & (1 << index) else values[index]
+        payload.update(msgpack.unpackb(body[self.struct.size:]))
+        return payload
+
+
+THERMAL_LAYOUT = PackedLayout(
+    "thermal",
+    (
+        ("available", "?"),
+        ("frameId", "q"),
+        ("maxTempC", "d"),
+        ("minTempC", "d"),
+        ("fps", "d"),
+        ("updatedAtMs", "q"),
+        ("httpPort", "H"),
+    ),
+)
+WEBCAM_LAYOUT = PackedLayout(
+    "webcam",
+    (
+        ("available", "?"),
+        ("frameId", "q"),
+        ("fps", "d"),
+        ("updatedAtMs", "q"),
+        ("httpPort", "H"),
+    ),
+)
+PACKED_LAYOUTS = {"thermal": (FRAME_KIND_THERMAL, THERMAL_LAYOUT), "webcam": (FRAME_KIND_WEBCAM, WEBCAM_LAYOUT)}
+LAYOUTS_BY_KIND = {kind: layout for kind, layout in PACKED_LAYOUTS.values()}
+
+
+def binary_available() -> bool:
+    return msgpack is not None
+
+
+def _compact(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {
+            key: _compact(item) if isinstance(item, (dict, list, tuple)) else item
+            for key, item in value.items()
+        }
+    if len(value) > 1 and all(isinstance(item, dict) for item in value):
+        keys = list(value[0])
+        if all(list(item) == keys for item in value):
+            rows = [
+                [_compact(item[key]) if isinstance(item[key], (dict, list, tuple)) else item[key] for key in keys]
+                for item in value
+            ]
+            return msgpack.ExtType(EXT_COLUMNAR, msgpack.packb([keys, rows]))
+    return [_compact(item) if isinstance(item, (dict, list, tuple)) else item for item in value]
+
+
+def _ext_hook(code: int, data: bytes) -> Any:
+    if code != EXT_COLUMNAR:
+        return msgpack.ExtType(code, data)
+    keys, rows = msgpack.unpackb(data, ext_hook=_ext_hook)
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def encode_binary(payload: dict[str, Any]) -> bytes:
+    packed = PACKED_LAYOUTS.get(payload.get("type"))
+    if packed is not None:
+        kind, layout = packed
+        try:
+            return bytes((kind,)) + layout.pack(payload)
+        except (struct.error, TypeError):
+            pass
+    return bytes((FRAME_KIND_MSGPACK,)) + msgpack.packb(_compact(payload))
+
+
+def decode_binary(frame: bytes) -> Any:
+    if not frame:
+        raise ValueError("empty_frame")
+    kind = frame[0]
+    body = memoryview(frame)[1:]
+    layout = LAYOUTS_BY_KIND.get(kind)
+    if layout is not None:
+        try:
+            return layout.unpack(body)
+        except struct.error as exc:
+            raise ValueError("truncated_frame") from exc
+    if kind != FRAME_KIND_MSGPACK:
+        raise ValueError("unknown_frame_kind")
+    return msgpack.unpackb(body, ext_hook=_ext_hook)
+
+
+def pack_jpeg_frame(
+    stream: str, frame_id: int, updated_ms: int, jpeg: bytes, min_temp_c: float, max_temp_c: float
+) -> bytes:
+    header = JPEG_FRAME_HEADER.pack(JPEG_STREAMS.index(stream), frame_id, updated_ms, min_temp_c, max_temp_c)
+    return b"".join((bytes((FRAME_KIND_JPEG,)), header, jpeg))
+
+
+def unpack_jpeg_frame(frame: bytes) -> tuple[dict[str, Any], memoryview]:
+    if not frame or frame[0] != FRAME_KIND_JPEG:
+        raise ValueError("not_a_jpeg_frame")
+    stream, frame_id, updated_ms, min_temp_c, max_temp_c = JPEG_FRAME_HEADER.unpack_from(frame, 1)
+    meta = {
+        "stream": JPEG_STREAMS[stream],
+        "frameId": frame_id,
+        "updatedAtMs": updated_ms,
+        "minTempC": min_temp_c,
+        "maxTempC": max_temp_c,
+    }
+    return meta, memoryview(frame)[1 + JPEG_FRAME_HEADER.size :]
+
+
+def encode_payload(payload: dict[str, Any], wire_format: str) -> str | bytes:
+    if wire_format == WIRE_FORMAT_BINARY:
+        return encode_binary(payload)
+    return json.dumps(payload)
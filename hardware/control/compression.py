@@ -0,0 +1,214 @@
+import ipaddress
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Sequence
+
+from websockets.extensions.base import Extension
+from websockets.extensions.permessage_deflate import PerMessageDeflate, ServerPerMessageDeflateFactory
+from websockets.frames import CONT, CTRL_OPCODES, Frame, Opcode
+from websockets.typing import ExtensionParameter
+
+from .codec import FRAME_KIND_JPEG
+from .constants import (
+    WS_COMPRESSION_CONTEXT_TAKEOVER,
+    WS_COMPRESSION_LAN_NETWORKS,
+    WS_COMPRESSION_LEVEL,
+    WS_COMPRESSION_MEM_LEVEL,
+    WS_COMPRESSION_MIN_BYTES,
+    WS_COMPRESSION_SHARED_CACHE_SIZE,
+    WS_COMPRESSION_WINDOW_BITS,
+)
+
+_EMPTY_UNCOMPRESSED_BLOCK = b"\x00\x00\xff\xff"
+JPEG_FRAME_PREFIX = bytes((FRAME_KIND_JPEG,))
+
+
+class CompressionStats:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.messages = 0
+        self.skipped_small = 0
+        self.skipped_policy = 0
+        self.skipped_media = 0
+        self.shared_hits = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.compress_s = 0.0
+
+    def record(self, bytes_in: int, bytes_out: int, elapsed_s: float, shared_hit: bool) -> None:
+        with self.lock:
+            self.messages += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.compress_s += elapsed_s
+            if shared_hit:
+                self.shared_hits += 1
+
+    def state_payload(self) -> dict[str, Any]:
+        with self.lock:
+            return {
+                "messages": self.messages,
+                "skippedSmall": self.skipped_small,
+                "skippedPolicy": self.skipped_policy,
+                "skippedMedia": self.skipped_media,
+                "sharedHits": self.shared_hits,
+                "bytesIn": self.bytes_in,
+                "bytesOut": self.bytes_out,
+                "ratio": round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else None,
+                "compressMs": round(self.compress_s * 1000.0, 3),
+            }
+
+
+compression_stats = CompressionStats()
+
+
+class SharedDeflateCache:
+    # Without context takeover a message compresses to the same bytes for every client with the same
+    # window and settings, so a broadcast is deflated once and the result reused.
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.entries: OrderedDict[tuple[bytes, int], bytes] = OrderedDict()
+
+    def get(self, key: tuple[bytes, int]) -> bytes | None:
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key: tuple[bytes, int], value: bytes) -> None:
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+class BroadcastDeflate(PerMessageDeflate):
+    # permessage-deflate that leaves small messages and policy-exempt clients uncompressed (RFC 7692
+    # allows any message to go out with RSV1 clear) and shares output across clients when possible.
+    def __init__(
+        self,
+        remote_no_context_takeover: bool,
+        local_no_context_takeover: bool,
+        remote_max_window_bits: int,
+        local_max_window_bits: int,
+        compress_settings: dict[Any, Any] | None,
+        min_bytes: int,
+        shared_cache: SharedDeflateCache | None,
+    ) -> None:
+        super().__init__(
+            remote_no_context_takeover,
+            local_no_context_takeover,
+            remote_max_window_bits,
+            local_max_window_bits,
+            compress_settings,
+        )
+        self.min_bytes = min_bytes
+        self.shared_cache = shared_cache if local_no_context_takeover else None
+        self.enabled = True
+        self.skipping_message = False
+
+    def encode(self, frame: Frame) -> Frame:
+        if frame.opcode in CTRL_OPCODES:
+            return frame
+        if frame.opcode is CONT:
+            if self.skipping_message:
+                self.skipping_message = not frame.fin
+                return frame
+            return super().encode(frame)
+
+        if frame.opcode is Opcode.BINARY and frame.data[:1] == JPEG_FRAME_PREFIX:
+            # JPEG does not deflate; trying would only spend CPU on every media subscriber.
+            compression_stats.skipped_media += 1
+            self.skipping_message = not frame.fin
+            return frame
+        if not self.enabled:
+            compression_stats.skipped_policy += 1
+            self.skipping_message = not frame.fin
+            return frame
+        if frame.fin and len(frame.data) < self.min_bytes:
+            compression_stats.skipped_small += 1
+            return frame
+
+        started = time.perf_counter()
+        if self.shared_cache is None or not frame.fin:
+            encoded = super().encode(frame)
+            compression_stats.record(len(frame.data), len(encoded.data), time.perf_counter() - started, False)
+            return encoded
+
+        key = (bytes(frame.data), self.local_max_window_bits)
+        data = self.shared_cache.get(key)
+        shared_hit = data is not None
+        if data is None:
+            encoder = zlib.compressobj(wbits=-self.local_max_window_bits, **self.compress_settings)
+            data = encoder.compress(key[0]) + encoder.flush(zlib.Z_SYNC_FLUSH)
+            data = data[:-4] if data.endswith(_EMPTY_UNCOMPRESSED_BLOCK) else data
+            self.shared_cache.put(key, data)
+        compression_stats.record(len(frame.data), len(data), time.perf_counter() - started, shared_hit)
+        return Frame(frame.opcode, data, frame.fin, True, frame.rsv2, frame.rsv3)
+
+
+class BroadcastDeflateFactory(ServerPerMessageDeflateFactory):
+    def __init__(self, min_bytes: int, shared_cache: SharedDeflateCache | None, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.min_bytes = min_bytes
+        self.shared_cache = shared_cache
+
+    def process_request_params(
+        self,
+        params: Sequence[ExtensionParameter],
+        accepted_extensions: Sequence[Extension],
+    ) -> tuple[list[ExtensionParameter], PerMessageDeflate]:
+        response_params, negotiated = super().process_request_params(params, accepted_extensions)
+        return response_params, BroadcastDeflate(
+            negotiated.remote_no_context_takeover,
+            negotiated.local_no_context_takeover,
+            negotiated.remote_max_window_bits,
+            negotiated.local_max_window_bits,
+            negotiated.compress_settings,
+            self.min_bytes,
+            self.shared_cache,
+        )
+
+
+def build_compression_extensions() -> list[BroadcastDeflateFactory]:
+    return [
+        BroadcastDeflateFactory(
+            WS_COMPRESSION_MIN_BYTES,
+            SharedDeflateCache(WS_COMPRESSION_SHARED_CACHE_SIZE),
+            server_no_context_takeover=not WS_COMPRESSION_CONTEXT_TAKEOVER,
+            server_max_window_bits=WS_COMPRESSION_WINDOW_BITS,
+            client_max_window_bits=WS_COMPRESSION_WINDOW_BITS,
+            compress_settings={"level": WS_COMPRESSION_LEVEL, "memLevel": WS_COMPRESSION_MEM_LEVEL},
+        )
+    ]
+
+
+lan_networks = tuple(ipaddress.ip_network(network) for network in WS_COMPRESSION_LAN_NETWORKS)
+
+
+def is_lan_address(remote_address: Any) -> bool:
+    if not remote_address:
+        return False
+    try:
+        address = ipaddress.ip_address(remote_address[0])
+    except ValueError:
+        return False
+    if address.version == 6 and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    return any(address in network for network in lan_networks)
+
+
+def apply_client_compression_policy(websocket: Any) -> bool:
+    # Returns whether outgoing messages to this client are compressed.
+    negotiated = getattr(websocket, "compressed", None)
+    if negotiated is not None:
+        # aiohttp connections settle compression in the handshake; see http_ws.
+        return negotiated
+    extensions = getattr(getattr(websocket, "protocol", None), "extensions", ())
+    for extension in extensions:
+        if isinstance(extension, BroadcastDeflate):
+            extension.enabled = not is_lan_address(getattr(websocket, "remote_address", None))
+            return extension.enabled
+    return False
@@ -13,6 +13,11 @@ XARM_MIN_MOVE_MS = 50
 XARM_MAX_MOVE_MS = 5000
 XARM_SAFE_READ_RETRIES = 10
 XARM_SAFE_READ_DELAY_S = 0.05
+# USB IDs of the xArm's HID controller, used to spot it in sysfs when it is plugged back in.
+XARM_USB_VENDOR_ID = 0x0483
+XARM_USB_PRODUCT_ID = 0x5750
+# Slider streams keep only the newest pending target per servo; the bus sees at most this many writes per second.
+XARM_SLIDER_MAX_WRITES_PER_S = 50.0
 
 AUTOMATION_CLEANUP_SEQUENCE_DEG = (
     (0.0, 120.0, 150.0, 70.0, 100.0, 210.0),
@@ -48,6 +53,24 @@ AUTOMATION_DISPENSE_PRE_OPEN_WAIT_S = 1
 AUTOMATION_DISPENSE_POST_CLOSE_WAIT_S = 3
 # Per-valve flow calibration in milliliters per second (dropper 1..N).
 AUTOMATION_VALVE_FLOW_ML_PER_S = (8.0, 5.0, 8.0)
+# Closed-loop dispense: open the valve in pulses and check the measured volume between pulses.
+AUTOMATION_CLOSED_LOOP_MAX_PULSES = 6
+# Each pulse targets this fraction of the remaining volume so the loop tops up instead of overshooting.
+AUTOMATION_CLOSED_LOOP_PULSE_FRACTION = 0.8
+AUTOMATION_CLOSED_LOOP_MIN_PULSE_S = 0.1
+AUTOMATION_CLOSED_LOOP_TOLERANCE_ML = 1.0
+# Wait after each pulse closes before measuring; replaces the open-loop post-close wait.
+AUTOMATION_CLOSED_LOOP_SETTLE_S = 0.5
+AUTOMATION_CLOSED_LOOP_FRAME_TIMEOUT_S = 2.0
+
+# Online flow calibration: flow = a + b * reservoir fill, fitted per valve by recursive least squares.
+# AUTOMATION_VALVE_FLOW_ML_PER_S seeds the model until measurements arrive.
+AUTOMATION_FLOW_CALIBRATION_PATH = "data/flow_calibration.bin"
+AUTOMATION_RESERVOIR_CAPACITY_ML = (250.0, 250.0, 250.0)
+# Forgetting factor < 1 lets the fit track drift as reservoirs empty and valves wear.
+AUTOMATION_FLOW_RLS_FORGETTING = 0.97
+AUTOMATION_FLOW_RLS_INITIAL_COVARIANCE = 100.0
+AUTOMATION_FLOW_MIN_ML_PER_S = 0.2
 AUTOMATION_STIR_MAX_DURATION_S = 3600.0
 
 RIG_SERVO_CHANNELS = 4
@@ -62,12 +85,15 @@ RIG_DEFAULT_ANGLE = RIG_CLOSED_ANGLE
 RIG_INIT_SERVOS_ON_START = False
 RIG_STIRRER_GPIO = 4
 RIG_STIRRER_CHIP = 0
+# I2C bus shared by the PCA9685 and the MLX90640 (board.SCL/SDA on the Pi).
+RIG_I2C_BUS = 1
 RIG_STIRRER_DURATIONS_S = (1, 5, 10)
 RIG_DIAGNOSTIC_SERVO_CHANNELS = (1, 2, 3)
 RIG_DIAGNOSTIC_SERVO_OPEN_S = 2
 RIG_DIAGNOSTIC_STIRRER_S = 5
 RIG_DIAGNOSTIC_BASE_TO_VALVE_DELAY_S = 0.5
 RIG_DIAGNOSTIC_POST_CLOSE_S = 0.3
+RIG_SLIDER_MAX_WRITES_PER_S = 50.0
 
 THERMAL_HTTP_HOST = "0.0.0.0"
 THERMAL_HTTP_PORT = 8081
@@ -83,6 +109,39 @@ THERMAL_CAPTURE_INTERVAL_S = 0.2
 THERMAL_READ_RETRIES = 5
 THERMAL_READ_RETRY_DELAY_S = 0.01
 THERMAL_CAPTURE_ERROR_LOG_INTERVAL_S = 5.0
+# Read each MLX90640 chess-pattern sub-page as the sensor produces it and publish it as a frame update;
+# False falls back to the driver's getFrame() paced by THERMAL_CAPTURE_INTERVAL_S.
+THERMAL_SUBPAGE_CAPTURE = True
+# Sub-pages per second (two per full frame); lowered at startup if the I2C clock cannot carry it.
+THERMAL_REFRESH_RATE_HZ = 16
+# Bus clock requested from busio. On the Pi the kernel owns it: dtparam=i2c_arm_baudrate=1000000 in config.txt.
+THERMAL_I2C_FREQUENCY_HZ = 1000000
+# Largest share of each sub-page period one sub-page transfer may take; the PCA9685 shares the bus.
+THERMAL_I2C_MAX_BUS_SHARE = 0.75
+THERMAL_STATUS_POLL_S = 0.002
+# Per-pixel temporal filter: weight of each new reading in the moving average. Changes larger than the step
+# are taken as they are.
+THERMAL_FILTER_ENABLED = True
+THERMAL_FILTER_ALPHA = 0.3
+THERMAL_FILTER_STEP_C = 2.0
+# Colour scale edges move only when the scene crosses them or sits more than two margins inside them.
+THERMAL_SCALE_HYSTERESIS_C = 1.0
+# A filtered frame is encoded and sent only once some pixel has moved this much since the last one sent.
+THERMAL_PUBLISH_MIN_DELTA_C = 1.0
+# Thermal alarm rules, checked on every raw frame:
+#   (name, ROI as x, y, width, height in sensor pixels, kind, trigger, clear below, safety actions).
+# "max_above"/"mean_above" compare the ROI's hottest pixel/mean in C; "max_rise"/"mean_rise" compare its rise in
+# C/s over THERMAL_ALARM_RISE_WINDOW_S. ROIs are in sensor orientation; the MJPEG image is mirrored left-right.
+THERMAL_ALARM_RULES = (
+    ("overtemp", (0, 0, 32, 24), "max_above", 150.0, 140.0, ("force_stirrer_off", "close_non_base_servos")),
+    ("rapid_rise", (0, 0, 32, 24), "max_rise", 15.0, 5.0, ("force_stirrer_off",)),
+)
+THERMAL_ALARM_RISE_WINDOW_S = 1.0
+# Run a rule's safety actions when it triggers; alarms are broadcast either way.
+THERMAL_ALARM_ACTIONS_ENABLED = True
+# Recent thermal JPEGs kept for automation clips; only frames that changed the picture are published and stored.
+THERMAL_RING_BYTES = 16 * 1024 * 1024
+THERMAL_RING_SLOTS = THERMAL_REFRESH_RATE_HZ * 120
 
 WEBCAM_STREAM_PATH = "/webcam.mjpeg"
 WEBCAM_DEVICE_INDEX = 0
@@ -94,3 +153,148 @@ WEBCAM_CAPTURE_INTERVAL_S = 1.0 / WEBCAM_TARGET_FPS
 WEBCAM_FALLBACK_INTERVAL_S = 0.25
 WEBCAM_WS_BROADCAST_INTERVAL_S = 0.5
 WEBCAM_CAPTURE_ERROR_LOG_INTERVAL_S = 5.0
+# Recent webcam JPEGs kept for /webcam.jpg and /webcam/clip, allocated once at startup. At 640x480 quality 80
+# (about 40 KB a frame, 15 fps) 32 MiB holds roughly the last 50 s; slots cap the frame count for smaller frames.
+WEBCAM_RING_BYTES = 32 * 1024 * 1024
+WEBCAM_RING_SLOTS = WEBCAM_TARGET_FPS * 120
+WEBCAM_SNAPSHOT_PATH = "/webcam.jpg"
+WEBCAM_CLIP_PATH = "/webcam/clip"
+
+# Local liquid-level estimator (classical CV on webcam frames, runs in a worker process).
+# Flask region in webcam pixels: x, y, width, height. Calibrate to the rig's camera placement.
+VOLUME_FLASK_ROI = (260, 120, 120, 320)
+# (image row, millilitres) for the flask's graduation lines; rows are full-frame pixel rows.
+VOLUME_GRADUATION_ROWS = (
+    (160, 250.0),
+    (216, 200.0),
+    (272, 150.0),
+    (328, 100.0),
+    (384, 50.0),
+    (432, 0.0),
+)
+# Rows averaged above and below each candidate meniscus row.
+VOLUME_LOCAL_STEP_WINDOW_PX = 6
+# Minimum brightness step (0..255) across the meniscus before a local reading is trusted.
+VOLUME_LOCAL_MIN_STEP = 12.0
+VOLUME_LOCAL_BROADCAST_INTERVAL_S = 0.5
+VOLUME_LOCAL_BROADCAST_MIN_DELTA_ML = 0.5
+# Local readings older than this no longer count as trusted.
+VOLUME_LOCAL_STALE_S = 2.0
+VOLUME_REMOTE_MODEL = "claude-haiku-4-5"
+# Hard per-request deadline for the remote model, including connection setup.
+VOLUME_REMOTE_DEADLINE_S = 8.0
+VOLUME_REMOTE_MAX_CONCURRENCY = 1
+# How often an in-flight window-driven request checks whether its query window has closed.
+VOLUME_REMOTE_WINDOW_POLL_S = 0.25
+# The remote model audits local readings at most this often, and is the fallback when they are not trusted.
+VOLUME_REMOTE_AUDIT_INTERVAL_S = 30.0
+VOLUME_REMOTE_QUERY_INTERVAL_S = 2.0
+# Remote requests are skipped when the flask ROI thumbnail (width, height) matches an already-estimated frame.
+VOLUME_CHANGE_THUMBNAIL_SIZE = (16, 32)
+# Mean absolute gray-level difference (0..255) below which two thumbnails count as the same scene.
+VOLUME_CHANGE_MAX_MEAN_DIFF = 2.5
+VOLUME_CACHE_SIZE = 32
+
+# Thread pools for blocking work; serial devices each get a dedicated single-thread executor.
+EXECUTOR_MEDIA_WORKERS = 2
+EXECUTOR_LATENCY_EWMA_ALPHA = 0.1
+# Worker processes for thermal/webcam JPEG encoding fed through shared memory; 0 encodes on the media thread pool.
+# Threads stay the default: benchmarks/media_encode.py measures them faster, the shared-memory handoff costs more
+# than the GIL contention it avoids. Processes only pay off when encoding starves the control loop.
+MEDIA_ENCODER_PROCESSES = 0
+# Run capture and the MJPEG server in a child process so viewer fan-out cannot delay commands.
+MEDIA_PROCESS_ENABLED = False
+MEDIA_PROCESS_SOCKET_PATH = "/tmp/colab-media.sock"
+MEDIA_PROCESS_CONNECT_TIMEOUT_S = 15.0
+MEDIA_PROCESS_RESTART_DELAY_S = 2.0
+# Control-process HTTP endpoints (executor stats) when the media process owns THERMAL_HTTP_PORT.
+CONTROL_HTTP_PORT = 8082
+# Synthetic thermal/webcam frames instead of the sensors, for dashboard work and benchmarks off the rig.
+MEDIA_TEST_PATTERN = False
+# Raw incoming commands are logged at most once per interval per command type; 0 logs every message.
+COMMAND_LOG_INTERVAL_S = 1.0
+# permessage-deflate for the control websocket. Messages shorter than the minimum go out uncompressed.
+WS_COMPRESSION_ENABLED = True
+WS_COMPRESSION_MIN_BYTES = 512
+WS_COMPRESSION_WINDOW_BITS = 12
+WS_COMPRESSION_MEM_LEVEL = 5
+WS_COMPRESSION_LEVEL = 6
+# Context takeover lets each state snapshot reference the previous one (~60 B instead of ~800 B per state) but
+# deflates every message once per client; without it each broadcast is deflated once and shared by all clients.
+WS_COMPRESSION_CONTEXT_TAKEOVER = True
+WS_COMPRESSION_SHARED_CACHE_SIZE = 8
+# Clients connecting from these networks get uncompressed frames to keep Pi CPU for the rig. Loopback is
+# left out because tunnels and reverse proxies for remote dashboards connect from it.
+WS_COMPRESSION_LAN_NETWORKS = ("10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16", "fe80::/10")
+# Single-port mode: one aiohttp app on PORT serves the control websocket at CONTROL_WS_PATH (and at "/", where
+# websockets.serve answered) together with the HTTP and media routes, so a dashboard needs one connection.
+SINGLE_PORT_ENABLED = False
+CONTROL_WS_PATH = "/ws"
+# websockets' own defaults, kept for the aiohttp control websocket.
+WS_HEARTBEAT_S = 20.0
+WS_MAX_MESSAGE_BYTES = 2**20
+# JPEG frames for a websocket media subscriber are skipped while its transport holds more than this. It has to be
+# below the libraries' write limits (websockets 32 KiB, aiohttp 64 KiB), past which send() waits for the client.
+MEDIA_WS_MAX_BUFFER_BYTES = 16 * 1024
+# Kernel send buffer for a socket once it subscribes to media. Left to autotune it grows to megabytes of JPEGs that
+# the check above cannot see and that acks then wait behind; this still covers a frame burst at LAN speed.
+MEDIA_WS_SOCKET_SEND_BUFFER_BYTES = 64 * 1024
+# Telemetry recorder: one columnar file per server run.
+TELEMETRY_ENABLED = True
+TELEMETRY_DIRECTORY = "data/telemetry"
+TELEMETRY_SAMPLE_INTERVAL_S = THERMAL_CAPTURE_INTERVAL_S
+TELEMETRY_CHUNK_ROWS = 1024
+# Partial chunks are flushed at least this often so a crash loses little.
+TELEMETRY_FLUSH_INTERVAL_S = 10.0
+# An index block listing recent chunks is written after this many chunks and on close.
+TELEMETRY_INDEX_INTERVAL_CHUNKS = 16
+TELEMETRY_HTTP_MAX_ROWS = 20000
+# Session bundles: inbound commands, raw thermal frames, webcam JPEGs and device call timings, for replay off the rig.
+SESSION_RECORD_ON_START = False
+SESSION_DIRECTORY = "data/sessions"
+SESSION_FLUSH_INTERVAL_S = 0.5
+# Recording stops once a bundle reaches this size; webcam JPEGs are most of it (~0.5 MB/s).
+SESSION_MAX_BYTES = 2_000_000_000
+# Path to a bundle to replay against simulated devices instead of hardware; empty runs normally.
+SESSION_REPLAY_PATH = ""
+# Device call timings are divided by this, to match a replay client sending commands at the same speed.
+SESSION_REPLAY_SPEED = 1.0
+# Span tracing for automation jobs and device I/O, kept in a ring buffer and served as Chrome trace JSON.
+TRACING_ENABLED = True
+TRACING_BUFFER_SPANS = 20000
+# Event loop health: timer wakeup lag, stalls caught with the loop thread's stack, and an on-demand profiler.
+LOOP_MONITOR_ENABLED = True
+LOOP_LAG_INTERVAL_S = 0.05
+# A callback holding the loop at least this long is logged with its stack.
+LOOP_SLOW_CALLBACK_S = 0.1
+LOOP_SLOW_CALLBACK_HISTORY = 20
+LOOP_STACK_DEPTH = 16
+LOOP_PROFILE_INTERVAL_S = 0.002
+# GIL switch interval while profiling (default 5 ms), so samples land inside busy callbacks.
+LOOP_PROFILE_SWITCH_INTERVAL_S = 0.0002
+LOOP_PROFILE_DEFAULT_DURATION_S = 5.0
+LOOP_PROFILE_MAX_DURATION_S = 60.0
+LOOP_PROFILE_TOP = 20
+# Automation clips: webcam and thermal frames from CLIP_PRE_S before to CLIP_POST_S after each dispense and
+# cleanup job, copied out of the frame rings as the job runs and written per run under CLIP_DIRECTORY/<run>/<job>.
+CLIP_CAPTURE_ENABLED = True
+CLIP_DIRECTORY = "data/clips"
+CLIP_PRE_S = 5.0
+CLIP_POST_S = 5.0
+CLIP_COLLECT_INTERVAL_S = 1.0
+# A job that never reports its end (lost control connection) is closed after this long.
+CLIP_MAX_DURATION_S = 600.0
+# The writer thread paces itself to this disk bandwidth so clips never starve telemetry or session writes.
+CLIP_WRITE_BYTES_PER_S = 4_000_000
+# Frames copied out but not yet written; past this, new frames are dropped and counted on the clip.
+CLIP_MAX_PENDING_BYTES = 64 * 1024 * 1024
+# Device supervisor: devices that failed to open or were lost are re-probed with exponential backoff, and
+# immediately when a /dev or sysfs node appears (polled, so a replug recovers within one poll).
+DEVICE_SUPERVISOR_ENABLED = True
+DEVICE_HOTPLUG_POLL_S = 1.0
+DEVICE_RETRY_INITIAL_S = 1.0
+DEVICE_RETRY_MAX_S = 30.0
+# A probe still running after this counts as failed; no new probe starts while its thread is stuck in the open.
+DEVICE_PROBE_TIMEOUT_S = 10.0
+# Consecutive thermal capture failures before the sensor is treated as disconnected.
+DEVICE_LOST_AFTER_FAILURES = 5
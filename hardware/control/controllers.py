@@ -1,47 +1,56 @@
 import asyncio
 import contextlib
 import importlib
-import io
 import logging
 import math
 import time
 from typing import Any, Awaitable, Callable
 
 from .constants import (
+    DEVICE_LOST_AFTER_FAILURES,
     RIG_BASE_ROTATION_CHANNEL,
     RIG_BASE_ROTATION_POSITIONS,
     RIG_CLOSED_ANGLE,
     RIG_DEFAULT_ANGLE,
     RIG_DIAGNOSTIC_BASE_TO_VALVE_DELAY_S,
+    RIG_I2C_BUS,
     RIG_INIT_SERVOS_ON_START,
     RIG_OPEN_ANGLE,
     RIG_SERVO_ACTUATION_RANGE,
     RIG_SERVO_CHANNELS,
     RIG_SERVO_MAX_PULSE_US,
     RIG_SERVO_MIN_PULSE_US,
+    RIG_SLIDER_MAX_WRITES_PER_S,
     RIG_STIRRER_CHIP,
     RIG_STIRRER_DURATIONS_S,
     RIG_STIRRER_GPIO,
+    THERMAL_ALARM_RULES,
     THERMAL_FALLBACK_INTERVAL_S,
+    THERMAL_FILTER_ENABLED,
     THERMAL_FRAME_HEIGHT,
-    THERMAL_FRAME_SCALE,
     THERMAL_FRAME_WIDTH,
     THERMAL_HTTP_PORT,
-    THERMAL_JPEG_QUALITY,
+    THERMAL_I2C_FREQUENCY_HZ,
     THERMAL_CAPTURE_ERROR_LOG_INTERVAL_S,
     THERMAL_CAPTURE_INTERVAL_S,
     THERMAL_READ_RETRIES,
     THERMAL_READ_RETRY_DELAY_S,
+    THERMAL_REFRESH_RATE_HZ,
+    THERMAL_RING_BYTES,
+    THERMAL_RING_SLOTS,
     THERMAL_STREAM_PATH,
-    THERMAL_TEXT_BAND_HEIGHT,
+    THERMAL_SUBPAGE_CAPTURE,
     THERMAL_WS_BROADCAST_INTERVAL_S,
     WEBCAM_CAPTURE_ERROR_LOG_INTERVAL_S,
     WEBCAM_CAPTURE_INTERVAL_S,
+    WEBCAM_CLIP_PATH,
     WEBCAM_DEVICE_INDEX,
     WEBCAM_FALLBACK_INTERVAL_S,
     WEBCAM_FRAME_HEIGHT,
     WEBCAM_FRAME_WIDTH,
-    WEBCAM_JPEG_QUALITY,
+    WEBCAM_RING_BYTES,
+    WEBCAM_RING_SLOTS,
+    WEBCAM_SNAPSHOT_PATH,
     WEBCAM_STREAM_PATH,
     WEBCAM_WS_BROADCAST_INTERVAL_S,
     XARM_DEFAULT_MOVE_MS,
@@ -54,7 +63,22 @@ from .constants import (
     XARM_SAFE_READ_DELAY_S,
     XARM_SAFE_READ_RETRIES,
     XARM_SERVO_IDS,
+    XARM_SLIDER_MAX_WRITES_PER_S,
 )
+from .executors import media_executor, rig_executor, thermal_executor, webcam_executor, xarm_executor
+from .jpeg_ring import JpegRing
+from .media_encoder import MediaEncoderPool, encode_webcam_jpeg, render_thermal_jpeg
+from .metrics import (
+    device_io_seconds,
+    thermal_encode_seconds,
+    thermal_read_seconds,
+    webcam_capture_seconds,
+    webcam_encode_seconds,
+)
+from .mlx90640 import REFRESH_RATE_CODES, SubpageReader, i2c_bus_clock_hz, sustainable_refresh_hz
+from .thermal_alarms import ThermalAlarmEngine
+from .thermal_filter import ThermalFilter
+from .tracing import trace_span
 
 
 def clamp_int(value: int, low: int, high: int) -> int:
@@ -65,6 +89,83 @@ def clamp_float(value: float, low: float, high: float) -> float:
     return max(low, min(high, value))
 
 
+class LatestTargetWriter:
+    # Per-key latest-target-wins slots drained by one writer task. Every submitter's future resolves
+    # with the target that was actually written for its key, which may be a newer one.
+    def __init__(
+        self,
+        write: Callable[[int, Any, int], Awaitable[bool]],
+        max_writes_per_s: float,
+    ) -> None:
+        self.write = write
+        self.min_interval_s = 1.0 / max_writes_per_s if max_writes_per_s > 0 else 0.0
+        self.pending: dict[int, tuple[Any, list[asyncio.Future]]] = {}
+        # Bumped by every explicit write; a popped target from an older generation must not land after it.
+        self.generations: dict[int, int] = {}
+        self.explicit: dict[int, Any] = {}
+        self.task: asyncio.Task | None = None
+        self.last_write_monotonic = 0.0
+        self.writes = 0
+        self.coalesced = 0
+
+    def submit(self, key: int, target: Any) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        previous = self.pending.get(key)
+        if previous is None:
+            self.pending[key] = (target, [future])
+        else:
+            self.coalesced += 1
+            self.pending[key] = (target, previous[1] + [future])
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+        return future
+
+    def current(self, key: int, generation: int) -> bool:
+        return self.generations.get(key, 0) == generation
+
+    def discard(self, key: int, applied: Any) -> None:
+        self.generations[key] = self.generations.get(key, 0) + 1
+        self.explicit[key] = applied
+        entry = self.pending.pop(key, None)
+        if entry is None:
+            return
+        for future in entry[1]:
+            if not future.done():
+                future.set_result(applied)
+
+    async def _run(self) -> None:
+        while self.pending:
+            delay_s = self.last_write_monotonic + self.min_interval_s - time.monotonic()
+            if delay_s > 0:
+                await asyncio.sleep(delay_s)
+                continue
+
+            key = next(iter(self.pending))
+            target, waiters = self.pending.pop(key)
+            generation = self.generations.get(key, 0)
+            self.last_write_monotonic = time.monotonic()
+            try:
+                written = await self.write(key, target, generation)
+            except Exception as exc:
+                for future in waiters:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+
+            if written:
+                self.writes += 1
+            else:
+                # An explicit write took the device while this target waited for it.
+                self.coalesced += 1
+                target = self.explicit[key]
+            for future in waiters:
+                if not future.done():
+                    future.set_result(target)
+
+    def stats_payload(self) -> dict[str, int]:
+        return {"writes": self.writes, "coalesced": self.coalesced, "pending": len(self.pending)}
+
+
 def xarm_raw_to_angle_deg(raw: int) -> float:
     clamped_raw = clamp_int(raw, XARM_RAW_MIN, XARM_RAW_MAX)
     raw_span = XARM_RAW_MAX - XARM_RAW_MIN
@@ -110,16 +211,55 @@ class XArmController:
         self.available = False
         self.error: str | None = None
         self.arm: Any | None = None
-
+        self.slider_writer = LatestTargetWriter(self._write_slider_target, XARM_SLIDER_MAX_WRITES_PER_S)
+        self.set_position_seconds = device_io_seconds.labels("xarm", "set_position")
+        self.get_position_seconds = device_io_seconds.labels("xarm", "get_position")
+        self.initializing = True
+
+    def _open_arm(self) -> None:
+        xarm_module = importlib.import_module("xarm")
+        self.arm = xarm_module.Controller("USB")
+
+    async def initialize(self) -> None:
+        # The HID open and the startup scan (with read retries) take seconds, so they run after the server is
+        # listening; commands meanwhile fail with xarm_initializing. The device supervisor calls this again to
+        # reconnect, which keeps the centers captured at the first start.
+        first = self.initializing
+        self.arm = None
         try:
-            xarm_module = importlib.import_module("xarm")
-            self.arm = xarm_module.Controller("USB")
+            await xarm_executor.run(self._open_arm)
+            await self._scan_positions()
+            if first:
+                for servo_id in self.online_ids:
+                    self.startup_centers[servo_id] = self.positions[servo_id]
             self.available = True
+            self.error = None
         except Exception as exc:
             self.error = str(exc)
-            logging.exception("xArm initialization failed")
+            if first:
+                logging.exception("xArm initialization failed")
+            else:
+                logging.warning("xArm probe failed: %s", exc)
+        finally:
+            self.initializing = False
+
+    def mark_lost(self, exc: BaseException) -> None:
+        self.available = False
+        self.error = f"xarm_lost:{exc}"
+
+    async def _device_set_position(self, servo_id: int, target_raw: int, duration: int, wait: bool) -> None:
+        try:
+            await xarm_executor.run(
+                self.arm.setPosition, servo_id, target_raw, duration, wait, run_histogram=self.set_position_seconds
+            )
+        except Exception as exc:
+            # A failed HID write means the arm was unplugged or reset; the supervisor reopens it.
+            self.mark_lost(exc)
+            raise
 
     def _ensure_available(self) -> None:
+        if self.initializing:
+            raise RuntimeError("xarm_initializing")
         if not self.available or self.arm is None:
             suffix = f":{self.error}" if self.error else ""
             raise RuntimeError(f"xarm_unavailable{suffix}")
@@ -147,6 +287,7 @@ class XArmController:
 
         return {
             "available": self.available,
+            "initializing": self.initializing,
             "error": self.error,
             "servos": servos_payload,
             "limits": {"min": XARM_MIN_ANGLE_DEG, "max": XARM_MAX_ANGLE_DEG},
@@ -156,10 +297,9 @@ class XArmController:
         }
 
     async def safe_get_position(self, servo_id: int) -> int | None:
-        self._ensure_available()
         for _ in range(XARM_SAFE_READ_RETRIES):
             try:
-                raw = await asyncio.to_thread(self.arm.getPosition, servo_id)
+                raw = await xarm_executor.run(self.arm.getPosition, servo_id, run_histogram=self.get_position_seconds)
             except Exception:
                 raw = None
             parsed = parse_xarm_position_response(raw)
@@ -170,6 +310,9 @@ class XArmController:
 
     async def scan(self) -> None:
         self._ensure_available()
+        await self._scan_positions()
+
+    async def _scan_positions(self) -> None:
         online: set[int] = set()
         for servo_id in XARM_SERVO_IDS:
             position = await self.safe_get_position(servo_id)
@@ -179,13 +322,6 @@ class XArmController:
             online.add(servo_id)
         self.online_ids = online
 
-    async def capture_startup_centers(self) -> None:
-        if not self.available:
-            return
-        await self.scan()
-        for servo_id in self.online_ids:
-            self.startup_centers[servo_id] = self.positions[servo_id]
-
     async def set_position(
         self,
         servo_id: int,
@@ -199,20 +335,42 @@ class XArmController:
 
         target_raw = xarm_angle_deg_to_raw(angle_deg)
         duration = clamp_int(move_ms, XARM_MIN_MOVE_MS, XARM_MAX_MOVE_MS)
+        # An explicit move overrides whatever a slider left pending for this servo.
+        self.slider_writer.discard(servo_id, (target_raw, duration))
 
         async with self.lock:
-            await asyncio.to_thread(
-                self.arm.setPosition,
-                servo_id,
-                target_raw,
-                duration,
-                wait,
-            )
+            await self._device_set_position(servo_id, target_raw, duration, wait)
 
         self.positions[servo_id] = target_raw
         self.online_ids.add(servo_id)
         return round(xarm_raw_to_angle_deg(target_raw), 1), duration
 
+    async def _write_slider_target(self, servo_id: int, target: tuple[int, int], generation: int) -> bool:
+        self._ensure_available()
+        target_raw, duration = target
+        async with self.lock:
+            if not self.slider_writer.current(servo_id, generation):
+                return False
+            await self._device_set_position(servo_id, target_raw, duration, False)
+        self.positions[servo_id] = target_raw
+        self.online_ids.add(servo_id)
+        return True
+
+    async def set_position_latest(
+        self,
+        servo_id: int,
+        angle_deg: float,
+        move_ms: int,
+    ) -> tuple[float, int, bool]:
+        self._ensure_available()
+        if servo_id not in XARM_SERVO_IDS:
+            raise ValueError("invalid_id")
+
+        target = (xarm_angle_deg_to_raw(angle_deg), clamp_int(move_ms, XARM_MIN_MOVE_MS, XARM_MAX_MOVE_MS))
+        applied = await self.slider_writer.submit(servo_id, target)
+        applied_raw, applied_duration = applied
+        return round(xarm_raw_to_angle_deg(applied_raw), 1), applied_duration, applied != target
+
     async def set_many(self, targets: dict[int, float], move_ms: int) -> int:
         duration = clamp_int(move_ms, XARM_MIN_MOVE_MS, XARM_MAX_MOVE_MS)
         for servo_id, angle_deg in targets.items():
@@ -242,20 +400,39 @@ class RigController:
         self.servos: list[Any] = []
         self.lgpio: Any | None = None
         self.gpio_handle: Any | None = None
-
+        self.i2c: Any | None = None
+        self.slider_writer = LatestTargetWriter(self._write_slider_target, RIG_SLIDER_MAX_WRITES_PER_S)
+        self.servo_write_seconds = device_io_seconds.labels("rig", "servo_write")
+        self.initializing = True
+
+    def _close_devices(self) -> None:
+        if self.lgpio is not None and self.gpio_handle is not None:
+            with contextlib.suppress(Exception):
+                self.lgpio.gpiochip_close(self.gpio_handle)
+        self.gpio_handle = None
+        self.servos = []
+        # Each supervisor re-probe opens a new bus handle; the old one would keep its file descriptor.
+        if self.i2c is not None:
+            with contextlib.suppress(Exception):
+                self.i2c.deinit()
+        self.i2c = None
+
+    def _open_devices(self, restore_angles: bool) -> None:
+        self._close_devices()
+        board = importlib.import_module("board")
+        busio = importlib.import_module("busio")
+        servo_module = importlib.import_module("adafruit_motor.servo")
+        pca9685_module = importlib.import_module("adafruit_pca9685")
+        self.lgpio = importlib.import_module("lgpio")
+
+        self.i2c = busio.I2C(board.SCL, board.SDA)
         try:
-            board = importlib.import_module("board")
-            busio = importlib.import_module("busio")
-            servo_module = importlib.import_module("adafruit_motor.servo")
-            pca9685_module = importlib.import_module("adafruit_pca9685")
-            self.lgpio = importlib.import_module("lgpio")
-
-            i2c = busio.I2C(board.SCL, board.SDA)
-            pca = pca9685_module.PCA9685(i2c)
+            pca = pca9685_module.PCA9685(self.i2c)
             pca.frequency = 50
 
             self.gpio_handle = self.lgpio.gpiochip_open(RIG_STIRRER_CHIP)
             self.lgpio.gpio_claim_output(self.gpio_handle, RIG_STIRRER_GPIO, 0)
+            self.stirrer_active = False
 
             self.servos = [
                 servo_module.Servo(
@@ -266,19 +443,43 @@ class RigController:
                 )
                 for index in range(RIG_SERVO_CHANNELS)
             ]
+        except Exception:
+            self._close_devices()
+            raise
+
+        if restore_angles:
+            # Only the base goes back where it was. A valve recorded as open may have been mid-pulse when the bus
+            # dropped, and no job is left to close it, so every valve comes back closed.
+            for index in range(RIG_SERVO_CHANNELS):
+                if index != RIG_BASE_ROTATION_CHANNEL:
+                    self.servo_angles[index] = RIG_CLOSED_ANGLE
+                self.servos[index].angle = self.servo_angles[index]
+        else:
+            self._sync_servo_angles_from_outputs()
 
-            if RIG_INIT_SERVOS_ON_START:
-                for index, angle in enumerate(self.servo_angles):
-                    self.servos[index].angle = angle
-            else:
-                self._sync_servo_angles_from_outputs()
-
+    async def initialize(self) -> None:
+        first = self.initializing
+        try:
+            # A reconnected PCA9685 has usually lost power, so it gets the last base angle back and closed valves.
+            await rig_executor.run(self._open_devices, RIG_INIT_SERVOS_ON_START or not first)
             self.available = True
+            self.error = None
         except Exception as exc:
             self.error = str(exc)
-            logging.exception("rig initialization failed")
+            if first:
+                logging.exception("rig initialization failed")
+            else:
+                logging.warning("rig probe failed: %s", exc)
+        finally:
+            self.initializing = False
+
+    def mark_lost(self, exc: BaseException) -> None:
+        self.available = False
+        self.error = f"rig_lost:{exc}"
 
     def _ensure_available(self) -> None:
+        if self.initializing:
+            raise RuntimeError("rig_initializing")
         if not self.available:
             suffix = f":{self.error}" if self.error else ""
             raise RuntimeError(f"rig_unavailable{suffix}")
@@ -286,6 +487,7 @@ class RigController:
     def state_payload(self) -> dict[str, Any]:
         return {
             "available": self.available,
+            "initializing": self.initializing,
             "error": self.error,
             "channels": self.servo_angles,
             "baseChannel": RIG_BASE_ROTATION_CHANNEL,
@@ -320,15 +522,38 @@ class RigController:
 
             self.servo_angles[channel] = normalized
 
+    def _write_servo(self, channel: int, angle: float) -> None:
+        # PCA9685 writes are short blocking I2C transactions done on the loop.
+        with trace_span("rig.servo_write", channel=channel, angle=angle):
+            started = time.perf_counter()
+            try:
+                self.servos[channel].angle = angle
+            except OSError as exc:
+                self.mark_lost(exc)
+                raise
+            self.servo_write_seconds.observe(time.perf_counter() - started)
+        self.servo_angles[channel] = angle
+
     def set_channel_immediate(self, channel: int, angle: float) -> None:
         self._ensure_available()
-        self.servos[channel].angle = angle
-        self.servo_angles[channel] = angle
+        self.slider_writer.discard(channel, angle)
+        self._write_servo(channel, angle)
+
+    async def _write_slider_target(self, channel: int, angle: float, generation: int) -> bool:
+        self._ensure_available()
+        if not self.slider_writer.current(channel, generation):
+            return False
+        self._write_servo(channel, angle)
+        return True
+
+    async def set_channel_latest(self, channel: int, angle: float) -> tuple[float, bool]:
+        self._ensure_available()
+        applied = await self.slider_writer.submit(channel, angle)
+        return applied, applied != angle
 
     async def move_base_servo(self, target: float) -> None:
         self._ensure_available()
-        self.servos[RIG_BASE_ROTATION_CHANNEL].angle = target
-        self.servo_angles[RIG_BASE_ROTATION_CHANNEL] = target
+        self._write_servo(RIG_BASE_ROTATION_CHANNEL, target)
 
     async def run_stirrer(self, duration: float) -> None:
         self._ensure_available()
@@ -357,15 +582,15 @@ class RigController:
         for channel in range(RIG_SERVO_CHANNELS):
             if channel == RIG_BASE_ROTATION_CHANNEL:
                 continue
-            self.servos[channel].angle = RIG_CLOSED_ANGLE
-            self.servo_angles[channel] = RIG_CLOSED_ANGLE
+            self._write_servo(channel, RIG_CLOSED_ANGLE)
 
 
 class ThermalController:
-    def __init__(self) -> None:
+    def __init__(self, test_pattern: bool = False) -> None:
         self.available = False
         self.error: str | None = None
         self.sensor: Any | None = None
+        self.i2c: Any | None = None
         self.frame_buffer: list[float] = [0.0] * (THERMAL_FRAME_WIDTH * THERMAL_FRAME_HEIGHT)
         self.image_module: Any | None = None
         self.image_draw_module: Any | None = None
@@ -376,6 +601,7 @@ class ThermalController:
         self.min_temp_c: float | None = None
         self.fps: float | None = None
         self.latest_jpeg: bytes | None = None
+        self.ring = JpegRing(THERMAL_RING_BYTES, THERMAL_RING_SLOTS)
         self.frame_condition = asyncio.Condition()
         self.capture_task: asyncio.Task | None = None
         self.last_frame_monotonic: float | None = None
@@ -383,49 +609,107 @@ class ThermalController:
         self.last_capture_error_log_monotonic = 0.0
         self.on_thermal_update: Callable[[], Awaitable[None]] | None = None
         self.pause_reasons: set[str] = set()
+        self.encoder: MediaEncoderPool | None = None
+        self.test_pattern = test_pattern
+        # The port serving this stream's HTTP routes; the server moves it to PORT in single-port mode.
+        self.http_port = THERMAL_HTTP_PORT
+        self.on_raw_frame: Callable[[list[float]], None] | None = None
+        self.initializing = True
+        self.consecutive_failures = 0
+        self.subpages: SubpageReader | None = None
+        self.refresh_hz: float | None = None
+        self.filter: ThermalFilter | None = None
+        self.alarms: ThermalAlarmEngine | None = None
+        self.on_thermal_alarm: Callable[[dict[str, Any]], Awaitable[None]] | None = None
+        self.skipped_frames = 0
+        self.broadcast_pending = False
+
+    def _open_sensor(self) -> None:
+        self.image_module = importlib.import_module("PIL.Image")
+        self.image_draw_module = importlib.import_module("PIL.ImageDraw")
+        self.filter = ThermalFilter() if THERMAL_FILTER_ENABLED else None
+        # Kept across re-probes so an alarm raised before the sensor dropped out can still clear.
+        if self.alarms is None and THERMAL_ALARM_RULES:
+            self.alarms = ThermalAlarmEngine(THERMAL_ALARM_RULES)
+        if self.test_pattern:
+            return
+
+        board = importlib.import_module("board")
+        busio = importlib.import_module("busio")
+        mlx_module = importlib.import_module("adafruit_mlx90640")
 
+        self._close_bus()
+        self.i2c = busio.I2C(board.SCL, board.SDA, frequency=THERMAL_I2C_FREQUENCY_HZ)
         try:
-            board = importlib.import_module("board")
-            busio = importlib.import_module("busio")
-            mlx_module = importlib.import_module("adafruit_mlx90640")
-            self.image_module = importlib.import_module("PIL.Image")
-            self.image_draw_module = importlib.import_module("PIL.ImageDraw")
-
-            i2c = busio.I2C(board.SCL, board.SDA)
-            self.sensor = mlx_module.MLX90640(i2c)
-            if hasattr(mlx_module, "RefreshRate"):
-                if hasattr(mlx_module.RefreshRate, "REFRESH_4_HZ"):
-                    self.sensor.refresh_rate = mlx_module.RefreshRate.REFRESH_4_HZ
-                else:
-                    self.sensor.refresh_rate = mlx_module.RefreshRate.REFRESH_8_HZ
+            self.sensor = mlx_module.MLX90640(self.i2c)
+        except Exception:
+            self._close_bus()
+            raise
+        if THERMAL_SUBPAGE_CAPTURE:
+            clock_hz = i2c_bus_clock_hz(RIG_I2C_BUS)
+            refresh_hz = sustainable_refresh_hz(THERMAL_REFRESH_RATE_HZ, clock_hz)
+            self.sensor.refresh_rate = REFRESH_RATE_CODES[refresh_hz]
+            self.subpages = SubpageReader(self.sensor, refresh_hz)
+            self.refresh_hz = refresh_hz
+            logging.info("thermal sub-page capture at %s Hz (I2C clock %s Hz)", refresh_hz, clock_hz or "unknown")
+        elif hasattr(mlx_module, "RefreshRate"):
+            if hasattr(mlx_module.RefreshRate, "REFRESH_4_HZ"):
+                self.sensor.refresh_rate = mlx_module.RefreshRate.REFRESH_4_HZ
+            else:
+                self.sensor.refresh_rate = mlx_module.RefreshRate.REFRESH_8_HZ
+
+    def _close_bus(self) -> None:
+        # Each supervisor re-probe opens a new bus handle; the old one would keep its file descriptor.
+        if self.i2c is not None:
+            with contextlib.suppress(Exception):
+                self.i2c.deinit()
+        self.i2c = None
+
+    async def initialize(self) -> None:
+        first = self.initializing
+        self.sensor = None
+        self.subpages = None
+        self.refresh_hz = None
+        try:
+            await thermal_executor.run(self._open_sensor)
+            self.consecutive_failures = 0
             self.available = True
+            self.error = None
         except Exception as exc:
-            self.error = str(exc)
-            logging.exception("thermal initialization failed")
-
-    @staticmethod
-    def _temperature_to_rgb(normalized: float) -> tuple[int, int, int]:
-        clamped = max(0.0, min(1.0, normalized))
-        anchors = [
-            (0.0, (0, 0, 20)),
-            (0.2, (20, 20, 180)),
-            (0.4, (0, 180, 255)),
-            (0.6, (255, 255, 0)),
-            (0.8, (255, 80, 0)),
-            (1.0, (255, 255, 255)),
+            if self.test_pattern:
+                self.error = f"thermal_test_pattern_unavailable:{exc}"
+                logging.exception("thermal test pattern initialization failed")
+            elif first:
+                self.error = str(exc)
+                logging.exception("thermal initialization failed")
+            else:
+                self.error = str(exc)
+                logging.warning("thermal probe failed: %s", exc)
+        finally:
+            self.initializing = False
+
+    def _record_capture_failure(self, reason: str) -> None:
+        # Occasional bad frames are normal for the MLX90640; a run of them means the sensor is gone.
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= DEVICE_LOST_AFTER_FAILURES and not self.test_pattern:
+            self.available = False
+            self.error = f"thermal_lost:{reason}"
+
+    def _test_pattern_frame(self) -> list[float]:
+        phase = time.monotonic()
+        hot_x = (math.sin(phase) * 0.4 + 0.5) * (THERMAL_FRAME_WIDTH - 1)
+        hot_y = (math.cos(phase * 0.7) * 0.4 + 0.5) * (THERMAL_FRAME_HEIGHT - 1)
+        return [
+            22.0 + 18.0 * math.exp(-((x - hot_x) ** 2 + (y - hot_y) ** 2) / 18.0)
+            for y in range(THERMAL_FRAME_HEIGHT)
+            for x in range(THERMAL_FRAME_WIDTH)
         ]
-        for index in range(1, len(anchors)):
-            left_t, left_color = anchors[index - 1]
-            right_t, right_color = anchors[index]
-            if clamped <= right_t:
-                ratio = (clamped - left_t) / (right_t - left_t) if right_t > left_t else 0.0
-                red = int(left_color[0] + (right_color[0] - left_color[0]) * ratio)
-                green = int(left_color[1] + (right_color[1] - left_color[1]) * ratio)
-                blue = int(left_color[2] + (right_color[2] - left_color[2]) * ratio)
-                return red, green, blue
-        return anchors[-1][1]
 
     def _read_frame(self) -> list[float] | None:
+        if self.test_pattern:
+            return self._test_pattern_frame()
+        if self.subpages is not None:
+            return self.subpages.read_frame()
         if self.sensor is None:
             return None
         for _ in range(THERMAL_READ_RETRIES):
@@ -454,69 +738,30 @@ class ThermalController:
         else:
             logging.warning(message)
 
-    def _build_jpeg_frame(self, frame: list[float]) -> tuple[bytes, float, float]:
+    def _build_jpeg_frame(
+        self, frame: list[float], scale: tuple[float, float] | None = None
+    ) -> tuple[bytes, float, float]:
         if self.image_module is None or self.image_draw_module is None:
             raise RuntimeError("thermal_unavailable:image_lib_missing")
-
-        finite_values = [value for value in frame if math.isfinite(value)]
-        if not finite_values:
-            finite_values = [0.0]
-        min_temp = min(finite_values)
-        max_temp = max(finite_values)
-        span = max(max_temp - min_temp, 0.01)
-
-        pixels = [
-            self._temperature_to_rgb((value - min_temp) / span)
-            if math.isfinite(value)
-            else (0, 0, 0)
-            for value in frame
-        ]
-
-        image = self.image_module.new("RGB", (THERMAL_FRAME_WIDTH, THERMAL_FRAME_HEIGHT))
-        image.putdata(pixels)
-        if hasattr(self.image_module, "Transpose"):
-            image = image.transpose(self.image_module.Transpose.FLIP_LEFT_RIGHT)
-        else:
-            image = image.transpose(self.image_module.FLIP_LEFT_RIGHT)
-        if hasattr(self.image_module, "Resampling"):
-            image = image.resize(
-                (THERMAL_FRAME_WIDTH * THERMAL_FRAME_SCALE, THERMAL_FRAME_HEIGHT * THERMAL_FRAME_SCALE),
-                self.image_module.Resampling.NEAREST,
-            )
-        else:
-            image = image.resize(
-                (THERMAL_FRAME_WIDTH * THERMAL_FRAME_SCALE, THERMAL_FRAME_HEIGHT * THERMAL_FRAME_SCALE),
-                self.image_module.NEAREST,
-            )
-
-        draw = self.image_draw_module.Draw(image)
-        draw.rectangle(
-            (0, 0, image.width, THERMAL_TEXT_BAND_HEIGHT),
-            fill=(0, 0, 0),
-        )
-        draw.text(
-            (6, 6),
-            f"max {max_temp:.1f}C min {min_temp:.1f}C",
-            fill=(255, 255, 255),
-        )
-
-        buffer = io.BytesIO()
-        image.save(buffer, format="JPEG", quality=THERMAL_JPEG_QUALITY)
-        return buffer.getvalue(), min_temp, max_temp
+        return render_thermal_jpeg(frame, scale)
 
     def thermal_payload(self) -> dict[str, Any]:
         return {
             "type": "thermal",
             "subsystem": "thermal",
             "available": self.available,
+            "initializing": self.initializing,
             "error": self.error,
             "frameId": self.frame_counter,
             "maxTempC": self.max_temp_c,
             "minTempC": self.min_temp_c,
             "fps": self.fps,
+            "refreshHz": self.refresh_hz,
+            "skippedFrames": self.skipped_frames,
+            "alarms": None if self.alarms is None else self.alarms.state_payload(),
             "updatedAtMs": self.last_updated_ms,
             "streamPath": THERMAL_STREAM_PATH,
-            "httpPort": THERMAL_HTTP_PORT,
+            "httpPort": self.http_port,
         }
 
     def state_payload(self) -> dict[str, Any]:
@@ -526,8 +771,7 @@ class ThermalController:
         return payload
 
     async def start(self) -> None:
-        if not self.available:
-            return
+        # Started even without a sensor: the loop idles until the device supervisor brings one up.
         if self.capture_task and not self.capture_task.done():
             return
         self.capture_task = asyncio.create_task(self._capture_loop())
@@ -543,29 +787,38 @@ class ThermalController:
         next_capture_at = 0.0
         while True:
             try:
-                if self.pause_reasons:
+                if self.pause_reasons or not self.available:
                     await asyncio.sleep(THERMAL_FALLBACK_INTERVAL_S)
                     continue
 
+                # A sub-page read blocks until the sensor has one, which paces the loop at the sensor's rate.
                 now = time.monotonic()
                 if now < next_capture_at:
                     await asyncio.sleep(next_capture_at - now)
                     continue
-                next_capture_at = now + THERMAL_CAPTURE_INTERVAL_S
+                next_capture_at = now + (THERMAL_CAPTURE_INTERVAL_S if self.subpages is None else 0.0)
 
-                frame = await asyncio.to_thread(self._read_frame)
+                read_started = time.perf_counter()
+                frame = await thermal_executor.run(self._read_frame)
+                thermal_read_seconds.observe(time.perf_counter() - read_started)
                 if frame is None:
+                    self._record_capture_failure("retry_exhausted")
                     self._log_capture_error(
                         "thermal frame retry exhausted; continuing",
                         exc_info=False,
                     )
                     await asyncio.sleep(THERMAL_FALLBACK_INTERVAL_S)
                     continue
-
-                jpeg, min_temp, max_temp = await asyncio.to_thread(self._build_jpeg_frame, frame)
+                self.consecutive_failures = 0
+                if self.on_raw_frame is not None:
+                    self.on_raw_frame(frame)
                 now_monotonic = time.monotonic()
-                now_ms = int(time.time() * 1000)
+                if self.alarms is not None:
+                    for event in self.alarms.evaluate(frame, now_monotonic):
+                        if self.on_thermal_alarm is not None:
+                            await self.on_thermal_alarm(event)
 
+                # fps is the sensor's rate; frames left unchanged by the filter are counted but not sent.
                 if self.last_frame_monotonic is not None:
                     delta = max(now_monotonic - self.last_frame_monotonic, 1e-3)
                     current_fps = 1.0 / delta
@@ -575,23 +828,51 @@ class ThermalController:
                         self.fps = (self.fps * 0.8) + (current_fps * 0.2)
                 self.last_frame_monotonic = now_monotonic
 
-                async with self.frame_condition:
-                    self.frame_counter += 1
-                    self.latest_jpeg = jpeg
-                    self.min_temp_c = min_temp
-                    self.max_temp_c = max_temp
-                    self.last_updated_ms = now_ms
-                    self.frame_condition.notify_all()
+                scale = None
+                publish = True
+                if self.filter is not None:
+                    frame = self.filter.update(frame)
+                    scale = self.filter.color_scale()
+                    publish = self.filter.changed()
+                    if publish:
+                        self.filter.mark_published()
+                        frame = frame.tolist()
+                    else:
+                        self.skipped_frames += 1
 
+                if publish:
+                    encode_started = time.perf_counter()
+                    if self.encoder is not None and self.encoder.available:
+                        jpeg, min_temp, max_temp = await self.encoder.encode_thermal(frame, scale)
+                    else:
+                        jpeg, min_temp, max_temp = await media_executor.run(self._build_jpeg_frame, frame, scale)
+                    thermal_encode_seconds.observe(time.perf_counter() - encode_started)
+                    now_ms = int(time.time() * 1000)
+
+                    async with self.frame_condition:
+                        self.frame_counter += 1
+                        self.latest_jpeg = jpeg
+                        self.min_temp_c = min_temp
+                        self.max_temp_c = max_temp
+                        self.last_updated_ms = now_ms
+                        self.ring.append(self.frame_counter, jpeg, now_ms)
+                        self.frame_condition.notify_all()
+                    self.broadcast_pending = True
+
+                # A frame throttled here still goes out on a later pass even if the scene has gone idle by then.
+                now_monotonic = time.monotonic()
                 if (
                     self.on_thermal_update is not None
+                    and self.broadcast_pending
                     and now_monotonic - self.last_broadcast_monotonic >= THERMAL_WS_BROADCAST_INTERVAL_S
                 ):
                     self.last_broadcast_monotonic = now_monotonic
+                    self.broadcast_pending = False
                     await self.on_thermal_update()
             except asyncio.CancelledError:
                 raise
-            except Exception:
+            except Exception as exc:
+                self._record_capture_failure(str(exc))
                 self._log_capture_error("thermal capture failure", exc_info=True)
                 await asyncio.sleep(THERMAL_FALLBACK_INTERVAL_S)
 
@@ -612,22 +893,23 @@ class ThermalController:
                     await asyncio.wait_for(self.frame_condition.wait(), timeout_s)
                 except TimeoutError:
                     return None
+            return self.latest_snapshot()
 
-            if self.latest_jpeg is None or self.min_temp_c is None or self.max_temp_c is None:
-                return None
-
-            return (
-                self.frame_counter,
-                self.latest_jpeg,
-                self.min_temp_c,
-                self.max_temp_c,
-                self.last_updated_ms,
-                self.fps,
-            )
+    def latest_snapshot(self) -> tuple[int, bytes, float, float, int | None, float | None] | None:
+        if self.latest_jpeg is None or self.min_temp_c is None or self.max_temp_c is None:
+            return None
+        return (
+            self.frame_counter,
+            self.latest_jpeg,
+            self.min_temp_c,
+            self.max_temp_c,
+            self.last_updated_ms,
+            self.fps,
+        )
 
 
 class WebcamController:
-    def __init__(self) -> None:
+    def __init__(self, test_pattern: bool = False) -> None:
         self.available = False
         self.error: str | None = None
         self.cv2: Any | None = None
@@ -637,30 +919,58 @@ class WebcamController:
         self.last_updated_ms: int | None = None
         self.fps: float | None = None
         self.latest_jpeg: bytes | None = None
+        self.ring = JpegRing(WEBCAM_RING_BYTES, WEBCAM_RING_SLOTS)
         self.frame_condition = asyncio.Condition()
         self.capture_task: asyncio.Task | None = None
         self.last_frame_monotonic: float | None = None
         self.last_broadcast_monotonic = 0.0
         self.last_capture_error_log_monotonic = 0.0
         self.on_webcam_update: Callable[[], Awaitable[None]] | None = None
+        self.encoder: MediaEncoderPool | None = None
+        self.test_pattern = test_pattern
+        self.http_port = THERMAL_HTTP_PORT
+        self.test_pattern_base: Any | None = None
+        self.initializing = True
 
+    def _open_device(self) -> None:
+        if self.cv2 is None:
+            try:
+                self.cv2 = importlib.import_module("cv2")
+            except Exception as exc:
+                self.error = f"webcam_cv2_unavailable:{exc}"
+                logging.exception("webcam cv2 import failed")
+                return
+        if self.test_pattern:
+            self.available = True
+            self.error = None
+            return
+        self._open_capture()
+
+    async def initialize(self) -> None:
+        # cv2 (and numpy with it) is the slowest import in the server. A camera that fails to open here, or
+        # later fails a read, is reopened by the device supervisor rather than on every capture tick.
         try:
-            self.cv2 = importlib.import_module("cv2")
-        except Exception as exc:
-            self.error = f"webcam_cv2_unavailable:{exc}"
-            logging.exception("webcam cv2 import failed")
+            await webcam_executor.run(self._open_device)
+        finally:
+            self.initializing = False
+        if not self.available:
+            logging.warning("webcam unavailable: %s", self.error)
 
     def webcam_payload(self) -> dict[str, Any]:
         return {
             "type": "webcam",
             "subsystem": "webcam",
             "available": self.available,
+            "initializing": self.initializing,
             "error": self.error,
             "frameId": self.frame_counter,
             "fps": self.fps,
             "updatedAtMs": self.last_updated_ms,
             "streamPath": WEBCAM_STREAM_PATH,
-            "httpPort": THERMAL_HTTP_PORT,
+            "snapshotPath": WEBCAM_SNAPSHOT_PATH,
+            "clipPath": WEBCAM_CLIP_PATH,
+            "httpPort": self.http_port,
+            "ring": self.ring.stats_payload(),
         }
 
     def state_payload(self) -> dict[str, Any]:
@@ -724,11 +1034,23 @@ class WebcamController:
         self.error = None
         return True
 
-    def _capture_jpeg(self) -> bytes | None:
+    def _test_pattern_frame(self) -> Any:
+        np = importlib.import_module("numpy")
+        if self.test_pattern_base is None:
+            # Fixed noise over a gradient gives JPEGs about the size of real camera frames.
+            rng = np.random.default_rng(0)
+            gradient = np.linspace(0, 255, WEBCAM_FRAME_WIDTH, dtype=np.float32)[None, :, None]
+            noise = rng.normal(0.0, 24.0, (WEBCAM_FRAME_HEIGHT, WEBCAM_FRAME_WIDTH, 3))
+            self.test_pattern_base = np.clip(gradient + noise, 0, 255).astype(np.uint8)
+        self.available = True
+        self.error = None
+        return np.roll(self.test_pattern_base, (self.frame_counter * 8) % WEBCAM_FRAME_WIDTH, axis=1)
+
+    def _read_raw_frame(self) -> Any | None:
         if self.cv2 is None:
             return None
-        if not self._open_capture():
-            return None
+        if self.test_pattern:
+            return self._test_pattern_frame()
         if self.capture is None:
             return None
 
@@ -738,15 +1060,13 @@ class WebcamController:
             self.error = "webcam_read_failed"
             self._release_capture()
             return None
+        return frame
 
-        encode_params = [int(self.cv2.IMWRITE_JPEG_QUALITY), WEBCAM_JPEG_QUALITY]
-        encoded_ok, encoded = self.cv2.imencode(".jpg", frame, encode_params)
-        if not encoded_ok:
-            self.available = False
-            self.error = "webcam_encode_failed"
+    def _encode_jpeg(self, frame: Any) -> bytes | None:
+        if self.cv2 is None:
             return None
 
-        return encoded.tobytes()
+        return encode_webcam_jpeg(frame)
 
     async def start(self) -> None:
         if self.capture_task and not self.capture_task.done():
@@ -758,19 +1078,37 @@ class WebcamController:
             self.capture_task.cancel()
             with contextlib.suppress(asyncio.CancelledError):
                 await self.capture_task
-        await asyncio.to_thread(self._release_capture)
+        await webcam_executor.run(self._release_capture)
 
     async def _capture_loop(self) -> None:
         next_capture_at = 0.0
         while True:
             try:
+                if not self.available:
+                    await asyncio.sleep(WEBCAM_FALLBACK_INTERVAL_S)
+                    continue
+
                 now = time.monotonic()
                 if now < next_capture_at:
                     await asyncio.sleep(next_capture_at - now)
                     continue
                 next_capture_at = now + WEBCAM_CAPTURE_INTERVAL_S
 
-                jpeg = await asyncio.to_thread(self._capture_jpeg)
+                capture_started = time.perf_counter()
+                frame = await webcam_executor.run(self._read_raw_frame)
+                encode_started = time.perf_counter()
+                webcam_capture_seconds.observe(encode_started - capture_started)
+                if frame is None:
+                    jpeg = None
+                elif self.encoder is not None and self.encoder.available:
+                    jpeg = await self.encoder.encode_webcam(frame)
+                else:
+                    jpeg = await media_executor.run(self._encode_jpeg, frame)
+                if frame is not None:
+                    webcam_encode_seconds.observe(time.perf_counter() - encode_started)
+                if frame is not None and jpeg is None:
+                    self.available = False
+                    self.error = "webcam_encode_failed"
                 if jpeg is None:
                     await asyncio.sleep(WEBCAM_FALLBACK_INTERVAL_S)
                     continue
@@ -791,6 +1129,7 @@ class WebcamController:
                     self.frame_counter += 1
                     self.latest_jpeg = jpeg
                     self.last_updated_ms = now_ms
+                    self.ring.append(self.frame_counter, jpeg, now_ms)
                     self.frame_condition.notify_all()
 
                 if (
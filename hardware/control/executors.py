@@ -0,0 +1,149 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import threading
+import time
+from typing import Any, Callable, TypeVar
+
+from .constants import EXECUTOR_LATENCY_EWMA_ALPHA, EXECUTOR_MEDIA_WORKERS
+from .metrics import Histogram, executor_run_seconds, executor_wait_seconds, gauge
+from .tracing import trace_span
+
+T = TypeVar("T")
+
+
+class InstrumentedExecutor:
+    def __init__(self, name: str, max_workers: int) -> None:
+        self.name = name
+        self.max_workers = max_workers
+        self.pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=f"colab-{name}",
+        )
+        self._stats_lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.wait_ms: float | None = None
+        self.run_ms: float | None = None
+        self.max_wait_ms = 0.0
+        self.max_run_ms = 0.0
+        self.wait_histogram = executor_wait_seconds.labels(name)
+        self.run_histogram = executor_run_seconds.labels(name)
+        # Called from the worker thread with (executor name, function name, run ms) after each call.
+        self.observer: Callable[[str, str, float], None] | None = None
+
+    def _record(self, wait_ms: float, run_ms: float, failed: bool) -> None:
+        with self._stats_lock:
+            self.running -= 1
+            self.completed += 1
+            if failed:
+                self.failed += 1
+            if self.wait_ms is None or self.run_ms is None:
+                self.wait_ms = wait_ms
+                self.run_ms = run_ms
+            else:
+                self.wait_ms += EXECUTOR_LATENCY_EWMA_ALPHA * (wait_ms - self.wait_ms)
+                self.run_ms += EXECUTOR_LATENCY_EWMA_ALPHA * (run_ms - self.run_ms)
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            self.max_run_ms = max(self.max_run_ms, run_ms)
+
+    async def run(self, func: Callable[..., T], *args: Any, run_histogram: Histogram | None = None) -> T:
+        submitted = time.perf_counter()
+        with self._stats_lock:
+            self.queued += 1
+
+        timings: list[float] = []
+
+        def call() -> T:
+            started = time.perf_counter()
+            with self._stats_lock:
+                self.queued -= 1
+                self.running += 1
+            call_name = getattr(func, "__name__", type(func).__name__)
+            failed = True
+            try:
+                with trace_span(f"{self.name}.{call_name}", waitMs=round((started - submitted) * 1000.0, 3)):
+                    result = func(*args)
+                failed = False
+                return result
+            finally:
+                finished = time.perf_counter()
+                timings.extend((started - submitted, finished - started))
+                self._record((started - submitted) * 1000.0, (finished - started) * 1000.0, failed)
+                observer = self.observer
+                if observer is not None:
+                    observer(self.name, call_name, (finished - started) * 1000.0)
+
+        # run_in_executor does not carry context variables across the thread hop the way to_thread does.
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.pool, context.run, call)
+        finally:
+            # Histograms are loop-thread only, so the worker hands its timings back instead of observing.
+            if timings:
+                self.wait_histogram.observe(timings[0])
+                self.run_histogram.observe(timings[1])
+                # A caller's own histogram (a device transaction) gets the run time too, not the time queued.
+                if run_histogram is not None:
+                    run_histogram.observe(timings[1])
+
+    def stats_payload(self) -> dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "name": self.name,
+                "workers": self.max_workers,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "waitMs": None if self.wait_ms is None else round(self.wait_ms, 3),
+                "runMs": None if self.run_ms is None else round(self.run_ms, 3),
+                "maxWaitMs": round(self.max_wait_ms, 3),
+                "maxRunMs": round(self.max_run_ms, 3),
+            }
+
+    def shutdown(self) -> None:
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+# One thread per serial device keeps bus transactions ordered and stops a slow device
+# from holding threads another subsystem needs; encoding and decoding share a small pool.
+xarm_executor = InstrumentedExecutor("xarm", 1)
+# Rig I2C writes are short and stay on the loop; this thread opens the bus and PCA9685 at startup.
+rig_executor = InstrumentedExecutor("rig", 1)
+thermal_executor = InstrumentedExecutor("thermal", 1)
+webcam_executor = InstrumentedExecutor("webcam", 1)
+media_executor = InstrumentedExecutor("media", EXECUTOR_MEDIA_WORKERS)
+telemetry_executor = InstrumentedExecutor("telemetry", 1)
+session_executor = InstrumentedExecutor("session", 1)
+clip_executor = InstrumentedExecutor("clips", 1)
+
+executors = (
+    xarm_executor,
+    rig_executor,
+    thermal_executor,
+    webcam_executor,
+    media_executor,
+    telemetry_executor,
+    session_executor,
+    clip_executor,
+)
+
+gauge(
+    "colab_executor_queue_depth",
+    "Calls submitted to an executor and not yet started.",
+    ("executor",),
+    lambda: [((executor.name,), executor.queued) for executor in executors],
+)
+
+
+def executors_payload() -> list[dict[str, Any]]:
+    return [executor.stats_payload() for executor in executors]
+
+
+def shutdown_executors() -> None:
+    for executor in executors:
+        executor.shutdown()
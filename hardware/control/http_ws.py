@@ -0,0 +1,46 @@
+from typing import Any, AsyncIterator
+
+from .codec import BINARY_SUBPROTOCOL, binary_available
+from .compression import is_lan_address
+from .constants import WS_COMPRESSION_ENABLED, WS_HEARTBEAT_S, WS_MAX_MESSAGE_BYTES
+from .media_http import aiohttp_web
+
+# The control websocket served from the aiohttp app in single-port mode. The server's handler was written
+# against websockets' connection objects, so this wraps aiohttp's WebSocketResponse in the few parts of that API
+# it uses: send, iteration over incoming messages, subprotocol, remote_address and transport (for buffer sizes).
+# aiohttp compresses a whole connection or none of it, so the LAN policy is applied at the handshake; clients
+# that subscribe to media frames can pass ?compress=0 so JPEGs are not deflated for nothing.
+
+
+class AiohttpWebSocket:
+    def __init__(self, request: Any, response: Any) -> None:
+        self.request = request
+        self.response = response
+        self.subprotocol = response.ws_protocol
+        self.remote_address = (request.remote, 0) if request.remote else None
+        self.transport = request.transport
+        self.compressed = bool(response.compress)
+
+    async def send(self, payload: str | bytes) -> None:
+        if isinstance(payload, str):
+            await self.response.send_str(payload)
+        else:
+            await self.response.send_bytes(payload)
+
+    async def __aiter__(self) -> AsyncIterator[str | bytes]:
+        async for message in self.response:
+            if message.type in (aiohttp_web.WSMsgType.TEXT, aiohttp_web.WSMsgType.BINARY):
+                yield message.data
+            elif message.type == aiohttp_web.WSMsgType.ERROR:
+                break
+
+
+def websocket_response(request: Any) -> Any:
+    remote = (request.remote, 0) if request.remote else None
+    compress = WS_COMPRESSION_ENABLED and not is_lan_address(remote) and request.query.get("compress") != "0"
+    return aiohttp_web.WebSocketResponse(
+        protocols=(BINARY_SUBPROTOCOL,) if binary_available() else (),
+        compress=compress,
+        heartbeat=WS_HEARTBEAT_S,
+        max_msg_size=WS_MAX_MESSAGE_BYTES,
+    )
@@ -0,0 +1,114 @@
+from typing import Any, Iterator
+
+# Recent webcam JPEGs packed back to back in one buffer allocated at startup, with per-frame id, position, length
+# and timestamp in fixed slots indexed by frame id. Positions count bytes written since startup and never wrap, so
+# a frame is still intact exactly when it starts within one capacity of the write head; a frame that would run
+# past the end of the buffer starts again at its beginning. Readers get memoryview slices of the buffer, not
+# copies. A socket transport may hold on to a slice until the client reads it, so a frame that will soon be
+# written over is copied instead; anything else has seconds of camera output between it and the write head.
+
+# A frame is handed out by reference only while more than this share of the buffer is left to write before it.
+REFERENCE_HEADROOM_SHARE = 0.25
+
+
+class JpegRing:
+    def __init__(self, capacity_bytes: int, slots: int) -> None:
+        self.capacity = capacity_bytes
+        self.slots = slots
+        self.buffer = bytearray(capacity_bytes)
+        self.view = memoryview(self.buffer)
+        self.frame_ids = [0] * slots
+        self.positions = [0] * slots
+        self.lengths = [0] * slots
+        self.updated_ms = [0] * slots
+        self.head = 0
+        self.oldest_id = 0
+        self.newest_id = 0
+        self.dropped = 0
+
+    def _slot_intact(self, slot: int) -> bool:
+        return self.positions[slot] >= self.head - self.capacity
+
+    def intact(self, frame_id: int) -> bool:
+        slot = frame_id % self.slots
+        return frame_id > 0 and self.frame_ids[slot] == frame_id and self._slot_intact(slot)
+
+    def append(self, frame_id: int, jpeg: bytes, updated_ms: int) -> bool:
+        length = len(jpeg)
+        if length > self.capacity:
+            self.dropped += 1
+            return False
+        position = self.head
+        offset = position % self.capacity
+        if offset + length > self.capacity:
+            position += self.capacity - offset
+            offset = 0
+        self.head = position + length
+        self.view[offset : offset + length] = jpeg
+
+        slot = frame_id % self.slots
+        self.frame_ids[slot] = frame_id
+        self.positions[slot] = position
+        self.lengths[slot] = length
+        self.updated_ms[slot] = updated_ms
+        if self.newest_id == 0 or frame_id != self.newest_id + 1:
+            self.oldest_id = frame_id
+        self.newest_id = frame_id
+        # Frames leave from the old end, either written over or their slot reused.
+        while self.oldest_id < self.newest_id and not self.intact(self.oldest_id):
+            self.oldest_id += 1
+        return True
+
+    def get(self, frame_id: int) -> tuple[memoryview | bytes, int] | None:
+        if not self.intact(frame_id):
+            return None
+        slot = frame_id % self.slots
+        position = self.positions[slot]
+        offset = position % self.capacity
+        data = self.view[offset : offset + self.lengths[slot]]
+        if position + self.capacity - self.head < self.capacity * REFERENCE_HEADROOM_SHARE:
+            return bytes(data), self.updated_ms[slot]
+        return data, self.updated_ms[slot]
+
+    def latest_id(self) -> int:
+        return self.newest_id if self.intact(self.newest_id) else 0
+
+    def _first_at_or_after(self, updated_ms: float) -> int:
+        low, high = self.oldest_id, self.newest_id + 1
+        while low < high:
+            middle = (low + high) // 2
+            if self.updated_ms[middle % self.slots] < updated_ms:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def frame_ids_between(self, start_ms: float | None, end_ms: float | None) -> range:
+        if not self.latest_id():
+            return range(0)
+        first = self.oldest_id if start_ms is None else self._first_at_or_after(start_ms)
+        last = self.newest_id + 1 if end_ms is None else self._first_at_or_after(end_ms + 1)
+        return range(first, last)
+
+    def frames(self, frame_ids: range) -> Iterator[tuple[int, memoryview | bytes, int]]:
+        # Frames written over while a slow client worked through the range are skipped.
+        for frame_id in frame_ids:
+            entry = self.get(frame_id)
+            if entry is not None:
+                yield frame_id, entry[0], entry[1]
+
+    def stats_payload(self) -> dict[str, Any]:
+        latest = self.latest_id()
+        used_bytes = 0
+        span_ms = 0
+        if latest:
+            used_bytes = sum(self.lengths[frame_id % self.slots] for frame_id in range(self.oldest_id, latest + 1))
+            span_ms = self.updated_ms[latest % self.slots] - self.updated_ms[self.oldest_id % self.slots]
+        return {
+            "capacityBytes": self.capacity,
+            "usedBytes": used_bytes,
+            "frames": latest - self.oldest_id + 1 if latest else 0,
+            "oldestFrameId": self.oldest_id if latest else None,
+            "spanS": round(span_ms / 1000.0, 2),
+            "dropped": self.dropped,
+        }
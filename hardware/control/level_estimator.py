@@ -0,0 +1,241 @@
+import argparse
+import asyncio
+import concurrent.futures
+import csv
+import hashlib
+import importlib
+import logging
+import math
+import multiprocessing
+import os
+import sys
+import time
+from typing import Any, NamedTuple
+
+from .constants import (
+    VOLUME_CHANGE_THUMBNAIL_SIZE,
+    VOLUME_FLASK_ROI,
+    VOLUME_GRADUATION_ROWS,
+    VOLUME_LOCAL_MIN_STEP,
+    VOLUME_LOCAL_STEP_WINDOW_PX,
+)
+
+
+class LevelReading(NamedTuple):
+    volume_ml: float | None
+    # Brightness step across the detected meniscus; low values mean no clear liquid edge.
+    strength: float
+    row: int | None
+    elapsed_ms: float
+
+
+def _cv_modules() -> tuple[Any, Any]:
+    return importlib.import_module("cv2"), importlib.import_module("numpy")
+
+
+def row_to_volume_ml(row: float, graduations: tuple[tuple[float, float], ...]) -> float:
+    points = sorted(graduations)
+    if row <= points[0][0]:
+        (row_a, ml_a), (row_b, ml_b) = points[0], points[1]
+    elif row >= points[-1][0]:
+        (row_a, ml_a), (row_b, ml_b) = points[-2], points[-1]
+    else:
+        for index in range(1, len(points)):
+            if row <= points[index][0]:
+                (row_a, ml_a), (row_b, ml_b) = points[index - 1], points[index]
+                break
+    if row_b == row_a:
+        return max(0.0, ml_a)
+    # Extrapolate past the outermost graduations the same way a person reading the flask would.
+    return max(0.0, ml_a + (row - row_a) * (ml_b - ml_a) / (row_b - row_a))
+
+
+def estimate_level(
+    jpeg: bytes,
+    roi: tuple[int, int, int, int] = VOLUME_FLASK_ROI,
+    graduations: tuple[tuple[float, float], ...] = VOLUME_GRADUATION_ROWS,
+    min_step: float = VOLUME_LOCAL_MIN_STEP,
+    window_px: int = VOLUME_LOCAL_STEP_WINDOW_PX,
+) -> LevelReading:
+    started = time.perf_counter()
+    cv2, np = _cv_modules()
+
+    image = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return LevelReading(None, 0.0, None, (time.perf_counter() - started) * 1000.0)
+
+    x, y, width, height = roi
+    x0 = max(0, x)
+    y0 = max(0, y)
+    x1 = min(image.shape[1], x + width)
+    y1 = min(image.shape[0], y + height)
+    if x1 - x0 < 4 or y1 - y0 < 2 * window_px + 1:
+        return LevelReading(None, 0.0, None, (time.perf_counter() - started) * 1000.0)
+
+    # The row median ignores graduation ticks and printed labels that cover only part of the width,
+    # while the meniscus spans the whole flask.
+    patch = cv2.GaussianBlur(image[y0:y1, x0:x1], (5, 5), 0)
+    profile = np.median(patch, axis=1).astype(np.float32)
+
+    cumulative = np.concatenate(([0.0], np.cumsum(profile, dtype=np.float64)))
+    rows = np.arange(window_px, len(profile) - window_px + 1)
+    above = (cumulative[rows] - cumulative[rows - window_px]) / window_px
+    below = (cumulative[rows + window_px] - cumulative[rows]) / window_px
+    steps = np.abs(below - above)
+
+    best = int(np.argmax(steps))
+    strength = float(steps[best])
+    elapsed_ms = (time.perf_counter() - started) * 1000.0
+    if strength < min_step:
+        return LevelReading(None, strength, None, elapsed_ms)
+
+    row = int(rows[best]) + y0
+    return LevelReading(row_to_volume_ml(row, graduations), strength, row, elapsed_ms)
+
+
+def frame_thumbnail(
+    jpeg: bytes,
+    roi: tuple[int, int, int, int] = VOLUME_FLASK_ROI,
+    size: tuple[int, int] = VOLUME_CHANGE_THUMBNAIL_SIZE,
+) -> bytes | None:
+    cv2, np = _cv_modules()
+    # Decoding at quarter scale skips most of the IDCT work; the thumbnail is tiny anyway.
+    image = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if image is None:
+        return None
+    x, y, width, height = (value // 4 for value in roi)
+    patch = image[max(0, y):max(0, y + height), max(0, x):max(0, x + width)]
+    if patch.size == 0:
+        return None
+    return cv2.resize(patch, size, interpolation=cv2.INTER_AREA).tobytes()
+
+
+def thumbnail_key(thumbnail: bytes) -> int:
+    # Quantizing to 4 bits lets sensor noise land on the same key.
+    _cv2, np = _cv_modules()
+    quantized = (np.frombuffer(thumbnail, dtype=np.uint8) >> 4).tobytes()
+    return int.from_bytes(hashlib.blake2b(quantized, digest_size=8).digest(), "big")
+
+
+def thumbnail_distance(first: bytes, second: bytes) -> float:
+    _cv2, np = _cv_modules()
+    if len(first) != len(second):
+        return math.inf
+    first_values = np.frombuffer(first, dtype=np.uint8).astype(np.int16)
+    second_values = np.frombuffer(second, dtype=np.uint8).astype(np.int16)
+    return float(np.abs(first_values - second_values).mean())
+
+
+class LocalLevelEstimator:
+    def __init__(self) -> None:
+        self.executor: concurrent.futures.ProcessPoolExecutor | None = None
+        self.available = False
+        self.error: str | None = None
+
+    def start(self) -> None:
+        if self.executor is not None:
+            return
+        try:
+            _cv_modules()
+            # Spawn keeps the worker free of the server's threads and device handles.
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            self.available = True
+            self.error = None
+        except Exception as exc:
+            self.available = False
+            self.error = f"local_volume_unavailable:{exc}"
+            logging.exception("local volume estimator initialization failed")
+
+    def stop(self) -> None:
+        if self.executor is None:
+            return
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = None
+        self.available = False
+
+    async def estimate(self, jpeg: bytes) -> LevelReading | None:
+        if self.executor is None:
+            return None
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, estimate_level, jpeg)
+        except concurrent.futures.process.BrokenProcessPool as exc:
+            self.available = False
+            self.error = f"local_volume_worker_died:{exc}"
+            self.executor = None
+            logging.exception("local volume worker died; restarting")
+            self.start()
+            return None
+
+
+def evaluate_directory(directory: str, tolerance_ml: float) -> dict[str, Any]:
+    labels_path = os.path.join(directory, "labels.csv")
+    rows: list[dict[str, Any]] = []
+    with open(labels_path, newline="") as handle:
+        for entry in csv.DictReader(handle):
+            filename = entry["filename"]
+            expected_ml = float(entry["volume_ml"])
+            with open(os.path.join(directory, filename), "rb") as frame:
+                reading = estimate_level(frame.read())
+            rows.append(
+                {
+                    "filename": filename,
+                    "expected_ml": expected_ml,
+                    "estimated_ml": reading.volume_ml,
+                    "strength": reading.strength,
+                    "elapsed_ms": reading.elapsed_ms,
+                }
+            )
+
+    detected = [row for row in rows if row["estimated_ml"] is not None]
+    errors = [row["estimated_ml"] - row["expected_ml"] for row in detected]
+    elapsed = sorted(row["elapsed_ms"] for row in rows)
+    return {
+        "frames": len(rows),
+        "detected": len(detected),
+        "mae_ml": sum(abs(error) for error in errors) / len(errors) if errors else None,
+        "rmse_ml": math.sqrt(sum(error * error for error in errors) / len(errors)) if errors else None,
+        "max_abs_error_ml": max((abs(error) for error in errors), default=None),
+        "within_tolerance": sum(1 for error in errors if abs(error) <= tolerance_ml),
+        "median_ms": elapsed[len(elapsed) // 2] if elapsed else None,
+        "p95_ms": elapsed[min(len(elapsed) - 1, int(len(elapsed) * 0.95))] if elapsed else None,
+        "rows": rows,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Evaluate the local liquid-level estimator on recorded webcam frames.",
+    )
+    parser.add_argument("directory", help="directory with JPEG frames and labels.csv (filename,volume_ml)")
+    parser.add_argument("--tolerance-ml", type=float, default=5.0)
+    parser.add_argument("--verbose", action="store_true", help="print one line per frame")
+    args = parser.parse_args(argv)
+
+    report = evaluate_directory(args.directory, args.tolerance_ml)
+    if args.verbose:
+        for row in report["rows"]:
+            estimated = "-" if row["estimated_ml"] is None else f"{row['estimated_ml']:.1f}"
+            print(
+                f"{row['filename']}\texpected={row['expected_ml']:.1f}\testimated={estimated}"
+                f"\tstrength={row['strength']:.1f}\tms={row['elapsed_ms']:.2f}"
+            )
+
+    def fmt(value: float | None, digits: int = 2) -> str:
+        return "-" if value is None else f"{value:.{digits}f}"
+
+    print(f"frames={report['frames']} detected={report['detected']}")
+    print(
+        f"mae_ml={fmt(report['mae_ml'])} rmse_ml={fmt(report['rmse_ml'])} "
+        f"max_abs_error_ml={fmt(report['max_abs_error_ml'])}"
+    )
+    print(f"within_{args.tolerance_ml:g}ml={report['within_tolerance']}/{report['frames']}")
+    print(f"median_ms={fmt(report['median_ms'])} p95_ms={fmt(report['p95_ms'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
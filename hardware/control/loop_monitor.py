@@ -0,0 +1,224 @@
+import asyncio
+import contextlib
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Any
+
+from .constants import (
+    LOOP_LAG_INTERVAL_S,
+    LOOP_PROFILE_INTERVAL_S,
+    LOOP_PROFILE_SWITCH_INTERVAL_S,
+    LOOP_PROFILE_TOP,
+    LOOP_SLOW_CALLBACK_HISTORY,
+    LOOP_SLOW_CALLBACK_S,
+    LOOP_STACK_DEPTH,
+)
+from .metrics import loop_lag_seconds, loop_slow_callback_seconds
+
+# Valve timing in run_dispense shares the event loop with every broadcast and capture loop, so the loop itself
+# is watched: a timer task measures how late its wakeups are, a watchdog thread grabs the loop thread's stack
+# when that timer stops ticking, and a sampling profiler can be run against the loop thread on demand.
+
+
+def _frame_label(frame: Any) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def _is_idle(frame: Any) -> bool:
+    # The loop parks in selector.select() between callbacks.
+    return frame.f_code.co_name in ("select", "poll") and frame.f_code.co_filename.endswith("selectors.py")
+
+
+def format_stack(frame: Any) -> list[str]:
+    lines: list[str] = []
+    while frame is not None and len(lines) < LOOP_STACK_DEPTH:
+        code = frame.f_code
+        lines.append(f"{os.path.basename(code.co_filename)}:{frame.f_lineno} {code.co_name}")
+        frame = frame.f_back
+    lines.reverse()
+    return lines
+
+
+def folded_stack(frame: Any) -> tuple[str, ...]:
+    labels: list[str] = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return tuple(labels)
+
+
+def summarize_profile(
+    stacks: Counter, samples: int, idle: int, elapsed_s: float, interval_s: float
+) -> dict[str, Any]:
+    busy = samples - idle
+    self_counts: Counter = Counter()
+    total_counts: Counter = Counter()
+    for stack, count in stacks.items():
+        self_counts[stack[-1]] += count
+        for label in set(stack):
+            total_counts[label] += count
+    return {
+        "startedAt": time.time() - elapsed_s,
+        "durationS": round(elapsed_s, 3),
+        "intervalMs": round(interval_s * 1000.0, 3),
+        "samples": samples,
+        "busyPct": None if samples == 0 else round(100.0 * busy / samples, 1),
+        "stacks": [
+            {"stack": ";".join(stack), "samples": count}
+            for stack, count in stacks.most_common(LOOP_PROFILE_TOP)
+        ],
+        "functions": [
+            {"function": label, "selfSamples": count, "totalSamples": total_counts[label]}
+            for label, count in self_counts.most_common(LOOP_PROFILE_TOP)
+        ],
+    }
+
+
+class LoopMonitor:
+    def __init__(self) -> None:
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.loop_thread_id: int | None = None
+        self.task: asyncio.Task | None = None
+        self.watchdog_thread: threading.Thread | None = None
+        self.profile_thread: threading.Thread | None = None
+        self.stop_event = threading.Event()
+        self.last_tick = 0.0
+        self.lag_ms: float | None = None
+        self.max_lag_ms = 0.0
+        self.samples = 0
+        self.slow_callbacks = 0
+        # (tick the stall was caught at, wall time, stack); written by the watchdog, consumed by the lag task.
+        self.pending_stall: tuple[float, float, list[str]] | None = None
+        self.slow_callback_log: deque[dict[str, Any]] = deque(maxlen=LOOP_SLOW_CALLBACK_HISTORY)
+        self.last_profile: dict[str, Any] | None = None
+
+    async def start(self) -> None:
+        if self.task is not None and not self.task.done():
+            return
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.last_tick = time.perf_counter()
+        self.stop_event.clear()
+        self.task = asyncio.create_task(self._lag_loop())
+        self.watchdog_thread = threading.Thread(target=self._watchdog, name="colab-loop-watchdog", daemon=True)
+        self.watchdog_thread.start()
+
+    async def stop(self) -> None:
+        self.stop_event.set()
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.task
+        self.task = None
+
+    async def _lag_loop(self) -> None:
+        while True:
+            await asyncio.sleep(LOOP_LAG_INTERVAL_S)
+            # Measured from the previous tick so a stall before the first sleep (startup) is counted too.
+            previous_tick = self.last_tick
+            lag_s = max(0.0, time.perf_counter() - previous_tick - LOOP_LAG_INTERVAL_S)
+            loop_lag_seconds.observe(lag_s)
+            lag_ms = lag_s * 1000.0
+            self.samples += 1
+            self.lag_ms = lag_ms if self.lag_ms is None else self.lag_ms * 0.9 + lag_ms * 0.1
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+
+            pending = self.pending_stall
+            if pending is not None and pending[0] == previous_tick:
+                self.pending_stall = None
+                self._record_slow_callback(pending[1], lag_s, pending[2])
+            self.last_tick = time.perf_counter()
+
+    def _record_slow_callback(self, at: float, lag_s: float, stack: list[str]) -> None:
+        self.slow_callbacks += 1
+        loop_slow_callback_seconds.observe(lag_s)
+        # The lag is how late the timer fired, which is how long a valve close scheduled at that moment slipped.
+        self.slow_callback_log.append({"at": at, "lagMs": round(lag_s * 1000.0, 1), "stack": stack})
+        logging.warning("event loop stalled %.0fms; loop thread was in:\n  %s", lag_s * 1000.0, "\n  ".join(stack))
+
+    def _watchdog(self) -> None:
+        # Polls often enough to catch the stall while the offending callback is still on the stack.
+        poll_s = LOOP_SLOW_CALLBACK_S / 4.0
+        caught_tick = 0.0
+        while not self.stop_event.wait(poll_s):
+            tick = self.last_tick
+            if tick == caught_tick or time.perf_counter() - tick < LOOP_LAG_INTERVAL_S + LOOP_SLOW_CALLBACK_S:
+                continue
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+            caught_tick = tick
+            self.pending_stall = (tick, time.time(), format_stack(frame))
+
+    def start_profile(self, duration_s: float, interval_s: float = LOOP_PROFILE_INTERVAL_S) -> asyncio.Future:
+        if self.loop is None or self.loop_thread_id is None:
+            raise ValueError("loop_monitor_unavailable")
+        if self.profile_thread is not None and self.profile_thread.is_alive():
+            raise ValueError("profile_running")
+        future = self.loop.create_future()
+        self.profile_thread = threading.Thread(
+            target=self._profile,
+            args=(future, duration_s, interval_s),
+            name="colab-loop-profiler",
+            daemon=True,
+        )
+        self.profile_thread.start()
+        return future
+
+    def _profile(self, future: asyncio.Future, duration_s: float, interval_s: float) -> None:
+        stacks: Counter = Counter()
+        samples = 0
+        idle = 0
+        # The sampler only sees the loop thread once it hands over the GIL, which without a short switch interval
+        # is mostly when it parks in select(); that would hide short busy callbacks.
+        switch_interval_s = sys.getswitchinterval()
+        sys.setswitchinterval(min(switch_interval_s, LOOP_PROFILE_SWITCH_INTERVAL_S))
+        started = time.perf_counter()
+        deadline = started + duration_s
+        try:
+            while time.perf_counter() < deadline and not self.stop_event.is_set():
+                frame = sys._current_frames().get(self.loop_thread_id)
+                if frame is None:
+                    break
+                samples += 1
+                if _is_idle(frame):
+                    idle += 1
+                else:
+                    stacks[folded_stack(frame)] += 1
+                del frame
+                time.sleep(interval_s)
+        finally:
+            sys.setswitchinterval(switch_interval_s)
+        result = summarize_profile(stacks, samples, idle, time.perf_counter() - started, interval_s)
+        with contextlib.suppress(RuntimeError):
+            self.loop.call_soon_threadsafe(self._finish_profile, future, result)
+
+    def _finish_profile(self, future: asyncio.Future, result: dict[str, Any]) -> None:
+        self.last_profile = result
+        if not future.done():
+            future.set_result(result)
+
+    def state_payload(self) -> dict[str, Any]:
+        last = self.slow_callback_log[-1] if self.slow_callback_log else None
+        return {
+            "available": self.task is not None and not self.task.done(),
+            "lagMs": None if self.lag_ms is None else round(self.lag_ms, 2),
+            "maxLagMs": round(self.max_lag_ms, 2),
+            "slowCallbacks": self.slow_callbacks,
+            "lastSlowCallbackLagMs": None if last is None else last["lagMs"],
+            "profiling": self.profile_thread is not None and self.profile_thread.is_alive(),
+        }
+
+    def report_payload(self) -> dict[str, Any]:
+        return {
+            **self.state_payload(),
+            "samples": self.samples,
+            "slowCallbackLog": list(self.slow_callback_log),
+            "profile": self.last_profile,
+        }
@@ -0,0 +1,279 @@
+import array
+import asyncio
+import concurrent.futures
+import importlib
+import io
+import logging
+import math
+import multiprocessing
+import sys
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Sequence
+
+from .constants import (
+    THERMAL_FRAME_HEIGHT,
+    THERMAL_FRAME_SCALE,
+    THERMAL_FRAME_WIDTH,
+    THERMAL_JPEG_QUALITY,
+    THERMAL_TEXT_BAND_HEIGHT,
+    WEBCAM_JPEG_QUALITY,
+)
+
+THERMAL_PIXEL_COUNT = THERMAL_FRAME_WIDTH * THERMAL_FRAME_HEIGHT
+
+
+def temperature_to_rgb(normalized: float) -> tuple[int, int, int]:
+    clamped = max(0.0, min(1.0, normalized))
+    anchors = [
+        (0.0, (0, 0, 20)),
+        (0.2, (20, 20, 180)),
+        (0.4, (0, 180, 255)),
+        (0.6, (255, 255, 0)),
+        (0.8, (255, 80, 0)),
+        (1.0, (255, 255, 255)),
+    ]
+    for index in range(1, len(anchors)):
+        left_t, left_color = anchors[index - 1]
+        right_t, right_color = anchors[index]
+        if clamped <= right_t:
+            ratio = (clamped - left_t) / (right_t - left_t) if right_t > left_t else 0.0
+            red = int(left_color[0] + (right_color[0] - left_color[0]) * ratio)
+            green = int(left_color[1] + (right_color[1] - left_color[1]) * ratio)
+            blue = int(left_color[2] + (right_color[2] - left_color[2]) * ratio)
+            return red, green, blue
+    return anchors[-1][1]
+
+
+def render_thermal_jpeg(
+    frame: Sequence[float], scale: tuple[float, float] | None = None
+) -> tuple[bytes, float, float]:
+    image_module = importlib.import_module("PIL.Image")
+    image_draw_module = importlib.import_module("PIL.ImageDraw")
+
+    finite_values = [value for value in frame if math.isfinite(value)]
+    if not finite_values:
+        finite_values = [0.0]
+    min_temp = min(finite_values)
+    max_temp = max(finite_values)
+    scale_min, scale_max = scale if scale is not None else (min_temp, max_temp)
+    span = max(scale_max - scale_min, 0.01)
+
+    pixels = [
+        temperature_to_rgb((value - scale_min) / span)
+        if math.isfinite(value)
+        else (0, 0, 0)
+        for value in frame
+    ]
+
+    image = image_module.new("RGB", (THERMAL_FRAME_WIDTH, THERMAL_FRAME_HEIGHT))
+    image.putdata(pixels)
+    if hasattr(image_module, "Transpose"):
+        image = image.transpose(image_module.Transpose.FLIP_LEFT_RIGHT)
+    else:
+        image = image.transpose(image_module.FLIP_LEFT_RIGHT)
+    if hasattr(image_module, "Resampling"):
+        image = image.resize(
+            (THERMAL_FRAME_WIDTH * THERMAL_FRAME_SCALE, THERMAL_FRAME_HEIGHT * THERMAL_FRAME_SCALE),
+            image_module.Resampling.NEAREST,
+        )
+    else:
+        image = image.resize(
+            (THERMAL_FRAME_WIDTH * THERMAL_FRAME_SCALE, THERMAL_FRAME_HEIGHT * THERMAL_FRAME_SCALE),
+            image_module.NEAREST,
+        )
+
+    draw = image_draw_module.Draw(image)
+    draw.rectangle(
+        (0, 0, image.width, THERMAL_TEXT_BAND_HEIGHT),
+        fill=(0, 0, 0),
+    )
+    draw.text(
+        (6, 6),
+        f"max {max_temp:.1f}C min {min_temp:.1f}C",
+        fill=(255, 255, 255),
+    )
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=THERMAL_JPEG_QUALITY)
+    return buffer.getvalue(), min_temp, max_temp
+
+
+def encode_webcam_jpeg(frame: Any) -> bytes | None:
+    cv2 = importlib.import_module("cv2")
+    encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), WEBCAM_JPEG_QUALITY]
+    encoded_ok, encoded = cv2.imencode(".jpg", frame, encode_params)
+    if not encoded_ok:
+        return None
+    return encoded.tobytes()
+
+
+# Worker-side cache of the attached segment per stream; attaching maps the segment, so do it once per slot.
+_attached_segments: dict[str, shared_memory.SharedMemory] = {}
+
+
+def _attach(stream: str, name: str) -> shared_memory.SharedMemory:
+    segment = _attached_segments.get(stream)
+    if segment is not None and segment.name != name:
+        # The parent reallocated the slot (a resolution change or a new pool); drop the mapping of the old one.
+        segment.close()
+        segment = None
+    if segment is None:
+        # Spawned workers share the parent's resource tracker, and before Python 3.13 attaching registers the
+        # segment with it a second time; a registration that lands after the parent unlinked the slot is reported
+        # as leaked and unlinked again at exit. Unregistering here would drop the parent's own entry instead, so
+        # attach untracked and leave the segment to the parent, which created it.
+        if sys.version_info >= (3, 13):
+            segment = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            register = resource_tracker.register
+            resource_tracker.register = lambda *_args: None
+            try:
+                segment = shared_memory.SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+        _attached_segments[stream] = segment
+    return segment
+
+
+def _encode_thermal_from_shm(name: str, scale: tuple[float, float] | None) -> tuple[bytes, float, float]:
+    segment = _attach("thermal", name)
+    frame = segment.buf[: THERMAL_PIXEL_COUNT * 8].cast("d").tolist()
+    return render_thermal_jpeg(frame, scale)
+
+
+def _encode_webcam_from_shm(name: str, shape: tuple[int, ...], dtype: str) -> bytes | None:
+    np = importlib.import_module("numpy")
+    segment = _attach("webcam", name)
+    frame = np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf)
+    return encode_webcam_jpeg(frame)
+
+
+class SharedFrameSlots:
+    def __init__(self, stream: str, count: int) -> None:
+        self.stream = stream
+        self.count = count
+        self.size = 0
+        self.segments: list[shared_memory.SharedMemory] = []
+        self.free: asyncio.Queue[int] | None = None
+
+    def _allocate(self, size: int) -> None:
+        self.release()
+        self.segments = [shared_memory.SharedMemory(create=True, size=size) for _ in range(self.count)]
+        self.size = size
+        self.free = asyncio.Queue()
+        for index in range(self.count):
+            self.free.put_nowait(index)
+
+    async def acquire(self, size: int) -> shared_memory.SharedMemory:
+        if size > self.size:
+            # Only happens on the first frame or a resolution change; in-flight encodes hold no slot then.
+            self._allocate(size)
+        assert self.free is not None
+        index = await self.free.get()
+        return self.segments[index]
+
+    def give_back(self, segment: shared_memory.SharedMemory) -> None:
+        if self.free is None:
+            return
+        for index, candidate in enumerate(self.segments):
+            if candidate is segment:
+                self.free.put_nowait(index)
+                return
+
+    def release(self) -> None:
+        for segment in self.segments:
+            try:
+                segment.close()
+                segment.unlink()
+            except Exception:
+                logging.exception("failed to release %s frame slot", self.stream)
+        self.segments = []
+        self.size = 0
+        self.free = None
+
+
+class MediaEncoderPool:
+    def __init__(self, processes: int) -> None:
+        self.processes = processes
+        self.executor: concurrent.futures.ProcessPoolExecutor | None = None
+        self.available = False
+        self.error: str | None = None
+        # Each capture loop awaits one encode at a time, so one slot per stream is enough.
+        self.thermal_slots = SharedFrameSlots("thermal", 1)
+        self.webcam_slots = SharedFrameSlots("webcam", 1)
+
+    def start(self) -> None:
+        if self.processes <= 0 or self.executor is not None:
+            return
+        try:
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            self.available = True
+            self.error = None
+        except Exception as exc:
+            self.available = False
+            self.error = f"media_encoder_unavailable:{exc}"
+            logging.exception("media encoder pool initialization failed")
+
+    def stop(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        self.available = False
+        self.thermal_slots.release()
+        self.webcam_slots.release()
+
+    def _mark_broken(self, exc: BaseException) -> None:
+        self.available = False
+        self.error = f"media_encoder_failed:{exc}"
+        logging.exception("media encoder pool failed; falling back to in-process encoding")
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def encode_thermal(
+        self, frame: Sequence[float], scale: tuple[float, float] | None = None
+    ) -> tuple[bytes, float, float]:
+        if self.executor is None:
+            raise RuntimeError("media_encoder_unavailable")
+        segment = await self.thermal_slots.acquire(THERMAL_PIXEL_COUNT * 8)
+        try:
+            values = array.array("d", frame)
+            segment.buf[: len(values) * 8] = values.tobytes()
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, _encode_thermal_from_shm, segment.name, scale)
+        except concurrent.futures.process.BrokenProcessPool as exc:
+            self._mark_broken(exc)
+            raise
+        finally:
+            self.thermal_slots.give_back(segment)
+
+    async def encode_webcam(self, frame: Any) -> bytes | None:
+        if self.executor is None:
+            raise RuntimeError("media_encoder_unavailable")
+        np = importlib.import_module("numpy")
+        segment = await self.webcam_slots.acquire(frame.nbytes)
+        try:
+            np.ndarray(frame.shape, dtype=frame.dtype, buffer=segment.buf)[...] = frame
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor,
+                _encode_webcam_from_shm,
+                segment.name,
+                tuple(frame.shape),
+                frame.dtype.str,
+            )
+        except concurrent.futures.process.BrokenProcessPool as exc:
+            self._mark_broken(exc)
+            raise
+        finally:
+            self.webcam_slots.give_back(segment)
+
+    def state_payload(self) -> dict[str, Any]:
+        return {
+            "processes": self.processes,
+            "available": self.available,
+            "error": self.error,
+        }
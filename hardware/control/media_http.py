@@ -0,0 +1,242 @@
+import asyncio
+import functools
+import importlib
+import logging
+import math
+from typing import Any
+
+from .constants import THERMAL_STREAM_PATH, WEBCAM_CLIP_PATH, WEBCAM_SNAPSHOT_PATH, WEBCAM_STREAM_PATH
+from .metrics import PROMETHEUS_CONTENT_TYPE, metrics_text
+
+try:
+    aiohttp_web = importlib.import_module("aiohttp.web")
+except Exception:
+    aiohttp_web = None
+
+MJPEG_HEADERS = {
+    "Content-Type": "multipart/x-mixed-replace; boundary=frame",
+    "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
+    "Pragma": "no-cache",
+    "Connection": "close",
+    "Access-Control-Allow-Origin": "*",
+}
+NO_STORE_HEADERS = {
+    "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
+    "Access-Control-Allow-Origin": "*",
+}
+CLIP_FORMATS = ("multipart", "mjpeg")
+
+
+def parse_query_number(raw: str | None, error: str) -> float | None:
+    if raw is None or raw == "":
+        return None
+    try:
+        value = float(raw)
+    except ValueError:
+        raise ValueError(error) from None
+    if not math.isfinite(value):
+        raise ValueError(error)
+    return value
+
+
+async def handle_thermal_mjpeg(thermal: Any, request: Any) -> Any:
+    if aiohttp_web is None:
+        return None
+
+    if not thermal.available:
+        return aiohttp_web.Response(
+            status=503,
+            text=f"thermal_unavailable:{thermal.error}",
+        )
+
+    response = aiohttp_web.StreamResponse(status=200, headers=MJPEG_HEADERS)
+    await response.prepare(request)
+
+    last_seen_frame_id = 0
+    try:
+        while True:
+            snapshot = await thermal.wait_for_frame(last_seen_frame_id, timeout_s=5.0)
+            if snapshot is None and last_seen_frame_id:
+                # An unchanged scene publishes nothing; repeat the last frame so players and proxies keep the stream.
+                snapshot = thermal.latest_snapshot()
+            if snapshot is None:
+                await response.write(
+                    b"--frame\r\n"
+                    b"Content-Type: text/plain\r\n"
+                    b"\r\n"
+                    b"waiting_for_thermal_frame\r\n"
+                )
+                continue
+
+            frame_id, jpeg, min_temp, max_temp, updated_ms, _fps = snapshot
+            part_headers = (
+                "--frame\r\n"
+                "Content-Type: image/jpeg\r\n"
+                f"Content-Length: {len(jpeg)}\r\n"
+                f"X-Max-Temp-C: {max_temp:.2f}\r\n"
+                f"X-Min-Temp-C: {min_temp:.2f}\r\n"
+                f"X-Frame-Id: {frame_id}\r\n"
+                f"X-Updated-At-Ms: {updated_ms if updated_ms is not None else 0}\r\n"
+                "\r\n"
+            ).encode("ascii")
+            await response.write(part_headers)
+            await response.write(jpeg)
+            await response.write(b"\r\n")
+            last_seen_frame_id = frame_id
+    except (asyncio.CancelledError, ConnectionResetError, BrokenPipeError):
+        pass
+    return response
+
+
+async def handle_thermal_json(thermal: Any, _request: Any) -> Any:
+    if aiohttp_web is None:
+        return None
+    return aiohttp_web.json_response(thermal.state_payload())
+
+
+async def handle_webcam_mjpeg(webcam: Any, request: Any) -> Any:
+    if aiohttp_web is None:
+        return None
+
+    if not webcam.available and webcam.latest_jpeg is None:
+        return aiohttp_web.Response(
+            status=503,
+            text=f"webcam_unavailable:{webcam.error}",
+        )
+
+    response = aiohttp_web.StreamResponse(status=200, headers=MJPEG_HEADERS)
+    await response.prepare(request)
+
+    last_seen_frame_id = 0
+    try:
+        while True:
+            snapshot = await webcam.wait_for_frame(last_seen_frame_id, timeout_s=5.0)
+            if snapshot is None:
+                await response.write(
+                    b"--frame\r\n"
+                    b"Content-Type: text/plain\r\n"
+                    b"\r\n"
+                    b"waiting_for_webcam_frame\r\n"
+                )
+                continue
+
+            frame_id, jpeg, updated_ms, fps = snapshot
+            fps_value = fps if fps is not None else 0.0
+            part_headers = (
+                "--frame\r\n"
+                "Content-Type: image/jpeg\r\n"
+                f"Content-Length: {len(jpeg)}\r\n"
+                f"X-Frame-Id: {frame_id}\r\n"
+                f"X-Updated-At-Ms: {updated_ms if updated_ms is not None else 0}\r\n"
+                f"X-FPS: {fps_value:.2f}\r\n"
+                "\r\n"
+            ).encode("ascii")
+            await response.write(part_headers)
+            await response.write(jpeg)
+            await response.write(b"\r\n")
+            last_seen_frame_id = frame_id
+    except (asyncio.CancelledError, ConnectionResetError, BrokenPipeError):
+        pass
+    return response
+
+
+async def handle_webcam_json(webcam: Any, _request: Any) -> Any:
+    if aiohttp_web is None:
+        return None
+    return aiohttp_web.json_response(webcam.state_payload())
+
+
+async def handle_webcam_jpeg(webcam: Any, request: Any) -> Any:
+    if aiohttp_web is None:
+        return None
+    try:
+        requested = parse_query_number(request.query.get("frameId"), "invalid_frame_id")
+    except ValueError as exc:
+        return aiohttp_web.json_response({"error": str(exc)}, status=400)
+    frame_id = webcam.ring.latest_id() if requested is None else int(requested)
+    entry = webcam.ring.get(frame_id)
+    if entry is None and requested is None:
+        return aiohttp_web.Response(status=503, text=f"webcam_unavailable:{webcam.error}")
+    if entry is None:
+        return aiohttp_web.json_response({"error": "frame_not_in_ring"}, status=404)
+    jpeg, updated_ms = entry
+    headers = {**NO_STORE_HEADERS, "X-Frame-Id": str(frame_id), "X-Updated-At-Ms": str(updated_ms)}
+    return aiohttp_web.Response(body=jpeg, content_type="image/jpeg", headers=headers)
+
+
+async def handle_webcam_clip(webcam: Any, request: Any) -> Any:
+    if aiohttp_web is None:
+        return None
+    query = request.query
+    clip_format = query.get("format", "multipart")
+    try:
+        start_ms = parse_query_number(query.get("from"), "invalid_time")
+        end_ms = parse_query_number(query.get("to"), "invalid_time")
+        if clip_format not in CLIP_FORMATS:
+            raise ValueError("invalid_clip_format")
+    except ValueError as exc:
+        return aiohttp_web.json_response({"error": str(exc)}, status=400)
+    frame_ids = webcam.ring.frame_ids_between(start_ms, end_ms)
+    if not frame_ids:
+        return aiohttp_web.json_response({"error": "no_frames_in_range"}, status=404)
+
+    if clip_format == "mjpeg":
+        # Back-to-back JPEGs, the raw MJPEG file that ffmpeg and VLC play as -f mjpeg.
+        headers = {
+            **NO_STORE_HEADERS,
+            "Content-Type": "video/x-motion-jpeg",
+            "Content-Disposition": f'attachment; filename="webcam-{frame_ids[0]}-{frame_ids[-1]}.mjpeg"',
+        }
+    else:
+        headers = {**NO_STORE_HEADERS, "Content-Type": "multipart/mixed; boundary=frame"}
+    response = aiohttp_web.StreamResponse(status=200, headers=headers)
+    await response.prepare(request)
+    try:
+        for frame_id, jpeg, updated_ms in webcam.ring.frames(frame_ids):
+            if clip_format == "multipart":
+                await response.write(
+                    (
+                        "--frame\r\n"
+                        "Content-Type: image/jpeg\r\n"
+                        f"Content-Length: {len(jpeg)}\r\n"
+                        f"X-Frame-Id: {frame_id}\r\n"
+                        f"X-Updated-At-Ms: {updated_ms}\r\n"
+                        "\r\n"
+                    ).encode("ascii")
+                )
+            await response.write(jpeg)
+            if clip_format == "multipart":
+                await response.write(b"\r\n")
+        if clip_format == "multipart":
+            await response.write(b"--frame--\r\n")
+        await response.write_eof()
+    except (asyncio.CancelledError, ConnectionResetError, BrokenPipeError):
+        pass
+    return response
+
+
+async def handle_metrics(_request: Any) -> Any:
+    if aiohttp_web is None:
+        return None
+    return aiohttp_web.Response(
+        body=metrics_text().encode("utf-8"),
+        headers={"Content-Type": PROMETHEUS_CONTENT_TYPE},
+    )
+
+
+def add_media_routes(app: Any, thermal: Any, webcam: Any) -> None:
+    app.router.add_get(THERMAL_STREAM_PATH, functools.partial(handle_thermal_mjpeg, thermal))
+    app.router.add_get("/thermal.json", functools.partial(handle_thermal_json, thermal))
+    app.router.add_get(WEBCAM_STREAM_PATH, functools.partial(handle_webcam_mjpeg, webcam))
+    app.router.add_get("/webcam.json", functools.partial(handle_webcam_json, webcam))
+    app.router.add_get(WEBCAM_SNAPSHOT_PATH, functools.partial(handle_webcam_jpeg, webcam))
+    app.router.add_get(WEBCAM_CLIP_PATH, functools.partial(handle_webcam_clip, webcam))
+
+
+async def start_http_app(app: Any, host: str, port: int, label: str) -> Any:
+    runner = aiohttp_web.AppRunner(app)
+    await runner.setup()
+    site = aiohttp_web.TCPSite(runner, host, port)
+    await site.start()
+    logging.info("%s http server listening on %s:%s", label, host, port)
+    return runner
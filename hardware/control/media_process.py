@@ -0,0 +1,461 @@
+import asyncio
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import struct
+import time
+from typing import Any, Awaitable, Callable
+
+from .constants import (
+    DEVICE_SUPERVISOR_ENABLED,
+    MEDIA_ENCODER_PROCESSES,
+    MEDIA_PROCESS_CONNECT_TIMEOUT_S,
+    MEDIA_PROCESS_RESTART_DELAY_S,
+    THERMAL_HTTP_HOST,
+    THERMAL_HTTP_PORT,
+    THERMAL_WS_BROADCAST_INTERVAL_S,
+    WEBCAM_WS_BROADCAST_INTERVAL_S,
+)
+from .clips import ClipArchiver
+from .controllers import ThermalController, WebcamController
+from .executors import shutdown_executors
+from .media_encoder import MediaEncoderPool
+from .media_http import add_media_routes, aiohttp_web, handle_metrics, start_http_app
+from .supervisor import DeviceSupervisor
+
+# Each message on the media socket: metadata length, body length, UTF-8 JSON metadata, raw body (a JPEG or empty).
+MEDIA_MESSAGE_HEADER = struct.Struct("!II")
+MEDIA_PROCESS_PARENT_POLL_S = 1.0
+
+
+def pack_media_message(meta: dict[str, Any], body: bytes = b"") -> bytes:
+    encoded = json.dumps(meta).encode("utf-8")
+    return MEDIA_MESSAGE_HEADER.pack(len(encoded), len(body)) + encoded + body
+
+
+async def read_media_message(reader: asyncio.StreamReader) -> tuple[dict[str, Any], bytes]:
+    meta_length, body_length = MEDIA_MESSAGE_HEADER.unpack(await reader.readexactly(MEDIA_MESSAGE_HEADER.size))
+    meta = json.loads(await reader.readexactly(meta_length))
+    body = await reader.readexactly(body_length) if body_length else b""
+    return meta, body
+
+
+class RemoteMediaStream:
+    # Control-process stand-in for a capture controller that lives in the media process.
+    stream = ""
+    broadcast_interval_s = 0.0
+
+    def __init__(self, client: "MediaProcessClient") -> None:
+        self.client = client
+        self.available = False
+        self.error: str | None = "media_process_starting"
+        self.state: dict[str, Any] = {"initializing": True}
+        self.frame_counter = 0
+        self.last_updated_ms: int | None = None
+        self.fps: float | None = None
+        self.latest_jpeg: bytes | None = None
+        self.frame_condition = asyncio.Condition()
+        self.last_broadcast_monotonic = 0.0
+        self.pause_reasons: set[str] = set()
+
+    def _update_callback(self) -> Callable[[], Awaitable[None]] | None:
+        return None
+
+    def _apply_frame(self, state: dict[str, Any]) -> None:
+        pass
+
+    def state_payload(self) -> dict[str, Any]:
+        payload = dict(self.state)
+        payload["available"] = self.available
+        payload["error"] = self.error
+        return payload
+
+    def mark_disconnected(self, error: str) -> None:
+        self.available = False
+        self.error = error
+
+    async def apply(self, state: dict[str, Any], jpeg: bytes) -> None:
+        self.state = state
+        self.available = bool(state.get("available"))
+        self.error = state.get("error")
+        self.fps = state.get("fps")
+
+        frame_id = state.get("frameId", 0)
+        if jpeg and frame_id != self.frame_counter:
+            async with self.frame_condition:
+                self.frame_counter = frame_id
+                self.latest_jpeg = jpeg
+                self.last_updated_ms = state.get("updatedAtMs")
+                self._apply_frame(state)
+                self.frame_condition.notify_all()
+
+        callback = self._update_callback()
+        now_monotonic = time.monotonic()
+        if callback is not None and now_monotonic - self.last_broadcast_monotonic >= self.broadcast_interval_s:
+            self.last_broadcast_monotonic = now_monotonic
+            await callback()
+
+    def set_paused(self, reason: str, paused: bool) -> None:
+        if paused:
+            self.pause_reasons.add(reason)
+        else:
+            self.pause_reasons.discard(reason)
+        self.client.send_control({"type": "pause", "stream": self.stream, "reason": reason, "paused": paused})
+
+    async def _wait_for_new_frame(self, last_seen_frame_id: int, timeout_s: float) -> bool:
+        if self.frame_counter <= last_seen_frame_id:
+            try:
+                await asyncio.wait_for(self.frame_condition.wait(), timeout_s)
+            except TimeoutError:
+                return False
+        return self.latest_jpeg is not None
+
+
+class RemoteThermalController(RemoteMediaStream):
+    stream = "thermal"
+    broadcast_interval_s = THERMAL_WS_BROADCAST_INTERVAL_S
+
+    def __init__(self, client: "MediaProcessClient") -> None:
+        super().__init__(client)
+        self.min_temp_c: float | None = None
+        self.max_temp_c: float | None = None
+        self.on_thermal_update: Callable[[], Awaitable[None]] | None = None
+        self.on_thermal_alarm: Callable[[dict[str, Any]], Awaitable[None]] | None = None
+
+    def _update_callback(self) -> Callable[[], Awaitable[None]] | None:
+        return self.on_thermal_update
+
+    async def apply_alarm(self, event: dict[str, Any]) -> None:
+        if self.on_thermal_alarm is not None:
+            await self.on_thermal_alarm(event)
+
+    def _apply_frame(self, state: dict[str, Any]) -> None:
+        self.min_temp_c = state.get("minTempC")
+        self.max_temp_c = state.get("maxTempC")
+
+    def thermal_payload(self) -> dict[str, Any]:
+        return {"type": "thermal", "subsystem": "thermal", **self.state_payload()}
+
+    async def wait_for_frame(
+        self,
+        last_seen_frame_id: int,
+        timeout_s: float = 5.0,
+    ) -> tuple[int, bytes, float, float, int | None, float | None] | None:
+        async with self.frame_condition:
+            if not await self._wait_for_new_frame(last_seen_frame_id, timeout_s):
+                return None
+            if self.latest_jpeg is None or self.min_temp_c is None or self.max_temp_c is None:
+                return None
+            return (
+                self.frame_counter,
+                self.latest_jpeg,
+                self.min_temp_c,
+                self.max_temp_c,
+                self.last_updated_ms,
+                self.fps,
+            )
+
+
+class RemoteWebcamController(RemoteMediaStream):
+    stream = "webcam"
+    broadcast_interval_s = WEBCAM_WS_BROADCAST_INTERVAL_S
+
+    def __init__(self, client: "MediaProcessClient") -> None:
+        super().__init__(client)
+        self.on_webcam_update: Callable[[], Awaitable[None]] | None = None
+
+    def _update_callback(self) -> Callable[[], Awaitable[None]] | None:
+        return self.on_webcam_update
+
+    def webcam_payload(self) -> dict[str, Any]:
+        return {"type": "webcam", "subsystem": "webcam", **self.state_payload()}
+
+    async def wait_for_frame(
+        self,
+        last_seen_frame_id: int,
+        timeout_s: float = 5.0,
+    ) -> tuple[int, bytes, int | None, float | None] | None:
+        async with self.frame_condition:
+            if not await self._wait_for_new_frame(last_seen_frame_id, timeout_s):
+                return None
+            if self.latest_jpeg is None:
+                return None
+            return (
+                self.frame_counter,
+                self.latest_jpeg,
+                self.last_updated_ms,
+                self.fps,
+            )
+
+
+class RemoteClipArchiver:
+    # The frame rings live in the media process, so clips are cut and written there.
+    def __init__(self, client: "MediaProcessClient") -> None:
+        self.client = client
+        self.requested = 0
+
+    async def start(self) -> None:
+        return None
+
+    async def stop(self) -> None:
+        return None
+
+    def begin(self, run: str, job_id: str, kind: str, info: dict[str, Any] | None = None) -> None:
+        self.requested += 1
+        self.client.send_control(
+            {"type": "clip", "action": "begin", "run": run, "jobId": job_id, "kind": kind, "info": info or {}}
+        )
+
+    def end(self, job_id: str, status: str, info: dict[str, Any] | None = None) -> None:
+        self.client.send_control(
+            {"type": "clip", "action": "end", "jobId": job_id, "status": status, "info": info or {}}
+        )
+
+    def state_payload(self) -> dict[str, Any]:
+        return {"remote": True, "requested": self.requested}
+
+
+class MediaProcessClient:
+    def __init__(self, socket_path: str, test_pattern: bool = False) -> None:
+        self.socket_path = socket_path
+        self.test_pattern = test_pattern
+        self.thermal = RemoteThermalController(self)
+        self.webcam = RemoteWebcamController(self)
+        self.clips = RemoteClipArchiver(self)
+        self.process: Any | None = None
+        self.writer: asyncio.StreamWriter | None = None
+        self.task: asyncio.Task | None = None
+        self.restarts = 0
+
+    def _streams(self) -> tuple[RemoteMediaStream, ...]:
+        return (self.thermal, self.webcam)
+
+    def _spawn(self) -> None:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.socket_path)
+        # Spawn, not fork: the child must not inherit the control process's device handles or threads.
+        context = multiprocessing.get_context("spawn")
+        self.process = context.Process(
+            target=run_media_process,
+            args=(self.socket_path, self.test_pattern),
+            name="colab-media",
+        )
+        self.process.start()
+        logging.info("media process started pid=%s socket=%s", self.process.pid, self.socket_path)
+
+    async def _connect(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        deadline = time.monotonic() + MEDIA_PROCESS_CONNECT_TIMEOUT_S
+        while True:
+            try:
+                return await asyncio.open_unix_connection(self.socket_path)
+            except OSError:
+                if time.monotonic() >= deadline or self.process is None or not self.process.is_alive():
+                    raise
+                await asyncio.sleep(0.1)
+
+    def send_control(self, message: dict[str, Any]) -> None:
+        if self.writer is None or self.writer.is_closing():
+            return
+        self.writer.write(pack_media_message(message))
+
+    async def _run(self) -> None:
+        while True:
+            if self.process is None or not self.process.is_alive():
+                if self.process is not None:
+                    self.restarts += 1
+                    logging.warning("media process exited code=%s; restarting", self.process.exitcode)
+                self._spawn()
+
+            try:
+                reader, writer = await self._connect()
+            except OSError as exc:
+                for stream in self._streams():
+                    stream.mark_disconnected(f"media_process_unreachable:{exc}")
+                logging.warning("media process socket unreachable: %s", exc)
+                await asyncio.sleep(MEDIA_PROCESS_RESTART_DELAY_S)
+                continue
+
+            self.writer = writer
+            # Pauses requested while disconnected still have to reach a restarted child.
+            for stream in self._streams():
+                for reason in stream.pause_reasons:
+                    self.send_control({"type": "pause", "stream": stream.stream, "reason": reason, "paused": True})
+            try:
+                while True:
+                    meta, body = await read_media_message(reader)
+                    if "alarm" in meta:
+                        await self.thermal.apply_alarm(meta["alarm"])
+                        continue
+                    stream = self.thermal if meta.get("stream") == "thermal" else self.webcam
+                    await stream.apply(meta.get("state", {}), body)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                logging.warning("media process connection closed")
+            finally:
+                self.writer = None
+                writer.close()
+                for stream in self._streams():
+                    stream.mark_disconnected("media_process_disconnected")
+            await asyncio.sleep(MEDIA_PROCESS_RESTART_DELAY_S)
+
+    async def start(self) -> None:
+        if self.task is not None and not self.task.done():
+            return
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.task
+        if self.process is None:
+            return
+        process = self.process
+        self.process = None
+        if process.is_alive():
+            process.terminate()
+        await asyncio.to_thread(process.join, 5.0)
+        if process.is_alive():
+            logging.warning("media process did not exit; killing pid=%s", process.pid)
+            process.kill()
+            await asyncio.to_thread(process.join, 1.0)
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.socket_path)
+
+    def state_payload(self) -> dict[str, Any]:
+        return {
+            "pid": None if self.process is None else self.process.pid,
+            "alive": self.process is not None and self.process.is_alive(),
+            "connected": self.writer is not None,
+            "restarts": self.restarts,
+        }
+
+
+async def serve_media(socket_path: str, test_pattern: bool) -> None:
+    thermal = ThermalController(test_pattern)
+    webcam = WebcamController(test_pattern)
+    encoder = MediaEncoderPool(MEDIA_ENCODER_PROCESSES)
+    encoder.start()
+    thermal.encoder = encoder
+    webcam.encoder = encoder
+    await asyncio.gather(thermal.initialize(), webcam.initialize())
+    await thermal.start()
+    await webcam.start()
+    clips = ClipArchiver({"webcam": webcam.ring, "thermal": thermal.ring})
+    await clips.start()
+    supervisor = DeviceSupervisor()
+    if DEVICE_SUPERVISOR_ENABLED:
+        supervisor.add_media(thermal, webcam)
+        await supervisor.start()
+
+    runner = None
+    if aiohttp_web is not None:
+        app = aiohttp_web.Application()
+        add_media_routes(app, thermal, webcam)
+        # Capture and encode metrics live in this process, so it serves its own /metrics.
+        app.router.add_get("/metrics", handle_metrics)
+        runner = await start_http_app(app, THERMAL_HTTP_HOST, THERMAL_HTTP_PORT, "media")
+    else:
+        logging.warning("aiohttp is not installed; media stream endpoints disabled")
+
+    subscribers: set[asyncio.StreamWriter] = set()
+
+    async def send(message: bytes) -> None:
+        for writer in tuple(subscribers):
+            try:
+                writer.write(message)
+                await writer.drain()
+            except (ConnectionError, RuntimeError):
+                subscribers.discard(writer)
+
+    async def publish(stream: str, state: dict[str, Any], jpeg: bytes) -> None:
+        await send(pack_media_message({"stream": stream, "state": state}, jpeg))
+
+    async def publish_alarm(event: dict[str, Any]) -> None:
+        # Sent as soon as the capture loop raises it, ahead of the frame's own state update.
+        await send(pack_media_message({"stream": "thermal", "alarm": event}))
+
+    thermal.on_thermal_alarm = publish_alarm
+
+    async def forward(stream: str, controller: Any) -> None:
+        last_seen_frame_id = 0
+        last_status: tuple[Any, ...] | None = None
+        while True:
+            # Times out on a stalled stream so availability changes still reach the control process.
+            snapshot = await controller.wait_for_frame(last_seen_frame_id, timeout_s=1.0)
+            state = controller.state_payload()
+            status = (state.get("available"), state.get("error"), state.get("initializing"))
+            jpeg = b""
+            if snapshot is not None and snapshot[0] != last_seen_frame_id:
+                last_seen_frame_id = snapshot[0]
+                jpeg = snapshot[1]
+            elif status == last_status:
+                # Nothing new: an unchanged thermal scene publishes no frames and should cause no broadcasts.
+                continue
+            last_status = status
+            await publish(stream, state, jpeg)
+
+    async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        subscribers.add(writer)
+        await publish("thermal", thermal.state_payload(), b"")
+        await publish("webcam", webcam.state_payload(), b"")
+        try:
+            while True:
+                message, _body = await read_media_message(reader)
+                if message.get("type") == "pause" and message.get("stream") == "thermal":
+                    thermal.set_paused(str(message.get("reason")), bool(message.get("paused")))
+                elif message.get("type") == "clip" and message.get("action") == "begin":
+                    clips.begin(str(message["run"]), str(message["jobId"]), str(message["kind"]), message["info"])
+                elif message.get("type") == "clip" and message.get("action") == "end":
+                    clips.end(str(message["jobId"]), str(message["status"]), message["info"])
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            subscribers.discard(writer)
+            writer.close()
+
+    async def watch_parent(parent_pid: int) -> None:
+        # The control process may die without stopping us; re-parenting means nobody reads the socket.
+        while os.getppid() == parent_pid:
+            await asyncio.sleep(MEDIA_PROCESS_PARENT_POLL_S)
+        logging.warning("control process exited; stopping media process")
+
+    loop = asyncio.get_running_loop()
+    stop_requested = asyncio.Event()
+    loop.add_signal_handler(signal.SIGTERM, stop_requested.set)
+    loop.add_signal_handler(signal.SIGINT, stop_requested.set)
+
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(socket_path)
+    server = await asyncio.start_unix_server(handle_connection, path=socket_path)
+    tasks = [
+        asyncio.create_task(forward("thermal", thermal)),
+        asyncio.create_task(forward("webcam", webcam)),
+        asyncio.create_task(watch_parent(os.getppid())),
+        asyncio.create_task(stop_requested.wait()),
+    ]
+    logging.info("media process serving socket=%s", socket_path)
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        server.close()
+        await clips.stop()
+        await supervisor.stop()
+        await thermal.stop()
+        await webcam.stop()
+        encoder.stop()
+        if runner is not None:
+            await runner.cleanup()
+        shutdown_executors()
+
+
+def run_media_process(socket_path: str, test_pattern: bool = False) -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s media %(message)s",
+    )
+    asyncio.run(serve_media(socket_path, test_pattern))
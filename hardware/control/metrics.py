@@ -0,0 +1,188 @@
+import bisect
+import math
+from typing import Any, Callable, Iterable
+
+# Prometheus text exposition (format 0.0.4) without the client library. Histograms keep a fixed list of
+# bucket counts per label set, allocated the first time that label set is seen, so observing a sample is a
+# bisect plus two additions and can stay on in production. Samples are observed and rendered on the event
+# loop thread only, which is what lets them skip locking.
+
+LATENCY_BUCKETS_S = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+QUEUE_BYTES_BUCKETS = (0, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+
+class HistogramFamily:
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        label_names: tuple[str, ...] = (),
+        bounds: tuple[float, ...] = LATENCY_BUCKETS_S,
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.bounds = bounds
+        self.children: dict[tuple[str, ...], Histogram] = {}
+        if not label_names:
+            self.children[()] = Histogram(bounds)
+            self.observe = self.children[()].observe
+
+    def labels(self, *values: str) -> Histogram:
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = Histogram(self.bounds)
+        return child
+
+    def render(self, lines: list[str]) -> None:
+        lines.append(f"# HELP {self.name} {self.help_text}")
+        lines.append(f"# TYPE {self.name} histogram")
+        for values, child in sorted(self.children.items()):
+            counts, total = child.counts, child.total
+            cumulative = 0
+            for bound, count in zip(self.bounds, counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_label_text(self.label_names, values, le)} {cumulative}")
+            cumulative += counts[-1]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_label_text(self.label_names, values, le)} {cumulative}")
+            labels = _label_text(self.label_names, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+
+
+class GaugeFamily:
+    # Gauges are read at scrape time from the objects that already hold the numbers.
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        label_names: tuple[str, ...],
+        collect: Callable[[], Iterable[tuple[tuple[str, ...], float]]],
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.collect = collect
+
+    def render(self, lines: list[str]) -> None:
+        lines.append(f"# HELP {self.name} {self.help_text}")
+        lines.append(f"# TYPE {self.name} gauge")
+        for values, value in self.collect():
+            lines.append(f"{self.name}{_label_text(self.label_names, values)} {_format_value(value)}")
+
+
+registry: list[Any] = []
+
+
+def histogram(
+    name: str,
+    help_text: str,
+    label_names: tuple[str, ...] = (),
+    bounds: tuple[float, ...] = LATENCY_BUCKETS_S,
+) -> HistogramFamily:
+    family = HistogramFamily(name, help_text, label_names, bounds)
+    registry.append(family)
+    return family
+
+
+def gauge(
+    name: str,
+    help_text: str,
+    label_names: tuple[str, ...],
+    collect: Callable[[], Iterable[tuple[tuple[str, ...], float]]],
+) -> GaugeFamily:
+    family = GaugeFamily(name, help_text, label_names, collect)
+    registry.append(family)
+    return family
+
+
+def metrics_text() -> str:
+    lines: list[str] = []
+    for family in registry:
+        family.render(lines)
+    return "\n".join(lines) + "\n"
+
+
+command_seconds = histogram(
+    "colab_command_seconds", "Time to handle a websocket command, by command type.", ("command",)
+)
+broadcast_seconds = histogram(
+    "colab_broadcast_seconds", "Time to encode and send one broadcast to every client, by payload type.", ("type",)
+)
+client_send_buffer_bytes = histogram(
+    "colab_client_send_buffer_bytes",
+    "Bytes waiting in a client's websocket transport buffer, sampled per client at each broadcast.",
+    bounds=QUEUE_BYTES_BUCKETS,
+)
+thermal_read_seconds = histogram("colab_thermal_read_seconds", "MLX90640 frame read time.")
+thermal_encode_seconds = histogram("colab_thermal_encode_seconds", "Thermal frame render and JPEG encode time.")
+webcam_capture_seconds = histogram("colab_webcam_capture_seconds", "Webcam frame capture time.")
+webcam_encode_seconds = histogram("colab_webcam_encode_seconds", "Webcam JPEG encode time.")
+device_io_seconds = histogram(
+    "colab_device_io_seconds", "Duration of one xArm HID or rig I2C transaction.", ("device", "op")
+)
+executor_wait_seconds = histogram(
+    "colab_executor_wait_seconds", "Time a call waited for a worker thread, by executor.", ("executor",)
+)
+executor_run_seconds = histogram(
+    "colab_executor_run_seconds", "Time a call ran on a worker thread, by executor.", ("executor",)
+)
+device_probe_seconds = histogram(
+    "colab_device_probe_seconds", "Time to probe a missing device, by device and outcome.", ("device", "outcome")
+)
+volume_api_seconds = histogram(
+    "colab_volume_api_seconds", "Remote volume estimate latency, by outcome.", ("outcome",)
+)
+loop_lag_seconds = histogram("colab_loop_lag_seconds", "How late the event loop's monitor timer woke up.")
+loop_slow_callback_seconds = histogram(
+    "colab_loop_slow_callback_seconds", "Monitor timer lag of event loop stalls that were logged with a stack."
+)
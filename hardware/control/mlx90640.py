@@ -0,0 +1,232 @@
+import importlib
+import time
+from typing import Any
+
+from .constants import (
+    THERMAL_FRAME_HEIGHT,
+    THERMAL_FRAME_WIDTH,
+    THERMAL_I2C_MAX_BUS_SHARE,
+    THERMAL_READ_RETRIES,
+    THERMAL_STATUS_POLL_S,
+)
+
+# The Adafruit driver's getFrame() spins on the status register until both chess-pattern sub-pages have been
+# measured and converts each in a per-pixel Python loop. Here each sub-page is read as soon as the sensor flags
+# it, sleeping rather than polling through most of the sub-page period, converted with numpy against arrays
+# built once from the driver's EEPROM extraction, and merged into the running frame, so every sub-page is a
+# frame update. The maths follows the driver's _CalculateTo line for line.
+
+PIXEL_COUNT = THERMAL_FRAME_WIDTH * THERMAL_FRAME_HEIGHT
+SUBPAGE_WORDS = 832
+RAM_ADDRESS = 0x0400
+STATUS_REGISTER = 0x8000
+CONTROL_REGISTER = 0x800D
+STATUS_DATA_READY = 0x0008
+# Clears data-ready while keeping overwrite and measurement enabled, as the Melexis driver does.
+STATUS_CLEAR = 0x0030
+# Sub-page rate -> refresh-rate field of the control register.
+REFRESH_RATE_CODES = {0.5: 0b000, 1: 0b001, 2: 0b010, 4: 0b011, 8: 0b100, 16: 0b101, 32: 0b110, 64: 0b111}
+# One sub-page of RAM plus the register reads around it, at 9 clocks per byte with the ACK.
+SUBPAGE_TRANSFER_BITS = (SUBPAGE_WORDS * 2 + 16) * 9
+# Sleep until this fraction of a sub-page period after the last one, then poll for data-ready.
+READY_SLEEP_FRACTION = 0.8
+SCALEALPHA = 0.000001
+OPENAIR_TA_SHIFT = 8
+EMISSIVITY = 0.95
+
+
+def i2c_bus_clock_hz(bus: int) -> int | None:
+    try:
+        with open(f"/sys/class/i2c-adapter/i2c-{bus}/of_node/clock-frequency", "rb") as handle:
+            return int.from_bytes(handle.read(4), "big")
+    except OSError:
+        return None
+
+
+def sustainable_refresh_hz(requested_hz: float, clock_hz: int | None) -> float:
+    rates = [rate for rate in sorted(REFRESH_RATE_CODES) if rate <= requested_hz] or [min(REFRESH_RATE_CODES)]
+    if clock_hz is None:
+        return rates[-1]
+    transfer_s = SUBPAGE_TRANSFER_BITS / clock_hz
+    for rate in reversed(rates):
+        if transfer_s * rate <= THERMAL_I2C_MAX_BUS_SHARE:
+            return rate
+    return rates[0]
+
+
+class SubpageCalibration:
+    def __init__(self, sensor: Any, np: Any) -> None:
+        self.np = np
+        self.sensor = sensor
+        pixels = np.arange(PIXEL_COUNT)
+        il_pattern = pixels // 32 - (pixels // 64) * 2
+        chess_pattern = il_pattern ^ (pixels % 2)
+        conversion_pattern = ((pixels + 2) // 4 - (pixels + 3) // 4 + (pixels + 1) // 4 - pixels // 4) * (
+            1 - 2 * il_pattern
+        )
+        self.bad_pixels = np.array(sorted(set(sensor.brokenPixels) | set(sensor.outlierPixels)), dtype=np.intp)
+        good = np.ones(PIXEL_COUNT, dtype=bool)
+        good[self.bad_pixels] = False
+
+        offset = np.array(sensor.offset, dtype=np.float64)
+        kta = np.array(sensor.kta, dtype=np.float64) / 2.0**sensor.ktaScale
+        kv = np.array(sensor.kv, dtype=np.float64) / 2.0**sensor.kvScale
+        alpha = SCALEALPHA * 2.0**sensor.alphaScale / np.array(sensor.alpha, dtype=np.float64)
+        il_correction = sensor.ilChessC[2] * (2 * il_pattern - 1) - sensor.ilChessC[1] * conversion_pattern
+
+        # (chess mode, sub-page) -> the pixels that sub-page measures and their per-pixel constants.
+        self.subpages: dict[tuple[bool, int], tuple[Any, ...]] = {}
+        for chess, pattern in ((False, il_pattern), (True, chess_pattern)):
+            for subpage in (0, 1):
+                indices = np.flatnonzero((pattern == subpage) & good)
+                self.subpages[(chess, subpage)] = (
+                    indices,
+                    offset[indices],
+                    kta[indices],
+                    kv[indices],
+                    alpha[indices],
+                    il_correction[indices],
+                )
+
+        self.ks_to = list(sensor.ksTo)
+        self.ct = list(sensor.ct)
+        alpha_corr_r2 = 1 + self.ks_to[1] * self.ct[2]
+        self.alpha_corr_r = np.array(
+            [
+                1 / (1 + self.ks_to[0] * 40),
+                1.0,
+                alpha_corr_r2,
+                alpha_corr_r2 * (1 + self.ks_to[2] * (self.ct[3] - self.ct[2])),
+            ]
+        )
+        self.range_ks_to = np.array(self.ks_to[:4])
+        self.range_ct = np.array(self.ct[:4], dtype=np.float64)
+        self.range_edges = np.array(self.ct[1:4], dtype=np.float64)
+
+    def _vdd(self, words: Any, control: int) -> float:
+        sensor = self.sensor
+        resolution_ram = (control & 0x0C00) >> 10
+        resolution_correction = 2.0**sensor.resolutionEE / 2.0**resolution_ram
+        return (resolution_correction * float(words[810]) - sensor.vdd25) / sensor.kVdd + 3.3
+
+    def _ta(self, words: Any, vdd: float) -> float:
+        sensor = self.sensor
+        ptat = float(words[800])
+        ptat_art = ptat / (ptat * sensor.alphaPTAT + float(words[768])) * 2.0**18
+        return (ptat_art / (1 + sensor.KvPTAT * (vdd - 3.3)) - sensor.vPTAT25) / sensor.KtPTAT + 25
+
+    def temperatures(self, words: Any, control: int, subpage: int) -> tuple[Any, Any]:
+        np = self.np
+        sensor = self.sensor
+        vdd = self._vdd(words, control)
+        ta = self._ta(words, vdd)
+        tr = ta - OPENAIR_TA_SHIFT
+        ta4 = (ta + 273.15) ** 4
+        tr4 = (tr + 273.15) ** 4
+        ta_tr = tr4 - (tr4 - ta4) / EMISSIVITY
+
+        gain = sensor.gainEE / float(words[778])
+        mode = (control & 0x1000) >> 5
+        cp_scale = (1 + sensor.cpKta * (ta - 25)) * (1 + sensor.cpKv * (vdd - 3.3))
+        if subpage == 0:
+            ir_cp = float(words[776]) * gain - sensor.cpOffset[0] * cp_scale
+        elif mode == sensor.calibrationModeEE:
+            ir_cp = float(words[808]) * gain - sensor.cpOffset[1] * cp_scale
+        else:
+            ir_cp = float(words[808]) * gain - (sensor.cpOffset[1] + sensor.ilChessC[0]) * cp_scale
+
+        indices, offset, kta, kv, alpha, il_correction = self.subpages[(mode != 0, subpage)]
+        ir = words[indices] * gain
+        ir -= offset * (1 + kta * (ta - 25)) * (1 + kv * (vdd - 3.3))
+        if mode != sensor.calibrationModeEE:
+            ir += il_correction
+        ir -= sensor.tgc * ir_cp
+        ir /= EMISSIVITY
+
+        alpha_compensated = alpha * (1 + sensor.KsTa * (ta - 25))
+        sx = np.sqrt(np.sqrt(alpha_compensated**3 * (ir + alpha_compensated * ta_tr))) * self.ks_to[1]
+        to = np.sqrt(np.sqrt(ir / (alpha_compensated * (1 - self.ks_to[1] * 273.15) + sx) + ta_tr)) - 273.15
+        to_range = np.searchsorted(self.range_edges, to, side="right")
+        to = (
+            np.sqrt(
+                np.sqrt(
+                    ir
+                    / (
+                        alpha_compensated
+                        * self.alpha_corr_r[to_range]
+                        * (1 + self.range_ks_to[to_range] * (to - self.range_ct[to_range]))
+                    )
+                    + ta_tr
+                )
+            )
+            - 273.15
+        )
+        return indices, to
+
+
+class SubpageReader:
+    def __init__(self, sensor: Any, refresh_hz: float) -> None:
+        self.np = importlib.import_module("numpy")
+        self.device = sensor.i2c_device
+        self.calibration = SubpageCalibration(sensor, self.np)
+        self.refresh_hz = refresh_hz
+        self.period_s = 1.0 / refresh_hz
+        self.ram = bytearray(SUBPAGE_WORDS * 2)
+        self.word = bytearray(2)
+        # Bad pixels stay NaN, which the renderer draws black and leaves out of the colour scale.
+        self.frame = self.np.full(PIXEL_COUNT, self.np.nan)
+        self.subpages_seen = 0
+        self.next_ready_monotonic = 0.0
+
+    def _read_register(self, address: int) -> int:
+        with self.device as i2c:
+            i2c.write_then_readinto(address.to_bytes(2, "big"), self.word)
+        return int.from_bytes(self.word, "big")
+
+    def _write_register(self, address: int, value: int) -> None:
+        with self.device as i2c:
+            i2c.write(address.to_bytes(2, "big") + value.to_bytes(2, "big"))
+
+    def _wait_ready(self) -> bool:
+        delay_s = self.next_ready_monotonic - time.monotonic()
+        if delay_s > 0:
+            time.sleep(delay_s)
+        deadline = time.monotonic() + 2 * self.period_s
+        while not self._read_register(STATUS_REGISTER) & STATUS_DATA_READY:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(THERMAL_STATUS_POLL_S)
+        self.next_ready_monotonic = time.monotonic() + self.period_s * READY_SLEEP_FRACTION
+        return True
+
+    def read_subpage(self) -> int | None:
+        if not self._wait_ready():
+            return None
+        for _ in range(THERMAL_READ_RETRIES):
+            self._write_register(STATUS_REGISTER, STATUS_CLEAR)
+            with self.device as i2c:
+                i2c.write_then_readinto(RAM_ADDRESS.to_bytes(2, "big"), self.ram)
+            status = self._read_register(STATUS_REGISTER)
+            # The next sub-page landed during the read, so RAM may hold parts of both; read it again.
+            if not status & STATUS_DATA_READY:
+                break
+        else:
+            return None
+        subpage = status & 0x0001
+        control = self._read_register(CONTROL_REGISTER)
+        words = self.np.frombuffer(self.ram, dtype=">i2").astype(self.np.float64)
+        indices, temperatures = self.calibration.temperatures(words, control, subpage)
+        if not self.np.isfinite(temperatures).all():
+            return None
+        self.frame[indices] = temperatures
+        self.subpages_seen |= 1 << subpage
+        return subpage
+
+    def read_frame(self) -> list[float] | None:
+        # Each sub-page refreshes half the pixels; the other half carry over from the previous one.
+        for _ in range(2):
+            if self.read_subpage() is None:
+                return None
+            if self.subpages_seen == 0b11:
+                return self.frame.tolist()
+        return None
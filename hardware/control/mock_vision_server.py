@@ -0,0 +1,68 @@
+import argparse
+import asyncio
+import itertools
+import logging
+
+from aiohttp import web
+
+# Stand-in for the remote vision API. Run it, then start the server with
+#   ANTHROPIC_BASE_URL=http://127.0.0.1:8090 ANTHROPIC_API_KEY=mock python main.py
+# to exercise the volume client (deadlines, cancellation, coalescing) without network access.
+# benchmarks/volume_remote.py runs it in-process and checks the deadline and cancellation outcomes.
+
+message_ids = itertools.count(1)
+
+
+def build_app(volume_ml: float, latency_s: float, fail_every: int) -> web.Application:
+    app = web.Application()
+    app["requests"] = 0
+
+    async def handle_messages(request: web.Request) -> web.Response:
+        app["requests"] += 1
+        request_number = app["requests"]
+        body = await request.json()
+        await asyncio.sleep(latency_s)
+
+        if fail_every > 0 and request_number % fail_every == 0:
+            return web.json_response(
+                {"type": "error", "error": {"type": "overloaded_error", "message": "mock overload"}},
+                status=529,
+            )
+
+        logging.info("mock vision request=%s model=%s", request_number, body.get("model"))
+        return web.json_response(
+            {
+                "id": f"msg_mock_{next(message_ids)}",
+                "type": "message",
+                "role": "assistant",
+                "model": body.get("model", "mock"),
+                "content": [{"type": "text", "text": f"{volume_ml:g}"}],
+                "stop_reason": "end_turn",
+                "stop_sequence": None,
+                "usage": {"input_tokens": 1, "output_tokens": 1},
+            }
+        )
+
+    app.router.add_post("/v1/messages", handle_messages)
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Mock vision API for local volume estimation runs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--volume-ml", type=float, default=42.0)
+    parser.add_argument("--latency-s", type=float, default=0.5)
+    parser.add_argument("--fail-every", type=int, default=0, help="return an overload error every N requests")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    web.run_app(
+        build_app(args.volume_ml, args.latency_s, args.fail_every),
+        host=args.host,
+        port=args.port,
+    )
+
+
+if __name__ == "__main__":
+    main()
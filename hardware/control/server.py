@@ -1,24 +1,44 @@
 import asyncio
-import base64
+import contextlib
 import importlib
+import itertools
 import json
 import logging
 import math
-import os
-import re
+import socket
 import time
-from typing import Any
+from typing import Any, Awaitable, Callable, Iterator, Sequence
 
 import websockets
 
 from .constants import (
     AUTOMATION_BASE_ROTATION_SPEED_DEG_PER_S,
     AUTOMATION_CLEANUP_SEQUENCE_DEG,
+    AUTOMATION_CLOSED_LOOP_FRAME_TIMEOUT_S,
+    AUTOMATION_CLOSED_LOOP_MAX_PULSES,
+    AUTOMATION_CLOSED_LOOP_MIN_PULSE_S,
+    AUTOMATION_CLOSED_LOOP_PULSE_FRACTION,
+    AUTOMATION_CLOSED_LOOP_SETTLE_S,
+    AUTOMATION_CLOSED_LOOP_TOLERANCE_ML,
     AUTOMATION_DISPENSE_POST_CLOSE_WAIT_S,
     AUTOMATION_DISPENSE_PRE_OPEN_WAIT_S,
     AUTOMATION_STIR_MAX_DURATION_S,
     AUTOMATION_VALVE_FLOW_ML_PER_S,
+    CLIP_CAPTURE_ENABLED,
+    COMMAND_LOG_INTERVAL_S,
+    CONTROL_HTTP_PORT,
+    CONTROL_WS_PATH,
+    DEVICE_SUPERVISOR_ENABLED,
     HOST,
+    LOOP_MONITOR_ENABLED,
+    LOOP_PROFILE_DEFAULT_DURATION_S,
+    LOOP_PROFILE_MAX_DURATION_S,
+    MEDIA_ENCODER_PROCESSES,
+    MEDIA_PROCESS_ENABLED,
+    MEDIA_PROCESS_SOCKET_PATH,
+    MEDIA_TEST_PATTERN,
+    MEDIA_WS_MAX_BUFFER_BYTES,
+    MEDIA_WS_SOCKET_SEND_BUFFER_BYTES,
     PORT,
     RIG_BASE_ROTATION_CHANNEL,
     RIG_BASE_ROTATION_POSITIONS,
@@ -31,22 +51,84 @@ from .constants import (
     RIG_CLOSED_ANGLE,
     RIG_SERVO_CHANNELS,
     RIG_STIRRER_DURATIONS_S,
+    SESSION_RECORD_ON_START,
+    SESSION_REPLAY_PATH,
+    SESSION_REPLAY_SPEED,
+    SINGLE_PORT_ENABLED,
+    TELEMETRY_ENABLED,
+    TELEMETRY_HTTP_MAX_ROWS,
+    THERMAL_ALARM_ACTIONS_ENABLED,
     THERMAL_HTTP_HOST,
     THERMAL_HTTP_PORT,
     THERMAL_STREAM_PATH,
     WEBCAM_STREAM_PATH,
+    WS_COMPRESSION_ENABLED,
     XARM_DEFAULT_MOVE_MS,
     XARM_MAX_MOVE_MS,
     XARM_MIN_MOVE_MS,
     XARM_SERVO_IDS,
 )
-from .controllers import ThermalController, WebcamController, XArmController, RigController, clamp_int
+from .calibration import FlowCalibrationStore
+from .clips import ClipArchiver
+from .codec import (
+    BINARY_SUBPROTOCOL,
+    JPEG_STREAMS,
+    WIRE_FORMAT_BINARY,
+    WIRE_FORMAT_JSON,
+    binary_available,
+    decode_binary,
+    encode_payload,
+    pack_jpeg_frame,
+)
+from .compression import apply_client_compression_policy, build_compression_extensions, compression_stats
+from .controllers import (
+    ThermalController,
+    WebcamController,
+    XArmController,
+    RigController,
+    clamp_int,
+    xarm_raw_to_angle_deg,
+)
+from .executors import (
+    executors_payload,
+    media_executor,
+    rig_executor,
+    shutdown_executors,
+    telemetry_executor,
+    xarm_executor,
+)
+from .http_ws import AiohttpWebSocket, websocket_response
+from .loop_monitor import LoopMonitor
+from .media_encoder import MediaEncoderPool
+from .media_http import add_media_routes, handle_metrics, parse_query_number, start_http_app
+from .media_process import (
+    MediaProcessClient,
+    RemoteClipArchiver,
+    RemoteThermalController,
+    RemoteWebcamController,
+)
+from .metrics import broadcast_seconds, client_send_buffer_bytes, command_seconds, gauge
+from .session import SessionRecorder, install_replay_devices
+from .supervisor import DeviceSupervisor, i2c_bus_present, xarm_present
+from .telemetry import TelemetryReader, TelemetryRecorder, list_runs, run_path
+from .tracing import chrome_trace_payload, run_traced, trace_span, traced_lock
+from .volume import VolumeEstimator
 
 try:
     aiohttp_web = importlib.import_module("aiohttp.web")
 except Exception:
     aiohttp_web = None
 
+# Optional, like msgpack in codec: faster decoding when installed, json otherwise.
+try:
+    orjson = importlib.import_module("orjson")
+except Exception:
+    orjson = None
+
+decode_json: Callable[[str | bytes], Any] = orjson.loads if orjson is not None else json.loads
+
+CommandHandler = Callable[[Any, dict[str, Any]], Awaitable[None]]
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s %(levelname)s %(message)s",
@@ -54,24 +136,58 @@ logging.basicConfig(
 
 xarm_controller = XArmController()
 rig_controller = RigController()
-thermal_controller = ThermalController()
-webcam_controller = WebcamController()
+media_process: MediaProcessClient | None = None
+thermal_controller: ThermalController | RemoteThermalController
+webcam_controller: WebcamController | RemoteWebcamController
+if SESSION_REPLAY_PATH:
+    # Replay swaps in simulated devices, which only works with capture in this process.
+    thermal_controller = ThermalController(test_pattern=True)
+    webcam_controller = WebcamController(test_pattern=True)
+elif MEDIA_PROCESS_ENABLED:
+    media_process = MediaProcessClient(MEDIA_PROCESS_SOCKET_PATH, MEDIA_TEST_PATTERN)
+    thermal_controller = media_process.thermal
+    webcam_controller = media_process.webcam
+else:
+    thermal_controller = ThermalController(MEDIA_TEST_PATTERN)
+    webcam_controller = WebcamController(MEDIA_TEST_PATTERN)
+media_encoder = MediaEncoderPool(MEDIA_ENCODER_PROCESSES)
+flow_calibration = FlowCalibrationStore()
+volume_estimator = VolumeEstimator(webcam_controller)
+session_recorder = SessionRecorder(rig_controller, thermal_controller, webcam_controller)
+clip_archiver: ClipArchiver | RemoteClipArchiver
+if media_process is not None:
+    clip_archiver = media_process.clips
+else:
+    clip_archiver = ClipArchiver({"webcam": webcam_controller.ring, "thermal": thermal_controller.ring})
+# Clips from one server run share a directory; job ids only need to be unique within it.
+clip_run = time.strftime("run-%Y%m%d-%H%M%S")
+job_counter = itertools.count(1)
+loop_monitor = LoopMonitor()
+device_supervisor = DeviceSupervisor()
 clients: set[Any] = set()
 client_send_locks: dict[Any, asyncio.Lock] = {}
+client_formats: dict[Any, str] = {}
+media_subscriptions: dict[Any, dict[str, asyncio.Task]] = {}
+# The latest frame of each stream packed for websocket subscribers: (frame id, message), shared by all of them.
+packed_media_frames: dict[str, tuple[int, bytes]] = {}
+media_frames_sent = 0
+media_frames_skipped = 0
 
 rig_base_servo_task: asyncio.Task | None = None
 rig_stirrer_task: asyncio.Task | None = None
 rig_diagnostic_task: asyncio.Task | None = None
-volume_estimation_task: asyncio.Task | None = None
 automation_lock = asyncio.Lock()
-
-anthropic_client: Any | None = None
-anthropic_model = "claude-haiku-4-5"
-latest_volume_ml: float | None = None
-latest_volume_raw: str | None = None
-latest_volume_error: str | None = None
-latest_volume_updated_ms: int | None = None
-volume_query_enabled_until_monotonic = 0.0
+# Alarm rules whose actions ran and that have not cleared: valves and the stirrer stay off until they do.
+alarm_interlocks: set[str] = set()
+command_tasks: set[asyncio.Task] = set()
+
+gauge("colab_clients", "Connected websocket clients.", (), lambda: [((), len(clients))])
+gauge(
+    "colab_client_send_buffer_max_bytes",
+    "Largest websocket transport buffer across connected clients.",
+    (),
+    lambda: [((), max((client_send_buffer_size(websocket) for websocket in clients), default=0))],
+)
 
 
 def parse_xarm_move_ms(raw: Any) -> int:
@@ -82,6 +198,18 @@ def parse_xarm_move_ms(raw: Any) -> int:
     return clamp_int(int(raw), XARM_MIN_MOVE_MS, XARM_MAX_MOVE_MS)
 
 
+def parse_xarm_servo_id(raw: Any) -> int:
+    if isinstance(raw, bool) or not isinstance(raw, int):
+        raise ValueError("invalid_payload")
+    return raw
+
+
+def parse_xarm_angle(raw: Any) -> float:
+    if isinstance(raw, bool) or not isinstance(raw, (int, float)):
+        raise ValueError("invalid_payload")
+    return float(raw)
+
+
 def parse_bool(raw: Any, default: bool = False) -> bool:
     if raw is None:
         return default
@@ -173,6 +301,34 @@ def parse_dispense_amount_ml(raw: Any) -> float:
     return amount_ml
 
 
+def parse_calibration_open_s(raw: Any) -> float:
+    if isinstance(raw, bool) or not isinstance(raw, (int, float)):
+        raise ValueError("invalid_open_s")
+    open_s = float(raw)
+    if not math.isfinite(open_s) or open_s <= 0:
+        raise ValueError("invalid_open_s")
+    return open_s
+
+
+def parse_refill_volume_ml(raw: Any) -> float | None:
+    if raw is None:
+        return None
+    if isinstance(raw, bool) or not isinstance(raw, (int, float)):
+        raise ValueError("invalid_volume_ml")
+    volume_ml = float(raw)
+    if not math.isfinite(volume_ml) or volume_ml < 0:
+        raise ValueError("invalid_volume_ml")
+    return volume_ml
+
+
+def parse_dispense_mode(raw: Any) -> str:
+    if raw is None:
+        return "open_loop"
+    if raw not in ("open_loop", "closed_loop"):
+        raise ValueError("invalid_mode")
+    return raw
+
+
 def parse_automation_stir_duration_s(raw: Any) -> float:
     if isinstance(raw, bool) or not isinstance(raw, (int, float)):
         raise ValueError("invalid_duration_s")
@@ -186,31 +342,32 @@ def parse_automation_stir_duration_s(raw: Any) -> float:
     return duration_s
 
 
-def parse_volume_from_text(raw_text: str) -> float | None:
-    matches = re.findall(r"-?\d+(?:\.\d+)?", raw_text)
-    if not matches:
-        return None
-    for token in matches:
-        try:
-            volume_ml = float(token)
-        except ValueError:
-            continue
-        if not math.isfinite(volume_ml) or volume_ml < 0:
-            continue
-        return volume_ml
-    return None
+def parse_profile_duration_s(raw: Any) -> float:
+    if raw is None:
+        return float(LOOP_PROFILE_DEFAULT_DURATION_S)
+    if isinstance(raw, bool) or not isinstance(raw, (int, float)):
+        raise ValueError("invalid_duration_s")
+    duration_s = float(raw)
+    if not math.isfinite(duration_s) or duration_s <= 0 or duration_s > LOOP_PROFILE_MAX_DURATION_S:
+        raise ValueError("invalid_duration_s")
+    return duration_s
 
 
-def volume_payload() -> dict[str, Any]:
-    return {
-        "type": "volume",
-        "subsystem": "volume",
-        "model": anthropic_model,
-        "volumeMl": latest_volume_ml,
-        "raw": latest_volume_raw,
-        "error": latest_volume_error,
-        "updatedAtMs": latest_volume_updated_ms,
-    }
+def parse_media_stream(raw: Any) -> str:
+    if raw not in JPEG_STREAMS:
+        raise ValueError("invalid_stream")
+    return raw
+
+
+def parse_max_fps(raw: Any) -> float | None:
+    if raw is None:
+        return None
+    if isinstance(raw, bool) or not isinstance(raw, (int, float)):
+        raise ValueError("invalid_max_fps")
+    max_fps = float(raw)
+    if not math.isfinite(max_fps) or max_fps <= 0:
+        raise ValueError("invalid_max_fps")
+    return max_fps
 
 
 def state_payload() -> dict[str, Any]:
@@ -224,22 +381,45 @@ def state_payload() -> dict[str, Any]:
         "rig": rig_state,
         "thermal": thermal_state,
         "webcam": webcam_state,
-        "volume": {
-            "model": anthropic_model,
-            "volumeMl": latest_volume_ml,
-            "raw": latest_volume_raw,
-            "error": latest_volume_error,
-            "updatedAtMs": latest_volume_updated_ms,
-        },
+        "volume": volume_estimator.state_payload(),
         "servos": xarm_state["servos"],
         "limits": xarm_state["limits"],
         "defaults": xarm_state["defaults"],
         "onlineIds": xarm_state["onlineIds"],
         "angles": rig_state["channels"],
+        "calibration": flow_calibration.state_payload(),
+        "loop": loop_monitor.state_payload(),
+        "devices": device_supervisor.state_payload(),
+        "clips": clip_archiver.state_payload(),
+        "media": {
+            "subscribers": sum(len(streams) for streams in media_subscriptions.values()),
+            "framesSent": media_frames_sent,
+            "framesSkipped": media_frames_skipped,
+        },
     }
 
 
-async def send_text(websocket: Any, payload: str) -> bool:
+def telemetry_sample() -> list[float | None]:
+    return [
+        *(xarm_raw_to_angle_deg(xarm_controller.positions[servo_id]) for servo_id in XARM_SERVO_IDS),
+        *rig_controller.servo_angles,
+        1.0 if rig_controller.stirrer_active else 0.0,
+        thermal_controller.min_temp_c,
+        thermal_controller.max_temp_c,
+        volume_estimator.volume_ml,
+    ]
+
+
+telemetry_recorder = TelemetryRecorder(telemetry_sample)
+
+
+def spawn_command_task(coroutine: Awaitable[None]) -> None:
+    task = asyncio.create_task(coroutine)
+    command_tasks.add(task)
+    task.add_done_callback(command_tasks.discard)
+
+
+async def send_text(websocket: Any, payload: str | bytes) -> bool:
     lock = client_send_locks.get(websocket)
     if lock is None:
         return False
@@ -252,26 +432,42 @@ async def send_text(websocket: Any, payload: str) -> bool:
 
 
 async def send_json(websocket: Any, payload: dict[str, Any]) -> bool:
-    return await send_text(websocket, json.dumps(payload))
+    return await send_text(websocket, encode_payload(payload, client_formats.get(websocket, WIRE_FORMAT_JSON)))
+
 
+async def send_error(websocket: Any, reason: str, **fields: Any) -> None:
+    await send_json(websocket, {"type": "error", "error": reason, **fields})
 
-async def send_error(websocket: Any, reason: str) -> None:
-    await send_json(websocket, {"type": "error", "error": reason})
+
+def client_send_buffer_size(websocket: Any) -> int:
+    transport = getattr(websocket, "transport", None)
+    if transport is None:
+        return 0
+    return transport.get_write_buffer_size()
 
 
 async def broadcast_payload(payload: dict[str, Any]) -> None:
     if not clients:
         return
 
-    serialized_payload = json.dumps(payload)
+    started = time.perf_counter()
+    # Encode once per wire format in use rather than once per client.
+    serialized: dict[str, str | bytes] = {}
     stale_clients: list[Any] = []
-    for websocket in tuple(clients):
-        if not await send_text(websocket, serialized_payload):
-            stale_clients.append(websocket)
+    with trace_span("broadcast", type=payload.get("type")):
+        for websocket in tuple(clients):
+            client_send_buffer_bytes.observe(client_send_buffer_size(websocket))
+            wire_format = client_formats.get(websocket, WIRE_FORMAT_JSON)
+            if wire_format not in serialized:
+                serialized[wire_format] = encode_payload(payload, wire_format)
+            if not await send_text(websocket, serialized[wire_format]):
+                stale_clients.append(websocket)
 
     for websocket in stale_clients:
         clients.discard(websocket)
         client_send_locks.pop(websocket, None)
+        client_formats.pop(websocket, None)
+    broadcast_seconds.labels(payload.get("type", "unknown")).observe(time.perf_counter() - started)
 
 
 async def broadcast_state() -> None:
@@ -287,134 +483,158 @@ async def broadcast_webcam() -> None:
 
 
 async def broadcast_volume() -> None:
-    await broadcast_payload(volume_payload())
-
-
-def enable_volume_queries_for_seconds(duration_s: float) -> None:
-    global volume_query_enabled_until_monotonic
-    volume_query_enabled_until_monotonic = max(
-        volume_query_enabled_until_monotonic,
-        time.monotonic() + max(0.0, duration_s),
-    )
-
-
-def initialize_anthropic_client() -> None:
-    global anthropic_client
-    global latest_volume_error
-
+    await broadcast_payload(volume_estimator.volume_payload())
+
+
+def packed_media_frame(stream: str, snapshot: tuple[Any, ...]) -> bytes:
+    packed = packed_media_frames.get(stream)
+    if packed is not None and packed[0] == snapshot[0]:
+        return packed[1]
+    if stream == "thermal":
+        frame_id, jpeg, min_temp_c, max_temp_c, updated_ms, _fps = snapshot
+    else:
+        frame_id, jpeg, updated_ms, _fps = snapshot
+        min_temp_c = max_temp_c = math.nan
+    message = pack_jpeg_frame(stream, frame_id, updated_ms or 0, jpeg, min_temp_c, max_temp_c)
+    packed_media_frames[stream] = (frame_id, message)
+    return message
+
+
+async def send_media(websocket: Any, message: bytes) -> bool:
+    # Not under the client's send lock: both websocket libraries write a whole message to the transport before
+    # waiting for it to drain, so acks and state sent meanwhile follow the frame out instead of the drain.
     try:
-        dotenv_module = importlib.import_module("dotenv")
-        load_dotenv = getattr(dotenv_module, "load_dotenv", None)
-        if callable(load_dotenv):
-            load_dotenv()
+        await websocket.send(message)
+        return True
     except Exception:
-        pass
+        return False
 
-    api_key = os.getenv("ANTHROPIC_API_KEY", "").strip()
-    if not api_key:
-        latest_volume_error = "anthropic_api_key_missing"
-        logging.warning("volume estimation disabled: ANTHROPIC_API_KEY missing")
-        return
 
-    try:
-        anthropic_module = importlib.import_module("anthropic")
-        anthropic_client = anthropic_module.Anthropic(api_key=api_key)
-        latest_volume_error = None
-    except Exception as exc:
-        latest_volume_error = f"anthropic_init_failed:{exc}"
-        logging.exception("failed to initialize anthropic client")
+async def stream_media(websocket: Any, stream: str, max_fps: float | None) -> None:
+    global media_frames_sent
+    global media_frames_skipped
 
+    controller = thermal_controller if stream == "thermal" else webcam_controller
+    last_seen_frame_id = 0
+    while websocket in clients:
+        snapshot = await controller.wait_for_frame(last_seen_frame_id, timeout_s=5.0)
+        if snapshot is None or snapshot[0] == last_seen_frame_id:
+            continue
+        last_seen_frame_id = snapshot[0]
+        lock = client_send_locks.get(websocket)
+        if lock is None:
+            return
+        # A client that cannot keep up gets the newest frame once it drains rather than a growing backlog, and a
+        # control message on its way out goes first.
+        if lock.locked() or client_send_buffer_size(websocket) > MEDIA_WS_MAX_BUFFER_BYTES:
+            media_frames_skipped += 1
+            continue
+        if not await send_media(websocket, packed_media_frame(stream, snapshot)):
+            return
+        media_frames_sent += 1
+        if max_fps is not None:
+            await asyncio.sleep(1.0 / max_fps)
 
-def request_volume_estimate_sync(jpeg: bytes) -> tuple[float | None, str | None]:
-    if anthropic_client is None:
-        return None, "anthropic_unavailable"
 
-    image_base64 = base64.b64encode(jpeg).decode("ascii")
-    response = anthropic_client.messages.create(
-        model=anthropic_model,
-        max_tokens=64,
-        temperature=0,
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": (
-                            "Estimate the liquid and/or foam volume in the flask in milliliters. "
-                            "Return ONLY a single numeric value (example: 37.5). "
-                            "Do not include units or any extra words. "
-                            "Use graduation lines as reference, interpolate between markings, "
-                            "and infer even if the level is above highest marking or image is skewed."
-                            "If no flask is present, return 0."
-                        ),
-                    },
-                    {
-                        "type": "image",
-                        "source": {
-                            "type": "base64",
-                            "media_type": "image/jpeg",
-                            "data": image_base64,
-                        },
-                    },
-                ],
-            }
-        ],
+def limit_socket_send_buffer(websocket: Any) -> None:
+    transport = getattr(websocket, "transport", None)
+    sock = transport.get_extra_info("socket") if transport is not None else None
+    if sock is None:
+        return
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, MEDIA_WS_SOCKET_SEND_BUFFER_BYTES)
+    except OSError as exc:
+        logging.warning("could not limit media subscriber send buffer: %s", exc)
+
+
+def stop_media_streams(websocket: Any, streams: Sequence[str] | None = None) -> None:
+    subscriptions = media_subscriptions.get(websocket, {})
+    for stream in tuple(subscriptions) if streams is None else streams:
+        task = subscriptions.pop(stream, None)
+        if task is not None:
+            task.cancel()
+    if not subscriptions:
+        media_subscriptions.pop(websocket, None)
+
+
+def run_alarm_actions(actions: Sequence[str]) -> list[str]:
+    if not THERMAL_ALARM_ACTIONS_ENABLED:
+        return []
+    handlers = {
+        "force_stirrer_off": rig_controller.force_stirrer_off,
+        "close_non_base_servos": rig_controller.close_non_base_servos,
+    }
+    actions_run: list[str] = []
+    for action in actions:
+        handler = handlers.get(action)
+        if handler is None:
+            logging.warning("unknown thermal alarm action %s", action)
+            continue
+        try:
+            handler()
+        except Exception:
+            logging.exception("thermal alarm action %s failed", action)
+            continue
+        actions_run.append(action)
+    return actions_run
+
+
+async def handle_thermal_alarm(event: dict[str, Any]) -> None:
+    logging.warning(
+        "thermal alarm %s %s: %s %.2f (trigger %.2f)",
+        event["rule"],
+        event["status"],
+        event["kind"],
+        event["value"],
+        event["trigger"],
     )
-
-    text_fragments: list[str] = []
-    content = getattr(response, "content", None)
-    if isinstance(content, list):
-        for entry in content:
-            text_value = str(getattr(entry, "text", "")).strip()
-            if text_value:
-                text_fragments.append(text_value)
-
-    raw_text = " ".join(text_fragments).strip()
-    volume_ml = parse_volume_from_text(raw_text)
-    return volume_ml, raw_text
+    actions_run = run_alarm_actions(event["actions"]) if event["status"] == "active" else []
+    if actions_run:
+        alarm_interlocks.add(event["rule"])
+        stop_rig_tasks()
+    elif event["status"] == "cleared":
+        alarm_interlocks.discard(event["rule"])
+    await broadcast_payload({"type": "alarm", "subsystem": "thermal", **event, "actionsRun": actions_run})
+    if actions_run:
+        await broadcast_state()
 
 
-async def run_volume_estimation_loop() -> None:
-    global latest_volume_ml
-    global latest_volume_raw
-    global latest_volume_error
-    global latest_volume_updated_ms
+def stop_rig_tasks() -> None:
+    global rig_stirrer_task
+    global rig_diagnostic_task
 
-    while True:
-        try:
-            await asyncio.sleep(2.0)
+    for task in (rig_diagnostic_task, rig_stirrer_task):
+        if task and not task.done():
+            task.cancel()
+    rig_diagnostic_task = None
+    rig_stirrer_task = None
 
-            if anthropic_client is None:
-                continue
 
-            if time.monotonic() > volume_query_enabled_until_monotonic:
-                continue
+def ensure_no_alarm_interlock() -> None:
+    # A running dispense holds automation_lock on its client's handler, so it is stopped at its next pulse here.
+    if alarm_interlocks:
+        raise RuntimeError(f"thermal_alarm_active:{','.join(sorted(alarm_interlocks))}")
 
-            frame = webcam_controller.latest_jpeg
-            if frame is None:
-                continue
 
-            volume_ml, raw_text = await asyncio.to_thread(request_volume_estimate_sync, frame)
-            latest_volume_updated_ms = int(time.time() * 1000)
-            latest_volume_raw = raw_text
+def next_job_id(kind: str) -> str:
+    return f"{kind}-{next(job_counter):04d}"
 
-            if volume_ml is None:
-                latest_volume_ml = None
-                latest_volume_error = "volume_parse_failed"
-            else:
-                latest_volume_ml = round(volume_ml, 2)
-                latest_volume_error = None
 
-            await broadcast_volume()
-        except asyncio.CancelledError:
-            raise
-        except Exception as exc:
-            latest_volume_ml = None
-            latest_volume_updated_ms = int(time.time() * 1000)
-            latest_volume_error = f"volume_estimation_failed:{exc}"
-            logging.exception("volume estimation loop failed")
-            await broadcast_volume()
+@contextlib.contextmanager
+def clip_capture(job_id: str, kind: str, info: dict[str, Any]) -> Iterator[None]:
+    if not CLIP_CAPTURE_ENABLED:
+        yield
+        return
+    clip_archiver.begin(clip_run, job_id, kind, info)
+    status = "failed"
+    try:
+        yield
+        status = "completed"
+    except asyncio.CancelledError:
+        status = "cancelled"
+        raise
+    finally:
+        clip_archiver.end(job_id, status)
 
 
 async def run_rig_base_move(target: float) -> None:
@@ -426,6 +646,7 @@ async def run_rig_base_move(target: float) -> None:
 
 
 async def run_rig_stirrer(duration: float) -> None:
+    ensure_no_alarm_interlock()
     rig_controller.stirrer_active = True
     await broadcast_state()
     try:
@@ -445,12 +666,15 @@ async def run_rig_diagnostic(websocket: Any, base_to_valve_delay_s: float) -> No
     global rig_base_servo_task
 
     rig_controller._ensure_available()
+    ensure_no_alarm_interlock()
 
     try:
         rig_controller.close_non_base_servos()
         rig_controller.force_stirrer_off()
-        await rig_controller.move_base_servo(RIG_BASE_ROTATION_POSITIONS[0])
-        await sleep_non_negative(base_to_valve_delay_s)
+        with trace_span("base_move", toDeg=RIG_BASE_ROTATION_POSITIONS[0]):
+            await rig_controller.move_base_servo(RIG_BASE_ROTATION_POSITIONS[0])
+        with trace_span("base_to_valve_wait"):
+            await sleep_non_negative(base_to_valve_delay_s)
         await broadcast_state()
         await send_json(
             websocket,
@@ -470,24 +694,29 @@ async def run_rig_diagnostic(websocket: Any, base_to_valve_delay_s: float) -> No
                 rig_base_servo_task = move_task
 
             if move_task is not None:
-                await move_task
+                with trace_span("base_move", toDeg=base_position):
+                    await move_task
                 await broadcast_state()
-                await sleep_non_negative(base_to_valve_delay_s)
+                with trace_span("base_to_valve_wait"):
+                    await sleep_non_negative(base_to_valve_delay_s)
 
             channel = RIG_DIAGNOSTIC_SERVO_CHANNELS[index]
-            rig_controller.set_channel_immediate(channel, RIG_OPEN_ANGLE)
-            await broadcast_state()
+            with trace_span("valve_open", channel=channel, openS=RIG_DIAGNOSTIC_SERVO_OPEN_S):
+                rig_controller.set_channel_immediate(channel, RIG_OPEN_ANGLE)
+                await broadcast_state()
 
-            await sleep_non_negative(RIG_DIAGNOSTIC_SERVO_OPEN_S)
-            rig_controller.set_channel_immediate(channel, RIG_CLOSED_ANGLE)
+                await sleep_non_negative(RIG_DIAGNOSTIC_SERVO_OPEN_S)
+                rig_controller.set_channel_immediate(channel, RIG_CLOSED_ANGLE)
             await broadcast_state()
 
             if index < len(RIG_BASE_ROTATION_POSITIONS) - 1:
-                await sleep_non_negative(RIG_DIAGNOSTIC_POST_CLOSE_S)
+                with trace_span("post_close_wait"):
+                    await sleep_non_negative(RIG_DIAGNOSTIC_POST_CLOSE_S)
 
         rig_controller.stirrer_active = True
         await broadcast_state()
-        await rig_controller.run_stirrer(RIG_DIAGNOSTIC_STIRRER_S)
+        with trace_span("stirrer", durationS=RIG_DIAGNOSTIC_STIRRER_S):
+            await rig_controller.run_stirrer(RIG_DIAGNOSTIC_STIRRER_S)
         await broadcast_state()
         await send_json(
             websocket,
@@ -503,57 +732,142 @@ async def run_rig_diagnostic(websocket: Any, base_to_valve_delay_s: float) -> No
             rig_base_servo_task = None
 
 
-async def run_dispense(dropper: int, amount_ml: float) -> dict[str, Any]:
-    rig_controller._ensure_available()
-
-    dropper_index = dropper - 1
+async def prepare_dispense(dropper_index: int) -> None:
     target_base = float(RIG_BASE_ROTATION_POSITIONS[dropper_index])
-    valve_channel = int(RIG_DIAGNOSTIC_SERVO_CHANNELS[dropper_index])
-    valve_flow_ml_per_s = float(AUTOMATION_VALVE_FLOW_ML_PER_S[dropper_index])
-    if valve_flow_ml_per_s <= 0:
-        raise RuntimeError("invalid_valve_flow_rate")
 
-    rig_controller.close_non_base_servos()
+    with trace_span("close_valves"):
+        rig_controller.close_non_base_servos()
     await broadcast_state()
 
     current_base = float(rig_controller.servo_angles[RIG_BASE_ROTATION_CHANNEL])
     if round(current_base) != round(target_base):
         angular_delta = abs(target_base - current_base)
-        await run_rig_base_move(target_base)
+        with trace_span("base_move", fromDeg=current_base, toDeg=target_base):
+            await run_rig_base_move(target_base)
         await broadcast_state()
         if AUTOMATION_BASE_ROTATION_SPEED_DEG_PER_S > 0:
-            await sleep_non_negative(angular_delta / AUTOMATION_BASE_ROTATION_SPEED_DEG_PER_S)
-    await sleep_non_negative(AUTOMATION_DISPENSE_PRE_OPEN_WAIT_S)
+            with trace_span("base_settle"):
+                await sleep_non_negative(angular_delta / AUTOMATION_BASE_ROTATION_SPEED_DEG_PER_S)
+    with trace_span("pre_open_wait"):
+        await sleep_non_negative(AUTOMATION_DISPENSE_PRE_OPEN_WAIT_S)
+
+
+async def open_valve_for(valve_channel: int, open_s: float) -> None:
+    ensure_no_alarm_interlock()
+    with trace_span("valve_open", channel=valve_channel, openS=round(open_s, 3)):
+        rig_controller.set_channel_immediate(valve_channel, RIG_OPEN_ANGLE)
+        await broadcast_state()
+        try:
+            await sleep_non_negative(open_s)
+        finally:
+            rig_controller.set_channel_immediate(valve_channel, RIG_CLOSED_ANGLE)
+
 
-    valve_open_s = amount_ml / valve_flow_ml_per_s
+async def run_dispense(dropper: int, amount_ml: float) -> dict[str, Any]:
+    rig_controller._ensure_available()
+
+    dropper_index = dropper - 1
+    valve_channel = int(RIG_DIAGNOSTIC_SERVO_CHANNELS[dropper_index])
+
+    await prepare_dispense(dropper_index)
+
+    valve_open_s = flow_calibration.open_duration_s(dropper_index, amount_ml)
     sends = 1
     dispensed_amount_ml = amount_ml
 
-    rig_controller.set_channel_immediate(valve_channel, RIG_OPEN_ANGLE)
-    await broadcast_state()
-    await sleep_non_negative(valve_open_s)
-
-    rig_controller.set_channel_immediate(valve_channel, RIG_CLOSED_ANGLE)
+    await open_valve_for(valve_channel, valve_open_s)
+    await flow_calibration.record_draw(dropper_index, valve_open_s, amount_ml)
     if dropper == 3:
-        enable_volume_queries_for_seconds(10.0)
+        volume_estimator.enable_queries_for_seconds(10.0)
     await broadcast_state()
-    await sleep_non_negative(AUTOMATION_DISPENSE_POST_CLOSE_WAIT_S)
+    with trace_span("post_close_wait"):
+        await sleep_non_negative(AUTOMATION_DISPENSE_POST_CLOSE_WAIT_S)
 
     return {
         "dropper": dropper,
+        "mode": "open_loop",
         "sends": sends,
         "requestedAmountMl": round(amount_ml, 3),
         "dispensedAmountMl": round(dispensed_amount_ml, 3),
     }
 
 
+async def run_closed_loop_dispense(dropper: int, amount_ml: float) -> dict[str, Any]:
+    rig_controller._ensure_available()
+
+    with trace_span("volume_measure", phase="baseline"):
+        baseline_ml = await volume_estimator.measure(AUTOMATION_CLOSED_LOOP_FRAME_TIMEOUT_S)
+    if baseline_ml is None:
+        logging.warning("closed-loop dispense has no volume reading; falling back to open loop")
+        result = await run_dispense(dropper, amount_ml)
+        result["fallback"] = "volume_unavailable"
+        return result
+
+    dropper_index = dropper - 1
+    valve_channel = int(RIG_DIAGNOSTIC_SERVO_CHANNELS[dropper_index])
+
+    await prepare_dispense(dropper_index)
+
+    sends = 0
+    dispensed_amount_ml = 0.0
+    stop_reason = "max_pulses"
+    while sends < AUTOMATION_CLOSED_LOOP_MAX_PULSES:
+        remaining_ml = amount_ml - dispensed_amount_ml
+        if remaining_ml <= AUTOMATION_CLOSED_LOOP_TOLERANCE_ML:
+            stop_reason = "target_reached"
+            break
+
+        pulse_s = max(
+            AUTOMATION_CLOSED_LOOP_MIN_PULSE_S,
+            flow_calibration.open_duration_s(
+                dropper_index,
+                remaining_ml * AUTOMATION_CLOSED_LOOP_PULSE_FRACTION,
+            ),
+        )
+        await open_valve_for(valve_channel, pulse_s)
+        sends += 1
+        await broadcast_state()
+        with trace_span("settle"):
+            await sleep_non_negative(AUTOMATION_CLOSED_LOOP_SETTLE_S)
+
+        with trace_span("volume_measure", phase="pulse", pulse=sends):
+            measured_ml = await volume_estimator.measure(AUTOMATION_CLOSED_LOOP_FRAME_TIMEOUT_S)
+        if measured_ml is None:
+            # Stop rather than keep pouring blind; under-dispensing is recoverable.
+            await flow_calibration.record_draw(
+                dropper_index,
+                pulse_s,
+                pulse_s * flow_calibration.flow_ml_per_s(dropper_index),
+            )
+            stop_reason = "volume_unavailable"
+            break
+
+        pulse_ml = (measured_ml - baseline_ml) - dispensed_amount_ml
+        dispensed_amount_ml = measured_ml - baseline_ml
+        await flow_calibration.record_measured(dropper_index, pulse_s, pulse_ml)
+    else:
+        if amount_ml - dispensed_amount_ml <= AUTOMATION_CLOSED_LOOP_TOLERANCE_ML:
+            stop_reason = "target_reached"
+
+    return {
+        "dropper": dropper,
+        "mode": "closed_loop",
+        "sends": sends,
+        "stopReason": stop_reason,
+        "requestedAmountMl": round(amount_ml, 3),
+        "dispensedAmountMl": round(dispensed_amount_ml, 3),
+        "baselineVolumeMl": round(baseline_ml, 3),
+        "flowMlPerS": round(flow_calibration.flow_ml_per_s(dropper_index), 3),
+    }
+
+
 async def run_cleanup(move_ms: int) -> int:
     xarm_controller._ensure_available()
 
     step_delay_s = move_ms / 1000.0
     expected_servo_count = len(XARM_SERVO_IDS)
 
-    for step in AUTOMATION_CLEANUP_SEQUENCE_DEG:
+    for step_index, step in enumerate(AUTOMATION_CLEANUP_SEQUENCE_DEG):
         if len(step) != expected_servo_count:
             raise RuntimeError("cleanup_step_invalid")
 
@@ -561,14 +875,16 @@ async def run_cleanup(move_ms: int) -> int:
             servo_id: float(step[servo_index])
             for servo_index, servo_id in enumerate(XARM_SERVO_IDS)
         }
-        await xarm_controller.set_many(targets, move_ms)
-        await broadcast_state()
-        await sleep_non_negative(step_delay_s)
+        with trace_span("cleanup_step", step=step_index):
+            await xarm_controller.set_many(targets, move_ms)
+            await broadcast_state()
+            with trace_span("step_wait"):
+                await sleep_non_negative(step_delay_s)
 
     return len(AUTOMATION_CLEANUP_SEQUENCE_DEG)
 
 
-async def handle_xarm_scan(websocket: Any) -> None:
+async def handle_xarm_scan(websocket: Any, _params: dict[str, Any]) -> None:
     try:
         await xarm_controller.scan()
     except Exception as exc:
@@ -587,24 +903,69 @@ async def handle_xarm_scan(websocket: Any) -> None:
     await broadcast_state()
 
 
-async def handle_xarm_set(websocket: Any, data: dict[str, Any]) -> None:
-    servo_id = data.get("id")
-    angle = data.get("angle", data.get("position"))
+async def send_xarm_set_ack(
+    websocket: Any,
+    servo_id: int,
+    target_angle_deg: float,
+    duration: int,
+    requested_angle_deg: float,
+    superseded: bool,
+) -> None:
+    await send_json(
+        websocket,
+        {
+            "type": "ack",
+            "subsystem": "xarm",
+            "action": "set",
+            "id": servo_id,
+            "angle": target_angle_deg,
+            # Keep legacy key with degree units for older clients.
+            "position": target_angle_deg,
+            "moveMs": duration,
+            "requestedAngle": requested_angle_deg,
+            "superseded": superseded,
+        },
+    )
+
 
+async def finish_xarm_set_latest(websocket: Any, servo_id: int, angle: float, move_ms: int) -> None:
     try:
-        if (
-            isinstance(servo_id, bool)
-            or not isinstance(servo_id, int)
-            or isinstance(angle, bool)
-            or not isinstance(angle, (int, float))
-        ):
-            raise ValueError("invalid_payload")
+        target_angle_deg, duration, superseded = await xarm_controller.set_position_latest(
+            servo_id,
+            angle,
+            move_ms,
+        )
+    except ValueError as exc:
+        await send_error(websocket, str(exc))
+        return
+    except Exception as exc:
+        logging.exception("xarm set failed id=%s", servo_id)
+        await send_error(websocket, f"set_failed:{exc}")
+        return
 
-        move_ms = parse_xarm_move_ms(data.get("moveMs"))
-        wait = parse_bool(data.get("wait"), default=False)
+    await send_xarm_set_ack(websocket, servo_id, target_angle_deg, duration, angle, superseded)
+    # Coalesced requests share one bus write; only the request that was written triggers a state broadcast.
+    if not superseded:
+        await broadcast_state()
+
+
+async def handle_xarm_set(websocket: Any, params: dict[str, Any]) -> None:
+    servo_id = params["id"]
+    angle = params["angle"]
+    move_ms = params["moveMs"]
+    wait = params["wait"]
+
+    try:
+        if not wait:
+            # Slider streams: return to the receive loop so newer targets can replace this one while it waits for the bus.
+            xarm_controller._ensure_available()
+            if servo_id not in XARM_SERVO_IDS:
+                raise ValueError("invalid_id")
+            spawn_command_task(finish_xarm_set_latest(websocket, servo_id, angle, move_ms))
+            return
         target_angle_deg, duration = await xarm_controller.set_position(
             servo_id,
-            float(angle),
+            angle,
             move_ms,
             wait=wait,
         )
@@ -616,27 +977,14 @@ async def handle_xarm_set(websocket: Any, data: dict[str, Any]) -> None:
         await send_error(websocket, f"set_failed:{exc}")
         return
 
-    await send_json(
-        websocket,
-        {
-            "type": "ack",
-            "subsystem": "xarm",
-            "action": "set",
-            "id": servo_id,
-            "angle": target_angle_deg,
-            # Keep legacy key with degree units for older clients.
-            "position": target_angle_deg,
-            "moveMs": duration,
-        },
-    )
+    await send_xarm_set_ack(websocket, servo_id, target_angle_deg, duration, angle, False)
     await broadcast_state()
 
 
-async def handle_xarm_set_many(websocket: Any, data: dict[str, Any]) -> None:
+async def handle_xarm_set_many(websocket: Any, params: dict[str, Any]) -> None:
+    targets = params["targets"]
     try:
-        targets = parse_xarm_targets(data.get("targets"))
-        move_ms = parse_xarm_move_ms(data.get("moveMs"))
-        duration = await xarm_controller.set_many(targets, move_ms)
+        duration = await xarm_controller.set_many(targets, params["moveMs"])
     except ValueError as exc:
         await send_error(websocket, str(exc))
         return
@@ -658,10 +1006,9 @@ async def handle_xarm_set_many(websocket: Any, data: dict[str, Any]) -> None:
     await broadcast_state()
 
 
-async def handle_xarm_recenter(websocket: Any, data: dict[str, Any]) -> None:
+async def handle_xarm_recenter(websocket: Any, params: dict[str, Any]) -> None:
     try:
-        move_ms = parse_xarm_move_ms(data.get("moveMs"))
-        duration = await xarm_controller.recenter(move_ms)
+        duration = await xarm_controller.recenter(params["moveMs"])
     except ValueError as exc:
         await send_error(websocket, str(exc))
         return
@@ -682,15 +1029,17 @@ async def handle_xarm_recenter(websocket: Any, data: dict[str, Any]) -> None:
     await broadcast_state()
 
 
-async def handle_rig_set(websocket: Any, data: dict[str, Any]) -> None:
+async def handle_rig_set(websocket: Any, params: dict[str, Any]) -> None:
     global rig_base_servo_task
     global rig_diagnostic_task
 
     try:
         rig_controller._ensure_available()
-        channel = parse_rig_channel(data.get("channel"))
-        angle = parse_rig_angle(data.get("angle"))
-        target = rig_controller.clamp_angle_for_channel(channel, angle)
+        channel = params["channel"]
+        target = rig_controller.clamp_angle_for_channel(channel, params["angle"])
+        if channel != RIG_BASE_ROTATION_CHANNEL and target != RIG_CLOSED_ANGLE:
+            # Closing a valve stays allowed while an alarm holds the interlock; opening one does not.
+            ensure_no_alarm_interlock()
     except ValueError as exc:
         await send_error(websocket, str(exc))
         return
@@ -702,18 +1051,23 @@ async def handle_rig_set(websocket: Any, data: dict[str, Any]) -> None:
         rig_diagnostic_task.cancel()
     rig_diagnostic_task = None
 
-    try:
-        if channel == RIG_BASE_ROTATION_CHANNEL:
-            if rig_base_servo_task and not rig_base_servo_task.done():
-                rig_base_servo_task.cancel()
-            rig_base_servo_task = asyncio.create_task(run_rig_base_move(target))
-        else:
-            rig_controller.set_channel_immediate(channel, target)
-    except Exception as exc:
-        logging.exception("rig set failed channel=%s", channel)
-        await send_error(websocket, f"rig_set_failed:{exc}")
+    if channel != RIG_BASE_ROTATION_CHANNEL:
+        spawn_command_task(finish_rig_set_latest(websocket, channel, target))
         return
 
+    if rig_base_servo_task and not rig_base_servo_task.done():
+        rig_base_servo_task.cancel()
+    rig_base_servo_task = asyncio.create_task(run_rig_base_move(target))
+    await send_rig_set_ack(websocket, channel, target, target, False)
+
+
+async def send_rig_set_ack(
+    websocket: Any,
+    channel: int,
+    applied: float,
+    requested: float,
+    superseded: bool,
+) -> None:
     await send_json(
         websocket,
         {
@@ -721,18 +1075,31 @@ async def handle_rig_set(websocket: Any, data: dict[str, Any]) -> None:
             "subsystem": "rig",
             "action": "set",
             "channel": channel,
-            "angle": target,
+            "angle": applied,
+            "requestedAngle": requested,
+            "superseded": superseded,
         },
     )
 
 
-async def handle_rig_stir(websocket: Any, data: dict[str, Any]) -> None:
+async def finish_rig_set_latest(websocket: Any, channel: int, target: float) -> None:
+    try:
+        applied, superseded = await rig_controller.set_channel_latest(channel, target)
+    except Exception as exc:
+        logging.exception("rig set failed channel=%s", channel)
+        await send_error(websocket, f"rig_set_failed:{exc}")
+        return
+    await send_rig_set_ack(websocket, channel, applied, target, superseded)
+
+
+async def handle_rig_stir(websocket: Any, params: dict[str, Any]) -> None:
     global rig_stirrer_task
     global rig_diagnostic_task
 
+    duration = params["duration"]
     try:
         rig_controller._ensure_available()
-        duration = parse_stir_duration(data.get("duration"))
+        ensure_no_alarm_interlock()
     except ValueError as exc:
         await send_error(websocket, str(exc))
         return
@@ -759,14 +1126,15 @@ async def handle_rig_stir(websocket: Any, data: dict[str, Any]) -> None:
     )
 
 
-async def handle_rig_diagnostic(websocket: Any, data: dict[str, Any]) -> None:
+async def handle_rig_diagnostic(websocket: Any, params: dict[str, Any]) -> None:
     global rig_base_servo_task
     global rig_stirrer_task
     global rig_diagnostic_task
 
+    base_to_valve_delay_s = params["baseToValveDelayS"]
     try:
         rig_controller._ensure_available()
-        base_to_valve_delay_s = parse_base_to_valve_delay(data.get("baseToValveDelayS"))
+        ensure_no_alarm_interlock()
     except ValueError as exc:
         await send_error(websocket, str(exc))
         return
@@ -784,7 +1152,13 @@ async def handle_rig_diagnostic(websocket: Any, data: dict[str, Any]) -> None:
 
     if rig_diagnostic_task and not rig_diagnostic_task.done():
         rig_diagnostic_task.cancel()
-    rig_diagnostic_task = asyncio.create_task(run_rig_diagnostic(websocket, base_to_valve_delay_s))
+    rig_diagnostic_task = asyncio.create_task(
+        run_traced(
+            "rig.diagnostic",
+            run_rig_diagnostic(websocket, base_to_valve_delay_s),
+            baseToValveDelayS=base_to_valve_delay_s,
+        )
+    )
 
     await send_json(
         websocket,
@@ -797,14 +1171,16 @@ async def handle_rig_diagnostic(websocket: Any, data: dict[str, Any]) -> None:
     )
 
 
-async def handle_automation_dispense(websocket: Any, data: dict[str, Any]) -> None:
+async def handle_automation_dispense(websocket: Any, params: dict[str, Any]) -> None:
     global rig_base_servo_task
     global rig_diagnostic_task
 
+    dropper = params["dropper"]
+    amount_ml = params["amountMl"]
+    mode = params["mode"]
     try:
         rig_controller._ensure_available()
-        dropper = parse_dropper_number(data.get("dropper"))
-        amount_ml = parse_dispense_amount_ml(data.get("amountMl", data.get("amount")))
+        ensure_no_alarm_interlock()
     except ValueError as exc:
         await send_error(websocket, str(exc))
         return
@@ -820,28 +1196,39 @@ async def handle_automation_dispense(websocket: Any, data: dict[str, Any]) -> No
         rig_base_servo_task.cancel()
     rig_base_servo_task = None
 
+    job_id = next_job_id("dispense")
     queued_at = time.monotonic()
     try:
-        async with automation_lock:
-            queued_wait_s = time.monotonic() - queued_at
-            started_at = time.monotonic()
-            logging.info(
-                "automation dispense start dropper=%s amount_ml=%.3f queued_wait_s=%.3f",
-                dropper,
-                amount_ml,
-                queued_wait_s,
-            )
-            result = await run_dispense(dropper, amount_ml)
-            run_s = time.monotonic() - started_at
-            logging.info(
-                "automation dispense done dropper=%s amount_ml=%.3f run_s=%.3f",
-                dropper,
-                amount_ml,
-                run_s,
-            )
+        with trace_span(
+            "automation.dispense", root=True, jobId=job_id, dropper=dropper, amountMl=amount_ml, mode=mode
+        ):
+            async with traced_lock(automation_lock):
+                queued_wait_s = time.monotonic() - queued_at
+                started_at = time.monotonic()
+                logging.info(
+                    "automation dispense start job=%s dropper=%s amount_ml=%.3f mode=%s queued_wait_s=%.3f",
+                    job_id,
+                    dropper,
+                    amount_ml,
+                    mode,
+                    queued_wait_s,
+                )
+                with clip_capture(job_id, "dispense", {"dropper": dropper, "amountMl": amount_ml, "mode": mode}):
+                    if mode == "closed_loop":
+                        result = await run_closed_loop_dispense(dropper, amount_ml)
+                    else:
+                        result = await run_dispense(dropper, amount_ml)
+                run_s = time.monotonic() - started_at
+                logging.info(
+                    "automation dispense done job=%s dropper=%s amount_ml=%.3f run_s=%.3f",
+                    job_id,
+                    dropper,
+                    amount_ml,
+                    run_s,
+                )
     except Exception as exc:
-        logging.exception("automation dispense failed dropper=%s amount_ml=%s", dropper, amount_ml)
-        await send_error(websocket, f"dispense_failed:{exc}")
+        logging.exception("automation dispense failed job=%s dropper=%s amount_ml=%s", job_id, dropper, amount_ml)
+        await send_error(websocket, f"dispense_failed:{exc}", jobId=job_id)
         return
 
     await send_json(
@@ -850,18 +1237,20 @@ async def handle_automation_dispense(websocket: Any, data: dict[str, Any]) -> No
             "type": "ack",
             "subsystem": "automation",
             "action": "dispense",
+            "jobId": job_id,
             **result,
         },
     )
 
 
-async def handle_automation_stir(websocket: Any, data: dict[str, Any]) -> None:
+async def handle_automation_stir(websocket: Any, params: dict[str, Any]) -> None:
     global rig_stirrer_task
     global rig_diagnostic_task
 
+    duration_s = params["durationS"]
     try:
         rig_controller._ensure_available()
-        duration_s = parse_automation_stir_duration_s(data.get("durationS", data.get("duration")))
+        ensure_no_alarm_interlock()
     except ValueError as exc:
         await send_error(websocket, str(exc))
         return
@@ -879,21 +1268,22 @@ async def handle_automation_stir(websocket: Any, data: dict[str, Any]) -> None:
 
     queued_at = time.monotonic()
     try:
-        async with automation_lock:
-            queued_wait_s = time.monotonic() - queued_at
-            started_at = time.monotonic()
-            logging.info(
-                "automation stir start duration_s=%.3f queued_wait_s=%.3f",
-                duration_s,
-                queued_wait_s,
-            )
-            await run_rig_stirrer(duration_s)
-            run_s = time.monotonic() - started_at
-            logging.info(
-                "automation stir done duration_s=%.3f run_s=%.3f",
-                duration_s,
-                run_s,
-            )
+        with trace_span("automation.stir", root=True, durationS=duration_s):
+            async with traced_lock(automation_lock):
+                queued_wait_s = time.monotonic() - queued_at
+                started_at = time.monotonic()
+                logging.info(
+                    "automation stir start duration_s=%.3f queued_wait_s=%.3f",
+                    duration_s,
+                    queued_wait_s,
+                )
+                await run_rig_stirrer(duration_s)
+                run_s = time.monotonic() - started_at
+                logging.info(
+                    "automation stir done duration_s=%.3f run_s=%.3f",
+                    duration_s,
+                    run_s,
+                )
     except Exception as exc:
         logging.exception("automation stir failed duration_s=%s", duration_s)
         await send_error(websocket, f"stir_failed:{exc}")
@@ -910,34 +1300,34 @@ async def handle_automation_stir(websocket: Any, data: dict[str, Any]) -> None:
     )
 
 
-async def handle_automation_cleanup(websocket: Any, data: dict[str, Any]) -> None:
-    try:
-        move_ms = parse_xarm_move_ms(data.get("moveMs"))
-    except ValueError as exc:
-        await send_error(websocket, str(exc))
-        return
-
+async def handle_automation_cleanup(websocket: Any, params: dict[str, Any]) -> None:
+    move_ms = params["moveMs"]
+    job_id = next_job_id("cleanup")
     queued_at = time.monotonic()
     try:
-        async with automation_lock:
-            queued_wait_s = time.monotonic() - queued_at
-            started_at = time.monotonic()
-            logging.info(
-                "automation cleanup start move_ms=%s queued_wait_s=%.3f",
-                move_ms,
-                queued_wait_s,
-            )
-            steps = await run_cleanup(move_ms)
-            run_s = time.monotonic() - started_at
-            logging.info(
-                "automation cleanup done move_ms=%s steps=%s run_s=%.3f",
-                move_ms,
-                steps,
-                run_s,
-            )
+        with trace_span("automation.cleanup", root=True, jobId=job_id, moveMs=move_ms):
+            async with traced_lock(automation_lock):
+                queued_wait_s = time.monotonic() - queued_at
+                started_at = time.monotonic()
+                logging.info(
+                    "automation cleanup start job=%s move_ms=%s queued_wait_s=%.3f",
+                    job_id,
+                    move_ms,
+                    queued_wait_s,
+                )
+                with clip_capture(job_id, "cleanup", {"moveMs": move_ms}):
+                    steps = await run_cleanup(move_ms)
+                run_s = time.monotonic() - started_at
+                logging.info(
+                    "automation cleanup done job=%s move_ms=%s steps=%s run_s=%.3f",
+                    job_id,
+                    move_ms,
+                    steps,
+                    run_s,
+                )
     except Exception as exc:
-        logging.exception("automation cleanup failed move_ms=%s", move_ms)
-        await send_error(websocket, f"cleanup_failed:{exc}")
+        logging.exception("automation cleanup failed job=%s move_ms=%s", job_id, move_ms)
+        await send_error(websocket, f"cleanup_failed:{exc}", jobId=job_id)
         return
 
     await send_json(
@@ -946,133 +1336,171 @@ async def handle_automation_cleanup(websocket: Any, data: dict[str, Any]) -> Non
             "type": "ack",
             "subsystem": "automation",
             "action": "cleanup",
+            "jobId": job_id,
             "steps": steps,
             "moveMs": move_ms,
         },
     )
 
 
-async def handle_thermal_mjpeg(request: Any) -> Any:
-    if aiohttp_web is None:
-        return None
+async def handle_calibration_record(websocket: Any, params: dict[str, Any]) -> None:
+    dropper = params["dropper"]
+    await flow_calibration.record_measured(dropper - 1, params["openS"], params["deltaMl"])
+    await send_json(
+        websocket,
+        {
+            "type": "ack",
+            "subsystem": "calibration",
+            "action": "record",
+            "dropper": dropper,
+            "flowMlPerS": round(flow_calibration.flow_ml_per_s(dropper - 1), 3),
+        },
+    )
+    await broadcast_state()
 
-    if not thermal_controller.available:
-        return aiohttp_web.Response(
-            status=503,
-            text=f"thermal_unavailable:{thermal_controller.error}",
-        )
 
-    response = aiohttp_web.StreamResponse(
-        status=200,
-        headers={
-            "Content-Type": "multipart/x-mixed-replace; boundary=frame",
-            "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
-            "Pragma": "no-cache",
-            "Connection": "close",
-            "Access-Control-Allow-Origin": "*",
+async def handle_calibration_refill(websocket: Any, params: dict[str, Any]) -> None:
+    dropper = params["dropper"]
+    await flow_calibration.record_refill(dropper - 1, params["volumeMl"])
+    await send_json(
+        websocket,
+        {
+            "type": "ack",
+            "subsystem": "calibration",
+            "action": "refill",
+            "dropper": dropper,
+            "headMl": round(flow_calibration.models[dropper - 1].head_ml, 1),
         },
     )
-    await response.prepare(request)
+    await broadcast_state()
 
-    last_seen_frame_id = 0
+
+async def handle_session_record_start(websocket: Any, _params: dict[str, Any]) -> None:
     try:
-        while True:
-            snapshot = await thermal_controller.wait_for_frame(last_seen_frame_id, timeout_s=5.0)
-            if snapshot is None:
-                await response.write(
-                    b"--frame\r\n"
-                    b"Content-Type: text/plain\r\n"
-                    b"\r\n"
-                    b"waiting_for_thermal_frame\r\n"
-                )
-                continue
-
-            frame_id, jpeg, min_temp, max_temp, updated_ms, _fps = snapshot
-            part_headers = (
-                "--frame\r\n"
-                "Content-Type: image/jpeg\r\n"
-                f"Content-Length: {len(jpeg)}\r\n"
-                f"X-Max-Temp-C: {max_temp:.2f}\r\n"
-                f"X-Min-Temp-C: {min_temp:.2f}\r\n"
-                f"X-Frame-Id: {frame_id}\r\n"
-                f"X-Updated-At-Ms: {updated_ms if updated_ms is not None else 0}\r\n"
-                "\r\n"
-            ).encode("ascii")
-            await response.write(part_headers)
-            await response.write(jpeg)
-            await response.write(b"\r\n")
-            last_seen_frame_id = frame_id
-    except (asyncio.CancelledError, ConnectionResetError, BrokenPipeError):
-        pass
-    return response
+        path = await session_recorder.start()
+    except Exception as exc:
+        await send_error(websocket, f"session_start_failed:{exc}")
+        return
+    await send_json(websocket, {"type": "ack", "subsystem": "session", "action": "start", "path": path})
+
 
+async def handle_session_record_stop(websocket: Any, _params: dict[str, Any]) -> None:
+    path = await session_recorder.stop()
+    await send_json(
+        websocket,
+        {"type": "ack", "subsystem": "session", "action": "stop", "path": path, **session_recorder.state_payload()},
+    )
+
+
+async def handle_media_subscribe(websocket: Any, params: dict[str, Any]) -> None:
+    stream = params["stream"]
+    max_fps = params["maxFps"]
+    stop_media_streams(websocket, (stream,))
+    limit_socket_send_buffer(websocket)
+    await send_json(
+        websocket,
+        {"type": "ack", "subsystem": "media", "action": "subscribe", "stream": stream, "maxFps": max_fps},
+    )
+    media_subscriptions.setdefault(websocket, {})[stream] = asyncio.create_task(
+        stream_media(websocket, stream, max_fps)
+    )
+
+
+async def handle_media_unsubscribe(websocket: Any, params: dict[str, Any]) -> None:
+    stream = params["stream"]
+    stop_media_streams(websocket, (stream,))
+    await send_json(websocket, {"type": "ack", "subsystem": "media", "action": "unsubscribe", "stream": stream})
+
+
+async def handle_loop_profile(websocket: Any, params: dict[str, Any]) -> None:
+    duration_s = params["durationS"]
+    try:
+        profile = loop_monitor.start_profile(duration_s)
+    except ValueError as exc:
+        await send_error(websocket, str(exc))
+        return
+    await send_json(
+        websocket,
+        {"type": "ack", "subsystem": "loop", "action": "profile_start", "durationS": duration_s},
+    )
+    await broadcast_state()
+    spawn_command_task(finish_loop_profile(websocket, profile))
+
+
+async def finish_loop_profile(websocket: Any, profile: Awaitable[dict[str, Any]]) -> None:
+    result = await profile
+    await send_json(websocket, {"type": "ack", "subsystem": "loop", "action": "profile", **result})
+    await broadcast_state()
 
-async def handle_thermal_json(_request: Any) -> Any:
+
+async def handle_loop_json(_request: Any) -> Any:
     if aiohttp_web is None:
         return None
-    payload = thermal_controller.state_payload()
-    return aiohttp_web.json_response(payload)
+    return aiohttp_web.json_response(loop_monitor.report_payload())
 
 
-async def handle_webcam_mjpeg(request: Any) -> Any:
+async def handle_trace_json(_request: Any) -> Any:
     if aiohttp_web is None:
         return None
+    return aiohttp_web.json_response(chrome_trace_payload())
 
-    if not webcam_controller.available and webcam_controller.latest_jpeg is None:
-        return aiohttp_web.Response(
-            status=503,
-            text=f"webcam_unavailable:{webcam_controller.error}",
-        )
 
-    response = aiohttp_web.StreamResponse(
-        status=200,
-        headers={
-            "Content-Type": "multipart/x-mixed-replace; boundary=frame",
-            "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
-            "Pragma": "no-cache",
-            "Connection": "close",
-            "Access-Control-Allow-Origin": "*",
-        },
+async def handle_executors_json(_request: Any) -> Any:
+    if aiohttp_web is None:
+        return None
+    return aiohttp_web.json_response(
+        {
+            "executors": executors_payload(),
+            "mediaEncoder": media_encoder.state_payload(),
+            "mediaProcess": None if media_process is None else media_process.state_payload(),
+            "compression": compression_stats.state_payload(),
+            "telemetry": telemetry_recorder.state_payload(),
+            "session": session_recorder.state_payload(),
+        }
     )
-    await response.prepare(request)
 
-    last_seen_frame_id = 0
-    try:
-        while True:
-            snapshot = await webcam_controller.wait_for_frame(last_seen_frame_id, timeout_s=5.0)
-            if snapshot is None:
-                await response.write(
-                    b"--frame\r\n"
-                    b"Content-Type: text/plain\r\n"
-                    b"\r\n"
-                    b"waiting_for_webcam_frame\r\n"
-                )
-                continue
-
-            frame_id, jpeg, updated_ms, fps = snapshot
-            fps_value = fps if fps is not None else 0.0
-            part_headers = (
-                "--frame\r\n"
-                "Content-Type: image/jpeg\r\n"
-                f"Content-Length: {len(jpeg)}\r\n"
-                f"X-Frame-Id: {frame_id}\r\n"
-                f"X-Updated-At-Ms: {updated_ms if updated_ms is not None else 0}\r\n"
-                f"X-FPS: {fps_value:.2f}\r\n"
-                "\r\n"
-            ).encode("ascii")
-            await response.write(part_headers)
-            await response.write(jpeg)
-            await response.write(b"\r\n")
-            last_seen_frame_id = frame_id
-    except (asyncio.CancelledError, ConnectionResetError, BrokenPipeError):
-        pass
-    return response
+
+async def handle_telemetry_json(_request: Any) -> Any:
+    if aiohttp_web is None:
+        return None
+    runs = await telemetry_executor.run(list_runs)
+    return aiohttp_web.json_response({"recorder": telemetry_recorder.state_payload(), "runs": runs})
+
+
+def read_telemetry_range(
+    run: str, start: float | None, end: float | None, channels: list[str] | None
+) -> dict[str, Any]:
+    reader = TelemetryReader(run_path(run))
+    columns = reader.read_range(start, end, channels)
+    rows = len(columns["t"])
+    # Large ranges are decimated to an even stride so a browser chart stays responsive.
+    stride = max(1, math.ceil(rows / TELEMETRY_HTTP_MAX_ROWS))
+    payload: dict[str, Any] = {
+        "run": run,
+        "channels": list(reader.channels if channels is None else channels),
+        "rows": rows,
+        "stride": stride,
+    }
+    for name, values in columns.items():
+        sampled = values[::stride]
+        # NaN marks a sample where the device had no reading; JSON gets null instead.
+        payload[name] = [None if value != value else round(value, 3) for value in sampled.tolist()]
+    return payload
 
 
-async def handle_webcam_json(_request: Any) -> Any:
+async def handle_telemetry_range_json(request: Any) -> Any:
     if aiohttp_web is None:
         return None
-    payload = webcam_controller.state_payload()
+    query = request.query
+    try:
+        start = parse_query_number(query.get("start"), "invalid_time")
+        end = parse_query_number(query.get("end"), "invalid_time")
+        channels = [name for name in query.get("channels", "").split(",") if name] or None
+        payload = await telemetry_executor.run(read_telemetry_range, query.get("run", ""), start, end, channels)
+    except FileNotFoundError:
+        return aiohttp_web.json_response({"error": "run_not_found"}, status=404)
+    except ValueError as exc:
+        return aiohttp_web.json_response({"error": str(exc)}, status=400)
     return aiohttp_web.json_response(payload)
 
 
@@ -1082,97 +1510,239 @@ async def start_thermal_http_server() -> Any | None:
         return None
 
     app = aiohttp_web.Application()
-    app.router.add_get(THERMAL_STREAM_PATH, handle_thermal_mjpeg)
-    app.router.add_get("/thermal.json", handle_thermal_json)
-    app.router.add_get(WEBCAM_STREAM_PATH, handle_webcam_mjpeg)
-    app.router.add_get("/webcam.json", handle_webcam_json)
-
-    runner = aiohttp_web.AppRunner(app)
-    await runner.setup()
-    site = aiohttp_web.TCPSite(runner, THERMAL_HTTP_HOST, THERMAL_HTTP_PORT)
-    await site.start()
-    logging.info(
-        "media http server listening on %s:%s (%s, %s)",
-        THERMAL_HTTP_HOST,
-        THERMAL_HTTP_PORT,
-        THERMAL_STREAM_PATH,
-        WEBCAM_STREAM_PATH,
-    )
+    app.router.add_get("/executors.json", handle_executors_json)
+    app.router.add_get("/metrics", handle_metrics)
+    app.router.add_get("/trace.json", handle_trace_json)
+    app.router.add_get("/loop.json", handle_loop_json)
+    app.router.add_get("/telemetry.json", handle_telemetry_json)
+    app.router.add_get("/telemetry/range.json", handle_telemetry_range_json)
+    if SINGLE_PORT_ENABLED:
+        app.router.add_get(CONTROL_WS_PATH, handle_ws_request)
+        app.router.add_get("/", handle_ws_request)
+        if media_process is None:
+            thermal_controller.http_port = PORT
+            webcam_controller.http_port = PORT
+            add_media_routes(app, thermal_controller, webcam_controller)
+        else:
+            # Streams stay on the media process's port; websocket media subscriptions still come through here.
+            logging.info("media streams served by the media process on port %s", THERMAL_HTTP_PORT)
+        runner = await start_http_app(app, HOST, PORT, "control")
+        logging.info("control websocket at %s", CONTROL_WS_PATH)
+        return runner
+    if media_process is not None:
+        # The media process owns THERMAL_HTTP_PORT; only control endpoints are served here.
+        return await start_http_app(app, THERMAL_HTTP_HOST, CONTROL_HTTP_PORT, "control")
+
+    add_media_routes(app, thermal_controller, webcam_controller)
+    runner = await start_http_app(app, THERMAL_HTTP_HOST, THERMAL_HTTP_PORT, "media")
+    logging.info("media streams at %s and %s", THERMAL_STREAM_PATH, WEBCAM_STREAM_PATH)
     return runner
 
 
-async def handle_message(websocket: Any, message: str) -> None:
-    logging.info("recv %s", message)
-
-    try:
-        data = json.loads(message)
-    except json.JSONDecodeError:
-        await send_error(websocket, "invalid_json")
-        return
-
-    if not isinstance(data, dict):
-        await send_error(websocket, "invalid_payload")
-        return
-
-    command_type = data.get("type")
-
-    if command_type == "get_state":
-        await send_json(websocket, state_payload())
-        return
+async def handle_get_state(websocket: Any, _params: dict[str, Any]) -> None:
+    await send_json(websocket, state_payload())
 
-    if command_type in {"scan", "xarm_scan"}:
-        await handle_xarm_scan(websocket)
-        return
 
-    if command_type in {"set_many", "xarm_set_many"}:
-        await handle_xarm_set_many(websocket, data)
-        return
+def resolve_set_command(data: dict[str, Any]) -> CommandHandler | None:
+    if "id" in data:
+        return handle_xarm_set
+    if "channel" in data:
+        return handle_rig_set
+    return None
 
-    if command_type in {"recenter", "xarm_recenter"}:
-        await handle_xarm_recenter(websocket, data)
-        return
 
-    if command_type in {"set", "xarm_set"} and (
-        command_type == "xarm_set" or "id" in data
-    ):
-        await handle_xarm_set(websocket, data)
+def resolve_stir_command(data: dict[str, Any]) -> CommandHandler | None:
+    if "durationS" in data:
+        return handle_automation_stir
+    return handle_rig_stir
+
+
+COMMAND_HANDLERS: dict[str, CommandHandler] = {
+    "get_state": handle_get_state,
+    "scan": handle_xarm_scan,
+    "xarm_scan": handle_xarm_scan,
+    "set_many": handle_xarm_set_many,
+    "xarm_set_many": handle_xarm_set_many,
+    "recenter": handle_xarm_recenter,
+    "xarm_recenter": handle_xarm_recenter,
+    "xarm_set": handle_xarm_set,
+    "rig_set": handle_rig_set,
+    "dispense": handle_automation_dispense,
+    "automation_dispense": handle_automation_dispense,
+    "cleanup": handle_automation_cleanup,
+    "automation_cleanup": handle_automation_cleanup,
+    "automation_stir": handle_automation_stir,
+    "rig_stir": handle_rig_stir,
+    "diagnostic": handle_rig_diagnostic,
+    "rig_diagnostic": handle_rig_diagnostic,
+    "calibration_record": handle_calibration_record,
+    "calibration_refill": handle_calibration_refill,
+    "session_record_start": handle_session_record_start,
+    "session_record_stop": handle_session_record_stop,
+    "loop_profile": handle_loop_profile,
+    "media_subscribe": handle_media_subscribe,
+    "media_unsubscribe": handle_media_unsubscribe,
+}
+
+# Payload schema per handler: parameter name, payload keys in order of precedence (legacy aliases last) and the
+# parse_* validator. handle_message validates before dispatch, so handlers receive parsed values only.
+CommandField = tuple[str, tuple[str, ...], Callable[[Any], Any]]
+
+COMMAND_SCHEMAS: dict[CommandHandler, tuple[CommandField, ...]] = {
+    handle_xarm_set: (
+        ("id", ("id",), parse_xarm_servo_id),
+        ("angle", ("angle", "position"), parse_xarm_angle),
+        ("moveMs", ("moveMs",), parse_xarm_move_ms),
+        ("wait", ("wait",), parse_bool),
+    ),
+    handle_xarm_set_many: (
+        ("targets", ("targets",), parse_xarm_targets),
+        ("moveMs", ("moveMs",), parse_xarm_move_ms),
+    ),
+    handle_xarm_recenter: (("moveMs", ("moveMs",), parse_xarm_move_ms),),
+    handle_rig_set: (
+        ("channel", ("channel",), parse_rig_channel),
+        ("angle", ("angle",), parse_rig_angle),
+    ),
+    handle_rig_stir: (("duration", ("duration",), parse_stir_duration),),
+    handle_rig_diagnostic: (("baseToValveDelayS", ("baseToValveDelayS",), parse_base_to_valve_delay),),
+    handle_automation_dispense: (
+        ("dropper", ("dropper",), parse_dropper_number),
+        ("amountMl", ("amountMl", "amount"), parse_dispense_amount_ml),
+        ("mode", ("mode",), parse_dispense_mode),
+    ),
+    handle_automation_stir: (("durationS", ("durationS", "duration"), parse_automation_stir_duration_s),),
+    handle_automation_cleanup: (("moveMs", ("moveMs",), parse_xarm_move_ms),),
+    handle_calibration_record: (
+        ("dropper", ("dropper",), parse_dropper_number),
+        ("openS", ("openS",), parse_calibration_open_s),
+        ("deltaMl", ("deltaMl",), parse_dispense_amount_ml),
+    ),
+    handle_calibration_refill: (
+        ("dropper", ("dropper",), parse_dropper_number),
+        ("volumeMl", ("volumeMl",), parse_refill_volume_ml),
+    ),
+    handle_media_subscribe: (
+        ("stream", ("stream",), parse_media_stream),
+        ("maxFps", ("maxFps",), parse_max_fps),
+    ),
+    handle_media_unsubscribe: (("stream", ("stream",), parse_media_stream),),
+    handle_loop_profile: (("durationS", ("durationS",), parse_profile_duration_s),),
+}
+
+
+def validate_command(command_handler: CommandHandler, data: dict[str, Any]) -> dict[str, Any]:
+    params: dict[str, Any] = {}
+    for name, keys, parse in COMMAND_SCHEMAS.get(command_handler, ()):
+        raw = None
+        for key in keys:
+            if key in data:
+                raw = data[key]
+                break
+        params[name] = parse(raw)
+    return params
+
+
+# Legacy short names shared by two subsystems; the payload's keys pick the handler.
+AMBIGUOUS_COMMANDS: dict[str, Callable[[dict[str, Any]], CommandHandler | None]] = {
+    "set": resolve_set_command,
+    "stir": resolve_stir_command,
+}
+
+command_log_last_monotonic: dict[str, float] = {}
+command_log_suppressed: dict[str, int] = {}
+
+
+def log_command(log_key: str, message: str | bytes) -> None:
+    if not logging.getLogger().isEnabledFor(logging.INFO):
         return
-
-    if command_type in {"set", "rig_set"} and (
-        command_type == "rig_set" or "channel" in data
-    ):
-        await handle_rig_set(websocket, data)
+    now_monotonic = time.monotonic()
+    last_logged = command_log_last_monotonic.get(log_key)
+    if last_logged is not None and now_monotonic - last_logged < COMMAND_LOG_INTERVAL_S:
+        command_log_suppressed[log_key] = command_log_suppressed.get(log_key, 0) + 1
         return
+    command_log_last_monotonic[log_key] = now_monotonic
+    suppressed = command_log_suppressed.pop(log_key, 0)
+    if suppressed:
+        logging.info("recv %s (%s more %s suppressed)", message, suppressed, log_key)
+    else:
+        logging.info("recv %s", message)
+
+
+async def handle_message(websocket: Any, message: str | bytes) -> None:
+    if session_recorder.active:
+        session_recorder.record_command(websocket, message)
+    if isinstance(message, bytes) and client_formats.get(websocket) == WIRE_FORMAT_BINARY:
+        try:
+            data = decode_binary(message)
+        except (ValueError, TypeError):
+            log_command("invalid_binary", message)
+            await send_error(websocket, "invalid_binary")
+            return
+    else:
+        try:
+            data = decode_json(message)
+        except ValueError:
+            log_command("invalid_json", message)
+            await send_error(websocket, "invalid_json")
+            return
 
-    if command_type in {"dispense", "automation_dispense"}:
-        await handle_automation_dispense(websocket, data)
+    if not isinstance(data, dict):
+        log_command("invalid_payload", message)
+        await send_error(websocket, "invalid_payload")
         return
 
-    if command_type in {"cleanup", "automation_cleanup"}:
-        await handle_automation_cleanup(websocket, data)
+    command_type = data.get("type")
+    command_handler = None
+    if isinstance(command_type, str):
+        command_handler = COMMAND_HANDLERS.get(command_type)
+        if command_handler is None and command_type in AMBIGUOUS_COMMANDS:
+            command_handler = AMBIGUOUS_COMMANDS[command_type](data)
+
+    # Unknown types share one log key so arbitrary client strings cannot grow the rate-limit tables.
+    log_command(command_type if command_handler is not None else "unknown_command", message)
+    if command_handler is None:
+        await send_error(websocket, "unknown_command")
         return
+    started = time.perf_counter()
+    try:
+        try:
+            params = validate_command(command_handler, data)
+        except ValueError as exc:
+            await send_error(websocket, str(exc))
+            return
+        await command_handler(websocket, params)
+    finally:
+        command_seconds.labels(command_type).observe(time.perf_counter() - started)
 
-    if command_type in {"stir", "automation_stir"} and (
-        command_type == "automation_stir" or "durationS" in data
-    ):
-        await handle_automation_stir(websocket, data)
-        return
 
-    if command_type in {"stir", "rig_stir"}:
-        await handle_rig_stir(websocket, data)
-        return
+def select_subprotocol(_connection: Any, subprotocols: Sequence[str]) -> str | None:
+    # Unlike websockets' default, clients that offer no subprotocol are accepted and keep JSON text frames.
+    if BINARY_SUBPROTOCOL in subprotocols and binary_available():
+        return BINARY_SUBPROTOCOL
+    return None
 
-    if command_type in {"diagnostic", "rig_diagnostic"}:
-        await handle_rig_diagnostic(websocket, data)
-        return
 
-    await send_error(websocket, "unknown_command")
+async def handle_ws_request(request: Any) -> Any:
+    response = websocket_response(request)
+    if not response.can_prepare(request).ok:
+        return aiohttp_web.Response(status=426, text="websocket_upgrade_required")
+    await response.prepare(request)
+    await handler(AiohttpWebSocket(request, response))
+    return response
 
 
 async def handler(websocket: Any) -> None:
     clients.add(websocket)
     client_send_locks[websocket] = asyncio.Lock()
-    logging.info("client connected")
+    if getattr(websocket, "subprotocol", None) == BINARY_SUBPROTOCOL:
+        client_formats[websocket] = WIRE_FORMAT_BINARY
+    compressed = apply_client_compression_policy(websocket)
+    logging.info(
+        "client connected format=%s compressed=%s",
+        client_formats.get(websocket, WIRE_FORMAT_JSON),
+        compressed,
+    )
     await send_json(websocket, {"type": "info", "message": "connected"})
     await send_json(websocket, state_payload())
 
@@ -1182,24 +1752,72 @@ async def handler(websocket: Any) -> None:
     except websockets.ConnectionClosed:
         logging.info("client disconnected")
     finally:
+        stop_media_streams(websocket)
         clients.discard(websocket)
         client_send_locks.pop(websocket, None)
+        client_formats.pop(websocket, None)
 
 
-async def main() -> None:
-    global volume_estimation_task
-
-    logging.info("initializing controllers...")
-    initialize_anthropic_client()
-
-    thermal_controller.on_thermal_update = broadcast_thermal
-    webcam_controller.on_webcam_update = broadcast_webcam
-    await xarm_controller.capture_startup_centers()
+async def initialize_media() -> None:
+    if media_process is not None:
+        await media_process.start()
+        return
+    await asyncio.gather(thermal_controller.initialize(), webcam_controller.initialize())
+    if SESSION_REPLAY_PATH:
+        install_replay_devices(
+            SESSION_REPLAY_PATH,
+            SESSION_REPLAY_SPEED,
+            xarm_controller,
+            rig_controller,
+            thermal_controller,
+            webcam_controller,
+        )
+    media_encoder.start()
+    thermal_controller.encoder = media_encoder
+    webcam_controller.encoder = media_encoder
     await thermal_controller.start()
     await webcam_controller.start()
-    if anthropic_client is not None:
-        volume_estimation_task = asyncio.create_task(run_volume_estimation_loop())
-    thermal_http_runner = await start_thermal_http_server()
+
+
+async def initialize_volume() -> None:
+    # Importing the remote client SDK is as slow as cv2, so it happens on a worker thread too.
+    await media_executor.run(volume_estimator.initialize_client)
+    await volume_estimator.start()
+
+
+async def initialize_subsystem(name: str, initialize: Callable[[], Awaitable[None]]) -> None:
+    started = time.perf_counter()
+    try:
+        await initialize()
+    except Exception:
+        logging.exception("%s initialization failed", name)
+    logging.info("%s initialized in %.2fs", name, time.perf_counter() - started)
+    await broadcast_state()
+
+
+async def initialize_subsystems() -> None:
+    started = time.perf_counter()
+    subsystems: list[tuple[str, Callable[[], Awaitable[None]]]] = [
+        ("media", initialize_media),
+        ("volume", initialize_volume),
+    ]
+    if not SESSION_REPLAY_PATH:
+        # In replay the media step installs simulated arm and rig devices instead.
+        subsystems.append(("xarm", xarm_controller.initialize))
+        subsystems.append(("rig", rig_controller.initialize))
+    await asyncio.gather(*(initialize_subsystem(name, initialize) for name, initialize in subsystems))
+
+    if DEVICE_SUPERVISOR_ENABLED and not SESSION_REPLAY_PATH:
+        device_supervisor.add("xarm", xarm_controller, xarm_executor, xarm_present)
+        device_supervisor.add("rig", rig_controller, rig_executor, i2c_bus_present)
+        if media_process is None:
+            device_supervisor.add_media(thermal_controller, webcam_controller)
+        device_supervisor.on_change = broadcast_state
+        await device_supervisor.start()
+    if TELEMETRY_ENABLED:
+        await telemetry_recorder.start()
+    if SESSION_RECORD_ON_START:
+        await session_recorder.start()
     logging.info(
         "xarm available=%s online_ids=%s error=%s",
         xarm_controller.available,
@@ -1227,20 +1845,61 @@ async def main() -> None:
         THERMAL_HTTP_PORT,
         WEBCAM_STREAM_PATH,
     )
+    logging.info("startup finished in %.2fs", time.perf_counter() - started)
+
 
+async def main() -> None:
+    if LOOP_MONITOR_ENABLED:
+        await loop_monitor.start()
+    await telemetry_executor.run(flow_calibration.load)
+
+    thermal_controller.on_thermal_update = broadcast_thermal
+    thermal_controller.on_thermal_alarm = handle_thermal_alarm
+    webcam_controller.on_webcam_update = broadcast_webcam
+    volume_estimator.on_volume_update = broadcast_volume
+    thermal_http_runner = await start_thermal_http_server()
+    await clip_archiver.start()
+
+    # The port opens before any device is touched; controllers report `initializing` until their own
+    # startup (imports, device open, xArm scan) finishes, and all of them start at once.
+    startup_task: asyncio.Task | None = None
     try:
-        async with websockets.serve(handler, HOST, PORT):
+        compression_options: dict[str, Any] = {"compression": None}
+        if WS_COMPRESSION_ENABLED:
+            compression_options["extensions"] = build_compression_extensions()
+        # In single-port mode the aiohttp app already serves the control websocket on PORT.
+        websocket_server: Any = contextlib.nullcontext()
+        if not SINGLE_PORT_ENABLED or thermal_http_runner is None:
+            websocket_server = websockets.serve(
+                handler,
+                HOST,
+                PORT,
+                select_subprotocol=select_subprotocol,
+                **compression_options,
+            )
+        async with websocket_server:
             logging.info("websocket server listening on %s:%s", HOST, PORT)
+            logging.info("initializing controllers...")
+            startup_task = asyncio.create_task(initialize_subsystems())
             await asyncio.Future()
     finally:
-        if volume_estimation_task is not None and not volume_estimation_task.done():
-            volume_estimation_task.cancel()
-            try:
-                await volume_estimation_task
-            except asyncio.CancelledError:
-                pass
-            volume_estimation_task = None
-        await thermal_controller.stop()
-        await webcam_controller.stop()
+        if startup_task is not None and not startup_task.done():
+            startup_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await startup_task
+        await device_supervisor.stop()
+        await session_recorder.stop()
+        await telemetry_recorder.stop()
+        await clip_archiver.stop()
+        await loop_monitor.stop()
+        await volume_estimator.stop()
+        if media_process is not None:
+            await media_process.stop()
+        else:
+            await thermal_controller.stop()
+            await webcam_controller.stop()
+        media_encoder.stop()
+        flow_calibration.close()
         if thermal_http_runner is not None:
             await thermal_http_runner.cleanup()
+        shutdown_executors()
@@ -0,0 +1,495 @@
+import array
+import asyncio
+import collections
+import contextlib
+import importlib
+import itertools
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from typing import Any, Iterator
+
+import websockets
+
+from .codec import BINARY_SUBPROTOCOL, decode_binary
+from .constants import (
+    SESSION_DIRECTORY,
+    SESSION_FLUSH_INTERVAL_S,
+    SESSION_MAX_BYTES,
+    XARM_RAW_MAX,
+    XARM_RAW_MIN,
+)
+from .executors import session_executor, thermal_executor, webcam_executor, xarm_executor
+
+# A session bundle is one append-only file: magic "COLABSS1", u32 length, JSON header, then records of
+# u8 kind, f64 seconds since the session started, u32 length, payload. A torn final record is ignored.
+SESSION_FILE_MAGIC = b"COLABSS1"
+SESSION_FILE_HEADER = struct.Struct("<8sI")
+SESSION_RECORD_HEADER = struct.Struct("<BdI")
+# Command payloads start with the client number and whether the message was a binary frame.
+SESSION_COMMAND_HEADER = struct.Struct("<HB")
+SESSION_FILE_SUFFIX = ".session"
+
+RECORD_COMMAND = 1
+RECORD_THERMAL_FRAME = 2
+RECORD_WEBCAM_JPEG = 3
+RECORD_DEVICE_CALL = 4
+
+RECORDED_EXECUTORS = (xarm_executor, thermal_executor, webcam_executor)
+# Decoded webcam frames are ~1 MB each, so replay cycles through a bounded sample of the recording.
+REPLAY_WEBCAM_FRAMES = 64
+
+
+def encode_record(kind: int, offset_s: float, payload: bytes) -> bytes:
+    return SESSION_RECORD_HEADER.pack(kind, offset_s, len(payload)) + payload
+
+
+def encode_command(client: int, message: str | bytes) -> bytes:
+    if isinstance(message, bytes):
+        return SESSION_COMMAND_HEADER.pack(client, 1) + message
+    return SESSION_COMMAND_HEADER.pack(client, 0) + message.encode("utf-8")
+
+
+def encode_device_call(device: str, op: str, run_ms: float) -> bytes:
+    return json.dumps({"device": device, "op": op, "ms": round(run_ms, 3)}).encode("utf-8")
+
+
+class SessionFile:
+    # Runs on the session executor thread only.
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.fd: int | None = None
+
+    def open(self, header: dict[str, Any]) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_EXCL, 0o644)
+        encoded = json.dumps(header).encode("utf-8")
+        self.write(SESSION_FILE_HEADER.pack(SESSION_FILE_MAGIC, len(encoded)) + encoded)
+
+    def write(self, data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            written = os.write(self.fd, view)
+            view = view[written:]
+
+    def close(self) -> None:
+        if self.fd is None:
+            return
+        os.close(self.fd)
+        self.fd = None
+
+
+def read_session_header(path: str) -> dict[str, Any]:
+    with open(path, "rb") as handle:
+        magic, length = SESSION_FILE_HEADER.unpack(handle.read(SESSION_FILE_HEADER.size))
+        if magic != SESSION_FILE_MAGIC:
+            raise ValueError("session_file_invalid")
+        return json.loads(handle.read(length))
+
+
+def iter_session_records(path: str) -> Iterator[tuple[int, float, bytes]]:
+    with open(path, "rb") as handle:
+        magic, length = SESSION_FILE_HEADER.unpack(handle.read(SESSION_FILE_HEADER.size))
+        if magic != SESSION_FILE_MAGIC:
+            raise ValueError("session_file_invalid")
+        handle.seek(length, os.SEEK_CUR)
+        while True:
+            header = handle.read(SESSION_RECORD_HEADER.size)
+            if len(header) < SESSION_RECORD_HEADER.size:
+                return
+            kind, offset_s, size = SESSION_RECORD_HEADER.unpack(header)
+            payload = handle.read(size)
+            if len(payload) < size:
+                return
+            yield kind, offset_s, payload
+
+
+class TimedServo:
+    # Wraps a rig servo while recording so PCA9685 write times land in the bundle like executor calls do.
+    def __init__(self, servo: Any, recorder: "SessionRecorder") -> None:
+        self.servo = servo
+        self.recorder = recorder
+
+    @property
+    def angle(self) -> Any:
+        return self.servo.angle
+
+    @angle.setter
+    def angle(self, value: Any) -> None:
+        started = time.perf_counter()
+        self.servo.angle = value
+        self.recorder.record_device_call("rig", "angle", (time.perf_counter() - started) * 1000.0)
+
+
+class SessionRecorder:
+    def __init__(self, rig: Any, thermal: Any, webcam: Any) -> None:
+        self.rig = rig
+        self.thermal = thermal
+        self.webcam = webcam
+        self.lock = threading.Lock()
+        self.pending: list[bytes] = []
+        self.pending_bytes = 0
+        self.file: SessionFile | None = None
+        self.active = False
+        self.error: str | None = None
+        self.started_monotonic = 0.0
+        self.bytes_written = 0
+        self.records = 0
+        self.dropped = 0
+        self.client_ids: dict[int, int] = {}
+        self.flush_task: asyncio.Task | None = None
+        self.webcam_task: asyncio.Task | None = None
+        self.wrapped_servos: list[Any] | None = None
+
+    def _append(self, kind: int, payload: bytes) -> None:
+        if not self.active:
+            return
+        record = encode_record(kind, time.monotonic() - self.started_monotonic, payload)
+        with self.lock:
+            if self.bytes_written + self.pending_bytes + len(record) > SESSION_MAX_BYTES:
+                self.error = "session_size_limit"
+                self.dropped += 1
+                return
+            self.pending.append(record)
+            self.pending_bytes += len(record)
+            self.records += 1
+
+    def record_command(self, websocket: Any, message: str | bytes) -> None:
+        client = self.client_ids.setdefault(id(websocket), len(self.client_ids))
+        self._append(RECORD_COMMAND, encode_command(client, message))
+
+    def record_thermal_frame(self, frame: list[float]) -> None:
+        self._append(RECORD_THERMAL_FRAME, array.array("f", frame).tobytes())
+
+    def record_device_call(self, device: str, op: str, run_ms: float) -> None:
+        self._append(RECORD_DEVICE_CALL, encode_device_call(device, op, run_ms))
+
+    async def start(self) -> str:
+        if self.active:
+            return self.file.path
+        name = time.strftime("session-%Y%m%d-%H%M%S") + SESSION_FILE_SUFFIX
+        session_file = SessionFile(os.path.join(SESSION_DIRECTORY, name))
+        await session_executor.run(session_file.open, {"version": 1, "startedAt": time.time()})
+        self.file = session_file
+        self.error = None
+        self.bytes_written = 0
+        self.records = 0
+        self.dropped = 0
+        self.client_ids = {}
+        self.started_monotonic = time.monotonic()
+        self.active = True
+
+        for executor in RECORDED_EXECUTORS:
+            executor.observer = self.record_device_call
+        self.thermal.on_raw_frame = self.record_thermal_frame
+        if getattr(self.rig, "servos", None):
+            self.wrapped_servos = self.rig.servos
+            self.rig.servos = [TimedServo(servo, self) for servo in self.wrapped_servos]
+        self.webcam_task = asyncio.create_task(self._webcam_loop())
+        self.flush_task = asyncio.create_task(self._flush_loop())
+        logging.info("session recording to %s", session_file.path)
+        return session_file.path
+
+    async def stop(self) -> str | None:
+        if not self.active:
+            return None
+        self.active = False
+        for executor in RECORDED_EXECUTORS:
+            executor.observer = None
+        self.thermal.on_raw_frame = None
+        if self.wrapped_servos is not None:
+            # A rig reconnected while recording has fresh servos that were never wrapped.
+            if self.rig.servos and isinstance(self.rig.servos[0], TimedServo):
+                self.rig.servos = self.wrapped_servos
+            self.wrapped_servos = None
+        for task in (self.webcam_task, self.flush_task):
+            if task is not None and not task.done():
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+        await self._flush()
+        await session_executor.run(self.file.close)
+        logging.info("session recording stopped: %s records, %s bytes", self.records, self.bytes_written)
+        return self.file.path
+
+    async def _flush(self) -> None:
+        with self.lock:
+            pending = self.pending
+            self.pending = []
+            self.pending_bytes = 0
+        if not pending:
+            return
+        data = b"".join(pending)
+        try:
+            await session_executor.run(self.file.write, data)
+        except Exception as exc:
+            self.error = f"session_write_failed:{exc}"
+            logging.exception("session write failed")
+            return
+        with self.lock:
+            self.bytes_written += len(data)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(SESSION_FLUSH_INTERVAL_S)
+            await self._flush()
+
+    async def _webcam_loop(self) -> None:
+        last_frame_id = self.webcam.frame_counter
+        while True:
+            result = await self.webcam.wait_for_frame(last_frame_id, 1.0)
+            if result is None:
+                continue
+            last_frame_id = result[0]
+            self._append(RECORD_WEBCAM_JPEG, result[1])
+
+    def state_payload(self) -> dict[str, Any]:
+        return {
+            "active": self.active,
+            "error": self.error,
+            "path": None if self.file is None else self.file.path,
+            "records": self.records,
+            "bytes": self.bytes_written,
+            "dropped": self.dropped,
+        }
+
+
+class DeviceTimings:
+    # Cycles through the recorded durations of each (device, op) so replayed calls block like the hardware did.
+    def __init__(self, durations_ms: dict[tuple[str, str], list[float]], speed: float) -> None:
+        self.speed = speed
+        self.cycles = {key: itertools.cycle(values) for key, values in durations_ms.items() if values}
+        self.lock = threading.Lock()
+
+    def delay_s(self, device: str, op: str) -> float:
+        cycle = self.cycles.get((device, op))
+        if cycle is None:
+            return 0.0
+        with self.lock:
+            duration_ms = next(cycle)
+        return duration_ms / 1000.0 / self.speed
+
+    def sleep(self, device: str, op: str) -> None:
+        delay_s = self.delay_s(device, op)
+        if delay_s > 0:
+            time.sleep(delay_s)
+
+
+class SimulatedArm:
+    def __init__(self, timings: DeviceTimings) -> None:
+        self.timings = timings
+        self.positions: dict[int, int] = {}
+
+    def setPosition(self, servo_id: int, position: int, duration: int = 1000, wait: bool = False) -> None:
+        self.timings.sleep("xarm", "setPosition")
+        self.positions[servo_id] = position
+
+    def getPosition(self, servo_id: int) -> int:
+        self.timings.sleep("xarm", "getPosition")
+        return self.positions.get(servo_id, (XARM_RAW_MIN + XARM_RAW_MAX) // 2)
+
+
+class SimulatedServo:
+    def __init__(self, timings: DeviceTimings, angle: float) -> None:
+        self.timings = timings
+        self._angle = angle
+
+    @property
+    def angle(self) -> float:
+        return self._angle
+
+    @angle.setter
+    def angle(self, value: float) -> None:
+        self.timings.sleep("rig", "angle")
+        self._angle = value
+
+
+class SimulatedGpio:
+    def gpio_write(self, _handle: int, _gpio: int, _level: int) -> None:
+        return None
+
+
+class ReplayThermalSensor:
+    def __init__(self, timings: DeviceTimings, frames: list[list[float]]) -> None:
+        self.timings = timings
+        self.frames = itertools.cycle(frames)
+
+    def getFrame(self, buffer: list[float]) -> None:
+        self.timings.sleep("thermal", "_read_frame")
+        buffer[:] = next(self.frames)
+
+
+class ReplayCapture:
+    def __init__(self, timings: DeviceTimings, frames: list[Any]) -> None:
+        self.timings = timings
+        self.frames = itertools.cycle(frames)
+
+    def isOpened(self) -> bool:
+        return True
+
+    def read(self) -> tuple[bool, Any]:
+        self.timings.sleep("webcam", "_read_raw_frame")
+        return True, next(self.frames)
+
+    def set(self, *_args: Any) -> bool:
+        return True
+
+    def release(self) -> None:
+        return None
+
+
+def install_replay_devices(path: str, speed: float, xarm: Any, rig: Any, thermal: Any, webcam: Any) -> None:
+    durations_ms: dict[tuple[str, str], list[float]] = collections.defaultdict(list)
+    thermal_frames: list[list[float]] = []
+    webcam_jpegs: list[bytes] = []
+    for kind, _offset_s, payload in iter_session_records(path):
+        if kind == RECORD_DEVICE_CALL:
+            call = json.loads(payload)
+            durations_ms[(call["device"], call["op"])].append(call["ms"])
+        elif kind == RECORD_THERMAL_FRAME:
+            thermal_frames.append(array.array("f", payload).tolist())
+        elif kind == RECORD_WEBCAM_JPEG:
+            webcam_jpegs.append(payload)
+    timings = DeviceTimings(durations_ms, speed)
+
+    xarm.arm = SimulatedArm(timings)
+    xarm.available = True
+    xarm.initializing = False
+    xarm.error = None
+
+    rig.servos = [SimulatedServo(timings, angle) for angle in rig.servo_angles]
+    rig.lgpio = SimulatedGpio()
+    rig.gpio_handle = 0
+    rig.available = True
+    rig.initializing = False
+    rig.error = None
+
+    # Without recorded frames the controllers keep their test patterns.
+    if thermal_frames:
+        thermal.sensor = ReplayThermalSensor(timings, thermal_frames)
+        thermal.subpages = None
+        thermal.test_pattern = False
+    if webcam_jpegs and webcam.cv2 is not None:
+        np = importlib.import_module("numpy")
+        step = max(1, len(webcam_jpegs) // REPLAY_WEBCAM_FRAMES)
+        frames = [
+            webcam.cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), webcam.cv2.IMREAD_COLOR)
+            for jpeg in webcam_jpegs[::step][:REPLAY_WEBCAM_FRAMES]
+        ]
+        webcam.capture = ReplayCapture(timings, [frame for frame in frames if frame is not None])
+        webcam.test_pattern = False
+
+    logging.info(
+        "replaying %s at %sx: %s device timings, %s thermal frames, %s webcam frames",
+        path,
+        speed,
+        sum(len(values) for values in durations_ms.values()),
+        len(thermal_frames),
+        len(webcam_jpegs),
+    )
+
+
+def percentile(values: list[float], fraction: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 3)
+
+
+def decode_message(message: str | bytes, binary: bool) -> dict[str, Any]:
+    try:
+        data = decode_binary(message) if binary else json.loads(message)
+    except (ValueError, TypeError):
+        return {"type": "invalid"}
+    if not isinstance(data, dict) or not isinstance(data.get("type"), str):
+        return {"type": "invalid"}
+    return data
+
+
+def reply_key(data: dict[str, Any]) -> tuple[str, Any] | None:
+    # Slider acks come from per-servo and per-channel writers and can overtake each other, so commands and acks
+    # carrying a rig channel or an arm servo id are paired on it; everything else is answered in order.
+    if data.get("channel") is not None:
+        return ("rig", data["channel"])
+    if data.get("id") is not None:
+        return ("xarm", data["id"])
+    return None
+
+
+class SessionReplayer:
+    # Drives a server with a bundle's commands on the recorded schedule and reports reply latency.
+    def __init__(self, path: str) -> None:
+        self.commands: list[tuple[float, int, bool, str | bytes]] = []
+        for kind, offset_s, payload in iter_session_records(path):
+            if kind != RECORD_COMMAND:
+                continue
+            client, binary = SESSION_COMMAND_HEADER.unpack_from(payload)
+            body = payload[SESSION_COMMAND_HEADER.size:]
+            self.commands.append((offset_s, client, bool(binary), body if binary else body.decode("utf-8")))
+
+    async def run(self, url: str, speed: float = 1.0) -> dict[str, Any]:
+        client_numbers = sorted({client for _offset_s, client, _binary, _message in self.commands})
+        binary_clients = {client for _offset_s, client, binary, _message in self.commands if binary}
+        connections: dict[int, Any] = {}
+        # get_state replies look like broadcasts, so only commands answered by ack or error are timed.
+        waiting: dict[int, collections.deque] = {client: collections.deque() for client in client_numbers}
+        latencies_ms: dict[str, list[float]] = collections.defaultdict(list)
+        send_lag_ms: list[float] = []
+
+        async def receive(client: int, connection: Any) -> None:
+            async for message in connection:
+                reply = decode_message(message, client in binary_clients)
+                queue = waiting[client]
+                if reply["type"] not in ("ack", "error") or not queue:
+                    continue
+                # Errors carry no key; they answer the oldest command.
+                key = reply_key(reply) if reply["type"] == "ack" else None
+                index = next((index for index, entry in enumerate(queue) if entry[2] == key), 0)
+                sent_at, name, _key = queue[index]
+                del queue[index]
+                latencies_ms[name].append((time.perf_counter() - sent_at) * 1000.0)
+
+        for client in client_numbers:
+            subprotocols = [BINARY_SUBPROTOCOL] if client in binary_clients else None
+            connections[client] = await websockets.connect(url, subprotocols=subprotocols, max_size=None)
+        receivers = [asyncio.create_task(receive(client, connections[client])) for client in client_numbers]
+        try:
+            started = time.perf_counter()
+            for offset_s, client, binary, message in self.commands:
+                due = started + offset_s / speed
+                delay_s = due - time.perf_counter()
+                if delay_s > 0:
+                    await asyncio.sleep(delay_s)
+                send_lag_ms.append(max(0.0, time.perf_counter() - due) * 1000.0)
+                command = decode_message(message, binary)
+                if command["type"] != "get_state":
+                    waiting[client].append((time.perf_counter(), command["type"], reply_key(command)))
+                await connections[client].send(message)
+            deadline = time.perf_counter() + 5.0
+            while any(waiting.values()) and time.perf_counter() < deadline:
+                await asyncio.sleep(0.05)
+        finally:
+            for task in receivers:
+                task.cancel()
+            for connection in connections.values():
+                await connection.close()
+
+        everything = [value for values in latencies_ms.values() for value in values]
+        return {
+            "commands": len(self.commands),
+            "answered": len(everything),
+            "unanswered": sum(len(queue) for queue in waiting.values()),
+            "p50Ms": percentile(everything, 0.5),
+            "p99Ms": percentile(everything, 0.99),
+            "maxMs": None if not everything else round(max(everything), 3),
+            "sendLagP99Ms": percentile(send_lag_ms, 0.99),
+            "byType": {
+                name: {"count": len(values), "p50Ms": percentile(values, 0.5), "p99Ms": percentile(values, 0.99)}
+                for name, values in sorted(latencies_ms.items())
+            },
+        }
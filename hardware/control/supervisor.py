@@ -0,0 +1,199 @@
+import asyncio
+import contextlib
+import glob
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable
+
+from .constants import (
+    DEVICE_HOTPLUG_POLL_S,
+    DEVICE_PROBE_TIMEOUT_S,
+    DEVICE_RETRY_INITIAL_S,
+    DEVICE_RETRY_MAX_S,
+    RIG_I2C_BUS,
+    WEBCAM_DEVICE_INDEX,
+    XARM_USB_PRODUCT_ID,
+    XARM_USB_VENDOR_ID,
+)
+from .executors import InstrumentedExecutor, thermal_executor, webcam_executor
+from .metrics import device_probe_seconds
+
+# Devices that failed to open, or that a controller marked lost, are re-probed with exponential backoff
+# capped at DEVICE_RETRY_MAX_S. The /dev and sysfs nodes the devices show up as are polled too, and a probe
+# runs as soon as one appears, so a replug recovers within a poll interval. A probe reuses the controller's
+# own initialize(), so the new handle lands in the live controller on the device's executor thread.
+
+DEVICE_NODE_PATTERNS = ("/dev/hidraw*", "/dev/video*", "/dev/i2c-*", "/sys/bus/hid/devices/*")
+
+
+def device_nodes() -> frozenset[str]:
+    nodes: set[str] = set()
+    for pattern in DEVICE_NODE_PATTERNS:
+        nodes.update(glob.glob(pattern))
+    return frozenset(nodes)
+
+
+def xarm_present() -> bool:
+    # HID devices are named BUS:VID:PID.N in sysfs.
+    return bool(glob.glob(f"/sys/bus/hid/devices/*:{XARM_USB_VENDOR_ID:04X}:{XARM_USB_PRODUCT_ID:04X}.*"))
+
+
+def i2c_bus_present() -> bool:
+    return os.path.exists(f"/dev/i2c-{RIG_I2C_BUS}")
+
+
+def webcam_present() -> bool:
+    return os.path.exists(f"/dev/video{WEBCAM_DEVICE_INDEX}")
+
+
+def always_present() -> bool:
+    return True
+
+
+class SupervisedDevice:
+    def __init__(
+        self,
+        name: str,
+        controller: Any,
+        executor: InstrumentedExecutor,
+        present: Callable[[], bool],
+    ) -> None:
+        self.name = name
+        self.controller = controller
+        self.executor = executor
+        self.present = present
+        self.failures = 0
+        self.probes = 0
+        self.next_probe_monotonic = 0.0
+        self.lost_monotonic: float | None = None
+        self.last_recovery_s: float | None = None
+        self.probe_task: asyncio.Task | None = None
+        self.was_available = False
+
+    def schedule_retry(self) -> None:
+        delay_s = min(DEVICE_RETRY_MAX_S, DEVICE_RETRY_INITIAL_S * 2 ** min(self.failures, 16))
+        self.next_probe_monotonic = time.monotonic() + delay_s
+
+
+class DeviceSupervisor:
+    def __init__(self) -> None:
+        self.devices: list[SupervisedDevice] = []
+        self.task: asyncio.Task | None = None
+        self.nodes: frozenset[str] = frozenset()
+        self.on_change: Callable[[], Awaitable[None]] | None = None
+
+    def add(self, name: str, controller: Any, executor: InstrumentedExecutor, present: Callable[[], bool]) -> None:
+        self.devices.append(SupervisedDevice(name, controller, executor, present))
+
+    async def start(self) -> None:
+        if self.task is not None and not self.task.done():
+            return
+        self.nodes = device_nodes()
+        for device in self.devices:
+            device.was_available = device.controller.available
+            if not device.was_available:
+                device.lost_monotonic = time.monotonic()
+                device.schedule_retry()
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        tasks = [self.task, *(device.probe_task for device in self.devices)]
+        for task in tasks:
+            if task is not None and not task.done():
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+        self.task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(DEVICE_HOTPLUG_POLL_S)
+            try:
+                await self._poll()
+            except Exception:
+                logging.exception("device supervisor poll failed")
+
+    async def _poll(self) -> None:
+        nodes = device_nodes()
+        appeared = nodes - self.nodes
+        self.nodes = nodes
+        now = time.monotonic()
+        changed = False
+        for device in self.devices:
+            available = device.controller.available
+            if available != device.was_available:
+                device.was_available = available
+                changed = True
+                if not available:
+                    logging.warning("%s lost: %s", device.name, device.controller.error)
+                    device.failures = 0
+                    device.lost_monotonic = now
+                    device.next_probe_monotonic = now
+            if available or (device.probe_task is not None and not device.probe_task.done()):
+                continue
+            # A previous open that outlived its timeout still holds the device's only thread.
+            if device.executor.running or device.executor.queued:
+                continue
+            if appeared and device.present():
+                device.next_probe_monotonic = now
+            if now < device.next_probe_monotonic:
+                continue
+            if not device.present():
+                # Nothing to open; checking the node is the whole cost of this attempt.
+                device.failures += 1
+                device.schedule_retry()
+                continue
+            device.probe_task = asyncio.create_task(self._probe(device))
+        if changed and self.on_change is not None:
+            await self.on_change()
+
+    async def _probe(self, device: SupervisedDevice) -> None:
+        device.probes += 1
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(device.controller.initialize(), DEVICE_PROBE_TIMEOUT_S)
+        except TimeoutError:
+            device.controller.error = f"{device.name}_probe_timeout"
+        except Exception:
+            logging.exception("%s probe failed", device.name)
+        elapsed_s = time.perf_counter() - started
+        if device.controller.available:
+            device_probe_seconds.labels(device.name, "ok").observe(elapsed_s)
+            if device.lost_monotonic is not None:
+                device.last_recovery_s = time.monotonic() - device.lost_monotonic
+            logging.info(
+                "%s reconnected after %s probe(s), %.1fs unavailable",
+                device.name,
+                device.failures + 1,
+                device.last_recovery_s or 0.0,
+            )
+            device.failures = 0
+            device.lost_monotonic = None
+            device.was_available = True
+            if self.on_change is not None:
+                await self.on_change()
+            return
+        device_probe_seconds.labels(device.name, "failed").observe(elapsed_s)
+        device.failures += 1
+        device.schedule_retry()
+
+    def add_media(self, thermal: Any, webcam: Any) -> None:
+        # Shared by the control process and the media process, whichever owns capture.
+        self.add("thermal", thermal, thermal_executor, always_present if thermal.test_pattern else i2c_bus_present)
+        self.add("webcam", webcam, webcam_executor, always_present if webcam.test_pattern else webcam_present)
+
+    def state_payload(self) -> dict[str, Any]:
+        now = time.monotonic()
+        payload: dict[str, Any] = {}
+        for device in self.devices:
+            retry_in_s = None
+            if not device.controller.available and (device.probe_task is None or device.probe_task.done()):
+                retry_in_s = round(max(0.0, device.next_probe_monotonic - now), 1)
+            payload[device.name] = {
+                "probes": device.probes,
+                "failures": device.failures,
+                "retryInS": retry_in_s,
+                "lastRecoveryS": None if device.last_recovery_s is None else round(device.last_recovery_s, 1),
+            }
+        return payload
@@ -0,0 +1,365 @@
+import asyncio
+import contextlib
+import importlib
+import json
+import logging
+import math
+import os
+import struct
+import time
+from typing import Any, Callable, Sequence
+
+from .constants import (
+    RIG_SERVO_CHANNELS,
+    TELEMETRY_CHUNK_ROWS,
+    TELEMETRY_DIRECTORY,
+    TELEMETRY_FLUSH_INTERVAL_S,
+    TELEMETRY_INDEX_INTERVAL_CHUNKS,
+    TELEMETRY_SAMPLE_INTERVAL_S,
+    XARM_SERVO_IDS,
+)
+from .executors import telemetry_executor
+
+# File layout (little-endian):
+#   header   magic "COLABTL1", u32 length, JSON {"version", "channels", "startedAt"}
+#   chunk    "TCHK", u32 rows, f64 first time, f64 last time, f64[rows] unix times, f32[rows] per channel
+#   index    "TIDX", u32 entries, u64 previous index offset, entries (u64 offset, u32 rows, f64 first, f64 last),
+#            then trailer u64 own offset + "TEND"
+# A cleanly closed file ends in an index trailer, and readers follow the index chain back from there;
+# a file cut short by a crash is read by walking chunk headers from the start.
+TELEMETRY_FILE_MAGIC = b"COLABTL1"
+TELEMETRY_FILE_HEADER = struct.Struct("<8sI")
+TELEMETRY_CHUNK_HEADER = struct.Struct("<4sIdd")
+TELEMETRY_INDEX_HEADER = struct.Struct("<4sIQ")
+TELEMETRY_INDEX_ENTRY = struct.Struct("<QI4xdd")
+TELEMETRY_INDEX_TRAILER = struct.Struct("<Q4s")
+CHUNK_MAGIC = b"TCHK"
+INDEX_MAGIC = b"TIDX"
+TRAILER_MAGIC = b"TEND"
+TELEMETRY_FILE_SUFFIX = ".ctl"
+
+TELEMETRY_CHANNELS = (
+    *(f"xarm{servo_id}Deg" for servo_id in XARM_SERVO_IDS),
+    *(f"rig{channel}Deg" for channel in range(RIG_SERVO_CHANNELS)),
+    "stirrerActive",
+    "thermalMinC",
+    "thermalMaxC",
+    "volumeMl",
+)
+
+
+def _numpy() -> Any:
+    return importlib.import_module("numpy")
+
+
+def chunk_size_bytes(rows: int, channel_count: int) -> int:
+    return TELEMETRY_CHUNK_HEADER.size + rows * 8 + rows * 4 * channel_count
+
+
+class TelemetryWriter:
+    # Runs on the telemetry executor thread only.
+    def __init__(self, path: str, channels: Sequence[str]) -> None:
+        self.path = path
+        self.channels = tuple(channels)
+        self.fd: int | None = None
+        self.offset = 0
+        self.previous_index_offset = 0
+        self.unindexed: list[tuple[int, int, float, float]] = []
+        self.chunks = 0
+        self.bytes_written = 0
+
+    def open(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_EXCL, 0o644)
+        header = json.dumps(
+            {"version": 1, "channels": list(self.channels), "startedAt": time.time()}
+        ).encode("utf-8")
+        self._write(TELEMETRY_FILE_HEADER.pack(TELEMETRY_FILE_MAGIC, len(header)) + header)
+
+    def _write(self, data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            written = os.write(self.fd, view)
+            view = view[written:]
+        self.offset += len(data)
+        self.bytes_written += len(data)
+
+    def write_chunk(self, timestamps: Any, columns: Any) -> None:
+        np = _numpy()
+        rows = len(timestamps)
+        if rows == 0 or self.fd is None:
+            return
+        first, last = float(timestamps[0]), float(timestamps[-1])
+        body = b"".join(
+            (
+                TELEMETRY_CHUNK_HEADER.pack(CHUNK_MAGIC, rows, first, last),
+                np.ascontiguousarray(timestamps, dtype="<f8").tobytes(),
+                # Column-major so a reader can fetch one channel without touching the others.
+                np.ascontiguousarray(columns[:rows].T, dtype="<f4").tobytes(),
+            )
+        )
+        chunk_offset = self.offset
+        self._write(body)
+        self.unindexed.append((chunk_offset, rows, first, last))
+        self.chunks += 1
+        if len(self.unindexed) >= TELEMETRY_INDEX_INTERVAL_CHUNKS:
+            self.write_index()
+
+    def write_index(self) -> None:
+        if not self.unindexed or self.fd is None:
+            return
+        index_offset = self.offset
+        parts = [TELEMETRY_INDEX_HEADER.pack(INDEX_MAGIC, len(self.unindexed), self.previous_index_offset)]
+        parts.extend(TELEMETRY_INDEX_ENTRY.pack(*entry) for entry in self.unindexed)
+        parts.append(TELEMETRY_INDEX_TRAILER.pack(index_offset, TRAILER_MAGIC))
+        self._write(b"".join(parts))
+        self.previous_index_offset = index_offset
+        self.unindexed = []
+
+    def close(self) -> None:
+        if self.fd is None:
+            return
+        self.write_index()
+        os.close(self.fd)
+        self.fd = None
+
+
+class TelemetryReader:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as handle:
+            magic, header_length = TELEMETRY_FILE_HEADER.unpack(handle.read(TELEMETRY_FILE_HEADER.size))
+            if magic != TELEMETRY_FILE_MAGIC:
+                raise ValueError("telemetry_file_invalid")
+            self.header = json.loads(handle.read(header_length))
+        self.channels: tuple[str, ...] = tuple(self.header["channels"])
+        self.data_offset = TELEMETRY_FILE_HEADER.size + header_length
+        self.chunks = self._chunks_from_index() or self._chunks_from_scan()
+
+    def _chunks_from_index(self) -> list[tuple[int, int, float, float]] | None:
+        size = os.path.getsize(self.path)
+        if size < self.data_offset + TELEMETRY_INDEX_TRAILER.size:
+            return None
+        chunks: list[tuple[int, int, float, float]] = []
+        with open(self.path, "rb") as handle:
+            handle.seek(size - TELEMETRY_INDEX_TRAILER.size)
+            index_offset, magic = TELEMETRY_INDEX_TRAILER.unpack(handle.read(TELEMETRY_INDEX_TRAILER.size))
+            if magic != TRAILER_MAGIC:
+                return None
+            while True:
+                handle.seek(index_offset)
+                magic, count, previous = TELEMETRY_INDEX_HEADER.unpack(handle.read(TELEMETRY_INDEX_HEADER.size))
+                if magic != INDEX_MAGIC:
+                    return None
+                data = handle.read(count * TELEMETRY_INDEX_ENTRY.size)
+                chunks[:0] = list(TELEMETRY_INDEX_ENTRY.iter_unpack(data))
+                if previous == 0:
+                    return chunks
+                index_offset = previous
+
+    def _chunks_from_scan(self) -> list[tuple[int, int, float, float]]:
+        chunks: list[tuple[int, int, float, float]] = []
+        size = os.path.getsize(self.path)
+        offset = self.data_offset
+        with open(self.path, "rb") as handle:
+            while offset + 4 <= size:
+                handle.seek(offset)
+                header = handle.read(max(TELEMETRY_CHUNK_HEADER.size, TELEMETRY_INDEX_HEADER.size))
+                if header[:4] == CHUNK_MAGIC and len(header) >= TELEMETRY_CHUNK_HEADER.size:
+                    _magic, rows, first, last = TELEMETRY_CHUNK_HEADER.unpack_from(header)
+                    length = chunk_size_bytes(rows, len(self.channels))
+                    if offset + length > size:
+                        break
+                    chunks.append((offset, rows, first, last))
+                    offset += length
+                elif header[:4] == INDEX_MAGIC and len(header) >= TELEMETRY_INDEX_HEADER.size:
+                    _magic, count, _previous = TELEMETRY_INDEX_HEADER.unpack_from(header)
+                    offset += (
+                        TELEMETRY_INDEX_HEADER.size
+                        + count * TELEMETRY_INDEX_ENTRY.size
+                        + TELEMETRY_INDEX_TRAILER.size
+                    )
+                else:
+                    # Torn tail from a crash mid-write.
+                    break
+        return chunks
+
+    def time_range(self) -> tuple[float | None, float | None]:
+        if not self.chunks:
+            return None, None
+        return self.chunks[0][2], self.chunks[-1][3]
+
+    def read_range(
+        self,
+        start: float | None = None,
+        end: float | None = None,
+        channels: Sequence[str] | None = None,
+    ) -> dict[str, Any]:
+        np = _numpy()
+        names = list(self.channels if channels is None else channels)
+        unknown = [name for name in names if name not in self.channels]
+        if unknown:
+            raise ValueError(f"unknown_channel:{unknown[0]}")
+        low = -math.inf if start is None else start
+        high = math.inf if end is None else end
+
+        times: list[Any] = []
+        columns: dict[str, list[Any]] = {name: [] for name in names}
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            for offset, rows, first, last in self.chunks:
+                if last < low or first > high:
+                    continue
+                data_offset = offset + TELEMETRY_CHUNK_HEADER.size
+                chunk_times = np.frombuffer(os.pread(fd, rows * 8, data_offset), dtype="<f8")
+                mask = (chunk_times >= low) & (chunk_times <= high)
+                times.append(chunk_times[mask])
+                for name in names:
+                    column_offset = data_offset + rows * 8 + rows * 4 * self.channels.index(name)
+                    values = np.frombuffer(os.pread(fd, rows * 4, column_offset), dtype="<f4")
+                    columns[name].append(values[mask])
+        finally:
+            os.close(fd)
+
+        empty_times = np.empty(0, dtype="<f8")
+        empty_values = np.empty(0, dtype="<f4")
+        result: dict[str, Any] = {"t": np.concatenate(times) if times else empty_times}
+        for name in names:
+            result[name] = np.concatenate(columns[name]) if columns[name] else empty_values
+        return result
+
+
+def list_runs(directory: str = TELEMETRY_DIRECTORY) -> list[str]:
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(name for name in names if name.endswith(TELEMETRY_FILE_SUFFIX))
+
+
+def run_path(run: str, directory: str = TELEMETRY_DIRECTORY) -> str:
+    if os.path.basename(run) != run or not run.endswith(TELEMETRY_FILE_SUFFIX):
+        raise ValueError("invalid_run")
+    return os.path.join(directory, run)
+
+
+class TelemetryRecorder:
+    def __init__(self, sample: Callable[[], Sequence[float | None]], channels: Sequence[str] = TELEMETRY_CHANNELS) -> None:
+        self.sample = sample
+        self.channels = tuple(channels)
+        self.writer: TelemetryWriter | None = None
+        self.available = False
+        self.error: str | None = None
+        self.task: asyncio.Task | None = None
+        self.flush_task: asyncio.Task | None = None
+        self.timestamps: Any | None = None
+        self.columns: Any | None = None
+        self.rows = 0
+        self.samples = 0
+        self.last_flush_monotonic = 0.0
+        self.sample_us: float | None = None
+
+    def _allocate(self) -> None:
+        np = _numpy()
+        self.timestamps = np.empty(TELEMETRY_CHUNK_ROWS, dtype="<f8")
+        self.columns = np.empty((TELEMETRY_CHUNK_ROWS, len(self.channels)), dtype="<f4")
+        self.rows = 0
+
+    async def start(self) -> None:
+        if self.task is not None and not self.task.done():
+            return
+        try:
+            _numpy()
+            run = time.strftime("run-%Y%m%d-%H%M%S") + TELEMETRY_FILE_SUFFIX
+            self.writer = TelemetryWriter(os.path.join(TELEMETRY_DIRECTORY, run), self.channels)
+            await telemetry_executor.run(self.writer.open)
+        except Exception as exc:
+            self.writer = None
+            self.available = False
+            self.error = f"telemetry_unavailable:{exc}"
+            logging.exception("telemetry recorder failed to start")
+            return
+        self._allocate()
+        self.available = True
+        self.error = None
+        self.last_flush_monotonic = time.monotonic()
+        self.task = asyncio.create_task(self._record_loop())
+        logging.info("telemetry recording to %s", self.writer.path)
+
+    async def stop(self) -> None:
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.task
+        if self.writer is None:
+            return
+        await self._flush()
+        if self.flush_task is not None:
+            with contextlib.suppress(Exception):
+                await self.flush_task
+        await telemetry_executor.run(self.writer.close)
+        self.available = False
+
+    def record_sample(self) -> None:
+        started = time.perf_counter()
+        values = self.sample()
+        self.timestamps[self.rows] = time.time()
+        self.columns[self.rows] = [math.nan if value is None else value for value in values]
+        self.rows += 1
+        self.samples += 1
+        elapsed_us = (time.perf_counter() - started) * 1e6
+        self.sample_us = elapsed_us if self.sample_us is None else self.sample_us * 0.95 + elapsed_us * 0.05
+
+    async def _flush(self) -> None:
+        if self.writer is None or self.rows == 0:
+            return
+        # Hand the filled buffers to the writer thread and keep sampling into fresh ones.
+        timestamps = self.timestamps[: self.rows]
+        columns = self.columns[: self.rows]
+        self._allocate()
+        self.last_flush_monotonic = time.monotonic()
+        if self.flush_task is not None and not self.flush_task.done():
+            await self.flush_task
+        self.flush_task = asyncio.create_task(self._write_chunk(timestamps, columns))
+
+    async def _write_chunk(self, timestamps: Any, columns: Any) -> None:
+        try:
+            await telemetry_executor.run(self.writer.write_chunk, timestamps, columns)
+        except Exception as exc:
+            self.error = f"telemetry_write_failed:{exc}"
+            logging.exception("telemetry chunk write failed")
+
+    async def _record_loop(self) -> None:
+        next_sample_at = time.monotonic()
+        while True:
+            try:
+                self.record_sample()
+                if (
+                    self.rows >= TELEMETRY_CHUNK_ROWS
+                    or time.monotonic() - self.last_flush_monotonic >= TELEMETRY_FLUSH_INTERVAL_S
+                ):
+                    await self._flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception("telemetry sample failed")
+            next_sample_at += TELEMETRY_SAMPLE_INTERVAL_S
+            delay_s = next_sample_at - time.monotonic()
+            if delay_s < 0:
+                next_sample_at = time.monotonic()
+                delay_s = 0.0
+            await asyncio.sleep(delay_s)
+
+    def state_payload(self) -> dict[str, Any]:
+        return {
+            "available": self.available,
+            "error": self.error,
+            "path": None if self.writer is None else self.writer.path,
+            "samples": self.samples,
+            "chunks": 0 if self.writer is None else self.writer.chunks,
+            "bytes": 0 if self.writer is None else self.writer.bytes_written,
+            "sampleUs": None if self.sample_us is None else round(self.sample_us, 2),
+            "channels": list(self.channels),
+        }
@@ -0,0 +1,137 @@
+import importlib
+import time
+from collections import deque
+from typing import Any, NamedTuple, Sequence
+
+from .constants import THERMAL_ALARM_RISE_WINDOW_S, THERMAL_FRAME_HEIGHT, THERMAL_FRAME_WIDTH
+
+# Rules are checked on every raw frame in the capture loop, before filtering or encoding, so an alarm goes out
+# with the frame that crossed it. Each ROI's max and mean are computed once per frame on a view of the frame;
+# rate-of-rise keeps a short deque of (time, value) per rule trimmed from the left, never rescanning history.
+
+ALARM_KINDS = ("max_above", "mean_above", "max_rise", "mean_rise")
+
+
+class AlarmRule(NamedTuple):
+    name: str
+    roi: tuple[int, int, int, int]
+    kind: str
+    trigger: float
+    clear: float
+    actions: tuple[str, ...]
+
+
+class AlarmState:
+    def __init__(self) -> None:
+        self.active = False
+        self.value: float | None = None
+        self.triggered = 0
+        self.history: deque[tuple[float, float]] = deque()
+
+
+def parse_alarm_rules(rules: Sequence[Sequence[Any]]) -> list[AlarmRule]:
+    parsed: list[AlarmRule] = []
+    for name, roi, kind, trigger, clear, actions in rules:
+        x, y, width, height = (int(value) for value in roi)
+        if kind not in ALARM_KINDS:
+            raise ValueError(f"thermal_alarm_kind_invalid:{name}:{kind}")
+        inside = 0 <= x and 0 <= y and x + width <= THERMAL_FRAME_WIDTH and y + height <= THERMAL_FRAME_HEIGHT
+        if width <= 0 or height <= 0 or not inside:
+            raise ValueError(f"thermal_alarm_roi_invalid:{name}")
+        if float(clear) > float(trigger):
+            raise ValueError(f"thermal_alarm_clear_above_trigger:{name}")
+        parsed.append(
+            AlarmRule(str(name), (x, y, width, height), kind, float(trigger), float(clear), tuple(actions))
+        )
+    return parsed
+
+
+class ThermalAlarmEngine:
+    def __init__(self, rules: Sequence[Sequence[Any]]) -> None:
+        self.np = importlib.import_module("numpy")
+        self.rules = parse_alarm_rules(rules)
+        self.states = {rule.name: AlarmState() for rule in self.rules}
+        self.rois = sorted({rule.roi for rule in self.rules})
+        self.slices = {
+            (x, y, width, height): (slice(y, y + height), slice(x, x + width)) for x, y, width, height in self.rois
+        }
+
+    def _roi_stats(self, frame: Any, finite: Any, all_finite: bool) -> dict[tuple[int, ...], tuple[float, float]]:
+        np = self.np
+        stats: dict[tuple[int, ...], tuple[float, float]] = {}
+        for roi, (rows, columns) in self.slices.items():
+            view = frame[rows, columns]
+            if all_finite:
+                stats[roi] = (float(view.max()), float(view.mean()))
+                continue
+            # Dead pixels are NaN; leave them out rather than letting one poison the ROI.
+            mask = finite[rows, columns]
+            count = int(np.count_nonzero(mask))
+            if count == 0:
+                stats[roi] = (float("nan"), float("nan"))
+                continue
+            stats[roi] = (
+                float(np.max(view, where=mask, initial=-np.inf)),
+                float(np.sum(view, where=mask)) / count,
+            )
+        return stats
+
+    def evaluate(self, frame: Sequence[float], now_monotonic: float) -> list[dict[str, Any]]:
+        np = self.np
+        values = np.asarray(frame, dtype=np.float64).reshape(THERMAL_FRAME_HEIGHT, THERMAL_FRAME_WIDTH)
+        finite = np.isfinite(values)
+        stats = self._roi_stats(values, finite, bool(finite.all()))
+
+        events: list[dict[str, Any]] = []
+        for rule in self.rules:
+            state = self.states[rule.name]
+            roi_max, roi_mean = stats[rule.roi]
+            sample = roi_max if rule.kind.startswith("max") else roi_mean
+            if sample != sample:
+                continue
+            if rule.kind.endswith("_above"):
+                value = sample
+            else:
+                history = state.history
+                history.append((now_monotonic, sample))
+                while len(history) > 1 and history[1][0] <= now_monotonic - THERMAL_ALARM_RISE_WINDOW_S:
+                    history.popleft()
+                started, first = history[0]
+                # A rate over less than half the window is mostly noise.
+                if now_monotonic - started < THERMAL_ALARM_RISE_WINDOW_S / 2:
+                    continue
+                value = (sample - first) / (now_monotonic - started)
+            state.value = value
+
+            if not state.active and value > rule.trigger:
+                state.active = True
+                state.triggered += 1
+                events.append(self._event(rule, "active", value))
+            elif state.active and value < rule.clear:
+                state.active = False
+                events.append(self._event(rule, "cleared", value))
+        return events
+
+    def _event(self, rule: AlarmRule, status: str, value: float) -> dict[str, Any]:
+        return {
+            "rule": rule.name,
+            "status": status,
+            "kind": rule.kind,
+            "value": round(value, 2),
+            "trigger": rule.trigger,
+            "clear": rule.clear,
+            "roi": list(rule.roi),
+            "actions": list(rule.actions),
+            "atMs": int(time.time() * 1000),
+        }
+
+    def state_payload(self) -> dict[str, Any]:
+        payload: dict[str, Any] = {}
+        for rule in self.rules:
+            state = self.states[rule.name]
+            payload[rule.name] = {
+                "active": state.active,
+                "value": None if state.value is None else round(state.value, 2),
+                "triggered": state.triggered,
+            }
+        return payload
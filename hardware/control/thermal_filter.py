@@ -0,0 +1,83 @@
+import importlib
+from typing import Any, Sequence
+
+from .constants import (
+    THERMAL_FILTER_ALPHA,
+    THERMAL_FILTER_STEP_C,
+    THERMAL_PUBLISH_MIN_DELTA_C,
+    THERMAL_SCALE_HYSTERESIS_C,
+)
+
+# MLX90640 pixels carry a few tenths of a degree of noise, so per-frame min/max (and the colour scale built
+# from them) flicker and every frame differs from the last. Each pixel is smoothed with an exponential moving
+# average in preallocated buffers; a change bigger than the noise (a heater switching on) skips the average so
+# real events are not smeared. The colour scale moves only when the scene leaves it or sits well inside it, and
+# a frame is only worth publishing once some pixel has moved past the noise since the last published one.
+
+
+class ThermalFilter:
+    def __init__(self) -> None:
+        self.np = importlib.import_module("numpy")
+        self.state: Any | None = None
+        self.published: Any | None = None
+        self.scale: tuple[float, float] | None = None
+        self.published_scale: tuple[float, float] | None = None
+
+    def _allocate(self, raw: Any) -> None:
+        np = self.np
+        self.state = raw.copy()
+        self.published = np.full_like(raw, np.nan)
+        self.delta = np.empty_like(raw)
+        self.magnitude = np.empty_like(raw)
+        self.jump = np.empty(raw.shape, dtype=bool)
+        self.mask = np.empty(raw.shape, dtype=bool)
+
+    def update(self, frame: Sequence[float]) -> Any:
+        np = self.np
+        raw = np.asarray(frame, dtype=np.float64)
+        if self.state is None or self.state.shape != raw.shape:
+            self._allocate(raw)
+            return self.state
+        np.subtract(raw, self.state, out=self.delta)
+        np.abs(self.delta, out=self.magnitude)
+        np.greater(self.magnitude, THERMAL_FILTER_STEP_C, out=self.jump)
+        np.multiply(self.delta, THERMAL_FILTER_ALPHA, out=self.magnitude)
+        np.copyto(self.magnitude, self.delta, where=self.jump)
+        self.state += self.magnitude
+        # Pixels without a value yet (NaN) take the reading as it is.
+        np.isnan(self.state, out=self.mask)
+        np.copyto(self.state, raw, where=self.mask)
+        return self.state
+
+    def color_scale(self) -> tuple[float, float]:
+        np = self.np
+        np.isfinite(self.state, out=self.mask)
+        if not self.mask.any():
+            return self.scale or (0.0, 0.01)
+        low = float(np.min(self.state, where=self.mask, initial=np.inf))
+        high = float(np.max(self.state, where=self.mask, initial=-np.inf))
+        margin = THERMAL_SCALE_HYSTERESIS_C
+        if self.scale is None:
+            self.scale = (low - margin, high + margin)
+            return self.scale
+        scale_low, scale_high = self.scale
+        # Widen at once so nothing clips; narrow only once the scene sits two margins inside the old edge.
+        if low < scale_low or low > scale_low + 2 * margin:
+            scale_low = low - margin
+        if high > scale_high or high < scale_high - 2 * margin:
+            scale_high = high + margin
+        self.scale = (scale_low, scale_high)
+        return self.scale
+
+    def changed(self) -> bool:
+        np = self.np
+        if self.scale != self.published_scale:
+            return True
+        np.subtract(self.state, self.published, out=self.delta)
+        np.abs(self.delta, out=self.magnitude)
+        np.isfinite(self.magnitude, out=self.mask)
+        return bool(np.max(self.magnitude, where=self.mask, initial=0.0) >= THERMAL_PUBLISH_MIN_DELTA_C)
+
+    def mark_published(self) -> None:
+        self.published[:] = self.state
+        self.published_scale = self.scale
@@ -0,0 +1,121 @@
+import asyncio
+import contextlib
+import contextvars
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, TypeVar
+
+from .constants import TRACING_BUFFER_SPANS, TRACING_ENABLED
+
+# Spans only start under a root span (an automation job), so the I/O paths they wrap cost one context
+# variable lookup when nothing is being traced. Context variables follow tasks and, through
+# InstrumentedExecutor, the hop onto worker threads, so device calls land under the job that made them.
+
+current_span: contextvars.ContextVar["Span | None"] = contextvars.ContextVar("current_span", default=None)
+span_ids = itertools.count(1)
+# (name, trace id, span id, parent id, start ns, duration ns, thread name, args); deque appends are thread-safe.
+finished_spans: deque[tuple[str, int, int, int, int, int, str, dict[str, Any]]] = deque(maxlen=TRACING_BUFFER_SPANS)
+trace_origin_ns = time.perf_counter_ns()
+
+T = TypeVar("T")
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "args", "start_ns", "token")
+
+    def __init__(self, name: str, trace_id: int, parent_id: int, args: dict[str, Any]) -> None:
+        self.name = name
+        self.span_id = next(span_ids)
+        self.trace_id = trace_id or self.span_id
+        self.parent_id = parent_id
+        self.args = args
+        self.start_ns = 0
+        self.token: contextvars.Token | None = None
+
+
+class trace_span:
+    # Usable as `with` in both sync and async code. A root span starts a new trace; any other span is a
+    # no-op unless a trace is already active in the current context.
+    __slots__ = ("span",)
+
+    def __init__(self, name: str, root: bool = False, **args: Any) -> None:
+        self.span: Span | None = None
+        if not TRACING_ENABLED:
+            return
+        parent = current_span.get()
+        if parent is not None:
+            self.span = Span(name, parent.trace_id, parent.span_id, args)
+        elif root:
+            self.span = Span(name, 0, 0, args)
+
+    def __enter__(self) -> "Span | None":
+        span = self.span
+        if span is not None:
+            span.token = current_span.set(span)
+            span.start_ns = time.perf_counter_ns()
+        return span
+
+    def __exit__(self, exc_type: Any, exc: Any, _traceback: Any) -> None:
+        span = self.span
+        if span is None:
+            return
+        duration_ns = time.perf_counter_ns() - span.start_ns
+        current_span.reset(span.token)
+        if exc_type is not None:
+            span.args["error"] = "cancelled" if exc_type is asyncio.CancelledError else repr(exc)
+        finished_spans.append(
+            (
+                span.name,
+                span.trace_id,
+                span.span_id,
+                span.parent_id,
+                span.start_ns,
+                duration_ns,
+                threading.current_thread().name,
+                span.args,
+            )
+        )
+
+
+@contextlib.asynccontextmanager
+async def traced_lock(lock: asyncio.Lock, name: str = "lock_wait") -> AsyncIterator[None]:
+    with trace_span(name):
+        await lock.acquire()
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+async def run_traced(name: str, awaitable: Awaitable[T], **args: Any) -> T:
+    # Root span for work handed to its own task, e.g. a job started by a handler that acks immediately.
+    with trace_span(name, root=True, **args):
+        return await awaitable
+
+
+def chrome_trace_payload() -> dict[str, Any]:
+    # Each trace gets its own track (tid) so concurrent jobs on the one loop thread nest cleanly in a
+    # flame-chart viewer; the thread a span actually ran on is kept in its args.
+    pid = os.getpid()
+    events: list[dict[str, Any]] = []
+    for name, trace_id, span_id, parent_id, start_ns, duration_ns, thread_name, args in tuple(finished_spans):
+        if parent_id == 0:
+            events.append(
+                {"ph": "M", "name": "thread_name", "pid": pid, "tid": trace_id, "args": {"name": f"{name} #{trace_id}"}}
+            )
+        events.append(
+            {
+                "ph": "X",
+                "name": name,
+                "cat": name.split(".", 1)[0],
+                "pid": pid,
+                "tid": trace_id,
+                "ts": (start_ns - trace_origin_ns) / 1000.0,
+                "dur": duration_ns / 1000.0,
+                "args": {**args, "spanId": span_id, "parentId": parent_id, "thread": thread_name},
+            }
+        )
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
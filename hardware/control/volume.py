@@ -0,0 +1,505 @@
+import asyncio
+import base64
+import collections
+import contextlib
+import importlib
+import logging
+import math
+import os
+import re
+import time
+from typing import Any, Awaitable, Callable
+
+from .constants import (
+    VOLUME_CACHE_SIZE,
+    VOLUME_CHANGE_MAX_MEAN_DIFF,
+    VOLUME_REMOTE_DEADLINE_S,
+    VOLUME_REMOTE_MAX_CONCURRENCY,
+    VOLUME_REMOTE_WINDOW_POLL_S,
+    VOLUME_LOCAL_BROADCAST_INTERVAL_S,
+    VOLUME_LOCAL_BROADCAST_MIN_DELTA_ML,
+    VOLUME_LOCAL_STALE_S,
+    VOLUME_REMOTE_AUDIT_INTERVAL_S,
+    VOLUME_REMOTE_MODEL,
+    VOLUME_REMOTE_QUERY_INTERVAL_S,
+)
+from .controllers import WebcamController
+from .executors import media_executor
+from .level_estimator import (
+    LevelReading,
+    LocalLevelEstimator,
+    frame_thumbnail,
+    thumbnail_distance,
+    thumbnail_key,
+)
+from .metrics import volume_api_seconds
+
+
+def parse_volume_from_text(raw_text: str) -> float | None:
+    matches = re.findall(r"-?\d+(?:\.\d+)?", raw_text)
+    if not matches:
+        return None
+    for token in matches:
+        try:
+            volume_ml = float(token)
+        except ValueError:
+            continue
+        if not math.isfinite(volume_ml) or volume_ml < 0:
+            continue
+        return volume_ml
+    return None
+
+
+class VolumeEstimateCache:
+    def __init__(self, capacity: int = VOLUME_CACHE_SIZE) -> None:
+        self.capacity = capacity
+        self.entries: collections.OrderedDict[int, tuple[bytes, float, str | None]] = collections.OrderedDict()
+
+    def get(self, thumbnail: bytes) -> tuple[float, str | None] | None:
+        key = thumbnail_key(thumbnail)
+        entry = self.entries.get(key)
+        if entry is None:
+            # Near-identical scenes can straddle a quantization step; fall back to a distance scan.
+            for candidate_key, candidate in reversed(self.entries.items()):
+                if thumbnail_distance(thumbnail, candidate[0]) <= VOLUME_CHANGE_MAX_MEAN_DIFF:
+                    key, entry = candidate_key, candidate
+                    break
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+        return entry[1], entry[2]
+
+    def put(self, thumbnail: bytes, volume_ml: float, raw_text: str | None) -> None:
+        key = thumbnail_key(thumbnail)
+        self.entries[key] = (thumbnail, volume_ml, raw_text)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+
+class VolumeEstimator:
+    def __init__(self, webcam: WebcamController) -> None:
+        self.webcam = webcam
+        self.client: Any | None = None
+        self.model = VOLUME_REMOTE_MODEL
+        self.local = LocalLevelEstimator()
+
+        self.volume_ml: float | None = None
+        self.source: str | None = None
+        self.raw: str | None = None
+        self.error: str | None = None
+        self.updated_ms: int | None = None
+
+        self.local_volume_ml: float | None = None
+        self.local_strength: float | None = None
+        self.local_updated_ms: int | None = None
+        self.local_updated_monotonic = 0.0
+        self.remote_volume_ml: float | None = None
+        self.audit_delta_ml: float | None = None
+        self.last_remote_monotonic = 0.0
+
+        self.estimate_cache = VolumeEstimateCache()
+        self.remote_inflight: asyncio.Task | None = None
+        # Set while the in-flight request serves only the query window, so closing the window may cancel it.
+        self.remote_inflight_windowed = False
+        self.remote_semaphore = asyncio.Semaphore(VOLUME_REMOTE_MAX_CONCURRENCY)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.coalesced_requests = 0
+        self.api_calls = 0
+        self.api_timeouts = 0
+        self.api_cancelled = 0
+        self.api_last_latency_ms: float | None = None
+
+        self.query_enabled_until_monotonic = 0.0
+        self.remote_task: asyncio.Task | None = None
+        self.local_task: asyncio.Task | None = None
+        self.audit_task: asyncio.Task | None = None
+        self.on_volume_update: Callable[[], Awaitable[None]] | None = None
+
+    def initialize_client(self) -> None:
+        try:
+            dotenv_module = importlib.import_module("dotenv")
+            load_dotenv = getattr(dotenv_module, "load_dotenv", None)
+            if callable(load_dotenv):
+                load_dotenv()
+        except Exception:
+            pass
+
+        api_key = os.getenv("ANTHROPIC_API_KEY", "").strip()
+        if not api_key:
+            self.error = "anthropic_api_key_missing"
+            logging.warning("remote volume estimation disabled: ANTHROPIC_API_KEY missing")
+            return
+
+        try:
+            anthropic_module = importlib.import_module("anthropic")
+            # One async client reuses its pooled connections; the SDK reads ANTHROPIC_BASE_URL,
+            # which is how control.mock_vision_server stands in for the remote API.
+            self.client = anthropic_module.AsyncAnthropic(
+                api_key=api_key,
+                timeout=VOLUME_REMOTE_DEADLINE_S,
+                max_retries=0,
+            )
+            self.error = None
+        except Exception as exc:
+            self.error = f"anthropic_init_failed:{exc}"
+            logging.exception("failed to initialize anthropic client")
+
+    def volume_payload(self) -> dict[str, Any]:
+        return {
+            "type": "volume",
+            "subsystem": "volume",
+            "model": self.model,
+            "volumeMl": self.volume_ml,
+            "source": self.source,
+            "raw": self.raw,
+            "error": self.error,
+            "updatedAtMs": self.updated_ms,
+            "local": {
+                "available": self.local.available,
+                "error": self.local.error,
+                "volumeMl": self.local_volume_ml,
+                "strength": self.local_strength,
+                "updatedAtMs": self.local_updated_ms,
+            },
+            "remoteVolumeMl": self.remote_volume_ml,
+            "auditDeltaMl": self.audit_delta_ml,
+            "cache": self.cache_payload(),
+        }
+
+    def cache_payload(self) -> dict[str, Any]:
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "coalesced": self.coalesced_requests,
+            "hitRate": round(self.cache_hits / lookups, 3) if lookups else None,
+            "apiCalls": self.api_calls,
+            "apiCallsSaved": self.cache_hits + self.coalesced_requests,
+            "apiTimeouts": self.api_timeouts,
+            "apiCancelled": self.api_cancelled,
+            "apiLastLatencyMs": self.api_last_latency_ms,
+            "size": len(self.estimate_cache.entries),
+        }
+
+    def state_payload(self) -> dict[str, Any]:
+        payload = self.volume_payload()
+        payload.pop("type", None)
+        payload.pop("subsystem", None)
+        return payload
+
+    def enable_queries_for_seconds(self, duration_s: float) -> None:
+        self.query_enabled_until_monotonic = max(
+            self.query_enabled_until_monotonic,
+            time.monotonic() + max(0.0, duration_s),
+        )
+
+    def local_reading_fresh(self) -> bool:
+        return (
+            self.local_volume_ml is not None
+            and time.monotonic() - self.local_updated_monotonic <= VOLUME_LOCAL_STALE_S
+        )
+
+    async def _request_remote_api(self, jpeg: bytes) -> tuple[float | None, str | None]:
+        if self.client is None:
+            return None, "anthropic_unavailable"
+
+        image_base64 = base64.b64encode(jpeg).decode("ascii")
+        response = await self.client.messages.create(
+            model=self.model,
+            max_tokens=64,
+            temperature=0,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": (
+                                "Estimate the liquid and/or foam volume in the flask in milliliters. "
+                                "Return ONLY a single numeric value (example: 37.5). "
+                                "Do not include units or any extra words. "
+                                "Use graduation lines as reference, interpolate between markings, "
+                                "and infer even if the level is above highest marking or image is skewed."
+                                "If no flask is present, return 0."
+                            ),
+                        },
+                        {
+                            "type": "image",
+                            "source": {
+                                "type": "base64",
+                                "media_type": "image/jpeg",
+                                "data": image_base64,
+                            },
+                        },
+                    ],
+                }
+            ],
+        )
+
+        text_fragments: list[str] = []
+        content = getattr(response, "content", None)
+        if isinstance(content, list):
+            for entry in content:
+                text_value = str(getattr(entry, "text", "")).strip()
+                if text_value:
+                    text_fragments.append(text_value)
+
+        raw_text = " ".join(text_fragments).strip()
+        volume_ml = parse_volume_from_text(raw_text)
+        return volume_ml, raw_text
+
+    def _apply_local(self, reading: LevelReading) -> None:
+        now_ms = int(time.time() * 1000)
+        self.local_strength = round(reading.strength, 1)
+        self.local_updated_ms = now_ms
+        if reading.volume_ml is None:
+            self.local_volume_ml = None
+            # The shown volume came from the level that just disappeared; a remote value is left alone.
+            if self.source == "local":
+                self.volume_ml = None
+                self.source = None
+                self.updated_ms = now_ms
+            return
+
+        self.local_volume_ml = round(reading.volume_ml, 2)
+        self.local_updated_monotonic = time.monotonic()
+        self.volume_ml = self.local_volume_ml
+        self.source = "local"
+        self.error = None
+        self.updated_ms = now_ms
+
+    def _apply_remote(self, volume_ml: float | None, raw_text: str | None) -> None:
+        self.last_remote_monotonic = time.monotonic()
+        self.raw = raw_text
+        if volume_ml is None:
+            self.remote_volume_ml = None
+            if not self.local_reading_fresh():
+                self.volume_ml = None
+                self.source = None
+                self.updated_ms = int(time.time() * 1000)
+            self.error = "volume_parse_failed"
+            return
+
+        self.remote_volume_ml = round(volume_ml, 2)
+        if self.local_reading_fresh():
+            self.audit_delta_ml = round(self.remote_volume_ml - self.local_volume_ml, 2)
+            return
+
+        self.volume_ml = self.remote_volume_ml
+        self.source = "remote"
+        self.error = None
+        self.updated_ms = int(time.time() * 1000)
+
+    async def _notify(self) -> None:
+        if self.on_volume_update is not None:
+            await self.on_volume_update()
+
+    async def request_remote(self, jpeg: bytes, windowed: bool = False, fresh: bool = False) -> float | None:
+        if fresh:
+            # A dispense pulse moves the level by less than the change gate tolerates, so neither the cache nor a
+            # request started on an older frame may answer for this one.
+            return await self._request_remote_gated(jpeg, use_cache=False)
+        # Only one remote request is in flight; concurrent callers share its result.
+        if self.remote_inflight is not None and not self.remote_inflight.done():
+            self.coalesced_requests += 1
+            self.remote_inflight_windowed = self.remote_inflight_windowed and windowed
+            return await asyncio.shield(self.remote_inflight)
+        self.remote_inflight_windowed = windowed
+        self.remote_inflight = asyncio.create_task(self._request_remote_gated(jpeg))
+        return await asyncio.shield(self.remote_inflight)
+
+    async def _await_remote_api(
+        self, jpeg: bytes, cancellable: bool = True
+    ) -> tuple[float | None, str | None] | None:
+        async with self.remote_semaphore:
+            started = time.monotonic()
+            deadline = started + VOLUME_REMOTE_DEADLINE_S
+            api_task = asyncio.create_task(self._request_remote_api(jpeg))
+            try:
+                while True:
+                    now = time.monotonic()
+                    if now >= deadline:
+                        self.api_timeouts += 1
+                        volume_api_seconds.labels("timeout").observe(now - started)
+                        raise TimeoutError("volume_api_deadline")
+                    if cancellable and self.remote_inflight_windowed and now > self.query_enabled_until_monotonic:
+                        self.api_cancelled += 1
+                        volume_api_seconds.labels("cancelled").observe(now - started)
+                        return None
+                    done, _pending = await asyncio.wait(
+                        {api_task},
+                        timeout=min(VOLUME_REMOTE_WINDOW_POLL_S, deadline - now),
+                    )
+                    if done:
+                        elapsed_s = time.monotonic() - started
+                        self.api_last_latency_ms = round(elapsed_s * 1000.0, 1)
+                        outcome = "error" if api_task.exception() is not None else "ok"
+                        volume_api_seconds.labels(outcome).observe(elapsed_s)
+                        return api_task.result()
+            finally:
+                if not api_task.done():
+                    api_task.cancel()
+                    with contextlib.suppress(asyncio.CancelledError, Exception):
+                        await api_task
+
+    async def _request_remote_gated(self, jpeg: bytes, use_cache: bool = True) -> float | None:
+        try:
+            thumbnail = await media_executor.run(frame_thumbnail, jpeg)
+        except Exception:
+            thumbnail = None
+            logging.exception("volume change gate failed; querying without cache")
+
+        if thumbnail is not None and use_cache:
+            cached = self.estimate_cache.get(thumbnail)
+            if cached is not None:
+                self.cache_hits += 1
+                self._apply_remote(*cached)
+                await self._notify()
+                return cached[0]
+            self.cache_misses += 1
+
+        try:
+            self.api_calls += 1
+            result = await self._await_remote_api(jpeg, cancellable=use_cache)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            self.last_remote_monotonic = time.monotonic()
+            self.error = f"volume_estimation_failed:{exc}"
+            if not self.local_reading_fresh():
+                self.volume_ml = None
+                self.source = None
+                self.updated_ms = int(time.time() * 1000)
+            logging.warning("remote volume estimation failed: %s", exc)
+            await self._notify()
+            return None
+
+        if result is None:
+            # The query window closed while waiting; nobody needs this answer any more.
+            return None
+
+        volume_ml, raw_text = result
+        if thumbnail is not None and volume_ml is not None:
+            self.estimate_cache.put(thumbnail, volume_ml, raw_text)
+        self._apply_remote(volume_ml, raw_text)
+        await self._notify()
+        return volume_ml
+
+    def _audit_due(self) -> bool:
+        return (
+            self.client is not None
+            and time.monotonic() - self.last_remote_monotonic >= VOLUME_REMOTE_AUDIT_INTERVAL_S
+        )
+
+    def _schedule_audit(self, jpeg: bytes) -> None:
+        if self.audit_task is not None and not self.audit_task.done():
+            return
+        self.audit_task = asyncio.create_task(self.request_remote(jpeg))
+
+    async def measure(self, frame_timeout_s: float) -> float | None:
+        # Wait for a frame captured after the caller's last actuation.
+        snapshot = await self.webcam.wait_for_frame(self.webcam.frame_counter, timeout_s=frame_timeout_s)
+        if snapshot is None:
+            return None
+        _frame_id, jpeg, _updated_ms, _fps = snapshot
+
+        reading = await self.local.estimate(jpeg)
+        if reading is not None:
+            self._apply_local(reading)
+            if reading.volume_ml is not None:
+                if self._audit_due():
+                    self._schedule_audit(jpeg)
+                await self._notify()
+                return reading.volume_ml
+
+        if self.client is None:
+            return None
+        return await self.request_remote(jpeg, fresh=True)
+
+    async def start(self) -> None:
+        self.local.start()
+        if self.local.available and (self.local_task is None or self.local_task.done()):
+            self.local_task = asyncio.create_task(self._local_loop())
+        if self.client is not None and (self.remote_task is None or self.remote_task.done()):
+            self.remote_task = asyncio.create_task(self._remote_loop())
+
+    async def stop(self) -> None:
+        for task in (self.local_task, self.remote_task, self.audit_task, self.remote_inflight):
+            if task is None or task.done():
+                continue
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self.local_task = None
+        self.remote_task = None
+        self.audit_task = None
+        self.remote_inflight = None
+        self.local.stop()
+        if self.client is not None:
+            with contextlib.suppress(Exception):
+                await self.client.close()
+
+    async def _local_loop(self) -> None:
+        last_seen_frame_id = 0
+        last_broadcast_monotonic = 0.0
+        last_broadcast_ml: float | None = None
+        while True:
+            try:
+                snapshot = await self.webcam.wait_for_frame(last_seen_frame_id, timeout_s=5.0)
+                if snapshot is None:
+                    continue
+                frame_id, jpeg, _updated_ms, _fps = snapshot
+                last_seen_frame_id = frame_id
+
+                reading = await self.local.estimate(jpeg)
+                if reading is None:
+                    await asyncio.sleep(VOLUME_LOCAL_BROADCAST_INTERVAL_S)
+                    continue
+                self._apply_local(reading)
+
+                now_monotonic = time.monotonic()
+                if now_monotonic - last_broadcast_monotonic < VOLUME_LOCAL_BROADCAST_INTERVAL_S:
+                    continue
+                if (
+                    last_broadcast_ml is not None
+                    and self.local_volume_ml is not None
+                    and abs(self.local_volume_ml - last_broadcast_ml) < VOLUME_LOCAL_BROADCAST_MIN_DELTA_ML
+                ):
+                    continue
+                if last_broadcast_ml is None and self.local_volume_ml is None:
+                    continue
+                last_broadcast_monotonic = now_monotonic
+                last_broadcast_ml = self.local_volume_ml
+                await self._notify()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception("local volume estimation failed")
+                await asyncio.sleep(VOLUME_LOCAL_BROADCAST_INTERVAL_S)
+
+    async def _remote_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.sleep(VOLUME_REMOTE_QUERY_INTERVAL_S)
+
+                if self.client is None:
+                    continue
+
+                if time.monotonic() > self.query_enabled_until_monotonic:
+                    continue
+
+                # A trusted local reading only needs the remote model as an occasional audit.
+                if self.local_reading_fresh() and not self._audit_due():
+                    continue
+
+                frame = self.webcam.latest_jpeg
+                if frame is None:
+                    continue
+
+                await self.request_remote(frame, windowed=True)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception("volume estimation loop failed")